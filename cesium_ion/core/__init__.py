@@ -5,11 +5,20 @@ Core module
 from .enums import AssetType, Status  # NOQA
 from .api_client import CesiumIonApiClient, API_CLIENT  # NOQA
 from .asset import Asset  # NOQA
+from .asset_table import AssetTable  # NOQA
 from .token import Token  # NOQA
+from .token_index import TokenIndex  # NOQA
+from .settings import PluginSettings  # NOQA
+from .tile_cache import TileCache, TILE_CACHE  # NOQA
 
 __all__ = ['AssetType',
            'Status',
            'CesiumIonApiClient',
            'API_CLIENT',
            'Asset',
-           'Token']
+           'AssetTable',
+           'Token',
+           'TokenIndex',
+           'PluginSettings',
+           'TileCache',
+           'TILE_CACHE']
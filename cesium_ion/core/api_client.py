@@ -3,17 +3,31 @@ Cesium ion API client
 """
 
 import json
+import threading
+import time
+from dataclasses import (
+    dataclass,
+    field
+)
+from types import MappingProxyType
 from typing import (
+    Callable,
     Dict,
     Optional,
-    List
+    List,
+    Tuple
 )
 
 from qgis.PyQt.QtCore import (
+    Qt,
     QUrl,
     QUrlQuery,
     QObject,
-    pyqtSignal
+    QEventLoop,
+    QMetaObject,
+    QTimer,
+    pyqtSignal,
+    pyqtSlot
 )
 from qgis.PyQt.QtNetwork import (
     QNetworkRequest,
@@ -22,34 +36,170 @@ from qgis.PyQt.QtNetwork import (
 from qgis.core import (
     QgsApplication,
     QgsBlockingNetworkRequest,
+    QgsNetworkAccessManager,
+    QgsMessageLog,
     Qgis
 )
 
+from .api_reply import ApiReply
 from .asset import Asset
+from .asset_catalog import AssetCatalog
+from .asset_table import AssetTable
+from .circuit_breaker import (
+    CircuitBreaker,
+    is_connectivity_failure
+)
+from .endpoint_cache import EndpointCache
+from .hedging import (
+    HedgedReply,
+    HedgingPolicy,
+    HedgingStatistics
+)
 from .meta import PLUGIN_METADATA_PARSER
+from .json_stream import (
+    JsonListDecoder,
+    ReplyItemsReader
+)
+from .pagination import PagedFetcher
+from .request_scheduler import (
+    RequestPriority,
+    RequestScheduler,
+    RequestSlot,
+    SchedulerStatistics,
+    ThreadInvoker,
+    reply_status
+)
+from .response_cache import (
+    CacheStatistics,
+    ResponseCache
+)
 from .token import Token
+from .token_index import TokenIndex
+
+
+class _BlockingCall:
+    """
+    A blocking call in progress, whose result is shared with identical
+    calls from other threads
+    """
+
+    def __init__(self):
+        self.thread_id = threading.get_ident()
+        self.done = threading.Event()
+        self.result = None
+
+
+@dataclass
+class _GetRequest:
+    """
+    An asynchronous GET request, which may be retried
+    """
+    endpoint: str
+    params: Optional[Dict[str, object]]
+    parser: Optional[Callable[[Dict], object]]
+    item_parser: Optional[Callable[[Dict], object]]
+    access_token: Optional[str]
+    in_flight_key: Tuple
+    cache_key: Optional[Tuple]
+    #: invoker for the thread which issued the request
+    invoker: ThreadInvoker
+    priority: RequestPriority = RequestPriority.Normal
+    #: replies waiting on the request
+    waiters: List[ApiReply] = field(default_factory=list)
+    #: scheduler handle for the queued request
+    queued: Optional[object] = None
+    #: number of retries made
+    attempt: int = 0
 
 
 class CesiumIonApiClient(QObject):
     """
-    Client for the Cesium ion REST API
+    Client for the Cesium ion REST API.
+
+    The client may be used concurrently from any thread, unless a method
+    states otherwise. Network requests are issued through the network
+    access manager for the calling thread, and asynchronous replies are
+    delivered in the calling thread, which must run an event loop (the
+    blocking methods run one while waiting). Signals emitted from other
+    threads are queued to receivers in the main thread.
     """
 
     URL = 'https://api.cesium.com'
     LIST_ASSETS_ENDPOINT = '/v1/assets'
     LIST_TOKENS_ENDPOINT = '/v2/tokens'
     CREATE_TOKEN_ENDPOINT = '/v2/tokens'
+    ACCOUNT_ENDPOINT = '/v1/me'
+    ASSET_ENDPOINT = '/v1/assets/{}/endpoint'
     OAUTH_ID = 'cesiion'
 
+    #: Number of assets requested per page when fetching the full catalog
+    ASSETS_PAGE_SIZE = 100
+    #: Number of tokens requested per page when fetching all tokens
+    TOKENS_PAGE_SIZE = 100
+
+    #: Size in bytes of the chunks in which finished replies are decoded
+    READ_CHUNK_SIZE = 65536
+
+    #: Maximum number of list responses held in the response cache
+    RESPONSE_CACHE_MAX_ENTRIES = 64
+    #: Time in seconds for which list responses are cached
+    RESPONSE_CACHE_TTL = 60
+    #: Time in seconds for which the token index is reused
+    TOKEN_INDEX_TTL = 300
+    #: Time in seconds after which background requests which are still
+    #: waiting to start are dropped
+    STALE_BACKGROUND_REQUEST_TIME = 120
+    #: Interval in seconds between checks of whether ion is reachable
+    #: again, while requests are failing fast
+    PROBE_INTERVAL = 15
+
+    UNREACHABLE_ERROR = 'Cesium ion is unreachable'
+
     error_occurred = pyqtSignal(str)
+    #: Emitted when ion becomes unreachable (False) or reachable again
+    #: (True). May be emitted from any thread.
+    reachability_changed = pyqtSignal(bool)
 
     def __init__(self, parent=None):
         super().__init__(parent)
-        # default headers to add to all requests
-        self.headers = {
+        # default headers to add to all requests. These are shared by all
+        # threads, so are read only
+        self._default_headers = MappingProxyType({
             'accept': 'application/json',
             'x-qgis-plugin-version': PLUGIN_METADATA_PARSER.get_version()
-        }
+        })
+        # guards the token index and in-flight requests
+        self._lock = threading.Lock()
+        # in-flight GET requests, by request key
+        self._in_flight: Dict[Tuple, _GetRequest] = {}
+        # in-flight blocking calls, by request key
+        self._in_flight_blocking: Dict[Tuple, _BlockingCall] = {}
+        # created up front, so that the catalog lives in the client's
+        # (main) thread
+        self._asset_catalog = AssetCatalog(self, parent=self)
+        self._response_cache = ResponseCache(
+            max_entries=self.RESPONSE_CACHE_MAX_ENTRIES,
+            ttl=self.RESPONSE_CACHE_TTL
+        )
+        self._token_index: Optional[TokenIndex] = None
+        self._token_index_time = 0.0
+        self._endpoint_cache = EndpointCache(self, parent=self)
+        self._scheduler = RequestScheduler()
+        self._circuit_breaker = CircuitBreaker(
+            state_changed=self._circuit_state_changed
+        )
+        self._hedging_policy = HedgingPolicy()
+        self._probe_timer = QTimer(self)
+        self._probe_timer.setInterval(self.PROBE_INTERVAL * 1000)
+        self._probe_timer.timeout.connect(self._probe)
+        self._probe_reply: Optional[QNetworkReply] = None
+
+    @property
+    def headers(self) -> Dict[str, str]:
+        """
+        Returns a copy of the default headers added to all requests
+        """
+        return dict(self._default_headers)
 
     @staticmethod
     def build_url(endpoint: str) -> QUrl:
@@ -84,7 +234,9 @@ class CesiumIonApiClient(QObject):
 
         network_request = QNetworkRequest(url)
 
-        combined_headers = self.headers
+        # never modify the shared default headers, so that per-request
+        # headers don't leak into other requests
+        combined_headers = dict(self._default_headers)
         if headers:
             combined_headers.update(headers)
 
@@ -93,16 +245,558 @@ class CesiumIonApiClient(QObject):
 
         return network_request
 
-    def list_assets_request(self,
-                            page: Optional[int] = None,
-                            filter_string: Optional[str] = None) \
-            -> QNetworkRequest:
+    @staticmethod
+    def _set_access_token(request: QNetworkRequest, access_token: str):
         """
-        List assets asynchronously
+        Authenticates a request with an access token
+        """
+        request.setRawHeader(
+            b'Authorization', 'Bearer {}'.format(access_token).encode()
+        )
+
+    def response_cache(self) -> ResponseCache:
+        """
+        Returns the in-memory cache of list responses
+        """
+        return self._response_cache
+
+    def response_cache_statistics(self) -> CacheStatistics:
+        """
+        Returns the hit and miss counts for the response cache
+        """
+        return self._response_cache.statistics()
+
+    def request_scheduler(self) -> RequestScheduler:
+        """
+        Returns the scheduler which limits the rate and concurrency of
+        API requests
+        """
+        return self._scheduler
+
+    def request_scheduler_statistics(self) -> SchedulerStatistics:
+        """
+        Returns the request scheduler statistics
+        """
+        return self._scheduler.statistics()
+
+    def circuit_breaker(self) -> CircuitBreaker:
+        """
+        Returns the circuit breaker which fails requests fast while ion
+        is unreachable
+        """
+        return self._circuit_breaker
+
+    def hedging_policy(self) -> HedgingPolicy:
+        """
+        Returns the policy which decides when slow GET requests are
+        hedged
+        """
+        return self._hedging_policy
+
+    def hedging_statistics(self) -> HedgingStatistics:
+        """
+        Returns the hedged request statistics
+        """
+        return self._hedging_policy.statistics()
+
+    def _circuit_state_changed(self, is_open: bool):
+        """
+        Called when the circuit breaker opens or closes, from any thread
+        """
+        if is_open:
+            QgsMessageLog.logMessage(
+                'Cesium ion is unreachable, requests will fail until it '
+                'can be reached again',
+                'Cesium ion', Qgis.Warning
+            )
+        else:
+            QgsMessageLog.logMessage(
+                'Cesium ion is reachable again', 'Cesium ion', Qgis.Info
+            )
+        # the probe timer lives on the main thread
+        QMetaObject.invokeMethod(self, '_update_probe_timer',
+                                 Qt.QueuedConnection)
+        self.reachability_changed.emit(not is_open)
+
+    @pyqtSlot()
+    def _update_probe_timer(self):
+        """
+        Starts probing ion while the circuit breaker is open
+        """
+        if self._circuit_breaker.is_open():
+            self._probe_timer.start()
+        else:
+            self._probe_timer.stop()
+
+    def _probe(self):
+        """
+        Checks whether ion is reachable again, with a lightweight request
+        which bypasses the circuit breaker and request scheduler
+        """
+        if not self._circuit_breaker.is_open():
+            self._probe_timer.stop()
+            return
+
+        if self._probe_reply is not None:
+            return
+
+        request = self._build_request(self.ACCOUNT_ENDPOINT)
+        request.setPriority(QNetworkRequest.LowPriority)
+        QgsApplication.authManager().updateNetworkRequest(
+            request, self.OAUTH_ID
+        )
+        self._probe_reply = QgsNetworkAccessManager.instance().get(request)
+        QgsApplication.authManager().updateNetworkReply(
+            self._probe_reply, self.OAUTH_ID
+        )
+        self._probe_reply.finished.connect(self._probe_finished)
+
+    def _probe_finished(self):
+        """
+        Called when a probe request is finished
+        """
+        reply = self._probe_reply
+        self._probe_reply = None
+        reply.deleteLater()
+
+        status_code, _ = reply_status(reply)
+        self._circuit_breaker.record(reply.error(), status_code)
+
+    def _finish_unreachable(self, reply: ApiReply,
+                            cache_key: Optional[Tuple]):
+        """
+        Finishes a reply for a request which could not reach ion, with the
+        cached response (even if expired) if available
+        """
+        stale = self._response_cache.get_stale(cache_key) \
+            if cache_key is not None else None
+        if stale is not None:
+            reply.set_result(stale, is_from_cache=True)
+        else:
+            reply.set_error(QNetworkReply.TemporaryNetworkFailureError,
+                            self.UNREACHABLE_ERROR)
+
+    def in_flight_request_count(self) -> int:
+        """
+        Returns the number of distinct GET requests currently in flight
+        """
+        with self._lock:
+            return len(self._in_flight)
+
+    def _in_flight_key(self, endpoint: str,
+                       params: Optional[Dict[str, object]],
+                       access_token: Optional[str],
+                       use_cache: bool = True) -> Tuple:
+        """
+        Returns the key identifying identical GET requests, which may
+        share a single network reply.
+
+        Requests bypassing the response cache never share replies with
+        cached requests, which may be finished with expired responses.
+        """
+        return ResponseCache.key(endpoint, params), \
+            access_token or self.OAUTH_ID, use_cache
+
+    def _coalesced_blocking(self, key: Tuple, call: Callable[[], object]):
+        """
+        Runs a blocking call, or waits for the result of an identical
+        call already running in another thread.
+
+        The main thread never waits on other threads, as their requests
+        may need the main thread (e.g. to refresh the OAuth login), and
+        calls are never shared within a thread.
+        """
+        with self._lock:
+            in_flight = self._in_flight_blocking.get(key)
+            if in_flight is None:
+                in_flight = _BlockingCall()
+                self._in_flight_blocking[key] = in_flight
+                is_owner = True
+            else:
+                is_owner = False
+
+        if not is_owner:
+            if in_flight.thread_id != threading.get_ident() and \
+                    threading.current_thread() is not threading.main_thread():
+                in_flight.done.wait()
+                return in_flight.result
+            return call()
+
+        try:
+            in_flight.result = call()
+        finally:
+            with self._lock:
+                del self._in_flight_blocking[key]
+            in_flight.done.set()
+        return in_flight.result
+
+    def _get(self,
+             endpoint: str,
+             params: Optional[Dict[str, object]],
+             parser: Optional[Callable[[Dict], object]] = None,
+             use_cache: bool = True,
+             item_parser: Optional[Callable[[Dict], object]] = None,
+             access_token: Optional[str] = None,
+             priority: RequestPriority = RequestPriority.Normal
+             ) -> ApiReply:
+        """
+        Issues an authenticated GET request to an endpoint.
+
+        The request is authenticated with the plugin's OAuth login, or
+        with access_token if specified. Responses for requests using an
+        access token, or with use_cache set to False, are never cached.
+
+        If parser is specified, the reply's result is the parsed JSON
+        response. If item_parser is specified, the response must be a list
+        response, and the result is the list of parsed items. List items
+        are decoded incrementally as the response data arrives.
+
+        Results are served from the response cache when a valid cached
+        response exists. They may be shared between callers and must not
+        be modified.
+
+        Identical requests (with the same endpoint, query parameters and
+        authentication) which are issued while a request is in flight
+        share its network reply, and all the waiting replies finish
+        together, and the shared request takes the highest priority of
+        the identical requests. Identical requests must use the same
+        parser.
+
+        Requests are started by the request scheduler in order of
+        priority, and are retried when they are rejected by the rate limit
+        or fail with server errors. Background requests which wait too
+        long to start are dropped, and fail with OperationCanceledError.
+
+        While ion is unreachable, requests fail immediately with
+        TemporaryNetworkFailureError, or are served from the response
+        cache even if the cached response has expired (unless use_cache
+        is False, in which case cached responses are never used).
+
+        The reply's finished signal is emitted in the calling thread.
+        """
+        reply = ApiReply()
+        # responses which must not be reused, such as endpoints with
+        # short-lived access tokens, are never stored
+        key = ResponseCache.key(endpoint, params) \
+            if use_cache and not access_token else None
+        if key is not None:
+            cached = self._response_cache.get(key)
+            if cached is not None:
+                reply.set_result(cached, is_from_cache=True)
+                return reply
+
+        if not self._circuit_breaker.allow_request():
+            self._finish_unreachable(reply, key)
+            return reply
+
+        in_flight_key = self._in_flight_key(endpoint, params, access_token,
+                                            use_cache)
+        with self._lock:
+            in_flight = self._in_flight.get(in_flight_key)
+            if in_flight is not None:
+                # an identical request is already in flight, so share its
+                # network reply
+                in_flight.waiters.append(reply)
+                promote = priority < in_flight.priority
+                if promote:
+                    in_flight.priority = priority
+            else:
+                get_request = _GetRequest(
+                    endpoint=endpoint,
+                    params=params,
+                    parser=parser,
+                    item_parser=item_parser,
+                    access_token=access_token,
+                    in_flight_key=in_flight_key,
+                    cache_key=key,
+                    invoker=ThreadInvoker.for_current_thread(),
+                    priority=priority,
+                    waiters=[reply]
+                )
+                self._in_flight[in_flight_key] = get_request
+
+        if in_flight is not None:
+            if promote and in_flight.queued is not None:
+                self._scheduler.promote(in_flight.queued, priority)
+            return reply
+
+        self._submit_get(get_request)
+        return reply
+
+    def _submit_get(self, get_request: _GetRequest, delay: float = 0):
+        """
+        Queues a GET request with the request scheduler. The request is
+        started in the thread which issued it.
+        """
+        get_request.queued = self._scheduler.submit(
+            lambda slot: get_request.invoker.invoke(
+                lambda: self._start_get(get_request, slot)
+            ),
+            delay,
+            get_request.priority,
+            max_queue_time=self.STALE_BACKGROUND_REQUEST_TIME
+            if get_request.priority == RequestPriority.Background else None,
+            dropped=lambda: get_request.invoker.invoke(
+                lambda: self._get_dropped(get_request)
+            )
+        )
+
+    def _get_dropped(self, get_request: _GetRequest):
+        """
+        Called when a queued GET request is dropped by the scheduler
+        """
+        with self._lock:
+            self._in_flight.pop(get_request.in_flight_key, None)
+            waiters = list(get_request.waiters)
+        for reply in waiters:
+            reply.set_error(QNetworkReply.OperationCanceledError,
+                            'Request dropped while queued')
+
+    def _start_get(self, get_request: _GetRequest, slot: RequestSlot):
+        """
+        Issues the network request for a GET request
+        """
+        if not self._circuit_breaker.allow_request():
+            # ion became unreachable while the request was queued
+            self._scheduler.finish(slot)
+            with self._lock:
+                self._in_flight.pop(get_request.in_flight_key, None)
+                waiters = list(get_request.waiters)
+            for reply in waiters:
+                self._finish_unreachable(reply, get_request.cache_key)
+            return
+
+        request = self._build_request(get_request.endpoint,
+                                      params=get_request.params)
+        request.setPriority(get_request.priority.network_priority())
+        # QgsNetworkAccessManager.instance() is the network access manager
+        # for the calling thread
+        network_access_manager = QgsNetworkAccessManager.instance()
+
+        def send() -> QNetworkReply:
+            if get_request.access_token:
+                self._set_access_token(request, get_request.access_token)
+                return network_access_manager.get(request)
+
+            QgsApplication.authManager().updateNetworkRequest(
+                request, self.OAUTH_ID
+            )
+            network_reply = network_access_manager.get(request)
+            QgsApplication.authManager().updateNetworkReply(
+                network_reply, self.OAUTH_ID
+            )
+            return network_reply
+
+        # GET requests are idempotent, so may be hedged
+        hedged_reply = HedgedReply(
+            send,
+            self._hedging_policy,
+            reader_factory=(
+                lambda network_reply: ReplyItemsReader(
+                    network_reply, get_request.item_parser
+                )
+            ) if get_request.item_parser is not None else None,
+            parent=network_access_manager
+        )
+
+        if get_request.item_parser is not None:
+            def parse_result():
+                items, _ = hedged_reply.reader().finish()
+                return items
+        else:
+            def parse_result():
+                return get_request.parser(
+                    json.loads(
+                        hedged_reply.reply().readAll().data().decode()
+                    )
+                )
+
+        def finished():
+            hedged_reply.deleteLater()
+            self._network_reply_finished(
+                hedged_reply.reply(), get_request, slot, parse_result
+            )
+
+        hedged_reply.finished.connect(finished)
+        hedged_reply.start()
+
+    def _network_reply_finished(self,
+                                network_reply: QNetworkReply,
+                                get_request: _GetRequest,
+                                slot: RequestSlot,
+                                parse_result: Callable[[], object]):
+        """
+        Called when the network reply for a GET request is finished, and
+        finishes all the replies waiting on it
+        """
+        network_reply.deleteLater()
+
+        status_code, retry_after = reply_status(network_reply)
+        self._scheduler.finish(slot, status_code, retry_after)
+        elapsed = time.monotonic() - slot.started
+        self._circuit_breaker.record(network_reply.error(), status_code,
+                                     elapsed)
+
+        if network_reply.error() not in (
+                QNetworkReply.NoError,
+                QNetworkReply.OperationCanceledError):
+            delay = self._scheduler.retry_delay(
+                get_request.attempt, status_code, retry_after
+            )
+            if delay is not None:
+                get_request.attempt += 1
+                self._submit_get(get_request, delay)
+                return
+
+        # replies which join after this point issue a new request
+        with self._lock:
+            self._in_flight.pop(get_request.in_flight_key, None)
+            waiters = list(get_request.waiters)
+
+        if is_connectivity_failure(network_reply.error(), status_code,
+                                   elapsed) and \
+                get_request.cache_key is not None and \
+                self._response_cache.get_stale(get_request.cache_key) \
+                is not None:
+            # serve the cached response, rather than failing
+            for reply in waiters:
+                self._finish_unreachable(reply, get_request.cache_key)
+            return
+
+        if network_reply.error() == QNetworkReply.OperationCanceledError:
+            for reply in waiters:
+                reply.set_error(network_reply.error(),
+                                network_reply.errorString())
+            return
+
+        if network_reply.error() != QNetworkReply.NoError:
+            self.error_occurred.emit(network_reply.errorString())
+            for reply in waiters:
+                reply.set_error(network_reply.error(),
+                                network_reply.errorString())
+            return
+
+        try:
+            result = parse_result()
+        except (ValueError, KeyError) as e:
+            self.error_occurred.emit(str(e))
+            for reply in waiters:
+                reply.set_error(QNetworkReply.UnknownContentError, str(e))
+            return
+
+        if get_request.cache_key is not None:
+            self._response_cache.put(get_request.cache_key, result)
+        for reply in waiters:
+            reply.set_result(result)
+
+    def _acquire_slot_blocking(self, delay: float = 0,
+                               priority: RequestPriority =
+                               RequestPriority.Normal) -> RequestSlot:
+        """
+        Blocks until the request scheduler allows a request to start, no
+        earlier than delay seconds from now
+        """
+        slots = []
+        loop = QEventLoop()
+        invoker = ThreadInvoker.for_current_thread()
+
+        def started(slot: RequestSlot):
+            slots.append(slot)
+            loop.quit()
+
+        self._scheduler.submit(
+            lambda slot: invoker.invoke(lambda: started(slot)),
+            delay,
+            priority
+        )
+        if not slots:
+            loop.exec_()
+        return slots[0]
+
+    def _send_blocking(self, request: QNetworkRequest,
+                       data: Optional[bytes] = None,
+                       auth_cfg: Optional[str] = None,
+                       priority: RequestPriority = RequestPriority.Normal) \
+            -> Tuple[Optional[QgsBlockingNetworkRequest],
+                     QgsBlockingNetworkRequest.ErrorCode]:
+        """
+        Sends a GET request (or a POST request, if data is specified)
+        through the request scheduler, blocking until it is complete.
+
+        Requests which are rejected by the rate limit or fail with server
+        errors are retried, after waiting for the delay requested by the
+        server or an increasing backoff delay. POST requests are only
+        retried when rejected by the rate limit.
+
+        While ion is unreachable, the request fails immediately and None
+        is returned in place of the blocking request.
+        """
+        request.setPriority(priority.network_priority())
+        attempt = 0
+        delay = 0
+        while True:
+            if not self._circuit_breaker.allow_request():
+                return None, QgsBlockingNetworkRequest.NetworkError
+
+            slot = self._acquire_slot_blocking(delay, priority)
+            blocking_request = QgsBlockingNetworkRequest()
+            if auth_cfg:
+                blocking_request.setAuthCfg(auth_cfg)
+            if data is None:
+                res = blocking_request.get(request)
+            else:
+                res = blocking_request.post(request, data)
+
+            status_code, retry_after = reply_status(blocking_request.reply())
+            self._scheduler.finish(slot, status_code, retry_after)
+            if res == QgsBlockingNetworkRequest.TimeoutError:
+                self._circuit_breaker.record_failure()
+            else:
+                self._circuit_breaker.record(
+                    blocking_request.reply().error(), status_code
+                )
+            if res == QgsBlockingNetworkRequest.NoError:
+                return blocking_request, res
+
+            delay = self._scheduler.retry_delay(
+                attempt, status_code, retry_after, idempotent=data is None
+            )
+            if delay is None:
+                return blocking_request, res
+
+            attempt += 1
+
+    def _get_blocking(self,
+                      endpoint: str,
+                      params: Optional[Dict[str, object]],
+                      parser: Optional[Callable[[Dict], object]] = None,
+                      use_cache: bool = True,
+                      item_parser: Optional[Callable[[Dict], object]] = None
+                      ) -> ApiReply:
+        """
+        Issues an authenticated GET request to an endpoint, blocking
+        until the reply is finished
+        """
+        reply = self._get(endpoint, params, parser, use_cache, item_parser)
+        if not reply.is_finished():
+            loop = QEventLoop()
+            reply.finished.connect(loop.quit)
+            loop.exec_()
+        return reply
+
+    @staticmethod
+    def _list_assets_params(page: Optional[int] = None,
+                            filter_string: Optional[str] = None,
+                            limit: Optional[int] = None) \
+            -> Dict[str, object]:
+        """
+        Returns the query parameters for listing assets
         """
         params = {}
         if page is not None:
             params['page'] = page
+        if limit is not None:
+            params['limit'] = limit
         if filter_string:
             params['search'] = filter_string
 
@@ -111,10 +805,19 @@ class CesiumIonApiClient(QObject):
         # quantized mesh support
         if Qgis.versionInt() >= 34000:
             params['type'].append('TERRAIN')
+        return params
 
+    def list_assets_request(self,
+                            page: Optional[int] = None,
+                            filter_string: Optional[str] = None,
+                            limit: Optional[int] = None) \
+            -> QNetworkRequest:
+        """
+        List assets asynchronously
+        """
         request = self._build_request(
             self.LIST_ASSETS_ENDPOINT,
-            params=params
+            params=self._list_assets_params(page, filter_string, limit)
         )
         return request
 
@@ -125,48 +828,306 @@ class CesiumIonApiClient(QObject):
         """
         Parse a list assets reply and return as a list of Asset objects
         """
-        req = self.list_assets_request(page, filter_string)
-        blocking_request = QgsBlockingNetworkRequest()
-        blocking_request.setAuthCfg(API_CLIENT.OAUTH_ID)
+        reply = self._get_blocking(
+            self.LIST_ASSETS_ENDPOINT,
+            self._list_assets_params(page, filter_string),
+            item_parser=Asset.from_json
+        )
+        return list(reply.result() or [])
 
-        res = blocking_request.get(req)
-        if res != QgsBlockingNetworkRequest.NoError:
-            self.error_occurred.emit(blocking_request.errorMessage())
-            return []
+    def list_all_assets_fetcher(self,
+                                filter_string: Optional[str] = None,
+                                parent: Optional[QObject] = None,
+                                priority: RequestPriority =
+                                RequestPriority.Normal
+                                ) -> PagedFetcher:
+        """
+        Returns a fetcher which retrieves every page of the asset listing.
 
-        reply = blocking_request.reply()
-        if reply.error() == QNetworkReply.OperationCanceledError:
-            return []
+        The fetcher is not started.
+        """
+        fetcher = PagedFetcher(
+            lambda page: self.list_assets_request(
+                page, filter_string, self.ASSETS_PAGE_SIZE
+            ),
+            Asset.from_json,
+            page_size=self.ASSETS_PAGE_SIZE,
+            auth_cfg=self.OAUTH_ID,
+            scheduler=self._scheduler,
+            priority=priority,
+            circuit_breaker=self._circuit_breaker,
+            hedging_policy=self._hedging_policy,
+            parent=parent
+        )
+        fetcher.error_occurred.connect(self.error_occurred)
+        return fetcher
 
-        if reply.error() != QNetworkReply.NoError:
-            self.error_occurred.emit(reply.errorString())
-            return []
+    def list_all_assets_blocking(self,
+                                 filter_string: Optional[str] = None
+                                 ) -> List[Asset]:
+        """
+        Retrieves the complete asset listing, following every page, and
+        returns it as a list of Asset objects.
 
-        assets_json = json.loads(reply.content().data().decode())['items']
-        return [Asset.from_json(asset) for asset in assets_json]
+        Identical listings already being retrieved by other threads are
+        shared.
+        """
+        key = self._in_flight_key(
+            self.LIST_ASSETS_ENDPOINT,
+            self._list_assets_params(filter_string=filter_string,
+                                     limit=self.ASSETS_PAGE_SIZE),
+            None
+        )
+        return list(self._coalesced_blocking(
+            key,
+            lambda: self.list_all_assets_fetcher(
+                filter_string
+            ).fetch_all_blocking()
+        ) or [])
 
-    def list_tokens_request(self,
-                            page: Optional[int] = None,
-                            filter_string: Optional[str] = None) \
-            -> QNetworkRequest:
+    def asset_catalog(self) -> AssetCatalog:
         """
-        Creates a list tokens request
+        Returns the persistent asset catalog for the current account.
+
+        The catalog must only be used from the main thread.
+        """
+        return self._asset_catalog
+
+    def cached_assets(self) -> Optional[List[Asset]]:
+        """
+        Returns the most recently fetched complete asset catalog without
+        any network access, or None if no catalog is available (e.g.
+        while the stored catalog is loading).
+
+        Must be called from the main thread.
+        """
+        return self.asset_catalog().assets()
+
+    def asset_table(self) -> Optional[AssetTable]:
+        """
+        Returns the most recently fetched complete asset catalog as a
+        columnar asset table, for fast sorting, filtering and aggregation.
+
+        Returns None if no catalog is available or NumPy is not
+        installed. Must be called from the main thread.
+        """
+        return self.asset_catalog().table()
+
+    def get_account(self,
+                    priority: RequestPriority = RequestPriority.Normal
+                    ) -> ApiReply:
+        """
+        Requests the current account's details asynchronously.
+
+        The reply's result is the raw JSON account response. Responses
+        are never cached, so that account changes are always detected.
+        """
+        return self._get(
+            self.ACCOUNT_ENDPOINT,
+            None,
+            parser=lambda json_data: json_data,
+            use_cache=False,
+            priority=priority
+        )
+
+    def endpoint_cache(self) -> EndpointCache:
+        """
+        Returns the cache of resolved asset endpoints, shared by the
+        plugin's tile prefetching, offline packs and tile proxy
+        """
+        return self._endpoint_cache
+
+    def get_asset_endpoint(self, asset_id,
+                           access_token: Optional[str] = None,
+                           priority: RequestPriority =
+                           RequestPriority.Normal) -> ApiReply:
+        """
+        Requests the endpoint for an asset asynchronously, using the
+        specified access token or the plugin's OAuth login.
+
+        The reply's result is the raw JSON endpoint response. Use
+        endpoint_cache() to resolve endpoints with caching.
+        """
+        return self._get(
+            self.ASSET_ENDPOINT.format(int(asset_id)),
+            None,
+            parser=lambda json_data: json_data,
+            use_cache=False,
+            access_token=access_token,
+            priority=priority
+        )
+
+    def get_asset_endpoint_blocking(self, asset_id,
+                                    access_token: Optional[str] = None,
+                                    priority: RequestPriority =
+                                    RequestPriority.Normal
+                                    ) -> Tuple[Optional[Dict],
+                                               QNetworkReply.NetworkError]:
+        """
+        Requests the endpoint for an asset, blocking until the request is
+        complete. May be called from any thread.
+
+        Returns the raw JSON endpoint response (or None if the request
+        failed) and the network error.
+        """
+        request = self._build_request(
+            self.ASSET_ENDPOINT.format(int(asset_id))
+        )
+
+        if access_token:
+            self._set_access_token(request, access_token)
+        blocking_request, res = self._send_blocking(
+            request, auth_cfg=None if access_token else self.OAUTH_ID,
+            priority=priority
+        )
+        if blocking_request is None:
+            return None, QNetworkReply.TemporaryNetworkFailureError
+
+        reply = blocking_request.reply()
+        if res != QgsBlockingNetworkRequest.NoError:
+            error = reply.error()
+            if error == QNetworkReply.NoError:
+                error = QNetworkReply.UnknownNetworkError
+            return None, error
+
+        try:
+            return json.loads(reply.content().data().decode()), \
+                QNetworkReply.NoError
+        except ValueError:
+            return None, QNetworkReply.UnknownContentError
+
+    @staticmethod
+    def _list_tokens_params(page: Optional[int] = None,
+                            filter_string: Optional[str] = None,
+                            limit: Optional[int] = None) \
+            -> Dict[str, object]:
+        """
+        Returns the query parameters for listing tokens
         """
         params = {}
         if page is not None:
             params['page'] = page
+        if limit is not None:
+            params['limit'] = limit
         if filter_string:
             params['search'] = filter_string
+        return params
 
+    def list_tokens_request(self,
+                            page: Optional[int] = None,
+                            filter_string: Optional[str] = None,
+                            limit: Optional[int] = None) \
+            -> QNetworkRequest:
+        """
+        Creates a list tokens request
+        """
         request = self._build_request(
             self.LIST_TOKENS_ENDPOINT,
-            params=params
+            params=self._list_tokens_params(page, filter_string, limit)
         )
         QgsApplication.authManager().updateNetworkRequest(
             request, API_CLIENT.OAUTH_ID
         )
         return request
 
+    def list_tokens(self,
+                    page: Optional[int] = None,
+                    filter_string: Optional[str] = None,
+                    priority: RequestPriority = RequestPriority.Normal
+                    ) -> ApiReply:
+        """
+        Lists tokens asynchronously.
+
+        The reply's result is a list of Token objects.
+        """
+        return self._get(
+            self.LIST_TOKENS_ENDPOINT,
+            self._list_tokens_params(page, filter_string),
+            item_parser=Token.from_json,
+            priority=priority
+        )
+
+    def list_all_tokens_fetcher(self,
+                                parent: Optional[QObject] = None,
+                                priority: RequestPriority =
+                                RequestPriority.Normal
+                                ) -> PagedFetcher:
+        """
+        Returns a fetcher which retrieves every page of the token listing.
+
+        The fetcher is not started.
+        """
+        fetcher = PagedFetcher(
+            lambda page: self.list_tokens_request(
+                page, limit=self.TOKENS_PAGE_SIZE
+            ),
+            Token.from_json,
+            page_size=self.TOKENS_PAGE_SIZE,
+            auth_cfg=self.OAUTH_ID,
+            scheduler=self._scheduler,
+            priority=priority,
+            circuit_breaker=self._circuit_breaker,
+            hedging_policy=self._hedging_policy,
+            parent=parent
+        )
+        fetcher.error_occurred.connect(self.error_occurred)
+        return fetcher
+
+    def list_all_tokens_blocking(self,
+                                 priority: RequestPriority =
+                                 RequestPriority.Normal) -> List[Token]:
+        """
+        Retrieves the complete token listing, following every page, and
+        returns it as a list of Token objects.
+
+        Listings already being retrieved by other threads are shared.
+        """
+        key = self._in_flight_key(
+            self.LIST_TOKENS_ENDPOINT,
+            self._list_tokens_params(limit=self.TOKENS_PAGE_SIZE),
+            None
+        )
+        return list(self._coalesced_blocking(
+            key,
+            lambda: self.list_all_tokens_fetcher(
+                priority=priority
+            ).fetch_all_blocking()
+        ) or [])
+
+    def token_index(self) -> TokenIndex:
+        """
+        Returns an index of all the account's tokens, by asset ID and
+        scope.
+
+        The index is rebuilt from the complete token listing if it is
+        older than TOKEN_INDEX_TTL, which blocks until all pages of the
+        listing have been retrieved. If the listing can't be retrieved,
+        the expired index is returned if available.
+        """
+        with self._lock:
+            if self._token_index is not None and \
+                    time.monotonic() - self._token_index_time <= \
+                    self.TOKEN_INDEX_TTL:
+                return self._token_index
+
+        # the listing is retrieved without holding the lock, as it runs
+        # an event loop. The index is used while users add layers, so
+        # don't wait behind background requests
+        tokens = self.list_all_tokens_blocking(RequestPriority.Interactive)
+        # an empty listing indicates a failed request (accounts always
+        # have a default token), so don't hold on to it
+        if not tokens:
+            with self._lock:
+                if self._token_index is not None:
+                    return self._token_index
+            return TokenIndex(tokens)
+
+        index = TokenIndex(tokens)
+        with self._lock:
+            self._token_index = index
+            self._token_index_time = time.monotonic()
+        return index
+
     def parse_list_tokens_reply(self,
                                 reply: QNetworkReply
                                 ) -> List[Token]:
@@ -180,9 +1141,17 @@ class CesiumIonApiClient(QObject):
         if reply.error() == QNetworkReply.OperationCanceledError:
             return []
 
-        reply_data = reply.readAll()
-        tokens_json = json.loads(reply_data.data().decode())['items']
-        return [Token.from_json(token) for token in tokens_json]
+        # decode the reply in chunks, rather than copying the complete
+        # response into a string
+        decoder = JsonListDecoder()
+        tokens = []
+        while reply.bytesAvailable() > 0:
+            chunk = reply.read(self.READ_CHUNK_SIZE)
+            tokens.extend(
+                Token.from_json(token) for token in decoder.feed(chunk)
+            )
+        tokens.extend(Token.from_json(token) for token in decoder.close())
+        return tokens
 
     def create_token(self, token_name: str,
                      scopes: List[str],
@@ -200,10 +1169,14 @@ class CesiumIonApiClient(QObject):
             {'Content-Type': 'application/json'}
         )
 
-        blocking_request = QgsBlockingNetworkRequest()
-        blocking_request.setAuthCfg(API_CLIENT.OAUTH_ID)
+        blocking_request, res = self._send_blocking(
+            request, json.dumps(params).encode(), auth_cfg=self.OAUTH_ID,
+            priority=RequestPriority.Interactive
+        )
+        if blocking_request is None:
+            self.error_occurred.emit(self.UNREACHABLE_ERROR)
+            return None
 
-        res = blocking_request.post(request, json.dumps(params).encode())
         if res != QgsBlockingNetworkRequest.NoError:
             self.error_occurred.emit(blocking_request.errorMessage())
             return None
@@ -216,8 +1189,19 @@ class CesiumIonApiClient(QObject):
             self.error_occurred.emit(reply.errorString())
             return None
 
+        # the new token must be included in subsequent token listings
+        self._response_cache.invalidate(self.LIST_TOKENS_ENDPOINT)
+
         token_json = json.loads(reply.content().data().decode())
-        return Token.from_json(token_json)
+        token = Token.from_json(token_json)
+        with self._lock:
+            if self._token_index is not None:
+                # copy the index rather than modifying it, as it may be in
+                # use by other threads
+                index = TokenIndex(self._token_index.tokens())
+                index.add(token)
+                self._token_index = index
+        return token
 
 
 API_CLIENT = CesiumIonApiClient()
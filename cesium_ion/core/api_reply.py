@@ -0,0 +1,99 @@
+"""
+Cesium ion API reply
+"""
+
+from typing import Optional
+
+from qgis.PyQt.QtCore import (
+    Qt,
+    QObject,
+    QMetaObject,
+    pyqtSignal,
+    pyqtSlot
+)
+from qgis.PyQt.QtNetwork import QNetworkReply
+
+
+class ApiReply(QObject):
+    """
+    The result of an asynchronous Cesium ion API request, which may be
+    served from the network or from the response cache.
+
+    The finished signal is always emitted asynchronously, so it is safe
+    to connect to it after the reply has been returned.
+    """
+
+    finished = pyqtSignal()
+
+    def __init__(self, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._is_finished = False
+        self._result = None
+        self._error = QNetworkReply.NoError
+        self._error_string = ''
+        self._is_from_cache = False
+
+    def is_finished(self) -> bool:
+        """
+        Returns True if the reply has finished
+        """
+        return self._is_finished
+
+    def result(self):
+        """
+        Returns the parsed result of the request, or None if the request
+        failed or has not yet finished
+        """
+        return self._result
+
+    def error(self) -> QNetworkReply.NetworkError:
+        """
+        Returns the network error for the request
+        """
+        return self._error
+
+    def error_string(self) -> str:
+        """
+        Returns a descriptive error string for the request
+        """
+        return self._error_string
+
+    def is_from_cache(self) -> bool:
+        """
+        Returns True if the result was served from the response cache
+        """
+        return self._is_from_cache
+
+    def set_result(self, result, is_from_cache: bool = False):
+        """
+        Finishes the reply with a successful result
+        """
+        self._result = result
+        self._is_from_cache = is_from_cache
+        self._set_finished()
+
+    def set_error(self, error: QNetworkReply.NetworkError,
+                  error_string: str):
+        """
+        Finishes the reply with an error
+        """
+        self._error = error
+        self._error_string = error_string
+        self._set_finished()
+
+    def _set_finished(self):
+        """
+        Marks the reply as finished, and schedules the finished signal
+        """
+        if self._is_finished:
+            return
+
+        self._is_finished = True
+        QMetaObject.invokeMethod(self, '_emit_finished', Qt.QueuedConnection)
+
+    @pyqtSlot()
+    def _emit_finished(self):
+        """
+        Emits the finished signal
+        """
+        self.finished.emit()
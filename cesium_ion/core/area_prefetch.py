@@ -0,0 +1,444 @@
+"""
+Area of interest tile prefetching
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+from dataclasses import (
+    dataclass,
+    field
+)
+from pathlib import Path
+from typing import (
+    List,
+    Optional,
+    Set
+)
+
+from qgis.PyQt.QtCore import (
+    QObject,
+    QUrl,
+    pyqtSignal
+)
+from qgis.PyQt.QtNetwork import (
+    QNetworkReply,
+    QNetworkRequest
+)
+from qgis.core import (
+    QgsApplication,
+    QgsNetworkAccessManager
+)
+
+from .tile_bounds import TileArea
+from .tile_cache import TileCache
+from .tile_prefetch import TilePrefetcher
+
+
+@dataclass
+class PrefetchPlan:
+    """
+    The tiles to prefetch for an asset and area of interest, and the
+    progress made fetching them
+    """
+    asset_id: int
+    urls: List[str] = field(default_factory=list)
+    completed: Set[str] = field(default_factory=set)
+    #: estimated total size of the tiles in bytes, or None if unknown
+    estimated_bytes: Optional[int] = None
+
+    def remaining_count(self) -> int:
+        """
+        Returns the number of tiles not yet fetched
+        """
+        return len(self.urls) - len(self.completed)
+
+    def is_complete(self) -> bool:
+        """
+        Returns True if all tiles have been fetched
+        """
+        return self.remaining_count() <= 0
+
+    def estimated_remaining_bytes(self) -> Optional[int]:
+        """
+        Returns the estimated size in bytes of the tiles not yet fetched,
+        or None if unknown
+        """
+        if self.estimated_bytes is None or not self.urls:
+            return None
+        return int(self.estimated_bytes * self.remaining_count() /
+                   len(self.urls))
+
+
+class PrefetchStore:
+    """
+    Stores area prefetch plans on disk, so that interrupted prefetches
+    can be resumed
+    """
+
+    #: Format version of the stored plan files
+    VERSION = 1
+
+    def __init__(self, directory: Optional[str] = None):
+        if directory is None:
+            directory = os.path.join(
+                QgsApplication.qgisSettingsDirPath(),
+                'cesium_ion',
+                'prefetch'
+            )
+        self._directory = Path(directory)
+
+    @staticmethod
+    def plan_key(asset_id: int, area: TileArea,
+                 max_geometric_error: float,
+                 area_id: str = '') -> str:
+        """
+        Returns the key identifying the plan for an asset, area and
+        geometric error
+        """
+        description = json.dumps([int(asset_id),
+                                  [round(v, 7) for v in area.extent],
+                                  max_geometric_error,
+                                  area_id])
+        return hashlib.sha1(description.encode()).hexdigest()
+
+    def _plan_path(self, key: str) -> Path:
+        """
+        Returns the path of the file for a plan
+        """
+        safe_key = ''.join(c for c in key if c.isalnum())
+        return self._directory / 'plan_{}.json'.format(safe_key)
+
+    def load(self, key: str) -> Optional[PrefetchPlan]:
+        """
+        Loads a stored plan, returning None if no valid plan is stored
+        """
+        try:
+            with open(self._plan_path(key), 'rt', encoding='utf8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if stored.get('version') != self.VERSION:
+            return None
+
+        try:
+            urls = stored['urls']
+            return PrefetchPlan(
+                asset_id=int(stored['asset_id']),
+                urls=urls,
+                completed={urls[i] for i in stored['completed']},
+                estimated_bytes=stored.get('estimated_bytes')
+            )
+        except (KeyError, IndexError, TypeError, ValueError):
+            return None
+
+    def save(self, key: str, plan: PrefetchPlan) -> bool:
+        """
+        Stores a plan, replacing any previously stored plan with the same
+        key.
+
+        Returns True if the plan was successfully written.
+        """
+        stored = {
+            'version': self.VERSION,
+            'asset_id': plan.asset_id,
+            'urls': plan.urls,
+            # completed tiles are stored by index, to keep files small
+            'completed': [i for i, url in enumerate(plan.urls)
+                          if url in plan.completed],
+            'estimated_bytes': plan.estimated_bytes
+        }
+
+        temp_path: Optional[str] = None
+        try:
+            self._directory.mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                    'wt', encoding='utf8', dir=str(self._directory),
+                    suffix='.tmp', delete=False) as f:
+                temp_path = f.name
+                json.dump(stored, f, separators=(',', ':'))
+            os.replace(temp_path, self._plan_path(key))
+            temp_path = None
+        except OSError:
+            return False
+        finally:
+            if temp_path is not None:
+                # the write failed, so don't leave the partial file behind
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+
+        return True
+
+    def remove(self, key: str):
+        """
+        Removes a stored plan
+        """
+        try:
+            self._plan_path(key).unlink()
+        except OSError:
+            pass
+
+
+class AreaPrefetch(QObject):
+    """
+    Prefetches the tiles of an asset which intersect an area of interest,
+    down to a target geometric error, into the QGIS network cache.
+
+    Prefetching happens in two steps. plan() traverses the tilesets to
+    find the tiles to fetch and estimates their total size by sampling,
+    then download() fetches the tiles. Plans and download progress are
+    stored, so an interrupted download resumes where it stopped.
+
+    Must be used from the main thread.
+    """
+
+    #: Number of tiles sampled to estimate the total download size
+    SIZE_SAMPLE_COUNT = 16
+    #: Number of fetched tiles between saves of the download progress
+    SAVE_INTERVAL = 100
+
+    #: Emitted when the plan is ready, with the number of tiles remaining
+    #: and the estimated number of bytes remaining (or -1 if unknown)
+    planned = pyqtSignal(int, 'qint64')
+    #: Emitted with the progress percentage of the current step
+    progress_changed = pyqtSignal(float)
+    #: Emitted when the current step has finished, failed or been
+    #: canceled
+    finished = pyqtSignal()
+    #: Emitted with an error message if prefetching failed
+    error_occurred = pyqtSignal(str)
+
+    # pylint: disable=too-many-arguments
+    def __init__(self,
+                 client,
+                 asset_id: int,
+                 area: TileArea,
+                 max_geometric_error: float,
+                 area_id: str = '',
+                 store: Optional[PrefetchStore] = None,
+                 tile_cache: Optional[TileCache] = None,
+                 parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._client = client
+        self._tile_cache = tile_cache
+        self._asset_id = int(asset_id)
+        self._area = area
+        self._max_geometric_error = max_geometric_error
+        self._store = store or PrefetchStore()
+        self._key = PrefetchStore.plan_key(
+            self._asset_id, area, max_geometric_error, area_id
+        )
+
+        self._plan: Optional[PrefetchPlan] = None
+        self._prefetcher: Optional[TilePrefetcher] = None
+        self._size_replies: List[QNetworkReply] = []
+        self._sampled_sizes: List[int] = []
+        self._unsaved_count = 0
+        self._is_canceled = False
+    # pylint: enable=too-many-arguments
+
+    def current_plan(self) -> Optional[PrefetchPlan]:
+        """
+        Returns the current plan, if planned
+        """
+        return self._plan
+
+    def is_resumable(self) -> bool:
+        """
+        Returns True if an incomplete plan is stored from an earlier
+        prefetch
+        """
+        stored = self._store.load(self._key)
+        return stored is not None and not stored.is_complete()
+
+    def plan(self):
+        """
+        Plans the prefetch, by traversing the tilesets and estimating the
+        download size. If an incomplete plan is stored from an earlier
+        prefetch then it is reused.
+        """
+        self._is_canceled = False
+        stored = self._store.load(self._key)
+        if stored is not None and not stored.is_complete():
+            self._plan = stored
+            self._emit_planned()
+            self.finished.emit()
+            return
+
+        self._prefetcher = TilePrefetcher(
+            self._client,
+            self._asset_id,
+            max_depth=None,
+            max_geometric_error=self._max_geometric_error,
+            area=self._area,
+            plan_only=True,
+            parent=self
+        )
+        self._prefetcher.progress_changed.connect(self._traversal_progress)
+        self._prefetcher.error_occurred.connect(self.error_occurred)
+        self._prefetcher.finished.connect(self._traversal_finished)
+        self._prefetcher.start()
+
+    def download(self):
+        """
+        Downloads the planned tiles which have not already been fetched
+        """
+        if self._plan is None:
+            return
+
+        self._is_canceled = False
+        self._prefetcher = TilePrefetcher(
+            self._client,
+            self._asset_id,
+            tile_urls=self._plan.urls,
+            skip_urls=self._plan.completed,
+            tile_cache=self._tile_cache,
+            parent=self
+        )
+        self._prefetcher.progress_changed.connect(self._download_progress)
+        self._prefetcher.tile_fetched.connect(self._tile_fetched)
+        self._prefetcher.error_occurred.connect(self.error_occurred)
+        self._prefetcher.finished.connect(self._download_finished)
+        self._prefetcher.start()
+
+    def cancel(self):
+        """
+        Cancels the current step. Download progress is kept, so that a
+        later download resumes from where it stopped.
+        """
+        self._is_canceled = True
+        for reply in list(self._size_replies):
+            reply.abort()
+        if self._prefetcher is not None:
+            self._prefetcher.cancel()
+
+    def _traversal_progress(self, fetched: int, discovered: int):
+        """
+        Called when the tileset traversal progresses
+        """
+        if discovered:
+            self.progress_changed.emit(100 * fetched / discovered)
+
+    def _traversal_finished(self):
+        """
+        Called when the tileset traversal has finished
+        """
+        prefetcher = self._prefetcher
+        self._prefetcher = None
+        prefetcher.deleteLater()
+
+        if prefetcher.is_canceled() or prefetcher.endpoint() is None:
+            self.finished.emit()
+            return
+
+        self._plan = PrefetchPlan(
+            asset_id=self._asset_id,
+            urls=prefetcher.planned_urls()
+        )
+        self._sample_sizes(prefetcher)
+
+    def _sample_sizes(self, prefetcher: TilePrefetcher):
+        """
+        Estimates the download size by requesting the headers of a sample
+        of the planned tiles
+        """
+        urls = self._plan.urls
+        if not urls:
+            self._sizes_sampled()
+            return
+
+        step = max(1, len(urls) // self.SIZE_SAMPLE_COUNT)
+        endpoint = prefetcher.endpoint()
+        self._sampled_sizes = []
+        for url in urls[::step][:self.SIZE_SAMPLE_COUNT]:
+            request = QNetworkRequest(QUrl(url))
+            if endpoint.access_token:
+                request.setRawHeader(
+                    b'Authorization',
+                    'Bearer {}'.format(endpoint.access_token).encode()
+                )
+            reply = QgsNetworkAccessManager.instance().head(request)
+            self._size_replies.append(reply)
+            reply.finished.connect(
+                lambda reply=reply: self._size_reply_finished(reply)
+            )
+
+    def _size_reply_finished(self, reply: QNetworkReply):
+        """
+        Called when a size sampling request has finished
+        """
+        reply.deleteLater()
+        if reply not in self._size_replies:
+            return
+        self._size_replies.remove(reply)
+
+        if reply.error() == QNetworkReply.NoError:
+            length = reply.header(QNetworkRequest.ContentLengthHeader)
+            if length is not None:
+                self._sampled_sizes.append(int(length))
+
+        if not self._size_replies:
+            self._sizes_sampled()
+
+    def _sizes_sampled(self):
+        """
+        Called when the download size has been estimated
+        """
+        if self._is_canceled:
+            self.finished.emit()
+            return
+
+        if self._sampled_sizes:
+            self._plan.estimated_bytes = int(
+                sum(self._sampled_sizes) / len(self._sampled_sizes) *
+                len(self._plan.urls)
+            )
+        self._store.save(self._key, self._plan)
+        self._emit_planned()
+        self.finished.emit()
+
+    def _emit_planned(self):
+        """
+        Emits the planned signal for the current plan
+        """
+        remaining_bytes = self._plan.estimated_remaining_bytes()
+        self.planned.emit(
+            self._plan.remaining_count(),
+            remaining_bytes if remaining_bytes is not None else -1
+        )
+
+    def _download_progress(self, fetched: int, discovered: int):
+        """
+        Called when the download progresses
+        """
+        if discovered:
+            self.progress_changed.emit(100 * fetched / discovered)
+
+    def _tile_fetched(self, url: str):
+        """
+        Called when a tile has been fetched
+        """
+        self._plan.completed.add(url)
+        self._unsaved_count += 1
+        if self._unsaved_count >= self.SAVE_INTERVAL:
+            self._store.save(self._key, self._plan)
+            self._unsaved_count = 0
+
+    def _download_finished(self):
+        """
+        Called when the download has finished
+        """
+        prefetcher = self._prefetcher
+        self._prefetcher = None
+        prefetcher.deleteLater()
+
+        if self._plan.is_complete():
+            self._store.remove(self._key)
+        else:
+            self._store.save(self._key, self._plan)
+        self._unsaved_count = 0
+        self.finished.emit()
@@ -2,8 +2,11 @@
 Cesium ion asset class
 """
 
-from dataclasses import dataclass
-from typing import Optional, Dict
+from typing import (
+    Optional,
+    Dict,
+    Union
+)
 
 from qgis.PyQt.QtCore import (
     Qt,
@@ -14,45 +17,195 @@ from .enums import (
     AssetType,
     Status
 )
+from .intern_pool import InternPool
 
 
-@dataclass
 class Asset:
     """
-    Represents an ion asset
+    Represents an ion asset.
+
+    Assets created from JSON keep the raw type, status and date strings,
+    which are only decoded on first access. Identical JSON records are
+    interned, so assets created from JSON are shared and must not be
+    modified.
     """
-    id: str
-    name: str
-    type: AssetType
-    status: Status
-    description: Optional[str] = None
-    attribution: Optional[str] = None
-    bytes: Optional[int] = None
-    date_added: Optional[QDateTime] = None
-    percent_complete: Optional[int] = None
-    archivable: Optional[bool] = None
-    exportable: Optional[bool] = None
+
+    __slots__ = (
+        'id',
+        'name',
+        'description',
+        'attribution',
+        'bytes',
+        'percent_complete',
+        'archivable',
+        'exportable',
+        # decoded values, or the raw strings if not yet decoded
+        '_type',
+        '_status',
+        '_date_added',
+        '__weakref__'
+    )
+
+    _INTERN_POOL = InternPool()
+
+    # pylint: disable=redefined-builtin
+    def __init__(self,
+                 id: str,
+                 name: str,
+                 type: Union[AssetType, str],
+                 status: Union[Status, str],
+                 description: Optional[str] = None,
+                 attribution: Optional[str] = None,
+                 bytes: Optional[int] = None,
+                 date_added: Union[QDateTime, str, None] = None,
+                 percent_complete: Optional[int] = None,
+                 archivable: Optional[bool] = None,
+                 exportable: Optional[bool] = None):
+        self.id = id
+        self.name = name
+        self._type = type
+        self._status = status
+        self.description = description
+        self.attribution = attribution
+        self.bytes = bytes
+        self._date_added = date_added
+        self.percent_complete = percent_complete
+        self.archivable = archivable
+        self.exportable = exportable
+    # pylint: enable=redefined-builtin
+
+    @property
+    def type(self) -> AssetType:
+        """
+        Returns the asset type
+        """
+        if isinstance(self._type, str):
+            self._type = AssetType.from_string(self._type)
+        return self._type
+
+    @type.setter
+    def type(self, value: Union[AssetType, str]):
+        self._type = value
+
+    @property
+    def status(self) -> Status:
+        """
+        Returns the asset status
+        """
+        if isinstance(self._status, str):
+            self._status = Status.from_string(self._status)
+        return self._status
+
+    @status.setter
+    def status(self, value: Union[Status, str]):
+        self._status = value
+
+    @property
+    def date_added(self) -> Optional[QDateTime]:
+        """
+        Returns the date the asset was added
+        """
+        if isinstance(self._date_added, str):
+            self._date_added = QDateTime.fromString(
+                self._date_added, Qt.DateFormat.ISODate
+            )
+        return self._date_added
+
+    @date_added.setter
+    def date_added(self, value: Union[QDateTime, str, None]):
+        self._date_added = value
+
+    def date_added_iso(self) -> Optional[str]:
+        """
+        Returns the date the asset was added as an ISO 8601 string,
+        without decoding the raw date
+        """
+        if self._date_added is None or isinstance(self._date_added, str):
+            return self._date_added
+        return self._date_added.toString(Qt.DateFormat.ISODateWithMs)
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Asset):
+            return NotImplemented
+
+        if self is other:
+            return True
+
+        return (self.id, self.name, self.type, self.status,
+                self.description, self.attribution, self.bytes,
+                self.date_added, self.percent_complete, self.archivable,
+                self.exportable) == \
+            (other.id, other.name, other.type, other.status,
+             other.description, other.attribution, other.bytes,
+             other.date_added, other.percent_complete, other.archivable,
+             other.exportable)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return 'Asset(id={!r}, name={!r}, type={})'.format(
+            self.id, self.name, self.type
+        )
 
     @staticmethod
     def from_json(json: Dict) -> 'Asset':
         """
         Creates an asset from a JSON object
         """
-        return Asset(
-            id=json['id'],
-            name=json['name'],
-            description=json.get('description'),
-            attribution=json.get('attribution'),
-            type=AssetType.from_string(json['type']),
-            bytes=json.get('bytes'),
-            date_added=QDateTime.fromString(
-                json['dateAdded'], Qt.DateFormat.ISODate
-            ) if 'dateAdded' in json else None,
-            status=Status.from_string(json['status']),
-            percent_complete=json.get('percentComplete'),
-            archivable=json.get('archivable'),
-            exportable=json.get('exportable')
-        )
+        def create():
+            return Asset(
+                id=json['id'],
+                name=json['name'],
+                description=json.get('description'),
+                attribution=json.get('attribution'),
+                type=json['type'],
+                bytes=json.get('bytes'),
+                date_added=json.get('dateAdded'),
+                status=json['status'],
+                percent_complete=json.get('percentComplete'),
+                archivable=json.get('archivable'),
+                exportable=json.get('exportable')
+            )
+
+        try:
+            key = InternPool.record_key(
+                json['id'],
+                (json['name'], json.get('description'),
+                 json.get('attribution'), json['type'], json.get('bytes'),
+                 json.get('dateAdded'), json['status'],
+                 json.get('percentComplete'), json.get('archivable'),
+                 json.get('exportable'))
+            )
+            return Asset._INTERN_POOL.intern(key, create)
+        except TypeError:
+            # unhashable values
+            return create()
+
+    def to_json(self) -> Dict:
+        """
+        Returns the asset as a JSON object, in the form returned by the
+        ion API
+        """
+        json = {
+            'id': self.id,
+            'name': self.name,
+            'type': self._type if isinstance(self._type, str)
+            else self._type.to_string(),
+            'status': self._status if isinstance(self._status, str)
+            else self._status.to_string()
+        }
+        optional = {
+            'description': self.description,
+            'attribution': self.attribution,
+            'bytes': self.bytes,
+            'dateAdded': self.date_added_iso(),
+            'percentComplete': self.percent_complete,
+            'archivable': self.archivable,
+            'exportable': self.exportable
+        }
+        json.update((key, value) for key, value in optional.items()
+                    if value is not None)
+        return json
 
     @staticmethod
     def from_qgis_drop_uri(name, uri) -> 'Asset':
@@ -0,0 +1,334 @@
+"""
+Cesium ion asset catalog
+"""
+
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Tuple
+)
+
+from qgis.PyQt.QtCore import (
+    QObject,
+    pyqtSignal
+)
+from qgis.PyQt.QtNetwork import QNetworkReply
+from qgis.core import QgsApplication
+
+from .api_reply import ApiReply
+from .asset import Asset
+from .asset_table import AssetTable
+from .catalog_store import (
+    CatalogStore,
+    LoadCatalogTask,
+    SaveCatalogTask
+)
+from .pagination import (
+    FetchedPage,
+    PagedFetcher
+)
+from .request_scheduler import RequestPriority
+from .settings import PluginSettings
+
+
+class AssetCatalog(QObject):
+    """
+    The complete asset catalog for the current Cesium ion account.
+
+    The catalog is loaded from the persistent catalog store (when
+    available) in a background task, and revalidated in the background
+    against the stored pages once they are loaded. Revalidation
+    conditionally requests every page of the listing, so pages which are
+    unchanged since they were stored cost a "not modified" response
+    instead of a full transfer. Changed catalogs are written back to the
+    store in a background task.
+
+    The catalog pages hold the parsed assets rather than the raw JSON
+    items, so that each asset is held in memory only once.
+
+    Must be used from the main thread.
+    """
+
+    #: Emitted with the page number and assets for each page fetched
+    #: during revalidation, in order
+    page_fetched = pyqtSignal(int, list)
+    #: Emitted when loading the stored catalog has finished, whether or
+    #: not a catalog was stored
+    loaded = pyqtSignal()
+    #: Emitted with the complete list of assets when revalidation
+    #: finds that the catalog has changed
+    updated = pyqtSignal(list)
+    #: Emitted when revalidation finds that the catalog is unchanged
+    unchanged = pyqtSignal()
+    #: Emitted when a revalidation has finished, failed or been canceled
+    finished = pyqtSignal()
+
+    def __init__(self,
+                 client,
+                 store: Optional[CatalogStore] = None,
+                 parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._client = client
+        self._store = store or CatalogStore()
+
+        self._loaded = False
+        self._load_task: Optional[LoadCatalogTask] = None
+        self._revalidate_when_loaded = False
+        self._account_id: Optional[str] = None
+        # pages of parsed assets, with their HTTP validators
+        self._pages: Optional[Dict[int, FetchedPage]] = None
+        # all the assets from the pages, in order
+        self._assets: Optional[List[Asset]] = None
+        self._table: Optional[AssetTable] = None
+
+        self._fetcher: Optional[PagedFetcher] = None
+        self._fetch_failed = False
+        self._account_reply: Optional[ApiReply] = None
+        self._fetched_account_id: Optional[str] = None
+
+        self._save_task: Optional[SaveCatalogTask] = None
+        # the most recent catalog waiting for the running save to finish
+        self._pending_save: Optional[
+            Tuple[str, Dict[int, FetchedPage]]] = None
+
+    def load(self):
+        """
+        Starts loading the stored catalog in a background task, if it
+        has not already been loaded or started loading
+        """
+        if self._loaded or self._load_task is not None:
+            return
+
+        account_id = PluginSettings.last_catalog_account()
+        if not PluginSettings.persistent_catalog_cache() or not account_id:
+            self._loaded = True
+            return
+
+        self._load_task = LoadCatalogTask(self._store, account_id)
+        self._load_task.catalog_loaded.connect(self._stored_catalog_loaded)
+        QgsApplication.taskManager().addTask(self._load_task)
+
+    def is_loading(self) -> bool:
+        """
+        Returns True if the stored catalog is being loaded
+        """
+        return self._load_task is not None
+
+    def assets(self) -> Optional[List[Asset]]:
+        """
+        Returns the current catalog, or None if no catalog is available
+        yet (e.g. while the stored catalog is loading)
+        """
+        self.load()
+        return self._assets
+
+    def table(self) -> Optional[AssetTable]:
+        """
+        Returns the current catalog as a columnar asset table, or None if
+        no catalog is available yet or NumPy is not available
+        """
+        self.load()
+        if self._table is None and self._assets is not None \
+                and AssetTable.is_available():
+            self._table = AssetTable.from_assets(self._assets)
+        return self._table
+
+    def is_revalidating(self) -> bool:
+        """
+        Returns True if a revalidation is in progress
+        """
+        return self._fetcher is not None or self._revalidate_when_loaded
+
+    def revalidate(self):
+        """
+        Starts revalidating the catalog in the background. If the stored
+        catalog is still loading, the revalidation starts once it has
+        loaded.
+
+        Does nothing if a revalidation is already in progress.
+        """
+        if self.is_revalidating():
+            return
+
+        self.load()
+        if self._load_task is not None:
+            self._revalidate_when_loaded = True
+            return
+
+        self._fetch_failed = False
+        self._fetcher = PagedFetcher(
+            lambda page: self._client.list_assets_request(
+                page, limit=self._client.ASSETS_PAGE_SIZE
+            ),
+            Asset.from_json,
+            page_size=self._client.ASSETS_PAGE_SIZE,
+            auth_cfg=self._client.OAUTH_ID,
+            cached_pages=self._pages,
+            scheduler=self._client.request_scheduler(),
+            priority=RequestPriority.Background,
+            circuit_breaker=self._client.circuit_breaker(),
+            parent=self
+        )
+        self._fetcher.page_fetched.connect(self._page_fetched)
+        self._fetcher.error_occurred.connect(self._fetch_error)
+        self._fetcher.error_occurred.connect(self._client.error_occurred)
+        self._fetcher.finished.connect(self._fetch_finished)
+
+        self._fetched_account_id = None
+        account_reply = self._client.get_account(
+            priority=RequestPriority.Background
+        )
+        self._account_reply = account_reply
+        account_reply.finished.connect(
+            lambda: self._account_reply_finished(account_reply)
+        )
+
+        self._fetcher.start()
+
+    def cancel(self):
+        """
+        Cancels any in-progress revalidation
+        """
+        if self._revalidate_when_loaded:
+            self._revalidate_when_loaded = False
+            self.finished.emit()
+            return
+
+        if self._fetcher is None:
+            return
+
+        fetcher = self._fetcher
+        self._fetcher = None
+        fetcher.cancel()
+        fetcher.deleteLater()
+
+        # the account reply is ignored when it finishes
+        self._account_reply = None
+
+        self.finished.emit()
+
+    def _stored_catalog_loaded(self, account_id: str,
+                               pages: Optional[Dict[int, FetchedPage]],
+                               assets: List[Asset]):
+        """
+        Called on the main thread when the stored catalog has loaded
+        """
+        self._load_task = None
+        self._loaded = True
+        if pages:
+            self._set_pages(account_id, pages, assets)
+
+        self.loaded.emit()
+
+        if self._revalidate_when_loaded:
+            self._revalidate_when_loaded = False
+            self.revalidate()
+
+    def _set_pages(self, account_id: str, pages: Dict[int, FetchedPage],
+                   assets: Optional[List[Asset]] = None):
+        """
+        Sets the current catalog pages of assets, and optionally the list
+        of all the assets from the pages
+        """
+        self._account_id = account_id
+        self._pages = pages
+        self._table = None
+        if assets is None:
+            assets = [
+                asset
+                for _, page in sorted(pages.items())
+                for asset in page.items
+            ]
+        self._assets = assets
+
+    def _page_fetched(self, page: int, assets: List[Asset]):
+        """
+        Called when a page has been fetched during revalidation
+        """
+        self.page_fetched.emit(page, assets)
+
+    def _fetch_error(self, _: str):
+        """
+        Called when the fetch fails
+        """
+        self._fetch_failed = True
+
+    def _account_reply_finished(self, reply: ApiReply):
+        """
+        Called when the account details reply is finished
+        """
+        reply.deleteLater()
+        if reply is not self._account_reply:
+            return
+
+        if reply.error() == QNetworkReply.NoError:
+            try:
+                self._fetched_account_id = str(reply.result()['id'])
+            except (KeyError, TypeError):
+                pass
+
+        self._account_reply = None
+        self._complete_revalidation()
+
+    def _fetch_finished(self):
+        """
+        Called when the paged fetch is finished
+        """
+        self._complete_revalidation()
+
+    def _complete_revalidation(self):
+        """
+        Completes the revalidation, once both the paged fetch and the
+        account details request have finished
+        """
+        if self._fetcher is None or not self._fetcher.is_finished():
+            return
+        if self._account_reply is not None:
+            return
+
+        fetcher = self._fetcher
+        self._fetcher = None
+        fetcher.deleteLater()
+
+        if self._fetch_failed or fetcher.is_canceled():
+            self.finished.emit()
+            return
+
+        account_id = self._fetched_account_id or self._account_id \
+            or 'default'
+
+        if fetcher.is_modified() or account_id != self._account_id:
+            self._set_pages(account_id, fetcher.pages())
+            if PluginSettings.persistent_catalog_cache():
+                self._save(account_id, self._pages)
+                PluginSettings.set_last_catalog_account(account_id)
+            self.updated.emit(self._assets)
+        else:
+            self.unchanged.emit()
+
+        self.finished.emit()
+
+    def _save(self, account_id: str, pages: Dict[int, FetchedPage]):
+        """
+        Writes a catalog to the store in a background task. Saves are
+        written one at a time, so that an older catalog never replaces a
+        newer one.
+        """
+        if self._save_task is not None:
+            self._pending_save = (account_id, pages)
+            return
+
+        self._save_task = SaveCatalogTask(self._store, account_id, pages)
+        self._save_task.catalog_saved.connect(self._catalog_saved)
+        QgsApplication.taskManager().addTask(self._save_task)
+
+    def _catalog_saved(self, _: bool):
+        """
+        Called on the main thread when a save task has finished
+        """
+        self._save_task = None
+        if self._pending_save is not None:
+            account_id, pages = self._pending_save
+            self._pending_save = None
+            self._save(account_id, pages)
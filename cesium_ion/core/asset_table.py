@@ -0,0 +1,357 @@
+"""
+Columnar Cesium ion asset table
+"""
+
+import datetime
+from dataclasses import dataclass
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Union
+)
+
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+from .asset import Asset
+from .enums import (
+    AssetType,
+    Status
+)
+
+
+@dataclass
+class AssetGroup:
+    """
+    Aggregated values for a group of assets
+    """
+    count: int = 0
+    #: total size of the assets in the group with a known size
+    total_bytes: int = 0
+
+
+class AssetTable:
+    """
+    A columnar table of assets, for fast sorting, filtering and
+    aggregation of large catalogs.
+
+    Assets are held as NumPy arrays of asset ids, sizes in bytes (-1 if
+    unknown), date added as seconds since the epoch (NaN if unknown) and
+    type and status codes (the enum values, or 0 if unknown). Names are
+    held as indices into a pool of unique names.
+
+    Requires NumPy, see is_available().
+    """
+
+    #: Columns which tables can be sorted and grouped by
+    COLUMNS = ('id', 'name', 'bytes', 'date_added', 'type', 'status')
+
+    def __init__(self,
+                 ids: 'np.ndarray',
+                 name_indices: 'np.ndarray',
+                 names: List[str],
+                 byte_sizes: 'np.ndarray',
+                 date_added: 'np.ndarray',
+                 types: 'np.ndarray',
+                 statuses: 'np.ndarray',
+                 sources: Sequence[Union[Asset, Dict]]):
+        self.ids = ids
+        self.name_indices = name_indices
+        self.names = names
+        self.bytes = byte_sizes
+        self.date_added = date_added
+        self.types = types
+        self.statuses = statuses
+        # the assets (or raw JSON records) for each row
+        self._sources = sources
+
+    @staticmethod
+    def is_available() -> bool:
+        """
+        Returns True if asset tables are available, i.e. NumPy is
+        installed
+        """
+        return np is not None
+
+    @staticmethod
+    def from_assets(assets: Sequence[Asset]) -> 'AssetTable':
+        """
+        Creates a table from a list of assets
+        """
+        return AssetTable._build(
+            assets,
+            ids=(asset.id for asset in assets),
+            names=(asset.name for asset in assets),
+            byte_sizes=(asset.bytes for asset in assets),
+            dates=(asset.date_added_iso() for asset in assets),
+            types=(asset.type.value for asset in assets),
+            statuses=(asset.status.value for asset in assets)
+        )
+
+    @staticmethod
+    def from_json(items: Sequence[Dict]) -> 'AssetTable':
+        """
+        Creates a table directly from raw asset JSON records, without
+        creating intermediate Asset objects
+        """
+        type_codes = AssetTable._enum_codes(AssetType)
+        status_codes = AssetTable._enum_codes(Status)
+        return AssetTable._build(
+            items,
+            ids=(item['id'] for item in items),
+            names=(item['name'] for item in items),
+            byte_sizes=(item.get('bytes') for item in items),
+            dates=(item.get('dateAdded') for item in items),
+            types=(type_codes.get(item['type'].upper(), 0)
+                   for item in items),
+            statuses=(status_codes.get(item['status'].upper(), 0)
+                      for item in items)
+        )
+
+    @staticmethod
+    def _enum_codes(enum_class) -> Dict[str, int]:
+        """
+        Returns a mapping of string values to codes for an enum
+        """
+        return {member.to_string(): member.value for member in enum_class}
+
+    # pylint: disable=too-many-arguments
+    @staticmethod
+    def _build(sources: Sequence,
+               ids: Iterable,
+               names: Iterable[str],
+               byte_sizes: Iterable[Optional[int]],
+               dates: Iterable[Optional[str]],
+               types: Iterable[int],
+               statuses: Iterable[int]) -> 'AssetTable':
+        """
+        Builds a table from column values
+        """
+        count = len(sources)
+
+        name_pool: Dict[str, int] = {}
+        name_indices = np.fromiter(
+            (name_pool.setdefault(name, len(name_pool)) for name in names),
+            dtype=np.int32, count=count
+        )
+
+        return AssetTable(
+            ids=np.fromiter((int(i) for i in ids),
+                            dtype=np.int64, count=count),
+            name_indices=name_indices,
+            names=list(name_pool.keys()),
+            byte_sizes=np.fromiter(
+                (-1 if b is None else b for b in byte_sizes),
+                dtype=np.int64, count=count
+            ),
+            date_added=AssetTable._parse_dates(list(dates)),
+            types=np.fromiter(types, dtype=np.int8, count=count),
+            statuses=np.fromiter(statuses, dtype=np.int8, count=count),
+            sources=sources
+        )
+    # pylint: enable=too-many-arguments
+
+    @staticmethod
+    def _parse_dates(dates: List[Optional[str]]) -> 'np.ndarray':
+        """
+        Parses ISO date strings to seconds since the epoch
+        """
+        try:
+            # NumPy parses UTC ISO strings, but not the trailing Z
+            parsed = np.array(
+                [d[:-1] if d and d.endswith('Z') else (d or 'NaT')
+                 for d in dates],
+                dtype='datetime64[ms]'
+            )
+            seconds = parsed.astype(np.int64) / 1000.0
+            seconds[np.isnat(parsed)] = np.nan
+            return seconds
+        except ValueError:
+            pass
+
+        # dates with explicit offsets
+        def to_seconds(date: Optional[str]) -> float:
+            if not date:
+                return np.nan
+            try:
+                value = datetime.datetime.fromisoformat(
+                    date.replace('Z', '+00:00')
+                )
+            except ValueError:
+                return np.nan
+            if value.tzinfo is None:
+                value = value.replace(tzinfo=datetime.timezone.utc)
+            return value.timestamp()
+
+        return np.fromiter((to_seconds(d) for d in dates),
+                           dtype=np.float64, count=len(dates))
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __iter__(self) -> Iterator[Asset]:
+        for row in range(len(self)):
+            yield self.asset(row)
+
+    def asset(self, row: int) -> Asset:
+        """
+        Returns the asset for a row
+        """
+        source = self._sources[row]
+        if isinstance(source, Asset):
+            return source
+        return Asset.from_json(source)
+
+    def assets(self) -> List[Asset]:
+        """
+        Returns the assets in the table, in row order
+        """
+        return list(self)
+
+    def name(self, row: int) -> str:
+        """
+        Returns the name of the asset in a row
+        """
+        return self.names[self.name_indices[row]]
+
+    def take(self, rows: 'np.ndarray') -> 'AssetTable':
+        """
+        Returns a new table containing the specified rows (as indices or
+        a boolean mask), in the specified order
+        """
+        if rows.dtype == np.bool_:
+            rows = np.flatnonzero(rows)
+
+        return AssetTable(
+            ids=self.ids[rows],
+            name_indices=self.name_indices[rows],
+            names=self.names,
+            byte_sizes=self.bytes[rows],
+            date_added=self.date_added[rows],
+            types=self.types[rows],
+            statuses=self.statuses[rows],
+            sources=[self._sources[row] for row in rows]
+        )
+
+    # pylint: disable=too-many-arguments
+    def filter(self,
+               types: Optional[Iterable[AssetType]] = None,
+               statuses: Optional[Iterable[Status]] = None,
+               min_bytes: Optional[int] = None,
+               max_bytes: Optional[int] = None,
+               added_after: Optional[float] = None,
+               added_before: Optional[float] = None,
+               name_contains: Optional[str] = None) -> 'AssetTable':
+        """
+        Returns a new table containing only the assets matching all of
+        the specified criteria.
+
+        Dates are specified as seconds since the epoch. Assets with an
+        unknown size or date never match size or date criteria.
+        """
+        mask = np.ones(len(self), dtype=np.bool_)
+        if types is not None:
+            mask &= np.isin(self.types, [t.value for t in types])
+        if statuses is not None:
+            mask &= np.isin(self.statuses, [s.value for s in statuses])
+        if min_bytes is not None:
+            mask &= (self.bytes >= min_bytes) & (self.bytes >= 0)
+        if max_bytes is not None:
+            mask &= (self.bytes <= max_bytes) & (self.bytes >= 0)
+        if added_after is not None:
+            mask &= self.date_added >= added_after
+        if added_before is not None:
+            mask &= self.date_added < added_before
+        if name_contains:
+            # match against the (smaller) pool of unique names
+            needle = name_contains.lower()
+            matching_names = [i for i, name in enumerate(self.names)
+                              if needle in name.lower()]
+            mask &= np.isin(self.name_indices, matching_names)
+
+        return self.take(mask)
+    # pylint: enable=too-many-arguments
+
+    def _column(self, column: str) -> 'np.ndarray':
+        """
+        Returns the array of values for a column
+        """
+        if column == 'id':
+            return self.ids
+        if column == 'name':
+            # rank the pooled names, so that rows sort alphabetically
+            order = sorted(range(len(self.names)),
+                           key=lambda i: self.names[i].lower())
+            ranks = np.empty(len(self.names), dtype=np.int32)
+            ranks[order] = np.arange(len(self.names), dtype=np.int32)
+            return ranks[self.name_indices]
+        if column == 'bytes':
+            return self.bytes
+        if column == 'date_added':
+            return self.date_added
+        if column == 'type':
+            return self.types
+        if column == 'status':
+            return self.statuses
+        raise ValueError('Unknown column: {}'.format(column))
+
+    def sort_order(self, column: str,
+                   descending: bool = False) -> 'np.ndarray':
+        """
+        Returns the row indices which sort the table by a column.
+
+        The sort is stable, and unknown dates are always sorted last.
+        """
+        values = self._column(column)
+        if descending:
+            if values.dtype.kind == 'f':
+                # keep NaN values last
+                values = np.where(np.isnan(values), np.inf, -values)
+            else:
+                values = -values.astype(np.int64)
+        return np.argsort(values, kind='stable')
+
+    def sort_by(self, column: str,
+                descending: bool = False) -> 'AssetTable':
+        """
+        Returns a new table sorted by a column
+        """
+        return self.take(self.sort_order(column, descending))
+
+    def group_by(self, column: str) -> Dict:
+        """
+        Groups the table by the type or status column, returning the
+        number and total size of assets for each type or status
+        """
+        if column == 'type':
+            values, enum_class = self.types, AssetType
+        elif column == 'status':
+            values, enum_class = self.statuses, Status
+        else:
+            raise ValueError('Cannot group by column: {}'.format(column))
+
+        known_bytes = np.where(self.bytes >= 0, self.bytes, 0)
+        codes, inverse, counts = np.unique(
+            values, return_inverse=True, return_counts=True
+        )
+        totals = np.bincount(inverse, weights=known_bytes,
+                             minlength=len(codes))
+
+        groups = {}
+        for code, count, total in zip(codes, counts, totals):
+            key = enum_class(int(code)) if code else None
+            groups[key] = AssetGroup(count=int(count),
+                                     total_bytes=int(total))
+        return groups
+
+    def total_bytes(self) -> int:
+        """
+        Returns the total size of all assets with a known size
+        """
+        return int(self.bytes[self.bytes >= 0].sum())
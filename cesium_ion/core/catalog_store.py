@@ -0,0 +1,247 @@
+"""
+Persistent on-disk store for Cesium ion asset catalogs
+"""
+
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import (
+    Dict,
+    List,
+    Optional
+)
+
+from qgis.PyQt.QtCore import (
+    QCoreApplication,
+    pyqtSignal
+)
+from qgis.core import (
+    QgsApplication,
+    QgsTask
+)
+
+from .asset import Asset
+from .pagination import FetchedPage
+
+
+class CatalogStore:
+    """
+    Stores fetched asset catalog pages on disk, one file per account.
+
+    Pages are stored as the raw JSON items returned by the API, together
+    with the HTTP validators required to conditionally revalidate them.
+    """
+
+    #: Format version of the stored catalog files
+    VERSION = 1
+
+    def __init__(self, directory: Optional[str] = None):
+        if directory is None:
+            directory = os.path.join(
+                QgsApplication.qgisSettingsDirPath(),
+                'cesium_ion',
+                'catalog'
+            )
+        self._directory = Path(directory)
+
+    def directory(self) -> Path:
+        """
+        Returns the directory in which catalogs are stored
+        """
+        return self._directory
+
+    def _catalog_path(self, account_id: str) -> Path:
+        """
+        Returns the path of the catalog file for an account
+        """
+        safe_id = ''.join(c for c in str(account_id) if c.isalnum())
+        return self._directory / 'assets_{}.json'.format(safe_id or 'default')
+
+    def load(self, account_id: str) -> Optional[Dict[int, FetchedPage]]:
+        """
+        Loads the stored catalog pages for an account.
+
+        Returns None if no valid catalog is stored for the account.
+        """
+        path = self._catalog_path(account_id)
+        try:
+            with open(path, 'rt', encoding='utf8') as f:
+                stored = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if stored.get('version') != self.VERSION:
+            return None
+
+        try:
+            return {
+                int(page['page']): FetchedPage(
+                    items=page['items'],
+                    has_more=page['has_more'],
+                    etag=page.get('etag'),
+                    last_modified=page.get('last_modified')
+                )
+                for page in stored['pages']
+            }
+        except (KeyError, TypeError, ValueError):
+            return None
+
+    def save(self, account_id: str, pages: Dict[int, FetchedPage]) -> bool:
+        """
+        Stores the catalog pages for an account, replacing any previously
+        stored catalog.
+
+        Returns True if the catalog was successfully written.
+        """
+        stored = {
+            'version': self.VERSION,
+            'account_id': str(account_id),
+            'pages': [
+                {
+                    'page': page_number,
+                    'items': page.items,
+                    'has_more': page.has_more,
+                    'etag': page.etag,
+                    'last_modified': page.last_modified
+                }
+                for page_number, page in sorted(pages.items())
+            ]
+        }
+
+        path = self._catalog_path(account_id)
+        temp_path: Optional[str] = None
+        try:
+            self._directory.mkdir(parents=True, exist_ok=True)
+            # write to a temporary file first, so that a concurrent reader
+            # or an interrupted write never sees a partial catalog
+            with tempfile.NamedTemporaryFile(
+                    'wt', encoding='utf8', dir=str(self._directory),
+                    suffix='.tmp', delete=False) as f:
+                temp_path = f.name
+                json.dump(stored, f, separators=(',', ':'))
+            os.replace(temp_path, path)
+            temp_path = None
+        except OSError:
+            return False
+        finally:
+            if temp_path is not None:
+                # the write failed, so don't leave the partial file behind
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+
+        return True
+
+    def remove(self, account_id: str):
+        """
+        Removes the stored catalog for an account
+        """
+        try:
+            self._catalog_path(account_id).unlink()
+        except OSError:
+            pass
+
+
+class LoadCatalogTask(QgsTask):
+    """
+    A task which loads a stored catalog and parses its assets in a
+    background thread, so that large catalogs don't block QGIS startup.
+
+    The loaded pages of parsed assets are emitted from the main thread via
+    the catalog_loaded signal once the task has finished. The raw JSON
+    items are discarded once parsed. If no valid catalog is stored, or
+    the task is canceled, the signal is emitted with None pages.
+    """
+
+    #: Emitted with the account ID, the loaded pages of assets (or None)
+    #: and the assets from all pages, in order
+    catalog_loaded = pyqtSignal(str, object, list)
+
+    def __init__(self, store: CatalogStore, account_id: str):
+        super().__init__(
+            QCoreApplication.translate(
+                'LoadCatalogTask', 'Loading Cesium ion assets'
+            ),
+            QgsTask.CanCancel | QgsTask.Hidden
+        )
+        self._store = store
+        self._account_id = account_id
+        self._pages: Optional[Dict[int, FetchedPage]] = None
+        self._assets: List[Asset] = []
+
+    # QgsTask interface
+
+    # pylint: disable=missing-function-docstring
+    def run(self):
+        pages = self._store.load(self._account_id)
+        if not pages:
+            return True
+
+        self._pages = {}
+        for page_number, page in sorted(pages.items()):
+            if self.isCanceled():
+                return False
+            assets = [Asset.from_json(item) for item in page.items]
+            self._pages[page_number] = FetchedPage(
+                items=assets,
+                has_more=page.has_more,
+                etag=page.etag,
+                last_modified=page.last_modified
+            )
+            self._assets.extend(assets)
+
+        return True
+
+    def finished(self, result):
+        if not result:
+            self._pages = None
+            self._assets = []
+
+        self.catalog_loaded.emit(self._account_id, self._pages or None,
+                                 self._assets)
+    # pylint: enable=missing-function-docstring
+
+
+class SaveCatalogTask(QgsTask):
+    """
+    A task which writes a catalog of assets to the store in a background
+    thread, so that storing large catalogs doesn't block the interface.
+
+    The catalog_saved signal is emitted from the main thread once the
+    task has finished.
+    """
+
+    #: Emitted with True if the catalog was successfully written
+    catalog_saved = pyqtSignal(bool)
+
+    def __init__(self, store: CatalogStore, account_id: str,
+                 pages: Dict[int, FetchedPage]):
+        super().__init__(
+            QCoreApplication.translate(
+                'SaveCatalogTask', 'Storing Cesium ion assets'
+            ),
+            QgsTask.Hidden
+        )
+        self._store = store
+        self._account_id = account_id
+        self._pages = pages
+
+    # QgsTask interface
+
+    # pylint: disable=missing-function-docstring
+    def run(self):
+        return self._store.save(self._account_id, {
+            page_number: FetchedPage(
+                items=[asset.to_json() for asset in page.items],
+                has_more=page.has_more,
+                etag=page.etag,
+                last_modified=page.last_modified
+            )
+            for page_number, page in self._pages.items()
+        })
+
+    def finished(self, result):
+        self.catalog_saved.emit(bool(result))
+    # pylint: enable=missing-function-docstring
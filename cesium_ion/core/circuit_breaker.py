@@ -0,0 +1,165 @@
+"""
+Circuit breaker for Cesium ion API requests
+"""
+
+import threading
+from dataclasses import (
+    dataclass,
+    replace
+)
+from typing import (
+    Callable,
+    Optional
+)
+
+from qgis.PyQt.QtNetwork import QNetworkReply
+from qgis.core import QgsNetworkAccessManager
+
+
+#: Network errors which indicate that ion could not be reached
+CONNECTIVITY_ERRORS = (
+    QNetworkReply.ConnectionRefusedError,
+    QNetworkReply.RemoteHostClosedError,
+    QNetworkReply.HostNotFoundError,
+    QNetworkReply.TimeoutError,
+    QNetworkReply.TemporaryNetworkFailureError,
+    QNetworkReply.NetworkSessionFailedError,
+    QNetworkReply.UnknownNetworkError,
+    QNetworkReply.ProxyConnectionRefusedError,
+    QNetworkReply.ProxyConnectionClosedError,
+    QNetworkReply.ProxyNotFoundError,
+    QNetworkReply.ProxyTimeoutError
+)
+
+#: HTTP statuses which indicate that ion is unavailable
+UNAVAILABLE_STATUSES = (502, 503, 504)
+
+
+def is_connectivity_failure(error: QNetworkReply.NetworkError,
+                            status_code: Optional[int],
+                            elapsed: float = 0) -> bool:
+    """
+    Returns True if a request failed because ion could not be reached,
+    given the request's network error, HTTP status (or None if no
+    response was received) and the time in seconds it took
+    """
+    if status_code is not None:
+        return status_code in UNAVAILABLE_STATUSES
+
+    if error == QNetworkReply.OperationCanceledError:
+        # QGIS aborts requests which time out, so only treat aborted
+        # requests as failures if they ran for the full timeout
+        timeout = QgsNetworkAccessManager.timeout() / 1000
+        return timeout > 0 and elapsed >= timeout * 0.95
+
+    return error in CONNECTIVITY_ERRORS
+
+
+@dataclass
+class CircuitBreakerStatistics:
+    """
+    Circuit breaker statistics
+    """
+    #: True if the circuit is open, and requests are failing fast
+    is_open: bool = False
+    #: Number of consecutive connectivity failures
+    consecutive_failures: int = 0
+    #: Number of times the circuit has opened
+    trips: int = 0
+    #: Number of requests failed fast while the circuit was open
+    rejected: int = 0
+
+
+class CircuitBreaker:
+    """
+    Tracks whether Cesium ion is reachable, so that requests can fail
+    immediately instead of each waiting for the full network timeout.
+
+    The circuit opens after a number of consecutive connectivity failures.
+    While it is open, allow_request() returns False. The circuit closes
+    again when any request (such as a periodic probe) receives a response.
+
+    The circuit breaker is thread-safe. The state changed callback may be
+    called from any thread.
+    """
+
+    #: Default number of consecutive failures after which the circuit
+    #: opens
+    DEFAULT_FAILURE_THRESHOLD = 3
+
+    def __init__(self,
+                 failure_threshold: int = DEFAULT_FAILURE_THRESHOLD,
+                 state_changed: Optional[Callable[[bool], None]] = None):
+        self._failure_threshold = max(1, failure_threshold)
+        self._state_changed = state_changed
+        self._lock = threading.Lock()
+        self._is_open = False
+        self._statistics = CircuitBreakerStatistics()
+
+    def is_open(self) -> bool:
+        """
+        Returns True if the circuit is open, and requests should fail
+        fast
+        """
+        with self._lock:
+            return self._is_open
+
+    def allow_request(self) -> bool:
+        """
+        Returns True if a request may be sent. Requests which are not
+        allowed are counted as rejected.
+        """
+        with self._lock:
+            if self._is_open:
+                self._statistics.rejected += 1
+                return False
+            return True
+
+    def record_success(self):
+        """
+        Records a request which received a response, closing the circuit
+        """
+        with self._lock:
+            self._statistics.consecutive_failures = 0
+            changed = self._is_open
+            self._is_open = False
+
+        if changed and self._state_changed is not None:
+            self._state_changed(False)
+
+    def record_failure(self):
+        """
+        Records a request which failed because ion could not be reached,
+        opening the circuit after enough consecutive failures
+        """
+        with self._lock:
+            self._statistics.consecutive_failures += 1
+            changed = not self._is_open and \
+                self._statistics.consecutive_failures >= \
+                self._failure_threshold
+            if changed:
+                self._is_open = True
+                self._statistics.trips += 1
+
+        if changed and self._state_changed is not None:
+            self._state_changed(True)
+
+    def record(self, error: QNetworkReply.NetworkError,
+               status_code: Optional[int],
+               elapsed: float = 0):
+        """
+        Records the outcome of a request, given its network error, HTTP
+        status and the time in seconds it took. Canceled requests are
+        ignored.
+        """
+        if is_connectivity_failure(error, status_code, elapsed):
+            self.record_failure()
+        elif status_code is not None:
+            self.record_success()
+
+    def statistics(self) -> CircuitBreakerStatistics:
+        """
+        Returns a snapshot of the circuit breaker statistics
+        """
+        with self._lock:
+            return replace(self._statistics, is_open=self._is_open)
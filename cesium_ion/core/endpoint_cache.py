@@ -0,0 +1,251 @@
+"""
+Cesium ion asset endpoint cache
+"""
+
+import base64
+import json
+import threading
+import time
+from dataclasses import (
+    dataclass,
+    field
+)
+from typing import (
+    Callable,
+    Dict,
+    List,
+    Optional,
+    Tuple
+)
+
+from qgis.PyQt.QtCore import QObject
+from qgis.PyQt.QtNetwork import QNetworkReply
+
+from .api_reply import ApiReply
+from .request_scheduler import RequestPriority
+
+
+@dataclass
+class AssetEndpoint:
+    """
+    A resolved asset endpoint, giving the URL and short-lived access token
+    for an asset's data
+    """
+    asset_id: int
+    type: Optional[str]
+    url: Optional[str]
+    access_token: Optional[str]
+    #: time (seconds since the epoch) at which the access token expires
+    expires: float
+    attributions: List[Dict] = field(default_factory=list)
+    #: for assets hosted outside of ion, the external type and options
+    external_type: Optional[str] = None
+    options: Optional[Dict] = None
+
+    @staticmethod
+    def from_json(asset_id: int, json_data: Dict,
+                  default_expiry: float) -> 'AssetEndpoint':
+        """
+        Creates an endpoint from the JSON response of the asset endpoint
+        API. The expiry is taken from the access token, if possible.
+        """
+        access_token = json_data.get('accessToken')
+        return AssetEndpoint(
+            asset_id=asset_id,
+            type=json_data.get('type'),
+            url=json_data.get('url'),
+            access_token=access_token,
+            expires=token_expiry(access_token) or default_expiry,
+            attributions=json_data.get('attributions', []),
+            external_type=json_data.get('externalType'),
+            options=json_data.get('options')
+        )
+
+
+def token_expiry(access_token: Optional[str]) -> Optional[float]:
+    """
+    Returns the expiry time (seconds since the epoch) encoded in a JWT
+    access token, or None if the token has no readable expiry
+    """
+    if not access_token:
+        return None
+
+    parts = access_token.split('.')
+    if len(parts) != 3:
+        return None
+
+    payload = parts[1]
+    try:
+        decoded = base64.urlsafe_b64decode(
+            payload + '=' * (-len(payload) % 4)
+        )
+        expiry = json.loads(decoded.decode()).get('exp')
+    except (ValueError, AttributeError):
+        return None
+
+    if isinstance(expiry, (int, float)) and not isinstance(expiry, bool):
+        return float(expiry)
+    return None
+
+
+class EndpointCache(QObject):
+    """
+    A cache of resolved asset endpoints, keyed by asset ID and token.
+
+    Endpoints are cached until shortly before their access token
+    expires, and are then resolved again when next requested.
+
+    get() and resolve_blocking() may be called from any thread, all other
+    methods must be called from the main thread.
+    """
+
+    #: Time in seconds for which endpoints are cached if the expiry of
+    #: their access token can't be determined
+    FALLBACK_TTL = 3600
+    #: Time in seconds before expiry at which endpoints are considered
+    #: stale
+    REFRESH_MARGIN = 300
+
+    def __init__(self,
+                 client,
+                 clock: Callable[[], float] = time.time,
+                 parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._client = client
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries: Dict[Tuple[int, Optional[str]], AssetEndpoint] = {}
+        # in-flight resolution replies, by key
+        self._pending: Dict[Tuple[int, Optional[str]], ApiReply] = {}
+
+    @staticmethod
+    def key(asset_id, token: Optional[str] = None) \
+            -> Tuple[int, Optional[str]]:
+        """
+        Returns the cache key for an asset ID and token. A token of None
+        refers to the plugin's OAuth login.
+        """
+        return int(asset_id), token or None
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def get(self, asset_id, token: Optional[str] = None) \
+            -> Optional[AssetEndpoint]:
+        """
+        Returns the cached endpoint for an asset and token, or None if no
+        fresh endpoint is cached
+        """
+        key = self.key(asset_id, token)
+        with self._lock:
+            endpoint = self._entries.get(key)
+            if endpoint is None:
+                return None
+            if endpoint.expires - self.REFRESH_MARGIN <= self._clock():
+                del self._entries[key]
+                return None
+            return endpoint
+
+    def put(self, endpoint: AssetEndpoint, token: Optional[str] = None):
+        """
+        Stores a resolved endpoint
+        """
+        key = self.key(endpoint.asset_id, token)
+        with self._lock:
+            self._entries[key] = endpoint
+
+    def invalidate(self, asset_id=None, token: Optional[str] = None):
+        """
+        Removes cached endpoints. If asset_id is None then all endpoints
+        are removed.
+        """
+        with self._lock:
+            if asset_id is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(self.key(asset_id, token), None)
+
+    def _default_expiry(self) -> float:
+        """
+        Returns the expiry for endpoints whose token has no expiry
+        """
+        return self._clock() + self.FALLBACK_TTL
+
+    def resolve(self, asset_id, token: Optional[str] = None,
+                force: bool = False,
+                priority: RequestPriority = RequestPriority.Normal
+                ) -> ApiReply:
+        """
+        Resolves the endpoint for an asset asynchronously, using the
+        specified token (or the plugin's OAuth login if token is None).
+
+        The reply's result is an AssetEndpoint. Concurrent resolutions of
+        the same asset and token share a single request.
+        """
+        key = self.key(asset_id, token)
+        if not force:
+            cached = self.get(asset_id, token)
+            if cached is not None:
+                reply = ApiReply()
+                reply.set_result(cached, is_from_cache=True)
+                return reply
+
+        pending = self._pending.get(key)
+        if pending is not None:
+            return pending
+
+        reply = ApiReply()
+        self._pending[key] = reply
+        json_reply = self._client.get_asset_endpoint(key[0], token,
+                                                     priority)
+        json_reply.finished.connect(
+            lambda: self._resolved(key, json_reply, reply)
+        )
+        return reply
+
+    def _resolved(self, key: Tuple[int, Optional[str]],
+                  json_reply: ApiReply, reply: ApiReply):
+        """
+        Called when an endpoint resolution has finished
+        """
+        self._pending.pop(key, None)
+        if json_reply.error() != QNetworkReply.NoError:
+            reply.set_error(json_reply.error(), json_reply.error_string())
+            return
+
+        endpoint = AssetEndpoint.from_json(
+            key[0], json_reply.result(), self._default_expiry()
+        )
+        with self._lock:
+            self._entries[key] = endpoint
+        reply.set_result(endpoint)
+
+    def resolve_blocking(self, asset_id,
+                         token: Optional[str] = None,
+                         priority: RequestPriority = RequestPriority.Normal
+                         ) -> Tuple[Optional[AssetEndpoint],
+                                    QNetworkReply.NetworkError]:
+        """
+        Resolves the endpoint for an asset, blocking until it has been
+        resolved. May be called from any thread.
+
+        Returns the endpoint (or None if it could not be resolved) and the
+        network error.
+        """
+        cached = self.get(asset_id, token)
+        if cached is not None:
+            return cached, QNetworkReply.NoError
+
+        json_data, error = self._client.get_asset_endpoint_blocking(
+            asset_id, token, priority
+        )
+        if json_data is None:
+            return None, error
+
+        endpoint = AssetEndpoint.from_json(
+            int(asset_id), json_data, self._default_expiry()
+        )
+        with self._lock:
+            self._entries[self.key(asset_id, token)] = endpoint
+        return endpoint, error
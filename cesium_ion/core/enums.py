@@ -80,3 +80,16 @@ class Status(Enum):
             'DATA_ERROR': Status.DataError,
             'ERROR': Status.Error
         }[string.upper()]
+
+    def to_string(self) -> str:
+        """
+        Returns a string value representing the status
+        """
+        return {
+            Status.AwaitingFiles: 'AWAITING_FILES',
+            Status.NotStarted: 'NOT_STARTED',
+            Status.InProgress: 'IN_PROGRESS',
+            Status.Complete: 'COMPLETE',
+            Status.DataError: 'DATA_ERROR',
+            Status.Error: 'ERROR'
+        }[self]
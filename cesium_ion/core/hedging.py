@@ -0,0 +1,349 @@
+"""
+Hedged requests, which reduce the tail latency of idempotent requests
+"""
+
+import math
+import threading
+import time
+from collections import deque
+from dataclasses import (
+    dataclass,
+    replace
+)
+from typing import (
+    Callable,
+    List,
+    Optional
+)
+
+from qgis.PyQt.QtCore import (
+    QObject,
+    QTimer,
+    pyqtSignal
+)
+from qgis.PyQt.QtNetwork import QNetworkReply
+
+
+class LatencyTracker:
+    """
+    Tracks the most recent response latencies, so that percentiles of
+    the latency distribution can be calculated.
+
+    The tracker is thread-safe.
+    """
+
+    #: Default number of latency samples retained
+    DEFAULT_WINDOW = 200
+
+    def __init__(self, window: int = DEFAULT_WINDOW):
+        self._lock = threading.Lock()
+        self._samples = deque(maxlen=max(1, window))
+
+    def add(self, latency: float):
+        """
+        Adds a latency sample, in seconds
+        """
+        with self._lock:
+            self._samples.append(latency)
+
+    def count(self) -> int:
+        """
+        Returns the number of retained samples
+        """
+        with self._lock:
+            return len(self._samples)
+
+    def percentile(self, percentile: float) -> Optional[float]:
+        """
+        Returns the specified percentile (0-100) of the retained samples,
+        or None if no samples have been added
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+
+        if not samples:
+            return None
+
+        # nearest rank
+        rank = math.ceil(percentile / 100 * len(samples))
+        return samples[min(max(rank, 1), len(samples)) - 1]
+
+
+@dataclass
+class HedgingStatistics:
+    """
+    Hedged request statistics
+    """
+    #: Number of requests which were eligible for hedging
+    requests: int = 0
+    #: Number of requests for which a hedge request was sent
+    hedged: int = 0
+    #: Number of hedge requests which completed before the original
+    #: request
+    hedge_wins: int = 0
+    #: Current delay in seconds after which requests are hedged, or None
+    #: if hedging is disabled or too few latencies are known
+    delay: Optional[float] = None
+
+
+class HedgingPolicy:
+    """
+    Decides when requests should be hedged.
+
+    When hedging is enabled, a request which has not started receiving
+    its response within the configured percentile of recent response
+    latencies is duplicated, and whichever request completes first is
+    used. Hedging with the 95th percentile sends around 5% additional
+    requests.
+
+    Hedge requests bypass the request scheduler, so hedging should only
+    be used for idempotent requests.
+
+    The policy is thread-safe.
+    """
+
+    #: Default latency percentile after which requests are hedged
+    DEFAULT_PERCENTILE = 95.0
+    #: Number of latency samples required before requests are hedged
+    MIN_SAMPLES = 20
+    #: Minimum delay in seconds before a request is hedged
+    MIN_DELAY = 0.05
+
+    def __init__(self,
+                 enabled: bool = False,
+                 percentile: float = DEFAULT_PERCENTILE,
+                 latencies: Optional[LatencyTracker] = None):
+        self._lock = threading.Lock()
+        self._enabled = enabled
+        self._percentile = percentile
+        self._latencies = latencies or LatencyTracker()
+        self._statistics = HedgingStatistics()
+
+    def set_enabled(self, enabled: bool):
+        """
+        Sets whether requests are hedged
+        """
+        with self._lock:
+            self._enabled = enabled
+
+    def is_enabled(self) -> bool:
+        """
+        Returns True if requests are hedged
+        """
+        with self._lock:
+            return self._enabled
+
+    def set_percentile(self, percentile: float):
+        """
+        Sets the latency percentile (0-100) after which requests are
+        hedged
+        """
+        with self._lock:
+            self._percentile = min(max(percentile, 0.0), 100.0)
+
+    def hedge_delay(self) -> Optional[float]:
+        """
+        Returns the delay in seconds after which a request which has not
+        started receiving its response should be hedged, or None if
+        requests should not be hedged
+        """
+        with self._lock:
+            if not self._enabled:
+                return None
+            percentile = self._percentile
+
+        if self._latencies.count() < self.MIN_SAMPLES:
+            return None
+
+        return max(self._latencies.percentile(percentile), self.MIN_DELAY)
+
+    def record_latency(self, latency: float):
+        """
+        Records the time in seconds a request took to start receiving its
+        response
+        """
+        self._latencies.add(latency)
+
+    def record_request(self):
+        """
+        Records a request which is eligible for hedging
+        """
+        with self._lock:
+            self._statistics.requests += 1
+
+    def record_hedged(self):
+        """
+        Records a request for which a hedge request was sent
+        """
+        with self._lock:
+            self._statistics.hedged += 1
+
+    def record_hedge_win(self):
+        """
+        Records a hedge request which completed before the original
+        request
+        """
+        with self._lock:
+            self._statistics.hedge_wins += 1
+
+    def statistics(self) -> HedgingStatistics:
+        """
+        Returns a snapshot of the hedging statistics
+        """
+        delay = self.hedge_delay()
+        with self._lock:
+            return replace(self._statistics, delay=delay)
+
+
+class HedgedReply(QObject):
+    """
+    Sends a request, and sends a duplicate hedge request if no response
+    has started after the policy's hedge delay. The first reply to
+    complete successfully wins, and the other reply is aborted.
+
+    The finished signal is emitted once, when the winning reply is
+    finished. If every reply fails, the last reply to finish is used.
+    """
+
+    finished = pyqtSignal()
+
+    def __init__(self,
+                 send: Callable[[], QNetworkReply],
+                 policy: Optional[HedgingPolicy] = None,
+                 reader_factory: Optional[
+                     Callable[[QNetworkReply], object]] = None,
+                 parent: Optional[QObject] = None):
+        """
+        :param send: sends the request, returning the network reply
+        :param policy: hedging policy, or None to never hedge
+        :param reader_factory: optional factory for a reader attached to
+         each reply as it is sent, such as a ReplyItemsReader
+        """
+        super().__init__(parent)
+        self._send = send
+        self._policy = policy
+        self._reader_factory = reader_factory
+        self._replies: List[QNetworkReply] = []
+        self._readers: List[object] = []
+        self._sent: List[float] = []
+        self._response_started = False
+        self._winner: Optional[int] = None
+        self._is_aborted = False
+        self._timer = QTimer(self)
+        self._timer.setSingleShot(True)
+        self._timer.timeout.connect(self._send_hedge)
+
+    def start(self):
+        """
+        Sends the request
+        """
+        self._send_reply()
+
+        delay = self._policy.hedge_delay() \
+            if self._policy is not None else None
+        if delay is not None:
+            self._policy.record_request()
+            self._timer.start(int(delay * 1000))
+
+    def abort(self):
+        """
+        Aborts all replies. The finished signal is not emitted.
+        """
+        self._is_aborted = True
+        self._timer.stop()
+        for reply in self._replies:
+            reply.abort()
+            reply.deleteLater()
+
+    def is_hedged(self) -> bool:
+        """
+        Returns True if a hedge request was sent
+        """
+        return len(self._replies) > 1
+
+    def reply(self) -> Optional[QNetworkReply]:
+        """
+        Returns the winning reply, or None if the request has not
+        finished
+        """
+        if self._winner is None:
+            return None
+        return self._replies[self._winner]
+
+    def reader(self) -> Optional[object]:
+        """
+        Returns the reader attached to the winning reply, or None if the
+        request has not finished or no reader factory was set
+        """
+        if self._winner is None:
+            return None
+        return self._readers[self._winner]
+
+    def _send_reply(self):
+        """
+        Sends a request
+        """
+        index = len(self._replies)
+        reply = self._send()
+        self._replies.append(reply)
+        self._sent.append(time.monotonic())
+        self._readers.append(
+            self._reader_factory(reply)
+            if self._reader_factory is not None else None
+        )
+        reply.metaDataChanged.connect(
+            lambda: self._reply_started(index)
+        )
+        reply.finished.connect(lambda: self._reply_finished(index))
+
+    def _send_hedge(self):
+        """
+        Sends the hedge request, if no response has started yet
+        """
+        if self._is_aborted or self._winner is not None or \
+                self._response_started:
+            return
+
+        self._policy.record_hedged()
+        self._send_reply()
+
+    def _reply_started(self, index: int):
+        """
+        Called when a reply starts receiving its response
+        """
+        if self._response_started:
+            return
+
+        self._response_started = True
+        self._timer.stop()
+        if self._policy is not None:
+            self._policy.record_latency(time.monotonic() - self._sent[index])
+
+    def _reply_finished(self, index: int):
+        """
+        Called when a reply is finished
+        """
+        if self._is_aborted or self._winner is not None:
+            # an aborted loser
+            return
+
+        reply = self._replies[index]
+        pending = [i for i, other in enumerate(self._replies)
+                   if i != index and not other.isFinished()]
+        if reply.error() != QNetworkReply.NoError and pending:
+            # wait for the other reply, which may still succeed
+            return
+
+        self._winner = index
+        self._timer.stop()
+        for i, other in enumerate(self._replies):
+            if i == index:
+                continue
+            if i in pending:
+                other.abort()
+            other.deleteLater()
+
+        if index > 0 and reply.error() == QNetworkReply.NoError:
+            self._policy.record_hedge_win()
+
+        self.finished.emit()
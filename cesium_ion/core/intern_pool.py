@@ -0,0 +1,56 @@
+"""
+Interning of shared record instances
+"""
+
+import threading
+import weakref
+from typing import (
+    Callable,
+    Hashable,
+    Tuple
+)
+
+
+class InternPool:
+    """
+    A thread-safe pool of shared instances, keyed by the raw values they
+    were created from.
+
+    Instances are only held weakly, so they are discarded once no longer
+    referenced elsewhere. Interned instances are shared between all
+    callers, and must not be modified.
+
+    Pools of records should be keyed with record_key(), rather than with
+    the raw values themselves, so that the pool doesn't hold a second
+    reference to every value of every record.
+    """
+
+    def __init__(self):
+        self._instances = weakref.WeakValueDictionary()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def record_key(record_id: Hashable, values: Tuple) -> Tuple:
+        """
+        Returns a compact key for a record, from its ID and a hash of all
+        its values.
+
+        :raises TypeError: if the values are not hashable
+        """
+        return record_id, hash(values)
+
+    def intern(self, key: Hashable, factory: Callable[[], object]):
+        """
+        Returns the pooled instance for a key, creating it with the
+        factory if no such instance exists
+        """
+        with self._lock:
+            instance = self._instances.get(key)
+            if instance is None:
+                instance = factory()
+                self._instances[key] = instance
+            return instance
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._instances)
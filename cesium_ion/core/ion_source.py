@@ -0,0 +1,42 @@
+"""
+Cesium ion layer data sources
+"""
+
+from dataclasses import dataclass
+from typing import Optional
+from urllib.parse import (
+    parse_qs,
+    urlsplit
+)
+
+
+@dataclass(frozen=True)
+class IonDataSource:
+    """
+    A decoded ion:// layer data source, as created by
+    Asset.as_qgis_data_source()
+    """
+    asset_id: int
+    access_token: Optional[str] = None
+    auth_cfg: Optional[str] = None
+
+    @staticmethod
+    def from_source(source: str) -> Optional['IonDataSource']:
+        """
+        Decodes a layer data source, returning None if the source is not
+        an ion:// source
+        """
+        if not source or not source.startswith('ion://'):
+            return None
+
+        params = parse_qs(urlsplit(source).query)
+        try:
+            asset_id = int(params['assetId'][0])
+        except (KeyError, IndexError, ValueError):
+            return None
+
+        return IonDataSource(
+            asset_id=asset_id,
+            access_token=params.get('accessToken', [None])[0],
+            auth_cfg=params.get('authcfg', [None])[0]
+        )
@@ -0,0 +1,249 @@
+"""
+Incremental decoding of JSON list responses
+"""
+
+import codecs
+import json
+from typing import (
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Tuple
+)
+
+
+class JsonListDecoder:
+    """
+    Incrementally decodes a JSON list response of the form
+    {"items": [...], ...}, as returned by the Cesium ion list endpoints.
+
+    Data is fed to the decoder as it arrives, and each element of the
+    items array is yielded as soon as it has been completely received.
+    Only the incomplete trailing element is held in memory, so memory use
+    does not grow with the size of the response.
+
+    All other members of the response object are collected into the
+    envelope, which is available once the response has been completely
+    decoded.
+    """
+
+    # decoder states
+    _START = 0
+    _KEY = 1
+    _COLON = 2
+    _VALUE = 3
+    _AFTER_VALUE = 4
+    _ITEM = 5
+    _AFTER_ITEM = 6
+    _DONE = 7
+
+    _WHITESPACE = ' \t\n\r'
+    _DELIMITERS = _WHITESPACE + ',:]}'
+
+    def __init__(self, array_key: str = 'items'):
+        self._array_key = array_key
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json_decoder = json.JSONDecoder()
+        self._text = ''
+        self._pos = 0
+        self._state = self._START
+        self._key: Optional[str] = None
+        self._is_closed = False
+        self._envelope: Dict = {}
+        self._item_count = 0
+
+    def feed(self, data: bytes) -> Iterator[Dict]:
+        """
+        Feeds a chunk of data to the decoder, yielding all items which
+        have been completed by the chunk.
+
+        :raises ValueError: if the data is not a valid list response
+        """
+        self._text += self._text_decoder.decode(data)
+        yield from self._decode()
+        # discard consumed text
+        self._text = self._text[self._pos:]
+        self._pos = 0
+
+    def close(self) -> Iterator[Dict]:
+        """
+        Signals that all data has been fed to the decoder, yielding any
+        remaining items.
+
+        :raises ValueError: if the response is incomplete or invalid
+        """
+        self._text += self._text_decoder.decode(b'', final=True)
+        self._is_closed = True
+        yield from self._decode()
+        if self._state != self._DONE:
+            raise ValueError('Incomplete JSON list response')
+
+    def envelope(self) -> Dict:
+        """
+        Returns the members of the response object other than the
+        items array
+        """
+        return self._envelope
+
+    def item_count(self) -> int:
+        """
+        Returns the number of items decoded so far
+        """
+        return self._item_count
+
+    def _skip_whitespace(self) -> bool:
+        """
+        Advances past whitespace, returning False if the end of the
+        available text was reached
+        """
+        text = self._text
+        length = len(text)
+        while self._pos < length and text[self._pos] in self._WHITESPACE:
+            self._pos += 1
+        return self._pos < length
+
+    def _expect(self, expected: str) -> str:
+        """
+        Consumes a single structural character, which must be one of
+        the expected characters
+        """
+        c = self._text[self._pos]
+        if c not in expected:
+            raise ValueError(
+                'Unexpected character {!r} at offset {}'.format(c, self._pos)
+            )
+        self._pos += 1
+        return c
+
+    def _decode_value(self) -> Tuple[bool, object]:
+        """
+        Decodes a complete JSON value at the current position.
+
+        Returns False if the value is incomplete.
+        """
+        try:
+            value, end = self._json_decoder.raw_decode(self._text, self._pos)
+        except json.JSONDecodeError:
+            if self._is_closed:
+                raise
+            return False, None
+
+        # a value which is not followed by a delimiter may be truncated
+        # (e.g. a number split across chunks), so wait for more data
+        if not self._is_closed and (
+                end == len(self._text) or
+                self._text[end] not in self._DELIMITERS):
+            return False, None
+
+        self._pos = end
+        return True, value
+
+    def _decode(self) -> Iterator[Dict]:
+        """
+        Decodes as much of the available text as possible
+        """
+        # pylint: disable=too-many-branches
+        while self._state != self._DONE and self._skip_whitespace():
+            if self._state == self._START:
+                self._expect('{')
+                self._state = self._KEY
+            elif self._state == self._KEY:
+                if self._text[self._pos] == '}':
+                    self._pos += 1
+                    self._state = self._DONE
+                    continue
+                complete, key = self._decode_value()
+                if not complete:
+                    return
+                if not isinstance(key, str):
+                    raise ValueError('Expected an object key')
+                self._key = key
+                self._state = self._COLON
+            elif self._state == self._COLON:
+                self._expect(':')
+                self._state = self._VALUE
+            elif self._state == self._VALUE:
+                if self._key == self._array_key \
+                        and self._text[self._pos] == '[':
+                    self._pos += 1
+                    self._envelope[self._key] = []
+                    self._state = self._ITEM
+                    continue
+                complete, value = self._decode_value()
+                if not complete:
+                    return
+                self._envelope[self._key] = value
+                self._state = self._AFTER_VALUE
+            elif self._state == self._AFTER_VALUE:
+                c = self._expect(',}')
+                self._state = self._KEY if c == ',' else self._DONE
+            elif self._state == self._ITEM:
+                if self._text[self._pos] == ']':
+                    self._pos += 1
+                    self._state = self._AFTER_VALUE
+                    continue
+                complete, item = self._decode_value()
+                if not complete:
+                    return
+                self._item_count += 1
+                self._state = self._AFTER_ITEM
+                yield item
+            elif self._state == self._AFTER_ITEM:
+                c = self._expect(',]')
+                self._state = self._ITEM if c == ',' else self._AFTER_VALUE
+        # pylint: enable=too-many-branches
+
+
+class ReplyItemsReader:
+    """
+    Decodes the items of a JSON list response from a network reply as
+    the data arrives, converting each item with a parser.
+    """
+
+    def __init__(self, reply, item_parser: Callable[[Dict], object]):
+        self._reply = reply
+        self._item_parser = item_parser
+        self._decoder = JsonListDecoder()
+        self._items: List = []
+        self._error: Optional[str] = None
+        reply.readyRead.connect(self._read_available)
+
+    def _read_available(self):
+        """
+        Decodes all currently available data from the reply
+        """
+        if self._error is not None:
+            return
+
+        self._parse_items(self._decoder.feed(self._reply.readAll().data()))
+
+    def _parse_items(self, items: Iterator[Dict]):
+        """
+        Parses decoded items, recording the error if the response or an
+        item is invalid
+        """
+        try:
+            for item in items:
+                self._items.append(self._item_parser(item))
+        except ValueError as e:
+            self._error = str(e)
+        except KeyError as e:
+            # an item is missing a field required by the parser
+            self._error = 'Invalid list item: missing {}'.format(e)
+
+    def finish(self) -> Tuple[List, Dict]:
+        """
+        Decodes any remaining data once the reply has finished, returning
+        the parsed items and the response envelope.
+
+        :raises ValueError: if the response was not a valid list response
+        """
+        self._read_available()
+        if self._error is None:
+            self._parse_items(self._decoder.close())
+        if self._error is not None:
+            raise ValueError(self._error)
+
+        return self._items, self._decoder.envelope()
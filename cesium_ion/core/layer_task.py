@@ -0,0 +1,115 @@
+"""
+Background layer construction for Cesium ion assets
+"""
+
+from typing import (
+    Callable,
+    List,
+    Optional
+)
+
+from qgis.PyQt.QtCore import (
+    QCoreApplication,
+    pyqtSignal
+)
+from qgis.core import (
+    QgsTask,
+    QgsTiledSceneLayer
+)
+
+from .asset import Asset
+from .token import Token
+from .tile_proxy import PROXIED_SOURCES
+
+
+class CreateLayersTask(QgsTask):
+    """
+    A task which creates the layers for Cesium ion assets in a background
+    thread.
+
+    Creating a layer resolves the ion endpoint for the asset and fetches
+    the tileset root, so is slow on slow connections.
+
+    The created layers are moved to the main thread, and are emitted from
+    the main thread via the layers_created signal once the task has
+    finished.
+
+    If a tile proxy URL is specified then the layers load their tiles
+    through the proxy.
+
+    If a token provider is specified then it is called from the background
+    thread to find or create the token for the layers, as doing so may
+    need to retrieve the complete token listing. The task fails if the
+    provider doesn't return a token.
+    """
+
+    #: Emitted with the list of valid layers when the task has finished,
+    #: followed by the names of any assets which could not be loaded
+    layers_created = pyqtSignal(list, list)
+
+    def __init__(self, assets: List[Asset], token: Optional[str],
+                 proxy_url: Optional[str] = None,
+                 token_provider: Optional[
+                     Callable[[], Optional[Token]]] = None):
+        super().__init__(
+            QCoreApplication.translate(
+                'CreateLayersTask', 'Loading Cesium ion assets'
+            ) if len(assets) > 1 else
+            QCoreApplication.translate(
+                'CreateLayersTask', 'Loading {}'
+            ).format(assets[0].name),
+            QgsTask.CanCancel
+        )
+        self._assets = assets
+        self._token = token
+        self._proxy_url = proxy_url
+        self._token_provider = token_provider
+        self._layers: List[QgsTiledSceneLayer] = []
+        self._invalid_names: List[str] = []
+
+    @staticmethod
+    def create_layer(asset: Asset,
+                     token: Optional[str],
+                     proxy_url: Optional[str] = None) -> QgsTiledSceneLayer:
+        """
+        Creates a layer for an asset with the specified token, without
+        adding it to the project
+        """
+        ds = PROXIED_SOURCES.proxied(asset.as_qgis_data_source(token),
+                                     proxy_url)
+        provider = asset.type.to_qgis_data_provider()
+        return QgsTiledSceneLayer(ds, asset.name, provider)
+
+    # QgsTask interface
+
+    # pylint: disable=missing-function-docstring
+    def run(self):
+        if self._token_provider is not None:
+            token = self._token_provider()
+            if token is None or not token.token:
+                return False
+            self._token = token.token
+
+        main_thread = QCoreApplication.instance().thread()
+        for i, asset in enumerate(self._assets):
+            if self.isCanceled():
+                return False
+
+            layer = self.create_layer(asset, self._token, self._proxy_url)
+            if layer.isValid():
+                layer.moveToThread(main_thread)
+                self._layers.append(layer)
+            else:
+                self._invalid_names.append(asset.name)
+
+            self.setProgress(100 * (i + 1) / len(self._assets))
+
+        return True
+
+    def finished(self, result):
+        if not result:
+            self._layers = []
+            return
+
+        self.layers_created.emit(self._layers, self._invalid_names)
+    # pylint: enable=missing-function-docstring
@@ -0,0 +1,732 @@
+"""
+Offline packs of Cesium ion assets
+"""
+
+import gzip
+import json
+import os
+import posixpath
+import shutil
+import tempfile
+from pathlib import Path
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Set
+)
+from urllib.parse import urlsplit
+
+from qgis.PyQt.QtCore import (
+    QObject,
+    QUrl,
+    pyqtSignal
+)
+from qgis.PyQt.QtNetwork import (
+    QNetworkReply,
+    QNetworkRequest
+)
+from qgis.core import (
+    QgsApplication,
+    QgsNetworkAccessManager
+)
+
+from .endpoint_cache import AssetEndpoint
+from .request_scheduler import RequestPriority
+from .tile_bounds import terrain_level_for_geometric_error
+from .tile_prefetch import (
+    TilePrefetcher,
+    resolve_tile_url
+)
+
+
+def pack_path(root_url: str, url: str) -> str:
+    """
+    Returns the path within a pack for the file at a URL, relative to the
+    pack directory.
+
+    URLs beneath the root tileset's directory keep their relative path,
+    other URLs are placed in an "external" directory by host. Queries are
+    dropped.
+    """
+    root = urlsplit(root_url)
+    target = urlsplit(url)
+    root_directory = posixpath.dirname(root.path) + '/'
+    if (target.scheme, target.netloc) == (root.scheme, root.netloc) and \
+            target.path.startswith(root_directory):
+        path = target.path[len(root_directory):]
+    else:
+        path = 'external/{}/{}'.format(target.netloc or 'local',
+                                       target.path)
+
+    # never allow paths to escape the pack directory
+    return '/'.join(part for part in path.split('/')
+                    if part not in ('', '.', '..'))
+
+
+def rewrite_tileset(tileset: Dict, tileset_url: str, root_url: str,
+                    packed_urls: Set[str]) -> Dict:
+    """
+    Rewrites a tileset for a pack, in place.
+
+    Content URIs are replaced with paths relative to the tileset's
+    location in the pack, and content which isn't packed is removed,
+    along with any subtrees of tiles left without content.
+    """
+    tileset_directory = posixpath.dirname(pack_path(root_url, tileset_url))
+
+    def local_uri(uri: str) -> Optional[str]:
+        url = resolve_tile_url(tileset_url, uri)
+        if url not in packed_urls:
+            return None
+        return posixpath.relpath(pack_path(root_url, url),
+                                 tileset_directory or '.')
+
+    def rewrite_content(content: Dict) -> bool:
+        key = 'uri' if 'uri' in content else 'url'
+        uri = local_uri(content.get(key) or '')
+        if uri is None:
+            return False
+        content[key] = uri
+        return True
+
+    def rewrite_tile(tile: Dict) -> bool:
+        has_content = False
+        if 'content' in tile:
+            if rewrite_content(tile['content']):
+                has_content = True
+            else:
+                del tile['content']
+        if 'contents' in tile:
+            contents = [c for c in tile['contents'] if rewrite_content(c)]
+            if contents:
+                tile['contents'] = contents
+                has_content = True
+            else:
+                del tile['contents']
+
+        children = [child for child in tile.get('children', [])
+                    if rewrite_tile(child)]
+        if children:
+            tile['children'] = children
+            has_content = True
+        elif 'children' in tile:
+            del tile['children']
+        return has_content
+
+    if 'root' in tileset:
+        rewrite_tile(tileset['root'])
+    return tileset
+
+
+def rewrite_terrain_layer(layer: Dict, level_count: int) -> Dict:
+    """
+    Rewrites a terrain layer.json for a pack, in place, so that tiles are
+    loaded from the pack and only the packed levels are available
+    """
+    layer['tiles'] = [template.split('?')[0]
+                      for template in layer.get('tiles', [])]
+    if 'available' in layer:
+        layer['available'] = layer['available'][:level_count]
+    layer['maxzoom'] = min(layer.get('maxzoom', 30), level_count - 1)
+    return layer
+
+
+class OfflinePack(QObject):
+    """
+    Downloads a complete asset into a local directory, so that it can be
+    loaded from disk as a local layer.
+
+    The asset's tilesets (or terrain layer.json) are traversed down to an
+    optional target geometric error and written to the pack with their
+    content URIs rewritten to local paths. Tile content is then
+    downloaded in parallel and streamed to disk. Partially downloaded
+    files are resumed using ranged requests, and the pack's manifest
+    records progress, so interrupted packs resume where they stopped.
+    Downloads rejected because the endpoint's access token has expired
+    are retried once the endpoint has been resolved again.
+
+    Must be used from the main thread.
+    """
+
+    #: Format version of the pack manifest
+    VERSION = 1
+    #: File name of the pack manifest
+    MANIFEST = 'pack.json'
+    #: Number of downloaded files between saves of the manifest
+    SAVE_INTERVAL = 100
+    #: Maximum number of downloads in flight at once
+    MAX_CONCURRENT_REQUESTS = 8
+    #: HTTP statuses indicating that the endpoint's access token has
+    #: expired or been revoked
+    AUTHENTICATION_ERRORS = (401, 403)
+
+    #: Emitted with the progress percentage of the pack
+    progress_changed = pyqtSignal(float)
+    #: Emitted when the pack has finished, failed or been canceled
+    finished = pyqtSignal()
+    #: Emitted with an error message if the pack could not be completed
+    error_occurred = pyqtSignal(str)
+
+    # pylint: disable=too-many-arguments
+    def __init__(self,
+                 client,
+                 asset_id: int,
+                 directory: str,
+                 max_geometric_error: Optional[float] = None,
+                 token: Optional[str] = None,
+                 max_concurrent_requests: int = MAX_CONCURRENT_REQUESTS,
+                 parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._client = client
+        self._asset_id = int(asset_id)
+        self._directory = Path(directory)
+        self._max_geometric_error = max_geometric_error
+        self._token = token
+        self._max_concurrent_requests = max(1, max_concurrent_requests)
+
+        self._endpoint: Optional[AssetEndpoint] = None
+        self._prefetcher: Optional[TilePrefetcher] = None
+        self._tilesets: Dict[str, bytes] = {}
+        self._root: Optional[str] = None
+        self._urls: List[str] = []
+        self._completed: Set[str] = set()
+        self._queue: List[str] = []
+        self._replies: Dict[QNetworkReply, str] = {}
+        self._files = {}
+        # replies whose data could not be written to disk
+        self._write_failures: Set[QNetworkReply] = set()
+        # files which have been retried after an authentication error
+        self._auth_retried: Set[str] = set()
+        self._is_refreshing = False
+        self._failed_count = 0
+        self._unsaved_count = 0
+        self._is_finished = False
+        self._is_canceled = False
+    # pylint: enable=too-many-arguments
+
+    @staticmethod
+    def default_directory(asset_id: int) -> str:
+        """
+        Returns the default directory for an asset's pack
+        """
+        return os.path.join(
+            QgsApplication.qgisSettingsDirPath(),
+            'cesium_ion',
+            'packs',
+            str(asset_id)
+        )
+
+    @staticmethod
+    def read_manifest(directory: str) -> Optional[Dict]:
+        """
+        Reads the manifest of a pack, returning None if the directory
+        does not contain a valid pack
+        """
+        try:
+            with open(os.path.join(directory, OfflinePack.MANIFEST), 'rt',
+                      encoding='utf8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        if not isinstance(manifest, dict) or \
+                manifest.get('version') != OfflinePack.VERSION:
+            return None
+        return manifest
+
+    @staticmethod
+    def local_source(directory: str) -> Optional[str]:
+        """
+        Returns the QGIS data source for a completed pack, or None if the
+        directory does not contain a completed pack
+        """
+        manifest = OfflinePack.read_manifest(directory)
+        if manifest is None or not manifest.get('complete') or \
+                not manifest.get('root'):
+            return None
+
+        path = os.path.join(directory, *manifest['root'].split('/'))
+        return 'url={}'.format(QUrl.fromLocalFile(path).toString())
+
+    def directory(self) -> str:
+        """
+        Returns the pack directory
+        """
+        return str(self._directory)
+
+    def asset_type(self) -> Optional[str]:
+        """
+        Returns the ion type of the packed asset, once known
+        """
+        return self._endpoint.type if self._endpoint else None
+
+    def is_complete(self) -> bool:
+        """
+        Returns True if all the pack's files have been downloaded
+        """
+        return self._root is not None and \
+            len(self._completed) >= len(self._urls)
+
+    def start(self):
+        """
+        Starts downloading the pack, by resolving the asset's endpoint
+        """
+        self._is_canceled = False
+        reply = self._client.endpoint_cache().resolve(
+            self._asset_id, self._token,
+            priority=RequestPriority.Background
+        )
+        reply.finished.connect(lambda: self._endpoint_resolved(reply))
+
+    def cancel(self):
+        """
+        Cancels downloading. Progress is kept, so that a later download
+        of the pack resumes from where it stopped.
+        """
+        if self._is_finished:
+            return
+
+        self._is_canceled = True
+        self._queue = []
+        if self._prefetcher is not None:
+            self._prefetcher.cancel()
+        for reply in list(self._replies.keys()):
+            reply.abort()
+        self._finish()
+
+    def _endpoint_resolved(self, reply):
+        """
+        Called when the asset's endpoint has been resolved
+        """
+        if self._is_finished:
+            return
+
+        endpoint = reply.result()
+        if reply.error() != QNetworkReply.NoError or endpoint is None:
+            self.error_occurred.emit(reply.error_string())
+            self._finish()
+            return
+
+        if not endpoint.url:
+            self.error_occurred.emit(
+                self.tr('Asset {} is not hosted on Cesium ion').format(
+                    self._asset_id
+                )
+            )
+            self._finish()
+            return
+
+        self._endpoint = endpoint
+        if self._load_manifest():
+            # resume an earlier download
+            self._start_downloads()
+            return
+
+        self._traverse()
+
+    def _root_url(self) -> str:
+        """
+        Returns the URL of the root tileset or terrain layer.json
+        """
+        if self._endpoint.type == 'TERRAIN':
+            return resolve_tile_url(self._endpoint.url, 'layer.json')
+        return self._endpoint.url
+
+    def _terrain_level_count(self) -> Optional[int]:
+        """
+        Returns the number of terrain levels to pack, or None for all
+        levels
+        """
+        if self._max_geometric_error is None:
+            return None
+        return terrain_level_for_geometric_error(
+            self._max_geometric_error
+        ) + 1
+
+    def _traverse(self):
+        """
+        Traverses the asset's tilesets to find the files to download
+        """
+        is_terrain = self._endpoint.type == 'TERRAIN'
+        self._prefetcher = TilePrefetcher(
+            self._client,
+            self._asset_id,
+            max_depth=self._terrain_level_count() if is_terrain else None,
+            max_geometric_error=None if is_terrain else
+            self._max_geometric_error,
+            endpoint=self._endpoint,
+            plan_only=True,
+            parent=self
+        )
+        self._prefetcher.tileset_fetched.connect(self._tileset_fetched)
+        self._prefetcher.progress_changed.connect(self._traversal_progress)
+        self._prefetcher.finished.connect(self._traversal_finished)
+        self._prefetcher.start()
+
+    def _tileset_fetched(self, url: str, content: bytes):
+        """
+        Called when a tileset has been fetched during the traversal
+        """
+        self._tilesets[url] = content
+
+    def _traversal_progress(self, fetched: int, discovered: int):
+        """
+        Called when the traversal progresses. The traversal is reported as
+        the first 5% of the pack.
+        """
+        if discovered:
+            self.progress_changed.emit(5 * fetched / discovered)
+
+    def _traversal_finished(self):
+        """
+        Called when the traversal has finished, writing the rewritten
+        tilesets to the pack
+        """
+        prefetcher = self._prefetcher
+        self._prefetcher = None
+        prefetcher.deleteLater()
+        if self._is_finished:
+            return
+
+        root_url = self._root_url()
+        if root_url not in self._tilesets:
+            self.error_occurred.emit(
+                self.tr('Could not retrieve the root tileset')
+            )
+            self._finish()
+            return
+
+        self._urls = prefetcher.planned_urls()
+        self._completed = set()
+        packed_urls = set(self._urls) | set(self._tilesets.keys())
+        try:
+            for url, content in self._tilesets.items():
+                tileset = json.loads(content.decode())
+                if self._endpoint.type == 'TERRAIN':
+                    level_count = self._terrain_level_count()
+                    rewrite_terrain_layer(
+                        tileset,
+                        level_count if level_count is not None else
+                        tileset.get('maxzoom', 30) + 1
+                    )
+                else:
+                    rewrite_tileset(tileset, url, root_url, packed_urls)
+                self._write_file(pack_path(root_url, url),
+                                 json.dumps(tileset).encode())
+        except (OSError, ValueError) as e:
+            self.error_occurred.emit(str(e))
+            self._finish()
+            return
+        self._tilesets = {}
+
+        self._root = pack_path(root_url, root_url)
+        self._save_manifest()
+        self._start_downloads()
+
+    def _write_file(self, path: str, content: bytes):
+        """
+        Atomically writes a file to the pack
+        """
+        target = self._directory.joinpath(*path.split('/'))
+        target.parent.mkdir(parents=True, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+                'wb', dir=str(target.parent), suffix='.tmp',
+                delete=False) as f:
+            f.write(content)
+            temp_path = f.name
+        os.replace(temp_path, target)
+
+    def _load_manifest(self) -> bool:
+        """
+        Loads the manifest of an earlier, incomplete download of the pack.
+
+        Returns True if the download can be resumed.
+        """
+        manifest = self.read_manifest(str(self._directory))
+        if manifest is None or manifest.get('complete') or \
+                manifest.get('asset_id') != self._asset_id or \
+                manifest.get('max_geometric_error') != \
+                self._max_geometric_error:
+            return False
+
+        try:
+            self._root = manifest['root']
+            self._urls = manifest['urls']
+            self._completed = {self._urls[i]
+                               for i in manifest['completed']}
+        except (KeyError, IndexError, TypeError):
+            self._root = None
+            self._urls = []
+            self._completed = set()
+            return False
+
+        return True
+
+    def _save_manifest(self):
+        """
+        Writes the pack manifest, recording the download progress
+        """
+        manifest = {
+            'version': self.VERSION,
+            'asset_id': self._asset_id,
+            'type': self._endpoint.type,
+            'max_geometric_error': self._max_geometric_error,
+            'root': self._root,
+            'complete': self.is_complete(),
+            'urls': self._urls,
+            # completed files are stored by index, to keep the manifest
+            # small
+            'completed': [i for i, url in enumerate(self._urls)
+                          if url in self._completed]
+        }
+        try:
+            self._write_file(self.MANIFEST,
+                             json.dumps(manifest,
+                                        separators=(',', ':')).encode())
+        except OSError as e:
+            self.error_occurred.emit(str(e))
+
+    def _start_downloads(self):
+        """
+        Starts downloading the pack's files which are not yet complete
+        """
+        self._queue = [url for url in self._urls
+                       if url not in self._completed]
+        self._failed_count = 0
+        self._fill_request_window()
+
+    def _local_path(self, url: str) -> Path:
+        """
+        Returns the local path of the file for a URL
+        """
+        return self._directory.joinpath(
+            *pack_path(self._root_url(), url).split('/')
+        )
+
+    def _fill_request_window(self):
+        """
+        Starts queued downloads, until the maximum number of concurrent
+        requests is reached
+        """
+        while self._queue and not self._is_refreshing and \
+                len(self._replies) < self._max_concurrent_requests:
+            url = self._queue.pop(0)
+            part_path = Path(str(self._local_path(url)) + '.part')
+            try:
+                offset = part_path.stat().st_size
+            except OSError:
+                offset = 0
+
+            request = QNetworkRequest(QUrl(url))
+            if self._endpoint.access_token:
+                request.setRawHeader(
+                    b'Authorization',
+                    'Bearer {}'.format(self._endpoint.access_token).encode()
+                )
+            if self._endpoint.type == 'TERRAIN':
+                request.setRawHeader(
+                    b'Accept', TilePrefetcher.TERRAIN_ACCEPT.encode()
+                )
+            # request the stored encoding, so that ranges of partially
+            # downloaded files are consistent between requests
+            request.setRawHeader(b'Accept-Encoding', b'identity')
+            if offset:
+                request.setRawHeader(
+                    b'Range', 'bytes={}-'.format(offset).encode()
+                )
+            request.setAttribute(
+                QNetworkRequest.CacheLoadControlAttribute,
+                QNetworkRequest.AlwaysNetwork
+            )
+            request.setAttribute(QNetworkRequest.CacheSaveControlAttribute,
+                                 False)
+
+            reply = QgsNetworkAccessManager.instance().get(request)
+            self._replies[reply] = url
+            reply.readyRead.connect(
+                lambda reply=reply: self._reply_ready_read(reply)
+            )
+            reply.finished.connect(
+                lambda reply=reply: self._reply_finished(reply)
+            )
+
+        if self._urls:
+            self.progress_changed.emit(
+                5 + 95 * len(self._completed) / len(self._urls)
+            )
+        if not self._queue and not self._replies:
+            self._downloads_finished()
+
+    def _reply_ready_read(self, reply: QNetworkReply):
+        """
+        Streams received data for a download to its partial file
+        """
+        url = self._replies.get(reply)
+        if url is None or reply in self._write_failures:
+            return
+
+        try:
+            f = self._files.get(reply)
+            if f is None:
+                status = reply.attribute(
+                    QNetworkRequest.HttpStatusCodeAttribute
+                )
+                if status is not None and status >= 400:
+                    return
+
+                part_path = Path(str(self._local_path(url)) + '.part')
+                part_path.parent.mkdir(parents=True, exist_ok=True)
+                # append to the partial file only if the server honored
+                # the range request
+                # pylint: disable=consider-using-with
+                f = open(part_path, 'ab' if status == 206 else 'wb')
+                # pylint: enable=consider-using-with
+                self._files[reply] = f
+
+            f.write(reply.readAll().data())
+        except OSError:
+            # the file fails, the rest of the pack continues
+            self._write_failures.add(reply)
+            reply.abort()
+
+    def _reply_finished(self, reply: QNetworkReply):
+        """
+        Called when a download has finished
+        """
+        reply.deleteLater()
+        self._reply_ready_read(reply)
+        url = self._replies.pop(reply, None)
+        f = self._files.pop(reply, None)
+        if f is not None:
+            f.close()
+        write_failed = reply in self._write_failures
+        self._write_failures.discard(reply)
+        if url is None or self._is_finished or self._is_canceled:
+            return
+
+        status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+        if write_failed:
+            # the partial file may be incomplete, so start it again next
+            # time
+            self._remove_part_file(url)
+            self._failed_count += 1
+        elif reply.error() == QNetworkReply.NoError:
+            try:
+                self._complete_file(
+                    url,
+                    reply.rawHeader(b'Content-Encoding').data().lower()
+                )
+            except OSError:
+                self._failed_count += 1
+        elif status == 416:
+            # the partial file is invalid, so start it again next time
+            self._remove_part_file(url)
+            self._failed_count += 1
+        elif status in self.AUTHENTICATION_ERRORS and \
+                url not in self._auth_retried:
+            # the endpoint's access token may have expired, so resolve
+            # it again and retry the file (once)
+            self._auth_retried.add(url)
+            self._queue.insert(0, url)
+            self._refresh_endpoint()
+        else:
+            self._failed_count += 1
+
+        self._fill_request_window()
+
+    def _remove_part_file(self, url: str):
+        """
+        Removes the partial file of a download, if it exists
+        """
+        try:
+            os.remove(str(self._local_path(url)) + '.part')
+        except OSError:
+            pass
+
+    def _refresh_endpoint(self):
+        """
+        Resolves the asset's endpoint again, pausing downloads until it
+        has been resolved
+        """
+        if self._is_refreshing:
+            return
+
+        self._is_refreshing = True
+        endpoint_cache = self._client.endpoint_cache()
+        endpoint_cache.invalidate(self._asset_id, self._token)
+        reply = endpoint_cache.resolve(
+            self._asset_id, self._token,
+            priority=RequestPriority.Background
+        )
+        reply.finished.connect(lambda: self._endpoint_refreshed(reply))
+
+    def _endpoint_refreshed(self, reply):
+        """
+        Called when the asset's endpoint has been resolved again,
+        resuming downloads. If the endpoint could not be resolved then
+        the retried files fail.
+        """
+        self._is_refreshing = False
+        if self._is_finished:
+            return
+
+        endpoint = reply.result()
+        if reply.error() == QNetworkReply.NoError and \
+                endpoint is not None and endpoint.url:
+            self._endpoint = endpoint
+        self._fill_request_window()
+
+    def _complete_file(self, url: str, content_encoding: bytes):
+        """
+        Moves a completely downloaded file into place
+        """
+        path = self._local_path(url)
+        part_path = str(path) + '.part'
+        if not os.path.exists(part_path):
+            # an empty response
+            path.parent.mkdir(parents=True, exist_ok=True)
+            path.write_bytes(b'')
+        elif content_encoding == b'gzip':
+            # the server sent compressed content regardless of the
+            # requested encoding
+            with gzip.open(part_path, 'rb') as source, \
+                    open(str(path) + '.tmp', 'wb') as target:
+                shutil.copyfileobj(source, target)
+            os.replace(str(path) + '.tmp', path)
+            os.remove(part_path)
+        else:
+            os.replace(part_path, path)
+
+        self._completed.add(url)
+        self._unsaved_count += 1
+        if self._unsaved_count >= self.SAVE_INTERVAL:
+            self._save_manifest()
+            self._unsaved_count = 0
+
+    def _downloads_finished(self):
+        """
+        Called when all downloads have finished
+        """
+        self._save_manifest()
+        self._unsaved_count = 0
+        if self._failed_count:
+            self.error_occurred.emit(
+                self.tr('{} files could not be downloaded').format(
+                    self._failed_count
+                )
+            )
+        self._finish()
+
+    def _finish(self):
+        """
+        Finishes the download
+        """
+        if self._is_finished:
+            return
+
+        if self._is_canceled and self._root is not None:
+            self._save_manifest()
+
+        self._is_finished = True
+        self.finished.emit()
@@ -0,0 +1,514 @@
+"""
+Paginated fetching of Cesium ion list endpoints
+"""
+
+import time
+from dataclasses import (
+    dataclass,
+    field
+)
+from typing import (
+    Callable,
+    Dict,
+    List,
+    Optional
+)
+
+from qgis.PyQt.QtCore import (
+    QObject,
+    QEventLoop,
+    pyqtSignal
+)
+from qgis.PyQt.QtNetwork import (
+    QNetworkRequest,
+    QNetworkReply
+)
+from qgis.core import (
+    QgsApplication,
+    QgsNetworkAccessManager
+)
+
+from .circuit_breaker import CircuitBreaker
+from .hedging import (
+    HedgedReply,
+    HedgingPolicy
+)
+from .json_stream import ReplyItemsReader
+from .request_scheduler import (
+    RequestPriority,
+    RequestScheduler,
+    RequestSlot,
+    ThreadInvoker,
+    reply_status
+)
+
+
+@dataclass
+class FetchedPage:
+    """
+    A single fetched page of a list endpoint, along with the HTTP
+    validators which can be used to conditionally request it again
+    """
+    items: List = field(default_factory=list)
+    has_more: bool = False
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+class PagedFetcher(QObject):
+    """
+    Fetches every page of a paginated Cesium ion list endpoint.
+
+    The first page is requested alone. If it indicates that further pages
+    exist, a window of concurrent page requests is kept in flight until
+    the end of the listing is found. The end is marked by a page without
+    a next link, or for endpoints which don't return next links, by an
+    empty page or a page with fewer items than the first page. Pages are
+    emitted strictly in order, regardless of the order in which replies
+    arrive.
+
+    Servers may return fewer items per page than requested, so a first
+    page shorter than the requested page size doesn't end the listing.
+    Instead, the second page is requested alone before the window of
+    concurrent requests is opened.
+
+    If previously fetched pages are supplied, those pages are requested
+    conditionally and reused without transferring their content again
+    when the server reports them as unmodified.
+
+    If a request scheduler is supplied, page requests are started by the
+    scheduler with the specified priority, and are retried when they are
+    rejected by the rate limit or fail with server errors.
+
+    If a circuit breaker is supplied, the fetch fails immediately while
+    ion is unreachable.
+
+    If a hedging policy is supplied, slow page requests are hedged with
+    a duplicate request.
+    """
+
+    #: Emitted with the page number and parsed items for each page, in order
+    page_fetched = pyqtSignal(int, list)
+    #: Emitted when all pages have been fetched, or the fetch has failed
+    #: or been canceled
+    finished = pyqtSignal()
+    error_occurred = pyqtSignal(str)
+
+    DEFAULT_MAX_CONCURRENT_REQUESTS = 6
+
+    def __init__(self,
+                 request_factory: Callable[[int], QNetworkRequest],
+                 item_parser: Callable[[Dict], object],
+                 page_size: int,
+                 auth_cfg: Optional[str] = None,
+                 max_concurrent_requests: int =
+                 DEFAULT_MAX_CONCURRENT_REQUESTS,
+                 cached_pages: Optional[Dict[int, FetchedPage]] = None,
+                 scheduler: Optional[RequestScheduler] = None,
+                 priority: RequestPriority = RequestPriority.Normal,
+                 circuit_breaker: Optional[CircuitBreaker] = None,
+                 hedging_policy: Optional[HedgingPolicy] = None,
+                 parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._request_factory = request_factory
+        self._item_parser = item_parser
+        self._page_size = page_size
+        self._auth_cfg = auth_cfg
+        self._max_concurrent_requests = max(1, max_concurrent_requests)
+        self._cached_pages = cached_pages or {}
+        self._scheduler = scheduler
+        self._priority = priority
+        self._circuit_breaker = circuit_breaker
+        self._hedging_policy = hedging_policy
+
+        self._next_page_to_request = 1
+        self._next_page_to_emit = 1
+        self._last_page: Optional[int] = None
+        self._more_pages_available = False
+        # number of items in the first page
+        self._first_page_size: Optional[int] = None
+        self._in_flight: Dict[int, HedgedReply] = {}
+        # scheduler handles for pages waiting for the scheduler to start
+        # their requests
+        self._queued_pages: Dict[int, Optional[object]] = {}
+        self._slots: Dict[int, RequestSlot] = {}
+        self._retries: Dict[int, int] = {}
+        # fetched pages (or error strings) which have not yet been emitted
+        self._completed: Dict[int, object] = {}
+        # emitted pages
+        self._pages: Dict[int, FetchedPage] = {}
+        self._modified_pages = set()
+        self._is_finished = False
+        self._is_canceled = False
+
+    def start(self):
+        """
+        Starts fetching pages
+        """
+        self._request_page(self._next_page_to_request)
+        self._next_page_to_request += 1
+
+    def cancel(self):
+        """
+        Cancels the fetch, aborting all in-flight requests
+        """
+        if self._is_finished:
+            return
+
+        self._is_canceled = True
+        self._abort_pages_after(0)
+        self._finish()
+
+    def is_finished(self) -> bool:
+        """
+        Returns True if the fetch has completed, failed or been canceled
+        """
+        return self._is_finished
+
+    def is_canceled(self) -> bool:
+        """
+        Returns True if the fetch was canceled
+        """
+        return self._is_canceled
+
+    def pages(self) -> Dict[int, FetchedPage]:
+        """
+        Returns all pages fetched so far, by page number
+        """
+        return self._pages
+
+    def is_modified(self) -> bool:
+        """
+        Returns True if the fetched pages differ from the cached pages
+        which were supplied when constructing the fetcher
+        """
+        return bool(self._modified_pages) or \
+            set(self._pages.keys()) != set(self._cached_pages.keys())
+
+    def fetch_all_blocking(self) -> List:
+        """
+        Starts the fetch and blocks until every page has been retrieved,
+        returning the combined items from all pages in order.
+
+        An empty list is returned if any page fails.
+        """
+        items = []
+        failed = []
+
+        self.page_fetched.connect(
+            lambda _, page_items: items.extend(page_items)
+        )
+        self.error_occurred.connect(failed.append)
+
+        loop = QEventLoop()
+        self.finished.connect(loop.quit)
+        self.start()
+        if not self._is_finished:
+            loop.exec_()
+
+        if failed or self._is_canceled:
+            return []
+
+        return items
+
+    def _request_page(self, page: int, delay: float = 0):
+        """
+        Requests a page, through the request scheduler if set
+        """
+        if self._scheduler is None:
+            self._start_page_request(page, None)
+            return
+
+        invoker = ThreadInvoker.for_current_thread()
+        self._queued_pages[page] = None
+        queued = self._scheduler.submit(
+            lambda slot: self._page_slot_acquired(page, slot, invoker),
+            delay,
+            self._priority
+        )
+        if page in self._queued_pages:
+            # not started immediately
+            self._queued_pages[page] = queued
+
+    def _page_slot_acquired(self, page: int, slot: RequestSlot,
+                            invoker: ThreadInvoker):
+        """
+        Called from any thread when the scheduler starts a page request
+        """
+        if self._is_finished:
+            # the fetch's thread may no longer be running an event loop,
+            # so return the slot immediately
+            self._scheduler.finish(slot)
+            return
+
+        invoker.invoke(lambda: self._start_page_request(page, slot))
+
+    def _start_page_request(self, page: int, slot: Optional[RequestSlot]):
+        """
+        Issues the network request for a page
+        """
+        self._queued_pages.pop(page, None)
+        if self._is_finished or \
+                (self._last_page is not None and page > self._last_page):
+            # no longer required
+            if slot is not None:
+                self._scheduler.finish(slot)
+            return
+
+        if self._circuit_breaker is not None and \
+                not self._circuit_breaker.allow_request():
+            if slot is not None:
+                self._scheduler.finish(slot)
+            self._completed[page] = 'Cesium ion is unreachable'
+            self._emit_completed_pages()
+            return
+
+        if slot is not None:
+            self._slots[page] = slot
+
+        request = self._request_factory(page)
+        request.setPriority(self._priority.network_priority())
+
+        cached_page = self._cached_pages.get(page)
+        if cached_page and (cached_page.etag or cached_page.last_modified):
+            # bypass the QGIS network cache, so that a "not modified"
+            # response is passed through to us
+            request.setAttribute(
+                QNetworkRequest.CacheLoadControlAttribute,
+                QNetworkRequest.AlwaysNetwork
+            )
+            if cached_page.etag:
+                request.setRawHeader(
+                    b'If-None-Match', cached_page.etag.encode()
+                )
+            if cached_page.last_modified:
+                request.setRawHeader(
+                    b'If-Modified-Since', cached_page.last_modified.encode()
+                )
+
+        if self._auth_cfg:
+            QgsApplication.authManager().updateNetworkRequest(
+                request, self._auth_cfg
+            )
+
+        def send() -> QNetworkReply:
+            reply = QgsNetworkAccessManager.instance().get(request)
+            if self._auth_cfg:
+                QgsApplication.authManager().updateNetworkReply(
+                    reply, self._auth_cfg
+                )
+            return reply
+
+        # decode items as the reply data arrives, instead of holding the
+        # complete response in memory
+        hedged_reply = HedgedReply(
+            send,
+            self._hedging_policy,
+            reader_factory=lambda reply: ReplyItemsReader(
+                reply, self._item_parser
+            ),
+            parent=self
+        )
+        self._in_flight[page] = hedged_reply
+        hedged_reply.finished.connect(
+            lambda: self._page_reply_finished(page, hedged_reply)
+        )
+        hedged_reply.start()
+
+    def _fill_request_window(self):
+        """
+        Keeps the maximum number of page requests in flight, until the
+        last page is known
+        """
+        max_requests = self._max_concurrent_requests
+        if self._next_page_to_emit <= 2 and \
+                self._first_page_size is not None and \
+                self._first_page_size < self._page_size:
+            # the first page was short, so it is either the only page or
+            # the server capped the page size. Probe the second page alone.
+            max_requests = 1
+
+        while (not self._is_finished and self._last_page is None and
+               len(self._in_flight) + len(self._queued_pages) <
+               max_requests):
+            self._request_page(self._next_page_to_request)
+            self._next_page_to_request += 1
+
+    def _abort_pages_after(self, page: int):
+        """
+        Aborts all in-flight and queued requests for pages after the
+        specified page
+        """
+        self._cancel_queued_pages(page)
+        for in_flight_page in [p for p in self._in_flight if p > page]:
+            hedged_reply = self._in_flight.pop(in_flight_page)
+            self._finish_slot(in_flight_page)
+            hedged_reply.abort()
+            hedged_reply.deleteLater()
+
+        for completed_page in [p for p in self._completed if p > page]:
+            del self._completed[completed_page]
+
+    def _cancel_queued_pages(self, page: int):
+        """
+        Withdraws the queued requests for pages after the specified page
+        from the scheduler
+        """
+        for queued_page in [p for p in self._queued_pages if p > page]:
+            queued = self._queued_pages.pop(queued_page)
+            if queued is not None:
+                self._scheduler.cancel(queued)
+
+    def _page_reply_finished(self, page: int, hedged_reply: HedgedReply):
+        """
+        Called when the reply for a page is finished
+        """
+        if self._in_flight.get(page) is not hedged_reply:
+            # aborted request
+            return
+
+        del self._in_flight[page]
+        reply = hedged_reply.reply()
+        reader = hedged_reply.reader()
+        hedged_reply.deleteLater()
+        reply.deleteLater()
+
+        status_code, retry_after = reply_status(reply)
+        if self._circuit_breaker is not None:
+            slot = self._slots.get(page)
+            self._circuit_breaker.record(
+                reply.error(), status_code,
+                time.monotonic() - slot.started if slot else 0
+            )
+        self._finish_slot(page, status_code, retry_after)
+
+        if self._is_finished:
+            return
+
+        if self._last_page is not None and page > self._last_page:
+            return
+
+        if reply.error() != QNetworkReply.NoError and \
+                self._scheduler is not None:
+            delay = self._scheduler.retry_delay(
+                self._retries.get(page, 0), status_code, retry_after
+            )
+            if delay is not None:
+                self._retries[page] = self._retries.get(page, 0) + 1
+                self._request_page(page, delay)
+                return
+
+        if reply.error() != QNetworkReply.NoError:
+            # defer the failure until all earlier pages are known, as the
+            # page may turn out to be past the end of the listing
+            self._completed[page] = reply.errorString()
+        else:
+            try:
+                fetched_page = self._parse_page_reply(page, reply, reader)
+            except (ValueError, KeyError) as e:
+                # malformed JSON, or items missing required fields
+                fetched_page = None
+                self._completed[page] = str(e)
+
+            if fetched_page is not None:
+                if page == 1:
+                    self._first_page_size = len(fetched_page.items)
+                self._completed[page] = fetched_page
+                if fetched_page.has_more:
+                    self._more_pages_available = True
+                elif self._last_page is None or page < self._last_page:
+                    self._last_page = page
+                    self._abort_pages_after(page)
+
+        self._emit_completed_pages()
+
+        if not self._is_finished and self._more_pages_available:
+            self._fill_request_window()
+
+    def _finish_slot(self, page: int,
+                     status_code: Optional[int] = None,
+                     retry_after: Optional[float] = None):
+        """
+        Returns the scheduler slot for a page's request
+        """
+        slot = self._slots.pop(page, None)
+        if slot is not None:
+            self._scheduler.finish(slot, status_code, retry_after)
+
+    def _parse_page_reply(self, page: int,
+                          reply: QNetworkReply,
+                          reader: ReplyItemsReader) -> FetchedPage:
+        """
+        Parses the reply for a page
+        """
+        status_code = reply.attribute(
+            QNetworkRequest.HttpStatusCodeAttribute
+        )
+        cached_page = self._cached_pages.get(page)
+        if status_code == 304 and cached_page is not None:
+            return cached_page
+
+        self._modified_pages.add(page)
+
+        items, envelope = reader.finish()
+
+        etag = reply.rawHeader(b'ETag').data().decode()
+        last_modified = reply.rawHeader(b'Last-Modified').data().decode()
+        return FetchedPage(
+            items=items,
+            has_more=self._has_more_pages(page, envelope, len(items)),
+            etag=etag or None,
+            last_modified=last_modified or None
+        )
+
+    def _has_more_pages(self, page: int, envelope: Dict,
+                        item_count: int) -> bool:
+        """
+        Returns True if a page reply indicates that further pages exist
+        """
+        if 'next' in envelope:
+            return bool(envelope['next'])
+
+        if not item_count:
+            return False
+
+        if page == 1 or self._first_page_size is None:
+            # the page size used by the server is not known yet
+            return True
+
+        # the server may return fewer items per page than requested, so
+        # compare against the actual size of the first page
+        return item_count >= self._first_page_size
+
+    def _emit_completed_pages(self):
+        """
+        Emits all completed pages which directly follow the last
+        emitted page
+        """
+        while self._next_page_to_emit in self._completed:
+            page = self._next_page_to_emit
+            result = self._completed.pop(page)
+            if isinstance(result, str):
+                self.error_occurred.emit(result)
+                self._abort_pages_after(0)
+                self._finish()
+                return
+
+            self._pages[page] = result
+            self.page_fetched.emit(page, result.items)
+            self._next_page_to_emit += 1
+
+        if self._last_page is not None and \
+                self._next_page_to_emit > self._last_page:
+            self._finish()
+
+    def _finish(self):
+        """
+        Marks the fetch as finished
+        """
+        if self._is_finished:
+            return
+
+        self._is_finished = True
+        self._cancel_queued_pages(0)
+        self.finished.emit()
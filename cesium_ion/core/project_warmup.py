@@ -0,0 +1,176 @@
+"""
+Checks of Cesium ion layers which failed to load with a project
+"""
+
+from collections import OrderedDict
+from typing import (
+    Dict,
+    List,
+    Optional,
+    Tuple
+)
+
+from qgis.PyQt.QtCore import (
+    QCoreApplication,
+    QObject,
+    pyqtSignal
+)
+from qgis.PyQt.QtNetwork import QNetworkReply
+from qgis.core import QgsMapLayer
+
+from .api_reply import ApiReply
+from .ion_source import IonDataSource
+from .request_scheduler import RequestPriority
+
+
+class ProjectWarmup(QObject):
+    """
+    Concurrently resolves the endpoints for the ion layers in a project
+    which failed to load, to find out why they can't be accessed.
+
+    Projects are read after their layers have been loaded, and the data
+    providers resolve the endpoints of their layers themselves, so valid
+    layers are skipped rather than resolving their endpoints again.
+
+    Layers which share an asset and token share a single resolution.
+    Failures are collected, so that they can be reported together once
+    the check has finished.
+
+    Must be used from the main thread.
+    """
+
+    #: Maximum number of endpoints resolved at once
+    MAX_CONCURRENT_REQUESTS = 6
+
+    #: Emitted when all endpoints have been resolved
+    finished = pyqtSignal()
+
+    def __init__(self,
+                 client,
+                 layers: List[QgsMapLayer],
+                 max_concurrent_requests: int = MAX_CONCURRENT_REQUESTS,
+                 parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._client = client
+        self._max_concurrent_requests = max(1, max_concurrent_requests)
+
+        # layer names by (asset id, token), in layer order
+        self._layer_names: Dict[Tuple[int, Optional[str]], List[str]] = \
+            OrderedDict()
+        for layer in layers:
+            if layer.isValid():
+                continue
+            source = IonDataSource.from_source(layer.source())
+            if source is None:
+                continue
+            if source.auth_cfg and source.auth_cfg != client.OAUTH_ID:
+                # authenticated with a configuration we can't use
+                continue
+            key = (source.asset_id, source.access_token)
+            self._layer_names.setdefault(key, []).append(layer.name())
+
+        self._queue = list(self._layer_names.keys())
+        self._pending: Dict[Tuple[int, Optional[str]], ApiReply] = {}
+        self._failures: List[Tuple[List[str], str]] = []
+        self._is_finished = False
+
+    def layer_count(self) -> int:
+        """
+        Returns the number of invalid ion layers being checked
+        """
+        return sum(len(names) for names in self._layer_names.values())
+
+    def is_finished(self) -> bool:
+        """
+        Returns True if the warm-up has finished
+        """
+        return self._is_finished
+
+    def failures(self) -> List[Tuple[List[str], str]]:
+        """
+        Returns the failed resolutions, as the names of the affected
+        layers and a description of the failure
+        """
+        return list(self._failures)
+
+    def start(self):
+        """
+        Starts the warm-up
+        """
+        self._fill_request_window()
+        self._check_finished()
+
+    def cancel(self):
+        """
+        Cancels the warm-up. Resolutions which are already in progress
+        will still complete, and are cached.
+        """
+        self._queue = []
+        self._pending = {}
+        self._check_finished()
+
+    def _fill_request_window(self):
+        """
+        Starts resolving endpoints, until the maximum number of concurrent
+        requests is reached
+        """
+        while self._queue and \
+                len(self._pending) < self._max_concurrent_requests:
+            key = self._queue.pop(0)
+            reply = self._client.endpoint_cache().resolve(
+                *key, priority=RequestPriority.Background
+            )
+            self._pending[key] = reply
+            reply.finished.connect(
+                lambda key=key, reply=reply: self._resolved(key, reply)
+            )
+
+    def _resolved(self, key: Tuple[int, Optional[str]], reply: ApiReply):
+        """
+        Called when an endpoint has been resolved
+        """
+        if self._pending.get(key) is not reply:
+            return
+        del self._pending[key]
+
+        self._failures.append(
+            (self._layer_names[key], self.describe_error(reply))
+        )
+
+        self._fill_request_window()
+        self._check_finished()
+
+    @staticmethod
+    def describe_error(reply: ApiReply) -> str:
+        """
+        Returns a description of why a layer could not be loaded, from
+        the result of resolving its endpoint
+        """
+        if reply.error() == QNetworkReply.NoError:
+            # the asset is accessible, so the failure lies elsewhere
+            return QCoreApplication.translate(
+                'ProjectWarmup', 'could not be loaded'
+            )
+        if reply.error() == QNetworkReply.AuthenticationRequiredError:
+            return QCoreApplication.translate(
+                'ProjectWarmup', 'invalid or expired token'
+            )
+        if reply.error() == QNetworkReply.ContentAccessDenied:
+            return QCoreApplication.translate(
+                'ProjectWarmup', 'token does not grant access to the asset'
+            )
+        if reply.error() == QNetworkReply.ContentNotFoundError:
+            return QCoreApplication.translate(
+                'ProjectWarmup', 'asset not found'
+            )
+        return reply.error_string()
+
+    def _check_finished(self):
+        """
+        Emits the finished signal once all endpoints have been resolved
+        """
+        if self._is_finished or self._queue or self._pending:
+            return
+
+        self._is_finished = True
+        self.finished.emit()
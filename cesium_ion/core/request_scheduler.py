@@ -0,0 +1,602 @@
+"""
+Rate limited scheduling of Cesium ion API requests
+"""
+
+import itertools
+import random
+import threading
+import time
+from dataclasses import (
+    dataclass,
+    replace
+)
+from email.utils import parsedate_to_datetime
+from enum import IntEnum
+from typing import (
+    Callable,
+    List,
+    Optional,
+    Tuple
+)
+
+from qgis.PyQt.QtCore import (
+    QObject,
+    pyqtSignal,
+    pyqtSlot
+)
+from qgis.PyQt.QtNetwork import QNetworkRequest
+
+
+class RequestPriority(IntEnum):
+    """
+    Request priorities, from highest to lowest
+    """
+    #: Requests a user is waiting on
+    Interactive = 0
+    Normal = 1
+    #: Requests for background work, such as catalog syncs and tile
+    #: prefetches
+    Background = 2
+
+    def network_priority(self) -> QNetworkRequest.Priority:
+        """
+        Returns the matching network request priority, used to order
+        requests which are waiting for a connection
+        """
+        return {
+            RequestPriority.Interactive: QNetworkRequest.HighPriority,
+            RequestPriority.Normal: QNetworkRequest.NormalPriority,
+            RequestPriority.Background: QNetworkRequest.LowPriority
+        }[self]
+
+
+class TokenBucket:
+    """
+    A token bucket rate limiter, allowing short bursts of requests while
+    limiting the sustained request rate.
+
+    Not thread-safe.
+    """
+
+    def __init__(self, rate: float, capacity: float,
+                 clock: Callable[[], float] = time.monotonic):
+        self._rate = max(rate, 0.001)
+        self._capacity = max(capacity, 1.0)
+        self._clock = clock
+        self._tokens = self._capacity
+        self._last_refill = clock()
+
+    def rate(self) -> float:
+        """
+        Returns the sustained rate, in tokens per second
+        """
+        return self._rate
+
+    def set_rate(self, rate: float, capacity: Optional[float] = None):
+        """
+        Sets the sustained rate and, optionally, the bucket capacity
+        """
+        self._refill()
+        self._rate = max(rate, 0.001)
+        if capacity is not None:
+            self._capacity = max(capacity, 1.0)
+            self._tokens = min(self._tokens, self._capacity)
+
+    def _refill(self):
+        """
+        Adds the tokens accumulated since the last refill
+        """
+        now = self._clock()
+        self._tokens = min(
+            self._capacity,
+            self._tokens + (now - self._last_refill) * self._rate
+        )
+        self._last_refill = now
+
+    def try_consume(self) -> float:
+        """
+        Consumes a token if one is available, returning 0. Otherwise
+        returns the time in seconds until a token will be available.
+        """
+        self._refill()
+        if self._tokens >= 1:
+            self._tokens -= 1
+            return 0.0
+        return (1 - self._tokens) / self._rate
+
+
+class AimdConcurrencyLimit:
+    """
+    An adaptive limit on the number of concurrent requests, using
+    additive increase/multiplicative decrease.
+
+    The limit grows by roughly one request for each window of successful
+    requests, and shrinks sharply when the server reports that it is
+    overloaded or more gently when request latency rises well above the
+    lowest latency observed.
+
+    Not thread-safe.
+    """
+
+    #: Factor by which the limit is reduced when the server is overloaded
+    OVERLOAD_DECREASE = 0.5
+    #: Factor by which the limit is reduced when latency rises
+    LATENCY_DECREASE = 0.9
+    #: Latency, as a multiple of the baseline latency, above which the
+    #: server is considered to be congested
+    LATENCY_TOLERANCE = 3.0
+    #: Rate at which the baseline latency drifts towards recent latencies
+    BASELINE_DRIFT = 0.01
+
+    def __init__(self, initial: int = 6, minimum: int = 1,
+                 maximum: int = 16):
+        self._minimum = max(1, minimum)
+        self._maximum = max(self._minimum, maximum)
+        self._limit = float(min(max(initial, self._minimum),
+                                self._maximum))
+        self._baseline_latency: Optional[float] = None
+
+    def limit(self) -> int:
+        """
+        Returns the current concurrency limit
+        """
+        return int(self._limit)
+
+    def on_success(self, latency: float):
+        """
+        Updates the limit after a successful request
+        """
+        if self._baseline_latency is None or \
+                latency < self._baseline_latency:
+            self._baseline_latency = latency
+        else:
+            # let the baseline follow sustained changes in latency, so
+            # that one fast response doesn't hold the limit down forever
+            self._baseline_latency += \
+                (latency - self._baseline_latency) * self.BASELINE_DRIFT
+
+        if latency > self._baseline_latency * self.LATENCY_TOLERANCE:
+            self._decrease(self.LATENCY_DECREASE)
+        else:
+            self._limit = min(self._maximum,
+                              self._limit + 1 / self._limit)
+
+    def on_overload(self):
+        """
+        Updates the limit after the server reported that it is overloaded
+        """
+        self._decrease(self.OVERLOAD_DECREASE)
+
+    def _decrease(self, factor: float):
+        """
+        Reduces the limit by a factor
+        """
+        self._limit = max(self._minimum, self._limit * factor)
+
+
+def parse_retry_after(value: Optional[str],
+                      now: Optional[float] = None) -> Optional[float]:
+    """
+    Parses a Retry-After header value, given either as a number of
+    seconds or as an HTTP date, returning the delay in seconds
+    """
+    if not value:
+        return None
+
+    value = value.strip()
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+
+    try:
+        date = parsedate_to_datetime(value)
+    except (TypeError, ValueError, IndexError):
+        return None
+    if date is None or date.tzinfo is None:
+        return None
+    return max(0.0, date.timestamp() -
+               (time.time() if now is None else now))
+
+
+def reply_status(reply) -> Tuple[Optional[int], Optional[float]]:
+    """
+    Returns the HTTP status of a QNetworkReply or QgsNetworkReplyContent
+    (or None if no response was received) and its Retry-After delay
+    """
+    status_code = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+    retry_after = parse_retry_after(
+        reply.rawHeader(b'Retry-After').data().decode('latin-1')
+    )
+    return (int(status_code) if status_code is not None else None), \
+        retry_after
+
+
+@dataclass
+class SchedulerStatistics:
+    """
+    Request scheduler statistics
+    """
+    #: Number of requests started
+    started: int = 0
+    #: Number of requests retried
+    retries: int = 0
+    #: Number of responses reporting that the rate limit was exceeded
+    throttled: int = 0
+    #: Number of responses with server errors
+    server_errors: int = 0
+    #: Number of queued requests dropped because they became stale
+    dropped: int = 0
+    #: Current concurrency limit
+    concurrency_limit: int = 0
+    #: Number of requests currently in progress
+    active: int = 0
+    #: Number of background requests currently in progress
+    active_background: int = 0
+    #: Number of requests waiting to start
+    queued: int = 0
+
+
+@dataclass
+class RequestSlot:
+    """
+    Permission to run a single request, which must be returned to the
+    scheduler by RequestScheduler.finish() when the request is complete
+    """
+    #: time at which the request started
+    started: float
+    priority: RequestPriority = RequestPriority.Normal
+
+
+@dataclass(eq=False)
+class _QueuedRequest:
+    """
+    A request waiting to start
+    """
+    start: Callable[[RequestSlot], None]
+    not_before: float
+    priority: RequestPriority
+    #: order in which the request was submitted
+    sequence: int
+    #: time after which the request is stale, if it has not yet started
+    expires: Optional[float] = None
+    dropped: Optional[Callable[[], None]] = None
+
+
+class RequestScheduler:
+    """
+    Schedules API requests, limiting their rate and concurrency.
+
+    Requests are started once a token is available from the token bucket
+    rate limiter and the adaptive concurrency limit allows, in order of
+    priority and then in the order they were submitted. Background
+    requests may only use a share of the concurrency limit, so that
+    connections remain available for interactive requests, and stale
+    background requests may be dropped while they wait.
+    When the server asks clients to slow down (with a Retry-After
+    header), no requests start until the requested time has passed.
+    Failed requests are retried with exponential backoff and jitter.
+
+    The scheduler is thread-safe. Request start callbacks may be called
+    from any thread (see ThreadInvoker).
+    """
+
+    #: Default sustained request rate, in requests per second
+    DEFAULT_RATE = 10.0
+    #: Default number of requests which may be sent in a burst
+    DEFAULT_BURST = 20
+    #: Default maximum number of times a request is retried
+    DEFAULT_MAX_RETRIES = 4
+    #: Delay in seconds before the first retry
+    BACKOFF_BASE = 0.5
+    #: Maximum delay in seconds between retries
+    BACKOFF_CAP = 30.0
+
+    #: Share of the concurrency limit which background requests may use
+    BACKGROUND_SHARE = 0.5
+
+    #: HTTP status indicating that the rate limit was exceeded
+    TOO_MANY_REQUESTS = 429
+    #: HTTP statuses for which idempotent requests are retried
+    RETRYABLE_STATUSES = (429, 500, 502, 503, 504)
+
+    def __init__(self,
+                 rate: float = DEFAULT_RATE,
+                 burst: int = DEFAULT_BURST,
+                 max_retries: int = DEFAULT_MAX_RETRIES,
+                 concurrency_limit: Optional[AimdConcurrencyLimit] = None,
+                 clock: Callable[[], float] = time.monotonic,
+                 rng: Optional[random.Random] = None):
+        self._lock = threading.Lock()
+        self._clock = clock
+        self._rng = rng or random.Random()
+        self._bucket = TokenBucket(rate, burst, clock)
+        self._limit = concurrency_limit or AimdConcurrencyLimit()
+        self._max_retries = max_retries
+        self._queue: List[_QueuedRequest] = []
+        self._sequence = itertools.count()
+        self._active = 0
+        self._active_background = 0
+        self._paused_until = 0.0
+        self._wake_timer: Optional[threading.Timer] = None
+        self._wake_time: Optional[float] = None
+        self._statistics = SchedulerStatistics()
+
+    def set_rate(self, rate: float, burst: Optional[int] = None):
+        """
+        Sets the sustained request rate, in requests per second, and
+        optionally the burst size
+        """
+        with self._lock:
+            self._bucket.set_rate(rate, burst)
+        self._dispatch()
+
+    def set_max_retries(self, max_retries: int):
+        """
+        Sets the maximum number of times a failed request is retried
+        """
+        with self._lock:
+            self._max_retries = max(0, max_retries)
+
+    def statistics(self) -> SchedulerStatistics:
+        """
+        Returns a snapshot of the scheduler statistics
+        """
+        with self._lock:
+            return replace(self._statistics,
+                           concurrency_limit=self._limit.limit(),
+                           active=self._active,
+                           active_background=self._active_background,
+                           queued=len(self._queue))
+
+    def submit(self, start: Callable[[RequestSlot], None],
+               delay: float = 0,
+               priority: RequestPriority = RequestPriority.Normal,
+               max_queue_time: Optional[float] = None,
+               dropped: Optional[Callable[[], None]] = None) \
+            -> _QueuedRequest:
+        """
+        Queues a request, which will be started by calling start with a
+        request slot once the request is allowed to proceed, no earlier
+        than delay seconds from now.
+
+        start may be called immediately, from the calling thread, or
+        later from another thread.
+
+        If max_queue_time is set, the request is dropped if it has not
+        started within that many seconds of becoming ready, and dropped
+        is called (from any thread).
+
+        Returns a handle for the queued request, for use with promote()
+        and cancel().
+        """
+        now = self._clock()
+        request = _QueuedRequest(
+            start=start,
+            not_before=now + delay,
+            priority=priority,
+            sequence=next(self._sequence),
+            expires=now + delay + max_queue_time
+            if max_queue_time is not None else None,
+            dropped=dropped
+        )
+        with self._lock:
+            self._queue.append(request)
+        self._dispatch()
+        return request
+
+    def promote(self, request: _QueuedRequest, priority: RequestPriority):
+        """
+        Raises the priority of a queued request, which will then never be
+        dropped. Does nothing if the request has already started.
+        """
+        with self._lock:
+            if request not in self._queue or priority >= request.priority:
+                return
+            request.priority = priority
+            request.expires = None
+        self._dispatch()
+
+    def cancel(self, request: _QueuedRequest) -> bool:
+        """
+        Withdraws a queued request, which will then never be started.
+
+        Returns False if the request has already started or been dropped.
+        """
+        with self._lock:
+            if request not in self._queue:
+                return False
+            self._queue.remove(request)
+        return True
+
+    def finish(self, slot: RequestSlot,
+               status_code: Optional[int] = None,
+               retry_after: Optional[float] = None):
+        """
+        Returns a request slot when its request is complete, with the
+        HTTP status of the response (or None if no response was
+        received) and the Retry-After delay requested by the server
+        """
+        with self._lock:
+            now = self._clock()
+            self._active -= 1
+            if slot.priority == RequestPriority.Background:
+                self._active_background -= 1
+            if status_code == self.TOO_MANY_REQUESTS:
+                self._statistics.throttled += 1
+                self._limit.on_overload()
+            elif status_code is not None and status_code >= 500:
+                self._statistics.server_errors += 1
+                self._limit.on_overload()
+            elif status_code is not None:
+                self._limit.on_success(now - slot.started)
+
+            if retry_after is not None:
+                self._paused_until = max(self._paused_until,
+                                         now + retry_after)
+        self._dispatch()
+
+    def retry_delay(self, attempt: int,
+                    status_code: Optional[int],
+                    retry_after: Optional[float] = None,
+                    idempotent: bool = True) -> Optional[float]:
+        """
+        Returns the delay in seconds before retrying a request which
+        failed with the specified HTTP status, or None if the request
+        should not be retried.
+
+        attempt is the number of retries already made. Requests which are
+        not idempotent are only retried when they were rejected by the
+        rate limit, as other failures may have been partially processed.
+        """
+        if status_code == self.TOO_MANY_REQUESTS:
+            pass
+        elif not idempotent or status_code not in self.RETRYABLE_STATUSES:
+            return None
+
+        with self._lock:
+            if attempt >= self._max_retries:
+                return None
+            self._statistics.retries += 1
+            # exponential backoff with full jitter, so that clients which
+            # failed together don't retry together
+            delay = self._rng.uniform(
+                0, min(self.BACKOFF_CAP, self.BACKOFF_BASE * 2 ** attempt)
+            )
+        return max(delay, retry_after or 0)
+
+    def _dispatch(self):
+        """
+        Starts all queued requests which are allowed to proceed
+        """
+        ready = []
+        with self._lock:
+            now = self._clock()
+            dropped = [r for r in self._queue
+                       if r.expires is not None and r.expires <= now]
+            for request in dropped:
+                self._queue.remove(request)
+            self._statistics.dropped += len(dropped)
+
+            wake_time = None
+            while self._queue and self._active < self._limit.limit():
+                if self._paused_until > now:
+                    wake_time = self._paused_until
+                    break
+
+                request = self._next_request(now)
+                if request is None:
+                    # wait for delayed requests, or for a request to
+                    # finish
+                    delayed = [r.not_before for r in self._queue
+                               if r.not_before > now]
+                    wake_time = min(delayed) if delayed else None
+                    break
+
+                wait = self._bucket.try_consume()
+                if wait > 0:
+                    wake_time = now + wait
+                    break
+
+                self._queue.remove(request)
+                self._active += 1
+                if request.priority == RequestPriority.Background:
+                    self._active_background += 1
+                self._statistics.started += 1
+                ready.append(
+                    (request, RequestSlot(started=now,
+                                          priority=request.priority))
+                )
+
+            if wake_time is not None:
+                self._schedule_wake(wake_time, now)
+
+        for request in dropped:
+            if request.dropped is not None:
+                request.dropped()
+        for request, slot in ready:
+            request.start(slot)
+
+    def _next_request(self, now: float) -> Optional[_QueuedRequest]:
+        """
+        Returns the next queued request to start, or None if no request
+        may start now. Must be called with the lock held.
+        """
+        background_limit = max(
+            1, int(self._limit.limit() * self.BACKGROUND_SHARE)
+        )
+        candidates = [
+            r for r in self._queue if r.not_before <= now and (
+                r.priority != RequestPriority.Background or
+                self._active_background < background_limit
+            )
+        ]
+        if not candidates:
+            return None
+        return min(candidates, key=lambda r: (r.priority, r.sequence))
+
+    def _schedule_wake(self, wake_time: float, now: float):
+        """
+        Schedules a dispatch of the queue at the specified time. Must be
+        called with the lock held.
+        """
+        if self._wake_time is not None and self._wake_time <= wake_time:
+            return
+
+        if self._wake_timer is not None:
+            self._wake_timer.cancel()
+        self._wake_time = wake_time
+        self._wake_timer = threading.Timer(max(0.0, wake_time - now),
+                                           self._wake)
+        self._wake_timer.daemon = True
+        self._wake_timer.start()
+
+    def _wake(self):
+        """
+        Called when a scheduled wake time is reached
+        """
+        with self._lock:
+            self._wake_timer = None
+            self._wake_time = None
+        self._dispatch()
+
+
+class ThreadInvoker(QObject):
+    """
+    Invokes callables in the thread in which the invoker was created,
+    which must run an event loop. Callables invoked from that thread are
+    called immediately.
+    """
+
+    _invoke = pyqtSignal(object)
+
+    _instances = threading.local()
+
+    def __init__(self, parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._invoke.connect(self._call)
+
+    @staticmethod
+    def for_current_thread() -> 'ThreadInvoker':
+        """
+        Returns the invoker for the calling thread
+        """
+        invoker = getattr(ThreadInvoker._instances, 'invoker', None)
+        if invoker is None:
+            invoker = ThreadInvoker()
+            ThreadInvoker._instances.invoker = invoker
+        return invoker
+
+    def invoke(self, function: Callable[[], None]):
+        """
+        Calls a function in the invoker's thread
+        """
+        # a direct connection from the invoker's thread, otherwise queued
+        self._invoke.emit(function)
+
+    @pyqtSlot(object)
+    def _call(self, function: Callable[[], None]):
+        """
+        Calls an invoked function
+        """
+        function()
@@ -0,0 +1,167 @@
+"""
+In-memory cache for Cesium ion API responses
+"""
+
+import threading
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import (
+    Callable,
+    Dict,
+    Hashable,
+    Optional,
+    Tuple
+)
+
+
+@dataclass
+class CacheStatistics:
+    """
+    Response cache usage statistics
+    """
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    expirations: int = 0
+    invalidations: int = 0
+
+    def hit_ratio(self) -> float:
+        """
+        Returns the fraction of lookups which were served from the cache
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class ResponseCache:
+    """
+    A bounded, thread-safe cache of parsed API responses.
+
+    Entries expire after a fixed time-to-live, and the least recently used
+    entry is evicted when the cache is full. Expired entries are retained
+    (within the same bound) as a fallback for when ion is unreachable,
+    see get_stale().
+    """
+
+    def __init__(self,
+                 max_entries: int = 64,
+                 ttl: float = 60,
+                 clock: Callable[[], float] = time.monotonic):
+        self._max_entries = max(1, max_entries)
+        self._ttl = ttl
+        self._clock = clock
+        self._lock = threading.Lock()
+        # key -> (expiry time, value), ordered from least to most
+        # recently used
+        self._entries: 'OrderedDict[Hashable, Tuple[float, object]]' = \
+            OrderedDict()
+        # expired values, ordered from least to most recently expired
+        self._stale: 'OrderedDict[Hashable, object]' = OrderedDict()
+        self._statistics = CacheStatistics()
+
+    @staticmethod
+    def key(endpoint: str,
+            params: Optional[Dict[str, object]] = None) -> Tuple:
+        """
+        Returns the cache key for a request to an endpoint with the
+        specified query parameters
+        """
+        normalized_params = []
+        for name, value in (params or {}).items():
+            if isinstance(value, (list, tuple)):
+                value = tuple(str(v) for v in value)
+            else:
+                value = str(value)
+            normalized_params.append((name, value))
+        return endpoint, tuple(sorted(normalized_params))
+
+    def get(self, key: Hashable) -> Optional[object]:
+        """
+        Returns the cached value for a key, or None if there is no
+        valid cached value
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self._statistics.misses += 1
+                return None
+
+            expiry, value = entry
+            if self._clock() >= expiry:
+                del self._entries[key]
+                self._stale[key] = value
+                if len(self._stale) > self._max_entries:
+                    self._stale.popitem(last=False)
+                self._statistics.expirations += 1
+                self._statistics.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self._statistics.hits += 1
+            return value
+
+    def get_stale(self, key: Hashable) -> Optional[object]:
+        """
+        Returns the cached value for a key, even if it has expired, or
+        None if no value is cached.
+
+        Stale lookups are not included in the statistics.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                return entry[1]
+            return self._stale.get(key)
+
+    def put(self, key: Hashable, value: object):
+        """
+        Stores a value in the cache
+        """
+        with self._lock:
+            self._stale.pop(key, None)
+            self._entries[key] = (self._clock() + self._ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_entries:
+                self._entries.popitem(last=False)
+                self._statistics.evictions += 1
+
+    def invalidate(self, endpoint: Optional[str] = None):
+        """
+        Removes cached entries for an endpoint, or all entries if no
+        endpoint is specified
+        """
+        with self._lock:
+            if endpoint is None:
+                removed = list(self._entries.keys())
+            else:
+                removed = [key for key in self._entries
+                           if key[0] == endpoint]
+            for key in removed:
+                del self._entries[key]
+            self._statistics.invalidations += len(removed)
+
+            if endpoint is None:
+                self._stale.clear()
+            else:
+                for key in [key for key in self._stale
+                            if key[0] == endpoint]:
+                    del self._stale[key]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def statistics(self) -> CacheStatistics:
+        """
+        Returns a snapshot of the cache usage statistics
+        """
+        with self._lock:
+            return CacheStatistics(**vars(self._statistics))
+
+    def reset_statistics(self):
+        """
+        Resets the cache usage statistics
+        """
+        with self._lock:
+            self._statistics = CacheStatistics()
@@ -0,0 +1,352 @@
+"""
+Cesium ion plugin settings
+"""
+
+from qgis.core import QgsSettings
+
+
+class PluginSettings:
+    """
+    Provides access to the persistent plugin settings
+    """
+
+    PREFIX = 'cesium_ion/'
+
+    @staticmethod
+    def _value(key: str, default, value_type):
+        """
+        Returns the stored value for a setting
+        """
+        return QgsSettings().value(
+            PluginSettings.PREFIX + key,
+            default,
+            value_type,
+            QgsSettings.Plugins
+        )
+
+    @staticmethod
+    def _set_value(key: str, value):
+        """
+        Stores the value for a setting
+        """
+        QgsSettings().setValue(
+            PluginSettings.PREFIX + key,
+            value,
+            QgsSettings.Plugins
+        )
+
+    @staticmethod
+    def async_browser_population() -> bool:
+        """
+        Returns True if the browser should be populated asynchronously,
+        with assets appearing as each page of the listing arrives
+        """
+        return PluginSettings._value('browser/async_population', True, bool)
+
+    @staticmethod
+    def set_async_browser_population(enabled: bool):
+        """
+        Sets whether the browser should be populated asynchronously
+        """
+        PluginSettings._set_value('browser/async_population', enabled)
+
+    @staticmethod
+    def stale_while_revalidate_browser() -> bool:
+        """
+        Returns True if refreshing the browser should keep showing the
+        existing assets while the catalog is revalidated
+        """
+        return PluginSettings._value(
+            'browser/stale_while_revalidate', True, bool
+        )
+
+    @staticmethod
+    def set_stale_while_revalidate_browser(enabled: bool):
+        """
+        Sets whether refreshing the browser should keep showing the
+        existing assets while the catalog is revalidated
+        """
+        PluginSettings._set_value('browser/stale_while_revalidate', enabled)
+
+    @staticmethod
+    def persistent_catalog_cache() -> bool:
+        """
+        Returns True if the asset catalog should be stored on disk and
+        revalidated, instead of being fetched again from scratch
+        """
+        return PluginSettings._value('catalog/persistent_cache', True, bool)
+
+    @staticmethod
+    def set_persistent_catalog_cache(enabled: bool):
+        """
+        Sets whether the asset catalog should be stored on disk
+        """
+        PluginSettings._set_value('catalog/persistent_cache', enabled)
+
+    @staticmethod
+    def last_catalog_account() -> str:
+        """
+        Returns the ID of the account for which the asset catalog was
+        most recently stored
+        """
+        return PluginSettings._value('catalog/last_account', '', str)
+
+    @staticmethod
+    def set_last_catalog_account(account_id: str):
+        """
+        Sets the ID of the account for which the asset catalog was most
+        recently stored
+        """
+        PluginSettings._set_value('catalog/last_account', account_id)
+
+    @staticmethod
+    def browser_sort_column() -> str:
+        """
+        Returns the asset table column which browser assets are sorted by
+        """
+        return PluginSettings._value('browser/sort_column', 'name', str)
+
+    @staticmethod
+    def set_browser_sort_column(column: str):
+        """
+        Sets the asset table column which browser assets are sorted by
+        """
+        PluginSettings._set_value('browser/sort_column', column)
+
+    @staticmethod
+    def reuse_existing_tokens() -> bool:
+        """
+        Returns True if existing tokens which already grant access to an
+        asset should be used instead of creating new tokens
+        """
+        return PluginSettings._value('tokens/reuse_existing', True, bool)
+
+    @staticmethod
+    def set_reuse_existing_tokens(enabled: bool):
+        """
+        Sets whether existing tokens which already grant access to an
+        asset should be used instead of creating new tokens
+        """
+        PluginSettings._set_value('tokens/reuse_existing', enabled)
+
+    @staticmethod
+    def warm_up_project_layers() -> bool:
+        """
+        Returns True if the ion layers which fail to load with a project
+        should be checked, and reported in a single message
+        """
+        return PluginSettings._value('project/warm_up_layers', True, bool)
+
+    @staticmethod
+    def set_warm_up_project_layers(enabled: bool):
+        """
+        Sets whether the ion layers which fail to load with a project
+        should be checked, and reported in a single message
+        """
+        PluginSettings._set_value('project/warm_up_layers', enabled)
+
+    @staticmethod
+    def prefetch_tiles() -> bool:
+        """
+        Returns True if the root tileset and top levels of tiles should
+        be prefetched when an asset is selected
+        """
+        return PluginSettings._value('prefetch/enabled', False, bool)
+
+    @staticmethod
+    def set_prefetch_tiles(enabled: bool):
+        """
+        Sets whether the root tileset and top levels of tiles should be
+        prefetched when an asset is selected
+        """
+        PluginSettings._set_value('prefetch/enabled', enabled)
+
+    @staticmethod
+    def prefetch_levels() -> int:
+        """
+        Returns the number of levels of tiles to prefetch
+        """
+        return PluginSettings._value('prefetch/levels', 2, int)
+
+    @staticmethod
+    def set_prefetch_levels(levels: int):
+        """
+        Sets the number of levels of tiles to prefetch
+        """
+        PluginSettings._set_value('prefetch/levels', levels)
+
+    @staticmethod
+    def tile_cache_enabled() -> bool:
+        """
+        Returns True if ion tile content should be stored in the
+        dedicated tile cache.
+
+        The dedicated tile cache is only read by the local tile proxy, so
+        layers only load cached tiles while tile_proxy_mode() is 'local'.
+        Otherwise tiles are cached by the QGIS network cache.
+        """
+        return PluginSettings._value('tile_cache/enabled', True, bool)
+
+    @staticmethod
+    def set_tile_cache_enabled(enabled: bool):
+        """
+        Sets whether ion tile content should be stored in the dedicated
+        tile cache
+        """
+        PluginSettings._set_value('tile_cache/enabled', enabled)
+
+    @staticmethod
+    def tile_cache_size_mb() -> int:
+        """
+        Returns the maximum size of the dedicated tile cache, in MB
+        """
+        return PluginSettings._value('tile_cache/max_size_mb', 1024, int)
+
+    @staticmethod
+    def set_tile_cache_size_mb(size: int):
+        """
+        Sets the maximum size of the dedicated tile cache, in MB
+        """
+        PluginSettings._set_value('tile_cache/max_size_mb', size)
+
+    @staticmethod
+    def tile_proxy_mode() -> str:
+        """
+        Returns the tile proxy mode, one of 'off', 'local' (run a tile
+        proxy in this QGIS instance) or 'remote' (use the tile proxy at
+        tile_proxy_url()).
+
+        The dedicated tile cache is only used in 'local' mode.
+        """
+        return PluginSettings._value('tile_proxy/mode', 'off', str)
+
+    @staticmethod
+    def set_tile_proxy_mode(mode: str):
+        """
+        Sets the tile proxy mode
+        """
+        PluginSettings._set_value('tile_proxy/mode', mode)
+
+    @staticmethod
+    def tile_proxy_url() -> str:
+        """
+        Returns the base URL of the remote tile proxy, including the
+        proxy's secret, e.g. http://host:8765/secret
+        """
+        return PluginSettings._value('tile_proxy/url', '', str)
+
+    @staticmethod
+    def set_tile_proxy_url(url: str):
+        """
+        Sets the base URL of the remote tile proxy
+        """
+        PluginSettings._set_value('tile_proxy/url', url)
+
+    @staticmethod
+    def tile_proxy_port() -> int:
+        """
+        Returns the port for the local tile proxy
+        """
+        return PluginSettings._value('tile_proxy/port', 8765, int)
+
+    @staticmethod
+    def set_tile_proxy_port(port: int):
+        """
+        Sets the port for the local tile proxy
+        """
+        PluginSettings._set_value('tile_proxy/port', port)
+
+    @staticmethod
+    def share_tile_proxy() -> bool:
+        """
+        Returns True if the local tile proxy should accept connections
+        from other workstations
+        """
+        return PluginSettings._value('tile_proxy/shared', False, bool)
+
+    @staticmethod
+    def set_share_tile_proxy(shared: bool):
+        """
+        Sets whether the local tile proxy should accept connections from
+        other workstations
+        """
+        PluginSettings._set_value('tile_proxy/shared', shared)
+
+    @staticmethod
+    def tile_proxy_secret() -> str:
+        """
+        Returns the secret required by a shared local tile proxy, or an
+        empty string to use a random secret for each session
+        """
+        return PluginSettings._value('tile_proxy/secret', '', str)
+
+    @staticmethod
+    def set_tile_proxy_secret(secret: str):
+        """
+        Sets the secret required by a shared local tile proxy
+        """
+        PluginSettings._set_value('tile_proxy/secret', secret)
+
+    @staticmethod
+    def api_request_rate() -> float:
+        """
+        Returns the maximum sustained rate of Cesium ion API requests, in
+        requests per second
+        """
+        return PluginSettings._value('api/requests_per_second', 10.0, float)
+
+    @staticmethod
+    def set_api_request_rate(rate: float):
+        """
+        Sets the maximum sustained rate of Cesium ion API requests, in
+        requests per second
+        """
+        PluginSettings._set_value('api/requests_per_second', rate)
+
+    @staticmethod
+    def api_max_retries() -> int:
+        """
+        Returns the maximum number of times a rate limited or failed
+        Cesium ion API request is retried
+        """
+        return PluginSettings._value('api/max_retries', 4, int)
+
+    @staticmethod
+    def set_api_max_retries(max_retries: int):
+        """
+        Sets the maximum number of times a rate limited or failed
+        Cesium ion API request is retried
+        """
+        PluginSettings._set_value('api/max_retries', max_retries)
+
+    @staticmethod
+    def hedge_api_requests() -> bool:
+        """
+        Returns True if slow Cesium ion API GET requests should be hedged
+        with a duplicate request
+        """
+        return PluginSettings._value('api/hedge_requests', False, bool)
+
+    @staticmethod
+    def set_hedge_api_requests(enabled: bool):
+        """
+        Sets whether slow Cesium ion API GET requests should be hedged
+        with a duplicate request
+        """
+        PluginSettings._set_value('api/hedge_requests', enabled)
+
+    @staticmethod
+    def hedge_percentile() -> float:
+        """
+        Returns the percentile of recent response latencies after which
+        Cesium ion API GET requests are hedged
+        """
+        return PluginSettings._value('api/hedge_percentile', 95.0, float)
+
+    @staticmethod
+    def set_hedge_percentile(percentile: float):
+        """
+        Sets the percentile of recent response latencies after which
+        Cesium ion API GET requests are hedged
+        """
+        PluginSettings._set_value('api/hedge_percentile', percentile)
@@ -0,0 +1,234 @@
+"""
+Geographic bounds of 3D Tiles and quantized mesh tiles
+"""
+
+import math
+from typing import (
+    Callable,
+    List,
+    Optional,
+    Sequence,
+    Tuple
+)
+
+#: A geographic extent, as (west, south, east, north) in degrees
+GeographicExtent = Tuple[float, float, float, float]
+
+#: A 4x4 transform, as 16 values in column-major order
+Transform = Sequence[float]
+
+IDENTITY_TRANSFORM = (1.0, 0.0, 0.0, 0.0,
+                      0.0, 1.0, 0.0, 0.0,
+                      0.0, 0.0, 1.0, 0.0,
+                      0.0, 0.0, 0.0, 1.0)
+
+# WGS 84 ellipsoid
+_SEMI_MAJOR_AXIS = 6378137.0
+_FLATTENING = 1 / 298.257223563
+_SEMI_MINOR_AXIS = _SEMI_MAJOR_AXIS * (1 - _FLATTENING)
+_E2 = _FLATTENING * (2 - _FLATTENING)
+_EP2 = _E2 / (1 - _E2)
+
+#: Estimated geometric error of level zero quantized mesh tiles, as used
+#: by CesiumJS for terrain with 65 samples per tile and two root tiles
+TERRAIN_LEVEL_ZERO_GEOMETRIC_ERROR = \
+    _SEMI_MAJOR_AXIS * 2 * math.pi * 0.25 / (65 * 2)
+
+
+def multiply_transforms(a: Transform, b: Transform) -> List[float]:
+    """
+    Returns the product a * b of two column-major 4x4 transforms
+    """
+    return [
+        sum(a[k * 4 + row] * b[column * 4 + k] for k in range(4))
+        for column in range(4)
+        for row in range(4)
+    ]
+
+
+def transform_point(transform: Transform,
+                    point: Sequence[float]) -> Tuple[float, float, float]:
+    """
+    Applies a column-major 4x4 transform to a point
+    """
+    x, y, z = point
+    return (
+        transform[0] * x + transform[4] * y + transform[8] * z +
+        transform[12],
+        transform[1] * x + transform[5] * y + transform[9] * z +
+        transform[13],
+        transform[2] * x + transform[6] * y + transform[10] * z +
+        transform[14]
+    )
+
+
+def ecef_to_geodetic(x: float, y: float, z: float) \
+        -> Tuple[float, float, float]:
+    """
+    Converts earth-centered, earth-fixed coordinates to WGS 84 longitude
+    and latitude (in degrees) and ellipsoidal height
+    """
+    p = math.hypot(x, y)
+    if p < 1e-9:
+        # on the polar axis
+        latitude = 90.0 if z >= 0 else -90.0
+        return 0.0, latitude, abs(z) - _SEMI_MINOR_AXIS
+
+    # Bowring's method
+    theta = math.atan2(z * _SEMI_MAJOR_AXIS, p * _SEMI_MINOR_AXIS)
+    latitude = math.atan2(
+        z + _EP2 * _SEMI_MINOR_AXIS * math.sin(theta) ** 3,
+        p - _E2 * _SEMI_MAJOR_AXIS * math.cos(theta) ** 3
+    )
+    n = _SEMI_MAJOR_AXIS / math.sqrt(1 - _E2 * math.sin(latitude) ** 2)
+    height = p / math.cos(latitude) - n
+    return (math.degrees(math.atan2(y, x)), math.degrees(latitude),
+            height)
+
+
+def _points_extent(points: List[Tuple[float, float, float]]) \
+        -> GeographicExtent:
+    """
+    Returns the geographic extent of a set of ECEF points
+    """
+    coordinates = [ecef_to_geodetic(*point) for point in points]
+    longitudes = [c[0] for c in coordinates]
+    latitudes = [c[1] for c in coordinates]
+    west, east = min(longitudes), max(longitudes)
+    if east - west > 180:
+        # the points span the antimeridian, so be conservative
+        west, east = -180.0, 180.0
+    return west, min(latitudes), east, max(latitudes)
+
+
+def bounding_volume_extent(volume: dict,
+                           transform: Transform = IDENTITY_TRANSFORM) \
+        -> Optional[GeographicExtent]:
+    """
+    Returns the approximate geographic extent of a 3D Tiles bounding
+    volume, or None if the extent can't be determined.
+
+    Tile transforms apply to box and sphere volumes, which are assumed
+    to be (after transforming) in earth-centered, earth-fixed
+    coordinates, as is the case for georeferenced tilesets.
+    """
+    if 'region' in volume:
+        west, south, east, north = volume['region'][:4]
+        return (math.degrees(west), math.degrees(south),
+                math.degrees(east), math.degrees(north))
+
+    if 'box' in volume:
+        box = volume['box']
+        center = box[0:3]
+        axes = (box[3:6], box[6:9], box[9:12])
+        corners = []
+        for sx in (-1, 1):
+            for sy in (-1, 1):
+                for sz in (-1, 1):
+                    corner = [
+                        center[i] + sx * axes[0][i] + sy * axes[1][i] +
+                        sz * axes[2][i]
+                        for i in range(3)
+                    ]
+                    corners.append(transform_point(transform, corner))
+        return _points_extent(corners)
+
+    if 'sphere' in volume:
+        x, y, z, radius = volume['sphere']
+        scale = max(
+            math.sqrt(sum(v * v for v in transform[i * 4:i * 4 + 3]))
+            for i in range(3)
+        )
+        center = transform_point(transform, (x, y, z))
+        if math.sqrt(sum(v * v for v in center)) < _SEMI_MINOR_AXIS / 2:
+            # not georeferenced
+            return None
+        longitude, latitude, _ = ecef_to_geodetic(*center)
+        delta = math.degrees(radius * scale / _SEMI_MINOR_AXIS)
+        longitude_delta = delta / max(math.cos(math.radians(latitude)),
+                                      1e-6)
+        if longitude_delta >= 180:
+            return (-180.0, max(-90.0, latitude - delta),
+                    180.0, min(90.0, latitude + delta))
+        return (longitude - longitude_delta, max(-90.0, latitude - delta),
+                longitude + longitude_delta, min(90.0, latitude + delta))
+
+    return None
+
+
+def extents_intersect(a: GeographicExtent, b: GeographicExtent) -> bool:
+    """
+    Returns True if two geographic extents intersect
+    """
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def terrain_tile_extent(level: int, x: int, y: int) -> GeographicExtent:
+    """
+    Returns the geographic extent of a quantized mesh tile, in the
+    geographic tiling scheme with TMS tile numbering
+    """
+    size = 180.0 / 2 ** level
+    return (-180.0 + x * size, -90.0 + y * size,
+            -180.0 + (x + 1) * size, -90.0 + (y + 1) * size)
+
+
+def terrain_tile_range(level: int, extent: GeographicExtent) \
+        -> Tuple[int, int, int, int]:
+    """
+    Returns the range of quantized mesh tiles covering an extent at a
+    level, as (min x, min y, max x, max y) inclusive
+    """
+    size = 180.0 / 2 ** level
+    columns = 2 ** (level + 1)
+    rows = 2 ** level
+
+    def clamp(value, maximum):
+        return max(0, min(maximum - 1, value))
+
+    return (clamp(int(math.floor((extent[0] + 180.0) / size)), columns),
+            clamp(int(math.floor((extent[1] + 90.0) / size)), rows),
+            clamp(int(math.floor((extent[2] + 180.0) / size)), columns),
+            clamp(int(math.floor((extent[3] + 90.0) / size)), rows))
+
+
+def terrain_level_for_geometric_error(geometric_error: float,
+                                      max_level: int = 30) -> int:
+    """
+    Returns the first quantized mesh level whose estimated geometric
+    error is no greater than the specified error
+    """
+    level = 0
+    error = TERRAIN_LEVEL_ZERO_GEOMETRIC_ERROR
+    while error > geometric_error and level < max_level:
+        level += 1
+        error /= 2
+    return level
+
+
+class TileArea:
+    """
+    An area of interest for tile traversal, defined by a geographic
+    extent and an optional finer test for intersection with tile
+    extents (e.g. against a polygon)
+    """
+
+    def __init__(self,
+                 extent: GeographicExtent,
+                 intersects: Optional[
+                     Callable[[GeographicExtent], bool]] = None):
+        self.extent = extent
+        self._intersects = intersects
+
+    def intersects(self, extent: Optional[GeographicExtent]) -> bool:
+        """
+        Returns True if a tile extent intersects the area. Tiles with an
+        unknown extent are assumed to intersect.
+        """
+        if extent is None:
+            return True
+        if not extents_intersect(self.extent, extent):
+            return False
+        if self._intersects is not None:
+            return self._intersects(extent)
+        return True
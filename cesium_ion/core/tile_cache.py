@@ -0,0 +1,347 @@
+"""
+Dedicated persistent cache for Cesium ion tile content
+"""
+
+import hashlib
+import json
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass
+from pathlib import Path
+from typing import (
+    Optional,
+    Tuple
+)
+from urllib.parse import urlsplit
+
+from qgis.core import QgsApplication
+
+
+@dataclass
+class CachedTile:
+    """
+    Tile content retrieved from the tile cache
+    """
+    url: str
+    content: bytes
+    content_type: str = ''
+
+
+@dataclass
+class TileCacheStatistics:
+    """
+    A snapshot of the tile cache's statistics
+    """
+    hits: int = 0
+    misses: int = 0
+    insertions: int = 0
+    evictions: int = 0
+    evicted_bytes: int = 0
+    entry_count: int = 0
+    size_bytes: int = 0
+    max_size_bytes: int = 0
+
+    def hit_ratio(self) -> float:
+        """
+        Returns the fraction of lookups which were hits
+        """
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+class TileCache:
+    """
+    A size-capped, least recently used, persistent cache for tile content
+    from Cesium ion tile hosts.
+
+    Ion tiles are kept separately from the QGIS network disk cache, so
+    that they are not evicted by the traffic of other web layers. Each
+    entry is stored as a file, and the file modification times record
+    the least recently used order across sessions.
+
+    The cache may be used concurrently from any thread.
+    """
+
+    #: Default maximum size of the cache, in bytes
+    DEFAULT_MAX_SIZE = 1024 * 1024 * 1024
+
+    #: Hosts whose content is cached
+    ION_TILE_HOSTS = ('cesium.com',)
+
+    #: File suffix of cache entries
+    ENTRY_SUFFIX = '.tile'
+
+    def __init__(self,
+                 directory: Optional[str] = None,
+                 max_size_bytes: int = DEFAULT_MAX_SIZE):
+        self._directory: Optional[Path] = \
+            Path(directory) if directory else None
+        self._max_size = max_size_bytes
+        self._lock = threading.Lock()
+        # entries by key, from least to most recently used, as sizes
+        self._entries: Optional[OrderedDict] = None
+        self._size = 0
+        self._statistics = TileCacheStatistics()
+
+    @staticmethod
+    def is_cacheable_url(url: str) -> bool:
+        """
+        Returns True if the content of a URL should be cached, i.e. the
+        URL is for an ion tile host
+        """
+        host = (urlsplit(url).hostname or '').lower()
+        return any(host == tile_host or host.endswith('.' + tile_host)
+                   for tile_host in TileCache.ION_TILE_HOSTS)
+
+    @staticmethod
+    def cache_url(url: str, access_token: Optional[str] = None) -> str:
+        """
+        Returns the URL under which content fetched with an access token
+        is cached, so that content is only served to requests with the
+        same credentials. Content fetched with the plugin's login (a
+        token of None) is cached under its URL.
+        """
+        if not access_token:
+            return url
+        credential = hashlib.sha256(access_token.encode()).hexdigest()
+        return '{}#credential={}'.format(url, credential[:16])
+
+    @staticmethod
+    def key(url: str) -> str:
+        """
+        Returns the cache key for a URL
+        """
+        return hashlib.sha1(url.encode()).hexdigest()
+
+    def directory(self) -> Path:
+        """
+        Returns the cache directory
+        """
+        if self._directory is None:
+            self._directory = Path(
+                QgsApplication.qgisSettingsDirPath()
+            ) / 'cesium_ion' / 'tile_cache'
+        return self._directory
+
+    def max_size(self) -> int:
+        """
+        Returns the maximum size of the cache, in bytes
+        """
+        return self._max_size
+
+    def set_max_size(self, max_size_bytes: int):
+        """
+        Sets the maximum size of the cache in bytes, evicting entries if
+        the cache is larger
+        """
+        with self._lock:
+            self._max_size = max(0, max_size_bytes)
+            if self._entries is not None:
+                self._evict()
+
+    def statistics(self) -> TileCacheStatistics:
+        """
+        Returns a snapshot of the cache statistics
+        """
+        with self._lock:
+            self._ensure_loaded()
+            return TileCacheStatistics(
+                hits=self._statistics.hits,
+                misses=self._statistics.misses,
+                insertions=self._statistics.insertions,
+                evictions=self._statistics.evictions,
+                evicted_bytes=self._statistics.evicted_bytes,
+                entry_count=len(self._entries),
+                size_bytes=self._size,
+                max_size_bytes=self._max_size
+            )
+
+    def reset_statistics(self):
+        """
+        Resets the hit, miss, insertion and eviction counts
+        """
+        with self._lock:
+            self._statistics = TileCacheStatistics()
+
+    def contains(self, url: str) -> bool:
+        """
+        Returns True if the cache contains an entry for a URL, without
+        affecting statistics or the least recently used order
+        """
+        with self._lock:
+            self._ensure_loaded()
+            return self.key(url) in self._entries
+
+    def get(self, url: str) -> Optional[CachedTile]:
+        """
+        Returns the cached content for a URL, or None if not cached
+        """
+        key = self.key(url)
+        with self._lock:
+            self._ensure_loaded()
+            if key not in self._entries:
+                self._statistics.misses += 1
+                return None
+            self._entries.move_to_end(key)
+
+        entry = self._read_entry(key)
+        if entry is None or entry[0].get('url') != url:
+            with self._lock:
+                self._statistics.misses += 1
+                if entry is None:
+                    self._discard(key)
+            return None
+
+        metadata, content = entry
+        with self._lock:
+            self._statistics.hits += 1
+        try:
+            # record the access, so that the least recently used order
+            # persists across sessions
+            os.utime(self._entry_path(key))
+        except OSError:
+            pass
+
+        return CachedTile(url=url, content=content,
+                          content_type=metadata.get('content_type', ''))
+
+    def put(self, url: str, content: bytes, content_type: str = '') -> bool:
+        """
+        Stores the content for a URL, evicting the least recently used
+        entries if the cache exceeds its maximum size.
+
+        Returns True if the content was stored.
+        """
+        if len(content) > self._max_size:
+            return False
+
+        key = self.key(url)
+        header = json.dumps({'url': url,
+                             'content_type': content_type}).encode()
+        temp_path: Optional[str] = None
+        try:
+            self.directory().mkdir(parents=True, exist_ok=True)
+            with tempfile.NamedTemporaryFile(
+                    'wb', dir=str(self.directory()), suffix='.tmp',
+                    delete=False) as f:
+                temp_path = f.name
+                f.write(header + b'\n')
+                f.write(content)
+            os.replace(temp_path, self._entry_path(key))
+            temp_path = None
+            size = os.path.getsize(self._entry_path(key))
+        except OSError:
+            return False
+        finally:
+            if temp_path is not None:
+                # the write failed, so don't leave the partial file behind
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
+
+        with self._lock:
+            self._ensure_loaded()
+            self._size -= self._entries.pop(key, 0)
+            self._entries[key] = size
+            self._size += size
+            self._statistics.insertions += 1
+            self._evict()
+        return True
+
+    def remove(self, url: str):
+        """
+        Removes the entry for a URL
+        """
+        with self._lock:
+            self._ensure_loaded()
+            self._discard(self.key(url))
+
+    def clear(self):
+        """
+        Removes all entries from the cache
+        """
+        with self._lock:
+            self._ensure_loaded()
+            for key in list(self._entries.keys()):
+                self._discard(key)
+
+    def _entry_path(self, key: str) -> Path:
+        """
+        Returns the path of the file for an entry
+        """
+        return self.directory() / (key + self.ENTRY_SUFFIX)
+
+    def _read_entry(self, key: str) -> Optional[Tuple[dict, bytes]]:
+        """
+        Reads the metadata and content of an entry
+        """
+        try:
+            with open(self._entry_path(key), 'rb') as f:
+                metadata = json.loads(f.readline().decode())
+                content = f.read()
+        except (OSError, ValueError):
+            return None
+        if not isinstance(metadata, dict):
+            return None
+        return metadata, content
+
+    def _ensure_loaded(self):
+        """
+        Builds the index of stored entries, from least to most recently
+        used. Must be called with the lock held.
+        """
+        if self._entries is not None:
+            return
+
+        entries = []
+        try:
+            with os.scandir(self.directory()) as it:
+                for entry in it:
+                    if not entry.name.endswith(self.ENTRY_SUFFIX):
+                        continue
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime,
+                                    entry.name[:-len(self.ENTRY_SUFFIX)],
+                                    stat.st_size))
+        except OSError:
+            pass
+
+        entries.sort()
+        self._entries = OrderedDict(
+            (key, size) for _, key, size in entries
+        )
+        self._size = sum(size for _, _, size in entries)
+        self._evict()
+
+    def _discard(self, key: str):
+        """
+        Removes an entry. Must be called with the lock held.
+        """
+        size = self._entries.pop(key, None)
+        if size is None:
+            return
+        self._size -= size
+        try:
+            self._entry_path(key).unlink()
+        except OSError:
+            pass
+
+    def _evict(self):
+        """
+        Evicts the least recently used entries until the cache is within
+        its maximum size. Must be called with the lock held.
+        """
+        while self._entries and self._size > self._max_size:
+            key, size = next(iter(self._entries.items()))
+            self._discard(key)
+            self._statistics.evictions += 1
+            self._statistics.evicted_bytes += size
+
+
+TILE_CACHE = TileCache()
@@ -0,0 +1,484 @@
+"""
+Prefetching of Cesium ion tiles into the network cache
+"""
+
+import json
+from typing import (
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Tuple
+)
+
+from qgis.PyQt.QtCore import (
+    QObject,
+    QUrl,
+    pyqtSignal
+)
+from qgis.PyQt.QtNetwork import (
+    QNetworkReply,
+    QNetworkRequest
+)
+from qgis.core import QgsNetworkAccessManager
+
+from .endpoint_cache import AssetEndpoint
+from .request_scheduler import RequestPriority
+from .tile_cache import TileCache
+from .tile_bounds import (
+    IDENTITY_TRANSFORM,
+    TileArea,
+    Transform,
+    bounding_volume_extent,
+    multiply_transforms,
+    terrain_level_for_geometric_error,
+    terrain_tile_extent,
+    terrain_tile_range
+)
+
+
+def resolve_tile_url(base_url: str, uri: str) -> str:
+    """
+    Resolves a tile content URI relative to the tileset it belongs to.
+
+    The query of the base URL (e.g. the asset version parameter) is
+    carried over to relative URIs without their own query, as clients
+    do when requesting tiles.
+    """
+    base = QUrl(base_url)
+    resolved = base.resolved(QUrl(uri))
+    if not resolved.hasQuery() and base.hasQuery() and \
+            QUrl(uri).isRelative():
+        resolved.setQuery(base.query())
+    return resolved.toString()
+
+
+def tile_content_uris(tile: Dict) -> List[str]:
+    """
+    Returns the content URIs for a tile, supporting both single content
+    (including the legacy "url" property) and multiple contents
+    """
+    contents = list(tile.get('contents', []))
+    if 'content' in tile:
+        contents.append(tile['content'])
+    uris = []
+    for content in contents:
+        uri = content.get('uri') or content.get('url')
+        if uri:
+            uris.append(uri)
+    return uris
+
+
+class TilePrefetcher(QObject):
+    """
+    Prefetches tiles for an ion asset into the QGIS network cache, so
+    that a layer for the asset renders immediately once added.
+
+    3D Tiles tilesets are traversed from the root tile, following
+    external tilesets. Quantized mesh terrain tiles are enumerated from
+    the terrain's layer.json. Traversal is limited to max_depth levels
+    of tiles and/or stops at tiles whose geometric error is no greater
+    than max_geometric_error (for terrain, at the first level whose
+    estimated geometric error is no greater), and can be restricted to
+    the tiles intersecting an area of interest.
+
+    In plan only mode tilesets are traversed but tile content is not
+    fetched, and the planned tile URLs are available via planned_urls().
+    A previously planned list of tile URLs can be fetched by specifying
+    tile_urls, and URLs which have already been fetched can be skipped.
+
+    Fetched tiles are stored in the QGIS network cache. If a tile cache
+    is specified, fetched tiles and tilesets from ion tile hosts are also
+    stored in it, and tiles already in it are not fetched again. As only
+    the local tile proxy reads from the tile cache, a tile cache should
+    only be specified while layers load tiles through the local proxy.
+
+    Must be used from the main thread.
+    """
+
+    #: Maximum number of tile requests in flight at once
+    MAX_CONCURRENT_REQUESTS = 6
+
+    #: Accept header for quantized mesh terrain tiles
+    TERRAIN_ACCEPT = 'application/vnd.quantized-mesh;' \
+                     'extensions=octvertexnormals-watermask-metadata,' \
+                     'application/octet-stream;q=0.9,*/*;q=0.01'
+
+    #: Emitted with the number of tiles fetched and the number of tiles
+    #: discovered so far
+    progress_changed = pyqtSignal(int, int)
+    #: Emitted with the URL of each tile content fetched
+    tile_fetched = pyqtSignal(str)
+    #: Emitted with the URL and content of each tileset (or terrain
+    #: layer.json) fetched
+    tileset_fetched = pyqtSignal(str, bytes)
+    #: Emitted when prefetching has finished, failed or been canceled
+    finished = pyqtSignal()
+    #: Emitted with an error message if the asset could not be prefetched
+    error_occurred = pyqtSignal(str)
+
+    # pylint: disable=too-many-arguments
+    def __init__(self,
+                 client,
+                 asset_id: int,
+                 token: Optional[str] = None,
+                 max_depth: Optional[int] = 2,
+                 max_geometric_error: Optional[float] = None,
+                 area: Optional[TileArea] = None,
+                 endpoint: Optional[AssetEndpoint] = None,
+                 plan_only: bool = False,
+                 skip_urls: Optional[Iterable[str]] = None,
+                 tile_urls: Optional[List[str]] = None,
+                 max_concurrent_requests: int = MAX_CONCURRENT_REQUESTS,
+                 tile_cache: Optional[TileCache] = None,
+                 parent: Optional[QObject] = None):
+        super().__init__(parent)
+        self._client = client
+        self._tile_cache = tile_cache
+        self._asset_id = asset_id
+        self._token = token
+        self._max_depth = max_depth
+        self._max_geometric_error = max_geometric_error
+        self._area = area
+        self._plan_only = plan_only
+        self._skip_urls = set(skip_urls or [])
+        self._tile_urls = tile_urls
+        self._max_concurrent_requests = max(1, max_concurrent_requests)
+
+        self._endpoint: Optional[AssetEndpoint] = endpoint
+        # queued requests, as (url, depth, is tileset, transform)
+        self._queue: List[Tuple[str, int, bool, Transform]] = []
+        self._seen_urls = set()
+        self._planned_urls: List[str] = []
+        self._replies: Dict[
+            QNetworkReply, Tuple[str, int, bool, Transform]
+        ] = {}
+        self._fetched_count = 0
+        self._fetched_bytes = 0
+        self._is_finished = False
+        self._is_canceled = False
+    # pylint: enable=too-many-arguments
+
+    def asset_id(self) -> int:
+        """
+        Returns the ID of the asset being prefetched
+        """
+        return self._asset_id
+
+    def fetched_count(self) -> int:
+        """
+        Returns the number of tiles and tilesets fetched so far
+        """
+        return self._fetched_count
+
+    def fetched_bytes(self) -> int:
+        """
+        Returns the number of bytes fetched so far
+        """
+        return self._fetched_bytes
+
+    def discovered_count(self) -> int:
+        """
+        Returns the number of tiles and tilesets discovered so far
+        """
+        return len(self._seen_urls)
+
+    def planned_urls(self) -> List[str]:
+        """
+        Returns the URLs of the tile content found by the traversal, in
+        traversal order
+        """
+        return list(self._planned_urls)
+
+    def endpoint(self) -> Optional[AssetEndpoint]:
+        """
+        Returns the resolved endpoint for the asset
+        """
+        return self._endpoint
+
+    def is_finished(self) -> bool:
+        """
+        Returns True if prefetching has finished
+        """
+        return self._is_finished
+
+    def is_canceled(self) -> bool:
+        """
+        Returns True if prefetching was canceled
+        """
+        return self._is_canceled
+
+    def start(self):
+        """
+        Starts prefetching, by resolving the asset's endpoint (unless an
+        endpoint was specified)
+        """
+        if self._endpoint is not None:
+            self._start_traversal()
+            return
+
+        reply = self._client.endpoint_cache().resolve(
+            self._asset_id, self._token,
+            priority=RequestPriority.Background
+        )
+        reply.finished.connect(lambda: self._endpoint_resolved(reply))
+
+    def cancel(self):
+        """
+        Cancels prefetching
+        """
+        if self._is_finished:
+            return
+
+        self._is_canceled = True
+        self._queue = []
+        for reply in list(self._replies.keys()):
+            reply.abort()
+        self._finish()
+
+    def _endpoint_resolved(self, reply):
+        """
+        Called when the asset's endpoint has been resolved
+        """
+        if self._is_finished:
+            return
+
+        endpoint = reply.result()
+        if reply.error() != QNetworkReply.NoError or endpoint is None:
+            self.error_occurred.emit(reply.error_string())
+            self._finish()
+            return
+
+        self._endpoint = endpoint
+        self._start_traversal()
+
+    def _start_traversal(self):
+        """
+        Starts traversing the asset's tiles from its root, or fetching
+        the specified tile URLs
+        """
+        if not self._endpoint.url:
+            self._finish()
+            return
+
+        if self._tile_urls is not None:
+            for url in self._tile_urls:
+                self._enqueue(url, 0, False, IDENTITY_TRANSFORM)
+        else:
+            if self._endpoint.type == 'TERRAIN':
+                url = resolve_tile_url(self._endpoint.url, 'layer.json')
+            else:
+                url = self._endpoint.url
+            self._enqueue(url, 0, True, IDENTITY_TRANSFORM)
+        self._fill_request_window()
+
+    def _enqueue(self, url: str, depth: int, is_tileset: bool,
+                 transform: Transform):
+        """
+        Queues a tile or tileset for fetching
+        """
+        if url in self._seen_urls:
+            return
+        self._seen_urls.add(url)
+
+        if not is_tileset:
+            self._planned_urls.append(url)
+            if self._plan_only:
+                return
+            if url in self._skip_urls:
+                # already fetched, e.g. by an earlier interrupted run
+                self._fetched_count += 1
+                return
+            if self._tile_cache is not None and \
+                    self._tile_cache.contains(
+                        TileCache.cache_url(url, self._token)):
+                self._fetched_count += 1
+                self.tile_fetched.emit(url)
+                return
+
+        self._queue.append((url, depth, is_tileset, transform))
+
+    def _create_request(self, url: str, is_tileset: bool) \
+            -> QNetworkRequest:
+        """
+        Creates a request for a tile or tileset
+        """
+        request = QNetworkRequest(QUrl(url))
+        if self._endpoint.access_token:
+            request.setRawHeader(
+                b'Authorization',
+                'Bearer {}'.format(self._endpoint.access_token).encode()
+            )
+        if self._endpoint.type == 'TERRAIN' and not is_tileset:
+            request.setRawHeader(b'Accept', self.TERRAIN_ACCEPT.encode())
+        request.setAttribute(QNetworkRequest.CacheLoadControlAttribute,
+                             QNetworkRequest.PreferCache)
+        return request
+
+    def _fill_request_window(self):
+        """
+        Starts fetching queued tiles, until the maximum number of
+        concurrent requests is reached
+        """
+        while self._queue and \
+                len(self._replies) < self._max_concurrent_requests:
+            request = self._queue.pop(0)
+            url, _, is_tileset, _ = request
+            reply = QgsNetworkAccessManager.instance().get(
+                self._create_request(url, is_tileset)
+            )
+            self._replies[reply] = request
+            reply.finished.connect(
+                lambda reply=reply: self._reply_finished(reply)
+            )
+
+        self.progress_changed.emit(self._fetched_count,
+                                   len(self._seen_urls))
+        if not self._queue and not self._replies:
+            self._finish()
+
+    def _reply_finished(self, reply: QNetworkReply):
+        """
+        Called when a tile or tileset request has finished
+        """
+        reply.deleteLater()
+        request = self._replies.pop(reply, None)
+        if request is None or self._is_finished:
+            return
+
+        url, depth, is_tileset, transform = request
+        if reply.error() == QNetworkReply.NoError:
+            self._fetched_count += 1
+            content = reply.readAll().data()
+            self._fetched_bytes += len(content)
+            if self._tile_cache is not None and \
+                    TileCache.is_cacheable_url(url):
+                self._tile_cache.put(
+                    TileCache.cache_url(url, self._token), content,
+                    reply.header(QNetworkRequest.ContentTypeHeader) or ''
+                )
+            if is_tileset:
+                self.tileset_fetched.emit(url, content)
+                self._tileset_fetched(url, depth, transform, content)
+            else:
+                self.tile_fetched.emit(url)
+
+        self._fill_request_window()
+
+    def _tileset_fetched(self, url: str, depth: int, transform: Transform,
+                         content: bytes):
+        """
+        Queues the tiles from a fetched tileset or terrain layer.json
+        """
+        try:
+            tileset = json.loads(content.decode())
+        except ValueError:
+            return
+
+        if self._endpoint.type == 'TERRAIN':
+            for tile_url in self._terrain_tile_urls(url, tileset):
+                self._enqueue(tile_url, 0, False, IDENTITY_TRANSFORM)
+            return
+
+        root = tileset.get('root')
+        if root is not None:
+            for tile_url, tile_depth, is_tileset, tile_transform in \
+                    self._walk_tiles(url, root, depth, transform):
+                self._enqueue(tile_url, tile_depth, is_tileset,
+                              tile_transform)
+
+    def _refine(self, tile: Dict) -> bool:
+        """
+        Returns True if the traversal should continue to a tile's children
+        """
+        if self._max_geometric_error is None:
+            return True
+        return tile.get('geometricError', 0) > self._max_geometric_error
+
+    def _walk_tiles(self, tileset_url: str, root: Dict, depth: int,
+                    transform: Transform) \
+            -> Iterator[Tuple[str, int, bool, Transform]]:
+        """
+        Walks the tile tree from a root tile, yielding the content URLs
+        for tiles within the traversal limits, with their depth, whether
+        the content is an external tileset and their transform
+        """
+        stack = [(root, depth, transform)]
+        while stack:
+            tile, tile_depth, parent_transform = stack.pop()
+            if self._max_depth is not None and tile_depth >= self._max_depth:
+                continue
+
+            tile_transform = parent_transform
+            if 'transform' in tile:
+                tile_transform = multiply_transforms(
+                    parent_transform, tile['transform']
+                )
+
+            if self._area is not None and not self._area.intersects(
+                    bounding_volume_extent(tile.get('boundingVolume', {}),
+                                           tile_transform)):
+                continue
+
+            for uri in tile_content_uris(tile):
+                # external tilesets continue the traversal at the depth
+                # of the tile which references them
+                is_tileset = uri.split('?')[0].lower().endswith('.json')
+                yield resolve_tile_url(tileset_url, uri), tile_depth, \
+                    is_tileset, tile_transform
+
+            if self._refine(tile):
+                for child in reversed(tile.get('children', [])):
+                    stack.append((child, tile_depth + 1, tile_transform))
+
+    def _terrain_tile_urls(self, layer_url: str,
+                           layer: Dict) -> Iterator[str]:
+        """
+        Yields the URLs of the terrain tiles within the traversal limits
+        """
+        templates = layer.get('tiles', [])
+        if not templates:
+            return
+
+        template = templates[0]
+        version = layer.get('version', '1.0.0')
+        level_count = layer.get('maxzoom', 30) + 1
+        if self._max_depth is not None:
+            level_count = min(level_count, self._max_depth)
+        if self._max_geometric_error is not None:
+            # terrain tiles have no geometric errors, so stop at the first
+            # level whose estimated error is small enough
+            level_count = min(level_count, terrain_level_for_geometric_error(
+                self._max_geometric_error
+            ) + 1)
+        for level in range(level_count):
+            if self._area is not None:
+                min_x, min_y, max_x, max_y = terrain_tile_range(
+                    level, self._area.extent
+                )
+            else:
+                # the geographic tiling scheme has two root tiles
+                min_x, min_y = 0, 0
+                max_x, max_y = 2 ** (level + 1) - 1, 2 ** level - 1
+
+            for x in range(min_x, max_x + 1):
+                for y in range(min_y, max_y + 1):
+                    if self._area is not None and not self._area.intersects(
+                            terrain_tile_extent(level, x, y)):
+                        continue
+                    uri = template.replace('{z}', str(level)) \
+                        .replace('{x}', str(x)) \
+                        .replace('{y}', str(y)) \
+                        .replace('{version}', version)
+                    yield resolve_tile_url(layer_url, uri)
+
+    def _finish(self):
+        """
+        Finishes prefetching
+        """
+        if self._is_finished:
+            return
+
+        self._is_finished = True
+        self.finished.emit()
@@ -0,0 +1,426 @@
+"""
+Local caching proxy for Cesium ion tiles
+"""
+
+import hmac
+import re
+import secrets
+import threading
+from http.server import (
+    BaseHTTPRequestHandler,
+    ThreadingHTTPServer
+)
+from typing import (
+    Dict,
+    Optional,
+    Tuple
+)
+from urllib.parse import urlsplit
+
+from qgis.PyQt.QtCore import QUrl
+from qgis.PyQt.QtNetwork import (
+    QNetworkReply,
+    QNetworkRequest
+)
+from qgis.core import (
+    QgsBlockingNetworkRequest,
+    QgsMessageLog,
+    Qgis
+)
+
+from .api_client import API_CLIENT
+from .ion_source import IonDataSource
+from .tile_cache import (
+    TileCache,
+    TILE_CACHE
+)
+from .tile_prefetch import resolve_tile_url
+
+
+def proxied_tile_url(endpoint_url: str, path: str, query: str = '') -> str:
+    """
+    Returns the upstream URL for a path requested from the proxy,
+    relative to the asset's endpoint URL
+    """
+    uri = path
+    if query:
+        uri += '?' + query
+    return resolve_tile_url(endpoint_url, uri)
+
+
+class ProxiedSources:
+    """
+    Rewrites ion:// layer data sources to load tiles through a tile
+    proxy, and maps the rewritten sources back to the original ion://
+    sources.
+
+    Projects store the original ion:// sources, and sources are only
+    rewritten when layers are loaded, so that projects can be opened on
+    workstations where the proxy is not available.
+
+    Each proxied source contains a random source key, which a local
+    proxy uses to look up the credentials of the original source. Sources
+    with an access token also send the token in a request header, so
+    that a proxy on another workstation can use it.
+
+    This class is thread-safe.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # original sources, by proxied source
+        self._originals: Dict[str, str] = {}
+        # source keys, by original source
+        self._keys: Dict[str, str] = {}
+        # original sources, by asset ID and source key
+        self._sources: Dict[Tuple[int, str], IonDataSource] = {}
+
+    def proxied(self, source: str, proxy_url: Optional[str]) -> str:
+        """
+        Returns the data source which loads an ion:// source through the
+        tile proxy at the specified base URL. Other sources, or all
+        sources if no proxy URL is specified, are returned unchanged.
+        """
+        ion_source = IonDataSource.from_source(source)
+        if ion_source is None or not proxy_url:
+            return source
+
+        with self._lock:
+            key = self._keys.get(source)
+            if key is None:
+                # keys must not be guessable, as they give access to the
+                # credentials of the source
+                key = secrets.token_hex(8)
+                self._keys[source] = key
+                self._sources[(ion_source.asset_id, key)] = ion_source
+
+        proxied = 'url={}/ion/{}-{}/'.format(
+            proxy_url.rstrip('/'), ion_source.asset_id, key
+        )
+        if ion_source.access_token:
+            proxied += '&http-header:{}={}'.format(
+                TileProxyServer.TOKEN_HEADER, ion_source.access_token
+            )
+        with self._lock:
+            self._originals[proxied] = source
+        return proxied
+
+    def source(self, asset_id: int, key: str) -> Optional[IonDataSource]:
+        """
+        Returns the original source for an asset ID and source key, or
+        None if the key is not known
+        """
+        with self._lock:
+            return self._sources.get((asset_id, key))
+
+    def original(self, source: str) -> str:
+        """
+        Returns the original ion:// source for a proxied source. Other
+        sources are returned unchanged.
+        """
+        with self._lock:
+            return self._originals.get(source, source)
+
+
+class _TileProxyRequestHandler(BaseHTTPRequestHandler):
+    """
+    Handles requests to the tile proxy, of the form
+    /{secret}/ion/{asset id}[-{source key}]/{path within the asset}
+
+    An empty path requests the asset's root (the endpoint URL).
+    """
+
+    PATH_PATTERN = re.compile(r'^/([^/]+)/ion/(\d+)(?:-(\w+))?/(.*)$')
+
+    #: Addresses of clients on this workstation
+    LOCAL_ADDRESSES = ('127.0.0.1', '::1')
+
+    #: Request headers forwarded to ion
+    FORWARDED_HEADERS = ('Accept',)
+
+    protocol_version = 'HTTP/1.1'
+
+    # BaseHTTPRequestHandler interface
+
+    # pylint: disable=invalid-name,missing-function-docstring
+    def do_GET(self):
+        self._handle(send_body=True)
+
+    def do_HEAD(self):
+        self._handle(send_body=False)
+
+    # pylint: disable=redefined-builtin
+    def log_message(self, format, *args):
+        # requests are not logged, to avoid flooding the message log
+        pass
+    # pylint: enable=redefined-builtin
+    # pylint: enable=invalid-name,missing-function-docstring
+
+    def _handle(self, send_body: bool):
+        """
+        Serves a request from the tile cache, or from ion if not cached
+        """
+        proxy: 'TileProxyServer' = self.server.tile_proxy
+        parts = urlsplit(self.path)
+        match = self.PATH_PATTERN.match(parts.path)
+        if not match or not proxy.is_valid_secret(match.group(1)):
+            # don't reveal whether the path or the secret is wrong
+            self._send(404, b'', '', send_body)
+            return
+
+        source = proxy.credentials(
+            int(match.group(2)),
+            match.group(3),
+            self.headers[TileProxyServer.TOKEN_HEADER],
+            self.client_address[0] in self.LOCAL_ADDRESSES
+        )
+        if source is None:
+            self._send(403, b'', '', send_body)
+            return
+
+        status, content, content_type = proxy.fetch(
+            source,
+            match.group(4),
+            parts.query,
+            {header: self.headers[header]
+             for header in self.FORWARDED_HEADERS if self.headers[header]}
+        )
+        self._send(status, content, content_type, send_body)
+
+    def _send(self, status: int, content: bytes, content_type: str,
+              send_body: bool):
+        """
+        Sends a response
+        """
+        self.send_response(status)
+        if content_type:
+            self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(content)))
+        self.end_headers()
+        if send_body:
+            self.wfile.write(content)
+
+
+class TileProxyServer:
+    """
+    A local HTTP proxy for Cesium ion tiles, backed by the dedicated tile
+    cache.
+
+    Layers whose data sources point at the proxy (see ProxiedSources)
+    request tiles from it instead of ion. The proxy resolves asset
+    endpoints with the credentials of each layer's original source, and
+    serves tiles from the tile cache, fetching and caching tiles which
+    are not yet cached. Cached tiles are keyed by the credentials used
+    to fetch them.
+
+    Requests from this workstation use the credentials of the source
+    identified by the source key in the request path. Requests from other
+    workstations must send an access token in the TOKEN_HEADER header,
+    and are never served with this workstation's credentials. Every
+    request path must also start with a secret. Unless a secret is
+    specified, a random secret is generated each time the proxy is
+    started. The secret is part of base_url().
+
+    Requests are handled on background threads.
+    """
+
+    #: Default port for the proxy
+    DEFAULT_PORT = 8765
+
+    #: Upstream HTTP status codes which indicate that the endpoint's
+    #: access token has expired or been revoked
+    AUTHENTICATION_ERRORS = (401, 403)
+
+    #: Request header with the access token for the requested asset
+    TOKEN_HEADER = 'X-Cesium-Ion-Token'
+
+    def __init__(self, client, tile_cache: TileCache,
+                 sources: Optional[ProxiedSources] = None):
+        self._client = client
+        self._tile_cache = tile_cache
+        self._sources = sources or ProxiedSources()
+        self._server: Optional[ThreadingHTTPServer] = None
+        self._thread: Optional[threading.Thread] = None
+        self._secret = ''
+
+    def is_running(self) -> bool:
+        """
+        Returns True if the proxy is running
+        """
+        return self._server is not None
+
+    def start(self, host: str = '127.0.0.1',
+              port: int = DEFAULT_PORT,
+              secret: Optional[str] = None) -> bool:
+        """
+        Starts the proxy, listening on the specified host and port. If
+        the proxy is already running it is restarted.
+
+        If no secret is specified then a random secret is used.
+
+        Returns True if the proxy was successfully started.
+        """
+        self.stop()
+        self._secret = secret or secrets.token_urlsafe(16)
+        try:
+            server = ThreadingHTTPServer((host, port),
+                                         _TileProxyRequestHandler)
+        except OSError as e:
+            QgsMessageLog.logMessage(
+                'Could not start the tile proxy on {}:{}: {}'.format(
+                    host, port, e
+                ),
+                'Cesium ion', Qgis.Warning
+            )
+            return False
+
+        server.daemon_threads = True
+        server.tile_proxy = self
+        self._server = server
+        self._thread = threading.Thread(target=server.serve_forever,
+                                        name='Cesium ion tile proxy',
+                                        daemon=True)
+        self._thread.start()
+        return True
+
+    def stop(self):
+        """
+        Stops the proxy
+        """
+        if self._server is None:
+            return
+
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+        self._server = None
+        self._thread = None
+        self._secret = ''
+
+    def secret(self) -> str:
+        """
+        Returns the secret which request paths must start with, or an
+        empty string if the proxy is not running
+        """
+        return self._secret
+
+    def is_valid_secret(self, secret: str) -> bool:
+        """
+        Returns True if a secret from a request path matches the proxy's
+        secret
+        """
+        return bool(self._secret) and hmac.compare_digest(
+            secret.encode(), self._secret.encode()
+        )
+
+    def base_url(self) -> Optional[str]:
+        """
+        Returns the base URL of the running proxy, including its secret,
+        as used by layers on this workstation
+        """
+        if self._server is None:
+            return None
+
+        host, port = self._server.server_address[:2]
+        if host in ('0.0.0.0', '::', ''):
+            host = '127.0.0.1'
+        return 'http://{}:{}/{}'.format(host, port, self._secret)
+
+    def credentials(self, asset_id: int, key: Optional[str],
+                    access_token: Optional[str],
+                    is_local: bool) -> Optional[IonDataSource]:
+        """
+        Returns the source whose credentials should be used for a
+        request, or None if the request has no usable credentials.
+
+        :param asset_id: requested asset ID
+        :param key: source key from the request path
+        :param access_token: access token sent in the TOKEN_HEADER header
+        :param is_local: True if the request is from this workstation
+        """
+        if key and is_local:
+            source = self._sources.source(asset_id, key)
+            if source is not None:
+                if source.access_token or \
+                        source.auth_cfg == self._client.OAUTH_ID:
+                    return source
+                # other authentication configurations can't be used to
+                # resolve endpoints
+                return None
+
+        if access_token:
+            return IonDataSource(asset_id=asset_id,
+                                 access_token=access_token)
+        return None
+
+    def fetch(self, source: IonDataSource, path: str, query: str,
+              headers: dict) -> Tuple[int, bytes, str]:
+        """
+        Returns the status, content and content type for a path within an
+        asset, from the tile cache or from ion, using the credentials of
+        the specified source. A source without an access token uses the
+        plugin's login. May be called from any thread.
+        """
+        asset_id = source.asset_id
+        token = source.access_token
+        endpoint_cache = self._client.endpoint_cache()
+        endpoint, error = endpoint_cache.resolve_blocking(asset_id, token)
+        if endpoint is None or not endpoint.url:
+            if error in (QNetworkReply.AuthenticationRequiredError,
+                         QNetworkReply.ContentAccessDenied):
+                return 403, b'', ''
+            return 404, b'', ''
+
+        url = proxied_tile_url(endpoint.url, path, query)
+        cached = self._tile_cache.get(TileCache.cache_url(url, token))
+        if cached is not None:
+            return 200, cached.content, cached.content_type
+
+        status, content, content_type = self._fetch_upstream(
+            url, endpoint.access_token, headers
+        )
+        if status in self.AUTHENTICATION_ERRORS:
+            # the endpoint's token may have expired, so resolve it again
+            endpoint_cache.invalidate(asset_id, token)
+            endpoint, _ = endpoint_cache.resolve_blocking(asset_id, token)
+            if endpoint is not None and endpoint.url:
+                url = proxied_tile_url(endpoint.url, path, query)
+                status, content, content_type = self._fetch_upstream(
+                    url, endpoint.access_token, headers
+                )
+
+        if status == 200 and TileCache.is_cacheable_url(url):
+            self._tile_cache.put(TileCache.cache_url(url, token), content,
+                                 content_type)
+        return status, content, content_type
+
+    @staticmethod
+    def _fetch_upstream(url: str, access_token: Optional[str],
+                        headers: dict) -> Tuple[int, bytes, str]:
+        """
+        Fetches a URL from ion, returning the status, content and content
+        type
+        """
+        request = QNetworkRequest(QUrl(url))
+        if access_token:
+            request.setRawHeader(
+                b'Authorization',
+                'Bearer {}'.format(access_token).encode()
+            )
+        for header, value in headers.items():
+            request.setRawHeader(header.encode(), value.encode())
+
+        blocking_request = QgsBlockingNetworkRequest()
+        blocking_request.get(request)
+        reply = blocking_request.reply()
+        status = reply.attribute(QNetworkRequest.HttpStatusCodeAttribute)
+        if status is None:
+            # a network error, with no HTTP response
+            return 502, b'', ''
+
+        return int(status), reply.content().data(), \
+            reply.rawHeader(b'Content-Type').data().decode('latin-1')
+
+
+PROXIED_SOURCES = ProxiedSources()
+TILE_PROXY = TileProxyServer(API_CLIENT, TILE_CACHE, PROXIED_SOURCES)
@@ -2,49 +2,159 @@
 Cesium ion token class
 """
 
-from dataclasses import dataclass, field
-from typing import Optional, Dict, List
+from typing import (
+    Optional,
+    Dict,
+    List,
+    Union
+)
 
 from qgis.PyQt.QtCore import (
     Qt,
     QDateTime
 )
 
+from .intern_pool import InternPool
+
+
+def _decode_date(value: Union[QDateTime, str, None]) -> Optional[QDateTime]:
+    """
+    Decodes a raw ISO date string
+    """
+    if isinstance(value, str):
+        return QDateTime.fromString(value, Qt.DateFormat.ISODate)
+    return value
+
 
-@dataclass
 class Token:
     """
-    Represents an ion asset
+    Represents an ion access token.
+
+    Tokens created from JSON keep the raw date strings, which are only
+    decoded on first access. Identical JSON records are interned, so
+    tokens created from JSON are shared and must not be modified.
     """
-    id: str
-    name: str
-    token: str
-    scopes: str
-    date_added: Optional[QDateTime] = None
-    date_modified: Optional[QDateTime] = None
-    date_last_used: Optional[QDateTime] = None
-    asset_ids: List[int] = field(default_factory=list)
-    is_default: Optional[bool] = None
+
+    __slots__ = (
+        'id',
+        'name',
+        'token',
+        'scopes',
+        'asset_ids',
+        'is_default',
+        # decoded values, or the raw strings if not yet decoded
+        '_date_added',
+        '_date_modified',
+        '_date_last_used',
+        '__weakref__'
+    )
+
+    _INTERN_POOL = InternPool()
+
+    # pylint: disable=redefined-builtin
+    def __init__(self,
+                 id: str,
+                 name: str,
+                 token: str,
+                 scopes: str,
+                 date_added: Union[QDateTime, str, None] = None,
+                 date_modified: Union[QDateTime, str, None] = None,
+                 date_last_used: Union[QDateTime, str, None] = None,
+                 asset_ids: Optional[List[int]] = None,
+                 is_default: Optional[bool] = None):
+        self.id = id
+        self.name = name
+        self.token = token
+        self.scopes = scopes
+        self._date_added = date_added
+        self._date_modified = date_modified
+        self._date_last_used = date_last_used
+        self.asset_ids = asset_ids if asset_ids is not None else []
+        self.is_default = is_default
+    # pylint: enable=redefined-builtin
+
+    @property
+    def date_added(self) -> Optional[QDateTime]:
+        """
+        Returns the date the token was added
+        """
+        self._date_added = _decode_date(self._date_added)
+        return self._date_added
+
+    @date_added.setter
+    def date_added(self, value: Union[QDateTime, str, None]):
+        self._date_added = value
+
+    @property
+    def date_modified(self) -> Optional[QDateTime]:
+        """
+        Returns the date the token was last modified
+        """
+        self._date_modified = _decode_date(self._date_modified)
+        return self._date_modified
+
+    @date_modified.setter
+    def date_modified(self, value: Union[QDateTime, str, None]):
+        self._date_modified = value
+
+    @property
+    def date_last_used(self) -> Optional[QDateTime]:
+        """
+        Returns the date the token was last used
+        """
+        self._date_last_used = _decode_date(self._date_last_used)
+        return self._date_last_used
+
+    @date_last_used.setter
+    def date_last_used(self, value: Union[QDateTime, str, None]):
+        self._date_last_used = value
+
+    def __eq__(self, other) -> bool:
+        if not isinstance(other, Token):
+            return NotImplemented
+
+        if self is other:
+            return True
+
+        return (self.id, self.name, self.token, self.scopes,
+                self.date_added, self.date_modified, self.date_last_used,
+                self.asset_ids, self.is_default) == \
+            (other.id, other.name, other.token, other.scopes,
+             other.date_added, other.date_modified, other.date_last_used,
+             other.asset_ids, other.is_default)
+
+    __hash__ = None
+
+    def __repr__(self) -> str:
+        return 'Token(id={!r}, name={!r})'.format(self.id, self.name)
 
     @staticmethod
     def from_json(json: Dict) -> 'Token':
         """
-        Creates an asset from a JSON object
-        """
-        return Token(
-            id=json['id'],
-            name=json['name'],
-            token=json.get('token'),
-            date_added=QDateTime.fromString(
-                json['dateAdded'], Qt.DateFormat.ISODate
-            ) if 'dateAdded' in json else None,
-            date_modified=QDateTime.fromString(
-                json['dateModified'], Qt.DateFormat.ISODate
-            ) if 'dateModified' in json else None,
-            date_last_used=QDateTime.fromString(
-                json['dateLastUsed'], Qt.DateFormat.ISODate
-            ) if 'dateLastUsed' in json else None,
-            asset_ids=json.get('assetIds', []),
-            is_default=json.get('isDefault'),
-            scopes=json['scopes']
-        )
+        Creates a token from a JSON object
+        """
+        def create():
+            return Token(
+                id=json['id'],
+                name=json['name'],
+                token=json.get('token'),
+                date_added=json.get('dateAdded'),
+                date_modified=json.get('dateModified'),
+                date_last_used=json.get('dateLastUsed'),
+                asset_ids=json.get('assetIds', []),
+                is_default=json.get('isDefault'),
+                scopes=json['scopes']
+            )
+
+        try:
+            key = InternPool.record_key(
+                json['id'],
+                (json['name'], json.get('token'), json.get('dateAdded'),
+                 json.get('dateModified'), json.get('dateLastUsed'),
+                 tuple(json.get('assetIds', [])), json.get('isDefault'),
+                 tuple(json['scopes']))
+            )
+            return Token._INTERN_POOL.intern(key, create)
+        except TypeError:
+            # unhashable values
+            return create()
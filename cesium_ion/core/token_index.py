@@ -0,0 +1,95 @@
+"""
+Cesium ion token index
+"""
+
+from collections import defaultdict
+from typing import (
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple
+)
+
+from .token import Token
+
+
+class TokenIndex:
+    """
+    An index of access tokens by asset ID and scope, for finding existing
+    tokens which grant access to a set of assets.
+
+    Only tokens restricted to specific assets are indexed for reuse.
+    Tokens without any asset IDs (including the account's default token)
+    grant access to every asset in the account, so they are never
+    returned by find().
+    """
+
+    def __init__(self, tokens: Optional[Iterable[Token]] = None):
+        self._tokens: List[Token] = []
+        # token positions by (asset id, scope), for non-default tokens
+        # restricted to specific assets
+        self._restricted: Dict[Tuple[int, str], Set[int]] = \
+            defaultdict(set)
+
+        for token in tokens or []:
+            self.add(token)
+
+    def __len__(self) -> int:
+        return len(self._tokens)
+
+    def tokens(self) -> List[Token]:
+        """
+        Returns all indexed tokens
+        """
+        return list(self._tokens)
+
+    def add(self, token: Token):
+        """
+        Adds a token to the index.
+
+        Tokens without a token string can't be used for access, and are
+        ignored.
+        """
+        if not token.token:
+            return
+
+        position = len(self._tokens)
+        self._tokens.append(token)
+        if token.is_default or not token.asset_ids:
+            # unrestricted tokens are never reused
+            return
+
+        for scope in token.scopes:
+            for asset_id in token.asset_ids:
+                self._restricted[(int(asset_id), scope)].add(position)
+
+    def find(self,
+             asset_ids: Iterable[int],
+             scopes: Iterable[str]) -> Optional[Token]:
+        """
+        Returns an existing token restricted to specific assets which
+        grants all the specified scopes for all the specified assets, or
+        None if no such token exists.
+
+        If several tokens cover the assets then the token restricted to
+        the fewest assets is returned.
+        """
+        candidates: Optional[Set[int]] = None
+        for asset_id in set(int(asset_id) for asset_id in asset_ids):
+            for scope in set(scopes):
+                covering = self._restricted.get((asset_id, scope), set())
+                candidates = set(covering) if candidates is None \
+                    else candidates & covering
+                if not candidates:
+                    return None
+
+        if not candidates:
+            return None
+
+        return self._tokens[min(
+            candidates,
+            key=lambda position: (len(self._tokens[position].asset_ids),
+                                  position)
+        )]
@@ -4,7 +4,10 @@ GUI module
 from .data_items import (
     CesiumIonDataItemProvider,  # NOQA
     CesiumIonDataItemGuiProvider,  # NOQA
-    CesiumIonDropHandler  # NOQA
+    CesiumIonDropHandler,  # NOQA
+    CesiumIonLayerUtils,  # NOQA
+    IonAssetItem,  # NOQA
+    IonRootItem  # NOQA
 )
 from .select_token_widget import SelectTokenWidget  # NOQA
 from .add_asset_dialog import (
@@ -16,6 +19,9 @@ from .asset_by_id_widget import AssetByIdWidget  # NOQA
 __all__ = ['CesiumIonDropHandler',
            'CesiumIonDataItemGuiProvider',
            'CesiumIonDataItemProvider',
+           'CesiumIonLayerUtils',
+           'IonAssetItem',
+           'IonRootItem',
            'SelectTokenWidget',
            'AddAssetDialog',
            'AddAssetByIdDialog',
@@ -22,13 +22,22 @@ class AddAssetDialog(QDialog):
     A custom dialog for adding an asset to a project
     """
 
-    def __init__(self, parent: Optional[QWidget] = None):
+    def __init__(self,
+                 parent: Optional[QWidget] = None,
+                 asset_count: int = 1):
         super().__init__(parent)
 
         self.setObjectName('AddAssetDialog')
         QgsGui.enableAutoGeometryRestore(self)
 
-        self.setWindowTitle(self.tr('Select Cesium ion Token'))
+        if asset_count > 1:
+            self.setWindowTitle(
+                self.tr('Select Cesium ion Token for {} Assets').format(
+                    asset_count
+                )
+            )
+        else:
+            self.setWindowTitle(self.tr('Select Cesium ion Token'))
 
         vl = QVBoxLayout()
         self.select_token_widget = SelectTokenWidget()
@@ -0,0 +1,166 @@
+"""
+Area prefetch dialog
+"""
+from typing import Optional
+
+from qgis.PyQt.QtWidgets import (
+    QDialog,
+    QWidget,
+    QVBoxLayout,
+    QFormLayout,
+    QCheckBox,
+    QDialogButtonBox
+)
+from qgis.core import (
+    QgsCoordinateReferenceSystem,
+    QgsCoordinateTransform,
+    QgsGeometry,
+    QgsMapLayerProxyModel,
+    QgsProject,
+    QgsRectangle
+)
+from qgis.gui import (
+    QgsDoubleSpinBox,
+    QgsExtentWidget,
+    QgsGui,
+    QgsMapLayerComboBox
+)
+from qgis.utils import iface
+
+from ..core import Asset
+from ..core.tile_bounds import TileArea
+
+
+class AreaPrefetchDialog(QDialog):
+    """
+    A custom dialog for selecting the area of interest and level of
+    detail for prefetching an asset's tiles
+    """
+
+    #: Default target geometric error, in meters
+    DEFAULT_GEOMETRIC_ERROR = 5.0
+
+    def __init__(self, asset: Asset, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+
+        self.setObjectName('AreaPrefetchDialog')
+        QgsGui.enableAutoGeometryRestore(self)
+
+        self.setWindowTitle(
+            self.tr('Prefetch Tiles for {}').format(asset.name)
+        )
+
+        vl = QVBoxLayout()
+        self.extent_widget = QgsExtentWidget()
+        if iface is not None:
+            self.extent_widget.setMapCanvas(iface.mapCanvas())
+            self.extent_widget.setOriginalExtent(
+                iface.mapCanvas().extent(),
+                iface.mapCanvas().mapSettings().destinationCrs()
+            )
+            self.extent_widget.setCurrentExtent(
+                iface.mapCanvas().extent(),
+                iface.mapCanvas().mapSettings().destinationCrs()
+            )
+            self.extent_widget.setOutputExtentFromCurrent()
+        vl.addWidget(self.extent_widget)
+
+        form = QFormLayout()
+        self.polygon_check = QCheckBox(self.tr('Limit to polygon layer'))
+        self.polygon_combo = QgsMapLayerComboBox()
+        self.polygon_combo.setFilters(QgsMapLayerProxyModel.PolygonLayer)
+        self.polygon_combo.setEnabled(False)
+        self.polygon_check.toggled.connect(self.polygon_combo.setEnabled)
+        self.polygon_check.toggled.connect(self.extent_widget.setDisabled)
+        form.addRow(self.polygon_check, self.polygon_combo)
+
+        self.error_spin = QgsDoubleSpinBox()
+        self.error_spin.setDecimals(2)
+        self.error_spin.setRange(0.01, 100000)
+        self.error_spin.setClearValue(self.DEFAULT_GEOMETRIC_ERROR)
+        self.error_spin.setValue(self.DEFAULT_GEOMETRIC_ERROR)
+        self.error_spin.setSuffix(self.tr(' m'))
+        self.error_spin.setToolTip(
+            self.tr('Tiles are fetched down to the level of detail with '
+                    'this geometric error. Smaller values fetch more '
+                    'detailed tiles.')
+        )
+        form.addRow(self.tr('Geometric error'), self.error_spin)
+        vl.addLayout(form)
+
+        self.button_box = QDialogButtonBox(
+            QDialogButtonBox.Ok | QDialogButtonBox.Cancel
+        )
+        self.button_box.accepted.connect(self.accept)
+        self.button_box.rejected.connect(self.reject)
+        vl.addWidget(self.button_box)
+
+        self.setLayout(vl)
+
+    def max_geometric_error(self) -> float:
+        """
+        Returns the target geometric error, in meters
+        """
+        return self.error_spin.value()
+
+    def area_id(self) -> str:
+        """
+        Returns an identifier for the polygon layer defining the area, if
+        any
+        """
+        if self.polygon_check.isChecked() and \
+                self.polygon_combo.currentLayer():
+            return self.polygon_combo.currentLayer().id()
+        return ''
+
+    def area(self) -> Optional[TileArea]:
+        """
+        Returns the selected area of interest, or None if no valid area
+        is selected
+        """
+        wgs84 = QgsCoordinateReferenceSystem('EPSG:4326')
+
+        if self.polygon_check.isChecked():
+            layer = self.polygon_combo.currentLayer()
+            if layer is None:
+                return None
+
+            transform = QgsCoordinateTransform(
+                layer.crs(), wgs84, QgsProject.instance()
+            )
+            geometries = []
+            for feature in layer.getFeatures():
+                geometry = QgsGeometry(feature.geometry())
+                if geometry.isEmpty():
+                    continue
+                geometry.transform(transform)
+                geometries.append(geometry)
+            if not geometries:
+                return None
+
+            polygon = QgsGeometry.unaryUnion(geometries)
+            engine = QgsGeometry.createGeometryEngine(polygon.constGet())
+            engine.prepareGeometry()
+            bounds = polygon.boundingBox()
+
+            def intersects(extent) -> bool:
+                return engine.intersects(
+                    QgsGeometry.fromRect(QgsRectangle(*extent)).constGet()
+                )
+
+            return TileArea(
+                (bounds.xMinimum(), bounds.yMinimum(),
+                 bounds.xMaximum(), bounds.yMaximum()),
+                intersects
+            )
+
+        extent = self.extent_widget.outputExtent()
+        if extent.isEmpty():
+            return None
+
+        transform = QgsCoordinateTransform(
+            self.extent_widget.outputCrs(), wgs84, QgsProject.instance()
+        )
+        bounds = transform.transformBoundingBox(extent)
+        return TileArea((bounds.xMinimum(), bounds.yMinimum(),
+                         bounds.xMaximum(), bounds.yMaximum()))
@@ -2,12 +2,21 @@
 Cesium ion data browser items
 """
 from functools import partial
+from typing import (
+    Callable,
+    List,
+    Optional,
+    Union
+)
 
 from qgis.PyQt.QtCore import (
     QCoreApplication
 )
 from qgis.PyQt.QtWidgets import (
-    QAction
+    QAction,
+    QActionGroup,
+    QMenu,
+    QMessageBox
 )
 from qgis.core import (
     Qgis,
@@ -15,7 +24,13 @@ from qgis.core import (
     QgsDataItemProvider,
     QgsDataCollectionItem,
     QgsDataItem,
-    QgsMimeDataUtils
+    QgsApplication,
+    QgsLayerTreeGroup,
+    QgsMapLayer,
+    QgsMimeDataUtils,
+    QgsProject,
+    QgsProxyProgressTask,
+    QgsTiledSceneLayer
 )
 from qgis.gui import (
     QgsDataItemGuiProvider,
@@ -28,8 +43,19 @@ from ..core import (
     Asset,
     AssetType,
     Status,
-    API_CLIENT
+    API_CLIENT,
+    AssetTable,
+    PluginSettings,
+    TileCache,
+    TILE_CACHE,
+    Token
 )
+from ..core.area_prefetch import AreaPrefetch
+from ..core.asset_catalog import AssetCatalog
+from ..core.layer_task import CreateLayersTask
+from ..core.offline_pack import OfflinePack
+from ..core.tile_prefetch import TilePrefetcher
+from ..core.tile_proxy import TILE_PROXY
 
 
 class IonAssetItem(QgsDataItem):
@@ -52,6 +78,16 @@ class IonAssetItem(QgsDataItem):
         )
         self.setIcon(GuiUtils.get_icon('cesium_3d_tile.svg'))
 
+    def update_asset(self, asset: Asset):
+        """
+        Updates the item to reflect changed asset details
+        """
+        renamed = asset.name != self.asset.name
+        self.asset = asset
+        if renamed:
+            self.setName(asset.name)
+            self.dataChanged.emit(self)
+
     # QgsDataItem interface:
 
     # pylint: disable=missing-docstring
@@ -74,28 +110,254 @@ class IonAssetItem(QgsDataItem):
 
 class IonRootItem(QgsDataCollectionItem):
     """
-    Root item for Cesium ion browser entries
+    Root item for Cesium ion browser entries.
+
+    When asynchronous population is enabled the root item is populated
+    on the main thread without blocking. If a previously fetched asset
+    catalog is available it is shown immediately and revalidated in the
+    background, otherwise children are appended as each page of the
+    listing arrives.
+
+    In stale-while-revalidate mode, refreshing the item keeps the existing
+    children while the catalog is revalidated, and then applies only the
+    added, removed and renamed assets.
+
+    Children are ordered using a columnar asset table, when NumPy is
+    available.
     """
 
+    #: Sort columns, and whether they are sorted in descending order
+    SORT_COLUMNS = {
+        'name': False,
+        'date_added': True,
+        'bytes': True,
+        'type': False
+    }
+
     def __init__(self):
         super().__init__(None, 'Cesium ion', 'cesium_ion', 'cesium_ion')
-        self.setCapabilitiesV2(
-            Qgis.BrowserItemCapabilities(
-                Qgis.BrowserItemCapability.Fertile
-            )
+
+        self._async_population = PluginSettings.async_browser_population()
+        self._stale_while_revalidate = self._async_population and \
+            PluginSettings.stale_while_revalidate_browser()
+        self._is_populating = False
+        self._is_streaming = False
+
+        capabilities = Qgis.BrowserItemCapabilities(
+            Qgis.BrowserItemCapability.Fertile
         )
+        if self._async_population:
+            # createChildren only starts the fetch, so it is safe to call
+            # on the main thread
+            capabilities |= Qgis.BrowserItemCapability.Fast
+        self.setCapabilitiesV2(capabilities)
 
         self.setIcon(GuiUtils.get_icon('browser_root.svg'))
 
+    def is_populating(self) -> bool:
+        """
+        Returns True if an asynchronous population is in progress
+        """
+        return self._is_populating
+
+    def cancel_population(self):
+        """
+        Cancels any in-progress asynchronous population
+        """
+        if not self._is_populating:
+            return
+
+        catalog = API_CLIENT.asset_catalog()
+        self._disconnect_catalog(catalog)
+        catalog.cancel()
+
+    def sort_column(self) -> str:
+        """
+        Returns the asset table column which children are sorted by
+        """
+        column = PluginSettings.browser_sort_column()
+        return column if column in self.SORT_COLUMNS else 'name'
+
+    def set_sort_column(self, column: str):
+        """
+        Sets the asset table column which children are sorted by
+        """
+        PluginSettings.set_browser_sort_column(column)
+        self.sort_children()
+
+    def sort_children(self, children: Optional[List[QgsDataItem]] = None):
+        """
+        Sets the sort keys for the asset children, so that they are
+        ordered by the current sort column.
+
+        The order is taken from the asset catalog's table, so that the
+        children don't need to be converted to a table. Children which
+        are not in the catalog are sorted last.
+
+        If children is not specified then the current children are
+        sorted.
+        """
+        if not AssetTable.is_available():
+            return
+
+        if children is None:
+            children = self.children()
+        asset_items = [child for child in children
+                       if isinstance(child, IonAssetItem)]
+        if not asset_items:
+            return
+
+        table = API_CLIENT.asset_catalog().table()
+        if table is None:
+            # no catalog, e.g. when populating synchronously
+            table = AssetTable.from_assets(
+                [item.asset for item in asset_items]
+            )
+
+        column = self.sort_column()
+        order = table.sort_order(column, descending=self.SORT_COLUMNS[column])
+        ranks = dict(zip(table.ids[order].tolist(), range(len(order))))
+        unranked = len(ranks)
+        for item in asset_items:
+            rank = ranks.get(int(item.asset.id), unranked)
+            if item.sortKey() != rank:
+                item.setSortKey(rank)
+                item.dataChanged.emit(item)
+
+    def _start_population(self, streaming: bool):
+        """
+        Starts asynchronously revalidating the asset catalog.
+
+        If streaming is True then children are appended as each page
+        of the catalog arrives, otherwise the children are updated once
+        the complete catalog has been revalidated.
+        """
+        self.cancel_population()
+
+        catalog = API_CLIENT.asset_catalog()
+        # restart any revalidation which we didn't start, so that no
+        # pages are missed
+        catalog.cancel()
+
+        self._is_populating = True
+        self._is_streaming = streaming
+        catalog.page_fetched.connect(self._page_fetched)
+        catalog.updated.connect(self._catalog_updated)
+        catalog.unchanged.connect(self._catalog_unchanged)
+        catalog.finished.connect(self._population_finished)
+        catalog.revalidate()
+
+    def _disconnect_catalog(self, catalog: AssetCatalog):
+        """
+        Disconnects from the asset catalog signals
+        """
+        self._is_populating = False
+        catalog.page_fetched.disconnect(self._page_fetched)
+        catalog.updated.disconnect(self._catalog_updated)
+        catalog.unchanged.disconnect(self._catalog_unchanged)
+        catalog.finished.disconnect(self._population_finished)
+
+    def _page_fetched(self, _: int, assets: List[Asset]):
+        """
+        Appends the assets from a newly fetched page as children
+        """
+        if not self._is_streaming:
+            return
+
+        for asset in assets:
+            self.addChildItem(IonAssetItem(self, asset), True)
+        # the children are sorted once the population has finished, as
+        # sorting after every page would be quadratic
+
+    def _catalog_updated(self, assets: List[Asset]):
+        """
+        Called when revalidation has found a changed catalog
+        """
+        if self._is_streaming:
+            return
+
+        self._apply_catalog(assets)
+
+    def _catalog_unchanged(self):
+        """
+        Called when revalidation has found an unchanged catalog
+        """
+        if self._is_streaming:
+            return
+
+        # the children may still differ from the catalog, e.g. if an
+        # earlier population was canceled part way through
+        self._apply_catalog(API_CLIENT.cached_assets() or [])
+
+    def _apply_catalog(self, assets: List[Asset]):
+        """
+        Updates the children to match the catalog, adding, removing and
+        renaming only the items which differ
+        """
+        existing_items = {
+            child.asset.id: child for child in self.children()
+            if isinstance(child, IonAssetItem)
+        }
+
+        for asset in assets:
+            item = existing_items.pop(asset.id, None)
+            if item is None:
+                self.addChildItem(IonAssetItem(self, asset), True)
+            else:
+                item.update_asset(asset)
+
+        for removed_item in existing_items.values():
+            self.deleteChildItem(removed_item)
+
+        self.sort_children()
+
+    def _population_finished(self):
+        """
+        Called when the asynchronous population has finished
+        """
+        self._disconnect_catalog(API_CLIENT.asset_catalog())
+        if self._is_streaming:
+            self.sort_children()
+
     # QgsDataCollectionItem interface
 
     # pylint: disable=missing-function-docstring
     def createChildren(self):
-        assets = API_CLIENT.list_assets_blocking()
+        if self._async_population:
+            assets = API_CLIENT.cached_assets()
+            self._start_population(streaming=assets is None)
+            if assets is None:
+                return []
+            res = [IonAssetItem(self, asset) for asset in assets]
+            self.sort_children(res)
+            return res
+
+        assets = API_CLIENT.list_all_assets_blocking()
         res = []
         for asset in assets:
             res.append(IonAssetItem(self, asset))
+        self.sort_children(res)
         return res
+
+    def refresh(self, *args):
+        if not args:
+            # a user initiated refresh, rather than the refresh with
+            # newly created children
+            self.cancel_population()
+
+            if self._stale_while_revalidate and \
+                    self.state() == Qgis.BrowserItemState.Populated and \
+                    self.children():
+                # keep showing the existing children until the catalog
+                # has been revalidated
+                self._start_population(streaming=False)
+                return
+
+        super().refresh(*args)
+
+    def depopulate(self):
+        self.cancel_population()
+        super().depopulate()
     # pylint: enable=missing-function-docstring
 
 
@@ -128,33 +390,464 @@ class CesiumIonLayerUtils:
     Utilities for working with cesium ion QGIS map layers
     """
 
+    #: Scopes granted to tokens created when adding assets
+    NEW_TOKEN_SCOPES = ['assets:list', 'assets:read']
+    #: Scopes an existing token must grant to be used for adding assets
+    REQUIRED_TOKEN_SCOPES = ['assets:read']
+
+    #: Maximum number of assets prefetched at once
+    MAX_PREFETCHED_ASSETS = 4
+
+    # in-progress layer creation tasks
+    _tasks: List[CreateLayersTask] = []
+    # in-progress tile prefetchers
+    _prefetchers: List[TilePrefetcher] = []
+    # in-progress area prefetches
+    _area_prefetches: List[AreaPrefetch] = []
+    # in-progress offline pack downloads
+    _offline_packs: List[OfflinePack] = []
+
+    @staticmethod
+    def tile_cache() -> Optional[TileCache]:
+        """
+        Returns the dedicated tile cache, or None if it is disabled
+        """
+        if not PluginSettings.tile_cache_enabled():
+            return None
+        TILE_CACHE.set_max_size(
+            PluginSettings.tile_cache_size_mb() * 1024 * 1024
+        )
+        return TILE_CACHE
+
+    @staticmethod
+    def prefetch_tile_cache() -> Optional[TileCache]:
+        """
+        Returns the tile cache prefetched tiles should be stored in, or
+        None if they should be stored in the QGIS network cache.
+
+        The dedicated tile cache is only read by the local tile proxy, so
+        tiles are only prefetched into it while layers load through the
+        local proxy.
+        """
+        if PluginSettings.tile_proxy_mode() != 'local' or \
+                not TILE_PROXY.is_running():
+            return None
+        return CesiumIonLayerUtils.tile_cache()
+
+    @staticmethod
+    def tile_proxy_url() -> Optional[str]:
+        """
+        Returns the base URL of the tile proxy layers should load tiles
+        through, or None if layers should load tiles from ion directly
+        """
+        mode = PluginSettings.tile_proxy_mode()
+        if mode == 'local':
+            return TILE_PROXY.base_url()
+        if mode == 'remote':
+            return PluginSettings.tile_proxy_url() or None
+        return None
+
+    @staticmethod
+    def prefetch_assets(assets: List[Asset]):
+        """
+        Prefetches the root tileset and top levels of tiles for assets in
+        the background, if prefetching is enabled.
+
+        Any previous prefetching is canceled.
+        """
+        CesiumIonLayerUtils.cancel_prefetch()
+        if not PluginSettings.prefetch_tiles():
+            return
+
+        for asset in assets[:CesiumIonLayerUtils.MAX_PREFETCHED_ASSETS]:
+            if asset.type.to_qgis_data_provider() is None:
+                continue
+
+            prefetcher = TilePrefetcher(
+                API_CLIENT,
+                int(asset.id),
+                max_depth=PluginSettings.prefetch_levels(),
+                tile_cache=CesiumIonLayerUtils.prefetch_tile_cache()
+            )
+            prefetcher.finished.connect(
+                partial(CesiumIonLayerUtils._prefetch_finished, prefetcher)
+            )
+            CesiumIonLayerUtils._prefetchers.append(prefetcher)
+            prefetcher.start()
+
+    @staticmethod
+    def cancel_prefetch():
+        """
+        Cancels any in-progress prefetching
+        """
+        for prefetcher in list(CesiumIonLayerUtils._prefetchers):
+            prefetcher.cancel()
+
+    @staticmethod
+    def _prefetch_finished(prefetcher: TilePrefetcher):
+        """
+        Called when prefetching an asset has finished
+        """
+        if prefetcher in CesiumIonLayerUtils._prefetchers:
+            CesiumIonLayerUtils._prefetchers.remove(prefetcher)
+        prefetcher.deleteLater()
+
+    @staticmethod
+    def prefetch_area_interactive(asset: Asset):
+        """
+        Interactively allows users to prefetch the tiles of an asset for
+        an area of interest.
+
+        The tiles to fetch are planned first, and the user is asked to
+        confirm the download after being shown its estimated size.
+        """
+        # pylint: disable=import-outside-toplevel
+        from .area_prefetch_dialog import AreaPrefetchDialog
+        # pylint: enable=import-outside-toplevel
+
+        dialog = AreaPrefetchDialog(asset)
+        if not dialog.exec_():
+            return
+
+        area = dialog.area()
+        if area is None:
+            iface.messageBar().pushWarning(
+                QCoreApplication.translate(
+                    'CesiumIonLayerUtils', 'Cesium ion'
+                ),
+                QCoreApplication.translate(
+                    'CesiumIonLayerUtils', 'No area of interest selected'
+                )
+            )
+            return
+
+        prefetch = AreaPrefetch(
+            API_CLIENT,
+            int(asset.id),
+            area,
+            dialog.max_geometric_error(),
+            dialog.area_id(),
+            tile_cache=CesiumIonLayerUtils.prefetch_tile_cache()
+        )
+        prefetch.error_occurred.connect(
+            partial(CesiumIonLayerUtils._area_prefetch_error, asset)
+        )
+        CesiumIonLayerUtils._area_prefetches.append(prefetch)
+        CesiumIonLayerUtils._run_background_step(
+            prefetch,
+            QCoreApplication.translate(
+                'CesiumIonLayerUtils', 'Planning tile prefetch for {}'
+            ).format(asset.name),
+            partial(CesiumIonLayerUtils._area_prefetch_planned,
+                    prefetch, asset)
+        )
+        prefetch.plan()
+
+    @staticmethod
+    def _run_background_step(operation: Union[AreaPrefetch, OfflinePack],
+                             description: str,
+                             on_finished: Callable[[], None]):
+        """
+        Shows the progress of a step of a background download in the task
+        manager, allowing it to be canceled, and calls on_finished when
+        the step finishes
+        """
+        task = QgsProxyProgressTask(description, True)
+        operation.progress_changed.connect(task.setProxyProgress)
+        task.canceled.connect(operation.cancel)
+
+        def step_finished():
+            operation.progress_changed.disconnect(task.setProxyProgress)
+            operation.finished.disconnect(step_finished)
+            task.finalize(not task.isCanceled())
+            on_finished()
+
+        operation.finished.connect(step_finished)
+        QgsApplication.taskManager().addTask(task)
+
+    @staticmethod
+    def _area_prefetch_planned(prefetch: AreaPrefetch, asset: Asset):
+        """
+        Called when planning an area prefetch has finished, asking the
+        user whether to download the planned tiles
+        """
+        plan = prefetch.current_plan()
+        if plan is None:
+            # planning failed or was canceled
+            CesiumIonLayerUtils._release_area_prefetch(prefetch)
+            return
+
+        if plan.is_complete():
+            CesiumIonLayerUtils._area_prefetch_complete(prefetch, asset)
+            return
+
+        estimated_bytes = plan.estimated_remaining_bytes()
+        if estimated_bytes is not None:
+            size = QCoreApplication.translate(
+                'CesiumIonLayerUtils', 'approximately {:.1f} MB'
+            ).format(estimated_bytes / 1024 / 1024)
+        else:
+            size = QCoreApplication.translate(
+                'CesiumIonLayerUtils', 'unknown size'
+            )
+
+        if plan.completed:
+            message = QCoreApplication.translate(
+                'CesiumIonLayerUtils',
+                'Resume the earlier prefetch for {}? {} tiles ({}) '
+                'remain to be downloaded.'
+            ).format(asset.name, plan.remaining_count(), size)
+        else:
+            message = QCoreApplication.translate(
+                'CesiumIonLayerUtils', 'Download {} tiles ({}) for {}?'
+            ).format(plan.remaining_count(), size, asset.name)
+
+        if QMessageBox.question(
+                iface.mainWindow(),
+                QCoreApplication.translate(
+                    'CesiumIonLayerUtils', 'Prefetch Tiles'
+                ),
+                message
+        ) != QMessageBox.Yes:
+            CesiumIonLayerUtils._release_area_prefetch(prefetch)
+            return
+
+        CesiumIonLayerUtils._run_background_step(
+            prefetch,
+            QCoreApplication.translate(
+                'CesiumIonLayerUtils', 'Prefetching tiles for {}'
+            ).format(asset.name),
+            partial(CesiumIonLayerUtils._area_prefetch_complete,
+                    prefetch, asset)
+        )
+        prefetch.download()
+
+    @staticmethod
+    def _area_prefetch_complete(prefetch: AreaPrefetch, asset: Asset):
+        """
+        Called when the download of an area prefetch has finished
+        """
+        CesiumIonLayerUtils._release_area_prefetch(prefetch)
+        plan = prefetch.current_plan()
+        if plan is None or not plan.is_complete():
+            return
+
+        iface.messageBar().pushSuccess(
+            QCoreApplication.translate(
+                'CesiumIonLayerUtils', 'Cesium ion'
+            ),
+            QCoreApplication.translate(
+                'CesiumIonLayerUtils', 'Prefetched {} tiles for {}'
+            ).format(len(plan.urls), asset.name)
+        )
+
+    @staticmethod
+    def _area_prefetch_error(asset: Asset, error: str):
+        """
+        Called when an area prefetch reports an error
+        """
+        iface.messageBar().pushWarning(
+            QCoreApplication.translate(
+                'CesiumIonLayerUtils', 'Cesium ion'
+            ),
+            QCoreApplication.translate(
+                'CesiumIonLayerUtils', 'Could not prefetch {}: {}'
+            ).format(asset.name, error)
+        )
+
+    @staticmethod
+    def _release_area_prefetch(prefetch: AreaPrefetch):
+        """
+        Releases a finished area prefetch
+        """
+        if prefetch in CesiumIonLayerUtils._area_prefetches:
+            CesiumIonLayerUtils._area_prefetches.remove(prefetch)
+            prefetch.deleteLater()
+
+    @staticmethod
+    def download_offline_pack_interactive(asset: Asset):
+        """
+        Interactively allows users to download an offline pack for an
+        asset, and adds the pack to the project as a local layer once
+        complete
+        """
+        # pylint: disable=import-outside-toplevel
+        from .offline_pack_dialog import OfflinePackDialog
+        # pylint: enable=import-outside-toplevel
+
+        dialog = OfflinePackDialog(asset)
+        if not dialog.exec_() or not dialog.directory():
+            return
+
+        if OfflinePack.local_source(dialog.directory()):
+            # already downloaded
+            CesiumIonLayerUtils.add_offline_pack_to_project(
+                asset, dialog.directory()
+            )
+            return
+
+        pack = OfflinePack(
+            API_CLIENT,
+            int(asset.id),
+            dialog.directory(),
+            dialog.max_geometric_error()
+        )
+        pack.error_occurred.connect(
+            partial(CesiumIonLayerUtils._offline_pack_error, asset)
+        )
+        CesiumIonLayerUtils._offline_packs.append(pack)
+        CesiumIonLayerUtils._run_background_step(
+            pack,
+            QCoreApplication.translate(
+                'CesiumIonLayerUtils', 'Downloading offline pack for {}'
+            ).format(asset.name),
+            partial(CesiumIonLayerUtils._offline_pack_finished,
+                    pack, asset)
+        )
+        pack.start()
+
+    @staticmethod
+    def _offline_pack_finished(pack: OfflinePack, asset: Asset):
+        """
+        Called when downloading an offline pack has finished
+        """
+        if pack in CesiumIonLayerUtils._offline_packs:
+            CesiumIonLayerUtils._offline_packs.remove(pack)
+            pack.deleteLater()
+
+        if pack.is_complete():
+            CesiumIonLayerUtils.add_offline_pack_to_project(
+                asset, pack.directory()
+            )
+
+    @staticmethod
+    def _offline_pack_error(asset: Asset, error: str):
+        """
+        Called when an offline pack download reports an error
+        """
+        iface.messageBar().pushWarning(
+            QCoreApplication.translate(
+                'CesiumIonLayerUtils', 'Cesium ion'
+            ),
+            QCoreApplication.translate(
+                'CesiumIonLayerUtils', 'Could not download {}: {}'
+            ).format(asset.name, error)
+        )
+
+    @staticmethod
+    def add_offline_pack_to_project(asset: Asset, directory: str) -> bool:
+        """
+        Adds a completed offline pack to the project as a local layer.
+
+        Returns True if the layer was successfully added.
+        """
+        source = OfflinePack.local_source(directory)
+        manifest = OfflinePack.read_manifest(directory)
+        if source is None or manifest is None:
+            return False
+
+        try:
+            provider = AssetType.from_string(
+                manifest.get('type') or ''
+            ).to_qgis_data_provider()
+        except KeyError:
+            provider = None
+        if provider is None:
+            return False
+
+        layer = QgsTiledSceneLayer(
+            source,
+            QCoreApplication.translate(
+                'CesiumIonLayerUtils', '{} (Offline)'
+            ).format(asset.name),
+            provider
+        )
+        if not layer.isValid():
+            iface.messageBar().pushWarning(
+                QCoreApplication.translate(
+                    'CesiumIonLayerUtils', 'Cesium ion'
+                ),
+                QCoreApplication.translate(
+                    'CesiumIonLayerUtils', 'Could not load: {}'
+                ).format(layer.name())
+            )
+            return False
+
+        QgsProject.instance().addMapLayer(layer)
+        return True
+
+    @staticmethod
+    def token_for_assets(new_token_name: str,
+                         assets: List[Asset]) -> Optional[Token]:
+        """
+        Returns a token granting access to all the specified assets.
+
+        An existing token restricted to assets including all the specified
+        assets is used if possible. Otherwise a new token restricted to
+        the assets is created. Tokens granting access to all assets, such
+        as the default token, are never used, as the token is stored in
+        the project.
+
+        This may block while the token listing is retrieved, so should be
+        called from a background thread.
+        """
+        asset_ids = [int(asset.id) for asset in assets]
+        if PluginSettings.reuse_existing_tokens():
+            existing = API_CLIENT.token_index().find(
+                asset_ids, CesiumIonLayerUtils.REQUIRED_TOKEN_SCOPES
+            )
+            if existing is not None:
+                return existing
+
+        return API_CLIENT.create_token(
+            new_token_name,
+            scopes=CesiumIonLayerUtils.NEW_TOKEN_SCOPES,
+            asset_ids=asset_ids
+        )
+
     @staticmethod
     def add_asset_interactive(asset: Asset):
         """
         Interactively allows users to add an asset to a project
         """
+        CesiumIonLayerUtils.add_assets_interactive([asset])
+
+    @staticmethod
+    def add_assets_interactive(assets: List[Asset]):
+        """
+        Interactively allows users to add multiple assets to a project.
+
+        The token is selected once for all the assets, and at most one
+        new token is created, covering all the assets. New tokens are
+        found or created by the layer creation task.
+        """
+        if not assets:
+            return
+
         # pylint: disable=import-outside-toplevel
         from .add_asset_dialog import AddAssetDialog
         # pylint: enable=import-outside-toplevel
 
-        dialog = AddAssetDialog()
+        # warm the network cache while the user selects a token
+        CesiumIonLayerUtils.prefetch_assets(assets)
+
+        dialog = AddAssetDialog(asset_count=len(assets))
         if not dialog.exec_():
+            CesiumIonLayerUtils.cancel_prefetch()
             return
 
         if dialog.existing_token():
-            CesiumIonLayerUtils.add_asset_with_token(
-                asset, dialog.existing_token()
+            CesiumIonLayerUtils.add_assets_with_token(
+                assets, dialog.existing_token()
             )
         else:
-            new_token = API_CLIENT.create_token(
-                dialog.new_token_name(),
-                scopes=['assets:list', 'assets:read'],
-                asset_ids=[int(asset.id)]
-            )
-            if new_token:
-                CesiumIonLayerUtils.add_asset_with_token(
-                    asset, new_token.token
+            CesiumIonLayerUtils.add_assets_with_token(
+                assets, None,
+                token_provider=partial(
+                    CesiumIonLayerUtils.token_for_assets,
+                    dialog.new_token_name(), assets
                 )
+            )
 
     @staticmethod
     def add_asset_by_id_interactive():
@@ -184,11 +877,96 @@ class CesiumIonLayerUtils:
         """
         Adds an asset with the specified token
         """
-        ds = asset.as_qgis_data_source(token)
-        provider = asset.type.to_qgis_data_provider()
-        iface.addTiledSceneLayer(
-            ds, asset.name, provider
+        CesiumIonLayerUtils.add_assets_with_token([asset], token)
+
+    @staticmethod
+    def add_assets_with_token(assets: List[Asset], token: Optional[str],
+                              token_provider: Optional[
+                                  Callable[[], Optional[Token]]] = None):
+        """
+        Adds multiple assets with the specified token, or with the token
+        returned by token_provider.
+
+        The layers are created in a background task, so that resolving
+        the assets (and the token) doesn't block the interface, and are
+        added to the project once they are ready.
+        """
+        if not assets:
+            return
+
+        task = CreateLayersTask(assets, token,
+                                CesiumIonLayerUtils.tile_proxy_url(),
+                                token_provider=token_provider)
+        task.layers_created.connect(
+            CesiumIonLayerUtils._task_layers_created
+        )
+        task.taskCompleted.connect(
+            partial(CesiumIonLayerUtils._release_task, task)
+        )
+        task.taskTerminated.connect(
+            partial(CesiumIonLayerUtils._release_task, task)
+        )
+        # keep the Python task object alive while the task manager runs it
+        CesiumIonLayerUtils._tasks.append(task)
+        QgsApplication.taskManager().addTask(task)
+
+    @staticmethod
+    def _release_task(task: CreateLayersTask):
+        """
+        Releases a finished layer creation task
+        """
+        if task in CesiumIonLayerUtils._tasks:
+            CesiumIonLayerUtils._tasks.remove(task)
+
+    @staticmethod
+    def _task_layers_created(layers: List[QgsMapLayer],
+                             invalid_names: List[str]):
+        """
+        Called when a layer creation task has created layers
+        """
+        if invalid_names:
+            iface.messageBar().pushWarning(
+                QCoreApplication.translate(
+                    'CesiumIonLayerUtils', 'Cesium ion'
+                ),
+                QCoreApplication.translate(
+                    'CesiumIonLayerUtils', 'Could not load: {}'
+                ).format(', '.join(invalid_names))
+            )
+
+        if len(layers) == 1:
+            QgsProject.instance().addMapLayer(layers[0])
+        elif layers:
+            CesiumIonLayerUtils.add_layers_to_project(layers)
+
+    @staticmethod
+    def add_layers_to_project(layers: List[QgsMapLayer],
+                              group_name: Optional[str] = None):
+        """
+        Adds multiple layers to the current project in a single
+        operation, under a new layer tree group.
+
+        The group is populated before it is inserted into the layer tree
+        and the map canvas is frozen while the layers are added, so that
+        the layer tree and canvas are only updated once.
+        """
+        project = QgsProject.instance()
+        group = QgsLayerTreeGroup(
+            group_name or QCoreApplication.translate(
+                'CesiumIonLayerUtils', 'Cesium ion Assets'
+            )
         )
+        for layer in layers:
+            group.addLayer(layer)
+
+        canvas = iface.mapCanvas()
+        canvas.freeze(True)
+        try:
+            project.addMapLayers(layers, False)
+            project.layerTreeRoot().insertChildNode(0, group)
+        finally:
+            canvas.freeze(False)
+        canvas.refresh()
 
 
 class CesiumIonDataItemGuiProvider(QgsDataItemGuiProvider):
@@ -216,17 +994,48 @@ class CesiumIonDataItemGuiProvider(QgsDataItemGuiProvider):
 
     def populateContextMenu(self, item, menu, selectedItems, context):
         if isinstance(item, IonAssetItem):
-            add_to_project_action = QAction(self.tr('Add Asset to Project…'),
-                                            menu)
-            add_to_project_action.triggered.connect(
-                partial(self._add_asset, item.asset))
+            selected_assets = [selected.asset for selected in selectedItems
+                               if isinstance(selected, IonAssetItem)]
+            if len(selected_assets) > 1:
+                add_to_project_action = QAction(
+                    self.tr('Add {} Assets to Project…').format(
+                        len(selected_assets)
+                    ),
+                    menu)
+                add_to_project_action.triggered.connect(
+                    partial(self._add_assets, selected_assets))
+            else:
+                add_to_project_action = QAction(
+                    self.tr('Add Asset to Project…'), menu)
+                add_to_project_action.triggered.connect(
+                    partial(self._add_asset, item.asset))
             menu.addAction(add_to_project_action)
+
+            if len(selected_assets) <= 1 and \
+                    item.asset.type.to_qgis_data_provider() is not None:
+                prefetch_action = QAction(
+                    self.tr('Prefetch Tiles for Area…'), menu)
+                prefetch_action.triggered.connect(
+                    partial(self._prefetch_area, item.asset))
+                menu.addAction(prefetch_action)
+
+                pack_action = QAction(
+                    self.tr('Download Offline Pack…'), menu)
+                pack_action.triggered.connect(
+                    partial(self._download_offline_pack, item.asset))
+                menu.addAction(pack_action)
         elif isinstance(item, IonRootItem):
             add_by_id_action = QAction(self.tr('Add Asset by ID…'),
                                        menu)
             add_by_id_action.triggered.connect(self._add_asset_by_id)
             menu.addAction(add_by_id_action)
 
+            if AssetTable.is_available():
+                menu.addMenu(self._create_sort_menu(item, menu))
+
+            if PluginSettings.tile_cache_enabled():
+                menu.addMenu(self._create_tile_cache_menu(menu))
+
     # pylint: enable=missing-docstring,unused-argument
 
     def _add_asset(self, asset: Asset):
@@ -235,12 +1044,110 @@ class CesiumIonDataItemGuiProvider(QgsDataItemGuiProvider):
         """
         CesiumIonLayerUtils.add_asset_interactive(asset)
 
+    def _add_assets(self, assets: List[Asset]):
+        """
+        Adds multiple assets to the project
+        """
+        CesiumIonLayerUtils.add_assets_interactive(assets)
+
+    def _prefetch_area(self, asset: Asset):
+        """
+        Prefetches the tiles of an asset for an area of interest
+        """
+        CesiumIonLayerUtils.prefetch_area_interactive(asset)
+
+    def _download_offline_pack(self, asset: Asset):
+        """
+        Downloads an offline pack for an asset
+        """
+        CesiumIonLayerUtils.download_offline_pack_interactive(asset)
+
     def _add_asset_by_id(self):
         """
         Interactively adds an asset by ID
         """
         CesiumIonLayerUtils.add_asset_by_id_interactive()
 
+    def _create_tile_cache_menu(self, parent) -> QMenu:
+        """
+        Creates a menu for inspecting and clearing the tile cache
+        """
+        cache_menu = QMenu(self.tr('Tile Cache'), parent)
+        if PluginSettings.tile_proxy_mode() != 'local':
+            # layers only read the dedicated cache through the local proxy
+            inactive_action = QAction(
+                self.tr('Only Used With the Local Tile Proxy'), cache_menu
+            )
+            inactive_action.setEnabled(False)
+            cache_menu.addAction(inactive_action)
+            cache_menu.addSeparator()
+        statistics_action = QAction(self.tr('Show Statistics…'),
+                                    cache_menu)
+        statistics_action.triggered.connect(self._show_tile_cache_statistics)
+        cache_menu.addAction(statistics_action)
+        clear_action = QAction(self.tr('Clear Tile Cache'), cache_menu)
+        clear_action.triggered.connect(self._clear_tile_cache)
+        cache_menu.addAction(clear_action)
+        return cache_menu
+
+    def _show_tile_cache_statistics(self):
+        """
+        Shows the tile cache statistics
+        """
+        # applies the configured maximum size
+        cache = CesiumIonLayerUtils.tile_cache() or TILE_CACHE
+        statistics = cache.statistics()
+        megabyte = 1024 * 1024
+        QMessageBox.information(
+            iface.mainWindow(),
+            self.tr('Tile Cache Statistics'),
+            self.tr('Size: {:.1f} MB of {:.0f} MB ({} tiles)\n'
+                    'Hits: {}\n'
+                    'Misses: {}\n'
+                    'Hit ratio: {:.0%}\n'
+                    'Insertions: {}\n'
+                    'Evictions: {} ({:.1f} MB)\n\n'
+                    'Location: {}\n\n'
+                    'Layers only load tiles from this cache while they '
+                    'load through the local tile proxy.').format(
+                statistics.size_bytes / megabyte,
+                statistics.max_size_bytes / megabyte,
+                statistics.entry_count,
+                statistics.hits,
+                statistics.misses,
+                statistics.hit_ratio(),
+                statistics.insertions,
+                statistics.evictions,
+                statistics.evicted_bytes / megabyte,
+                cache.directory()
+            )
+        )
+
+    def _clear_tile_cache(self):
+        """
+        Clears the tile cache
+        """
+        TILE_CACHE.clear()
+        TILE_CACHE.reset_statistics()
+
+    def _create_sort_menu(self, item: IonRootItem, parent) -> QMenu:
+        """
+        Creates a menu for selecting the sort order of assets
+        """
+        sort_menu = QMenu(self.tr('Sort Assets By'), parent)
+        action_group = QActionGroup(sort_menu)
+        current_column = item.sort_column()
+        for column, label in (('name', self.tr('Name')),
+                              ('date_added', self.tr('Date Added')),
+                              ('bytes', self.tr('Size')),
+                              ('type', self.tr('Type'))):
+            action = QAction(label, action_group)
+            action.setCheckable(True)
+            action.setChecked(column == current_column)
+            action.triggered.connect(partial(item.set_sort_column, column))
+            sort_menu.addAction(action)
+        return sort_menu
+
 
 class CesiumIonDropHandler(QgsCustomDropHandler):
     """
@@ -258,4 +1165,20 @@ class CesiumIonDropHandler(QgsCustomDropHandler):
 
         CesiumIonLayerUtils.add_asset_interactive(asset)
 
+    def handleMimeDataV2(self, data):
+        # handle drops consisting only of ion assets as a single batch,
+        # instead of one handleCustomUriDrop call per asset
+        if not QgsMimeDataUtils.isUriList(data):
+            return False
+
+        uris = QgsMimeDataUtils.decodeUriList(data)
+        if not uris or any(uri.providerKey != 'cesium_ion'
+                           for uri in uris):
+            return False
+
+        CesiumIonLayerUtils.add_assets_interactive([
+            Asset.from_qgis_drop_uri(uri.name, uri.uri) for uri in uris
+        ])
+        return True
+
     # pylint: enable=missing-docstring
@@ -0,0 +1,95 @@
+"""
+Offline pack dialog
+"""
+from typing import Optional
+
+from qgis.PyQt.QtWidgets import (
+    QDialog,
+    QWidget,
+    QVBoxLayout,
+    QFormLayout,
+    QLabel,
+    QDialogButtonBox
+)
+from qgis.gui import (
+    QgsDoubleSpinBox,
+    QgsFileWidget,
+    QgsGui
+)
+
+from ..core import Asset
+from ..core.offline_pack import OfflinePack
+
+
+class OfflinePackDialog(QDialog):
+    """
+    A custom dialog for selecting the location and level of detail of an
+    offline pack
+    """
+
+    def __init__(self, asset: Asset, parent: Optional[QWidget] = None):
+        super().__init__(parent)
+
+        self.setObjectName('OfflinePackDialog')
+        QgsGui.enableAutoGeometryRestore(self)
+
+        self.setWindowTitle(
+            self.tr('Download Offline Pack for {}').format(asset.name)
+        )
+
+        vl = QVBoxLayout()
+        label = QLabel(
+            self.tr('The asset will be downloaded to the selected folder '
+                    'and added to the project as a local layer. '
+                    'Interrupted downloads resume when the pack is '
+                    'downloaded again.')
+        )
+        label.setWordWrap(True)
+        vl.addWidget(label)
+
+        form = QFormLayout()
+        self.directory_widget = QgsFileWidget()
+        self.directory_widget.setStorageMode(QgsFileWidget.GetDirectory)
+        self.directory_widget.setFilePath(
+            OfflinePack.default_directory(asset.id)
+        )
+        form.addRow(self.tr('Folder'), self.directory_widget)
+
+        self.error_spin = QgsDoubleSpinBox()
+        self.error_spin.setDecimals(2)
+        self.error_spin.setRange(0, 100000)
+        self.error_spin.setSpecialValueText(self.tr('Full detail'))
+        self.error_spin.setClearValueMode(
+            QgsDoubleSpinBox.MinimumValue
+        )
+        self.error_spin.setValue(0)
+        self.error_spin.setSuffix(self.tr(' m'))
+        self.error_spin.setToolTip(
+            self.tr('Limits the pack to the level of detail with this '
+                    'geometric error, to reduce its size.')
+        )
+        form.addRow(self.tr('Geometric error'), self.error_spin)
+        vl.addLayout(form)
+
+        self.button_box = QDialogButtonBox(
+            QDialogButtonBox.Ok | QDialogButtonBox.Cancel
+        )
+        self.button_box.accepted.connect(self.accept)
+        self.button_box.rejected.connect(self.reject)
+        vl.addWidget(self.button_box)
+
+        self.setLayout(vl)
+
+    def directory(self) -> str:
+        """
+        Returns the selected pack directory
+        """
+        return self.directory_widget.filePath()
+
+    def max_geometric_error(self) -> Optional[float]:
+        """
+        Returns the target geometric error in meters, or None for full
+        detail
+        """
+        value = self.error_spin.value()
+        return value if value > 0 else None
@@ -11,12 +11,9 @@ from qgis.PyQt.QtWidgets import (
     QWidget
 )
 
-from qgis.core import (
-    QgsNetworkAccessManager
-)
-
 from .gui_utils import GuiUtils
 from ..core import API_CLIENT
+from ..core.request_scheduler import RequestPriority
 
 WIDGET, _ = uic.loadUiType(GuiUtils.get_ui_file_path('select_token.ui'))
 
@@ -49,15 +46,16 @@ class SelectTokenWidget(QWidget, WIDGET):
         self.combo_existing.currentIndexChanged.connect(self._validate)
         self.edit_manual.textChanged.connect(self._validate)
 
-        req = API_CLIENT.list_tokens_request()
-        self._list_tokens_reply = QgsNetworkAccessManager.instance().get(req)
+        self._list_tokens_reply = API_CLIENT.list_tokens(
+            priority=RequestPriority.Interactive
+        )
         self._list_tokens_reply.finished.connect(self._reply_finished)
 
     def _reply_finished(self):
         """
         Called when the list tokens reply is finished
         """
-        tokens = API_CLIENT.parse_list_tokens_reply(self._list_tokens_reply)
+        tokens = self._list_tokens_reply.result() or []
         for token in tokens:
             self.combo_existing.addItem(token.name, token.token)
 
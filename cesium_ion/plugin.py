@@ -2,12 +2,20 @@
 Cesium ion QGIS plugin
 """
 import os
-from typing import Optional
+from functools import partial
+from typing import (
+    Optional,
+    List,
+    Tuple,
+    Callable
+)
 
 from qgis.PyQt import sip
 from qgis.PyQt.QtCore import (
     QObject,
-    QCoreApplication
+    QCoreApplication,
+    QItemSelectionModel,
+    QModelIndex
 )
 from qgis.PyQt.QtWidgets import (
     QPushButton,
@@ -16,19 +24,34 @@ from qgis.PyQt.QtWidgets import (
 from qgis.core import (
     Qgis,
     QgsApplication,
-    QgsAuthMethodConfig
+    QgsAuthMethodConfig,
+    QgsMessageLog,
+    QgsPathResolver,
+    QgsProject
 )
 from qgis.gui import (
     QgsGui,
     QgisInterface,
-    QgsMessageBarItem
+    QgsMessageBarItem,
+    QgsBrowserTreeView
 )
 
-from .core import API_CLIENT
+from .core import (
+    API_CLIENT,
+    PluginSettings
+)
+from .core.project_warmup import ProjectWarmup
+from .core.tile_proxy import (
+    PROXIED_SOURCES,
+    TILE_PROXY
+)
 from .gui import (
     CesiumIonDataItemProvider,
     CesiumIonDataItemGuiProvider,
-    CesiumIonDropHandler
+    CesiumIonDropHandler,
+    CesiumIonLayerUtils,
+    IonAssetItem,
+    IonRootItem
 )
 
 
@@ -47,6 +70,15 @@ class CesiumIonPlugin(QObject):
         self.drop_handler: Optional[CesiumIonDropHandler] = None
 
         self._current_message_bar_item: Optional[QgsMessageBarItem] = None
+        self._browser_view_connections: List[
+            Tuple[QgsBrowserTreeView, Callable]
+        ] = []
+        self._browser_selection_connections: List[
+            Tuple[QItemSelectionModel, Callable]
+        ] = []
+        self._project_warmup: Optional[ProjectWarmup] = None
+        self._path_preprocessor_id: Optional[str] = None
+        self._path_writer_id: Optional[str] = None
 
     # qgis plugin interface
     # pylint: disable=missing-function-docstring
@@ -55,6 +87,16 @@ class CesiumIonPlugin(QObject):
         if not self._create_oauth_config():
             return
 
+        scheduler = API_CLIENT.request_scheduler()
+        scheduler.set_rate(PluginSettings.api_request_rate())
+        scheduler.set_max_retries(PluginSettings.api_max_retries())
+        hedging_policy = API_CLIENT.hedging_policy()
+        hedging_policy.set_enabled(PluginSettings.hedge_api_requests())
+        hedging_policy.set_percentile(PluginSettings.hedge_percentile())
+        # load the stored asset catalog in the background, so that it is
+        # ready by the time the browser is expanded
+        API_CLIENT.asset_catalog().load()
+
         self.data_item_provider = CesiumIonDataItemProvider()
         QgsApplication.dataItemProviderRegistry().addProvider(
             self.data_item_provider
@@ -68,6 +110,23 @@ class CesiumIonPlugin(QObject):
         self.drop_handler = CesiumIonDropHandler()
         self.iface.registerCustomDropHandler(self.drop_handler)
 
+        self._connect_browser_views()
+
+        QgsProject.instance().readProject.connect(self._project_read)
+
+        if PluginSettings.tile_proxy_mode() == 'local':
+            self._start_tile_proxy()
+
+        # projects store ion:// sources, which are rewritten to load
+        # through the tile proxy as layers are loaded, and restored when
+        # projects are saved
+        self._path_preprocessor_id = QgsPathResolver.setPathPreprocessor(
+            self._proxied_source
+        )
+        self._path_writer_id = QgsPathResolver.setPathWriter(
+            PROXIED_SOURCES.original
+        )
+
     def unload(self):
         if self.data_item_gui_provider and \
                 not sip.isdeleted(self.data_item_gui_provider):
@@ -86,8 +145,193 @@ class CesiumIonPlugin(QObject):
         self.iface.unregisterCustomDropHandler(self.drop_handler)
         self.drop_handler = None
 
+        for view, slot in self._browser_view_connections:
+            if not sip.isdeleted(view):
+                view.collapsed.disconnect(slot)
+        self._browser_view_connections = []
+        for selection_model, slot in self._browser_selection_connections:
+            if not sip.isdeleted(selection_model):
+                selection_model.currentChanged.disconnect(slot)
+        self._browser_selection_connections = []
+        CesiumIonLayerUtils.cancel_prefetch()
+
+        self._cancel_project_warmup()
+        if self._path_preprocessor_id is not None:
+            QgsPathResolver.removePathPreprocessor(
+                self._path_preprocessor_id
+            )
+            self._path_preprocessor_id = None
+        if self._path_writer_id is not None:
+            QgsPathResolver.removePathWriter(self._path_writer_id)
+            self._path_writer_id = None
+        TILE_PROXY.stop()
+        try:
+            QgsProject.instance().readProject.disconnect(self._project_read)
+        except TypeError:
+            # initGui did not complete
+            pass
+
     # pylint: enable=missing-function-docstring
 
+    def _connect_browser_views(self):
+        """
+        Connects to the browser panels, so that we can react to the
+        Cesium ion root item being collapsed
+        """
+        for view in self.iface.mainWindow().findChildren(QgsBrowserTreeView):
+            slot = partial(self._browser_item_collapsed, view)
+            view.collapsed.connect(slot)
+            self._browser_view_connections.append((view, slot))
+
+            selection_model = view.selectionModel()
+            if selection_model is not None:
+                slot = partial(self._browser_current_changed, view)
+                selection_model.currentChanged.connect(slot)
+                self._browser_selection_connections.append(
+                    (selection_model, slot)
+                )
+
+    @staticmethod
+    def _browser_item_collapsed(view: QgsBrowserTreeView,
+                                index: QModelIndex):
+        """
+        Called when an item in a browser panel is collapsed
+        """
+        model = view.model()
+        if not hasattr(model, 'dataItem'):
+            return
+
+        item = model.dataItem(index)
+        if isinstance(item, IonRootItem) and item.is_populating():
+            # discard the partial listing, so that it will be fetched
+            # again when the item is next expanded
+            item.depopulate()
+
+    @staticmethod
+    def _browser_current_changed(view: QgsBrowserTreeView,
+                                 current: QModelIndex,
+                                 _: QModelIndex):
+        """
+        Called when the current item in a browser panel changes, to
+        prefetch the tiles for selected assets
+        """
+        model = view.model()
+        if not hasattr(model, 'dataItem'):
+            return
+
+        item = model.dataItem(current)
+        if isinstance(item, IonAssetItem):
+            CesiumIonLayerUtils.prefetch_assets([item.asset])
+
+    def _start_tile_proxy(self):
+        """
+        Starts the local tile proxy
+        """
+        # apply the configured tile cache size
+        CesiumIonLayerUtils.tile_cache()
+        shared = PluginSettings.share_tile_proxy()
+        host = '0.0.0.0' if shared else '127.0.0.1'
+        # other workstations need to know the secret of a shared proxy,
+        # so a shared proxy may use a configured secret
+        secret = PluginSettings.tile_proxy_secret() if shared else None
+        if not TILE_PROXY.start(host, PluginSettings.tile_proxy_port(),
+                                secret):
+            self.iface.messageBar().pushWarning(
+                self.tr('Cesium ion'),
+                self.tr('Could not start the tile proxy on port {}. '
+                        'Layers will load tiles from Cesium ion directly.'
+                        ).format(PluginSettings.tile_proxy_port())
+            )
+        elif shared:
+            # the secret is not logged, as anyone knowing it can use the
+            # proxy
+            QgsMessageLog.logMessage(
+                'Sharing the tile proxy on port {}. Other workstations '
+                'need the configured tile proxy secret to use it.'.format(
+                    PluginSettings.tile_proxy_port()
+                ) if PluginSettings.tile_proxy_secret() else
+                'Sharing the tile proxy on port {} with a random secret. '
+                'Configure a tile proxy secret so that other workstations '
+                'can use it.'.format(PluginSettings.tile_proxy_port()),
+                'Cesium ion', Qgis.Info
+            )
+
+    @staticmethod
+    def _proxied_source(source: str) -> str:
+        """
+        Rewrites ion:// layer sources to load through the tile proxy, if
+        a tile proxy is in use
+        """
+        if not source.startswith('ion://'):
+            return source
+        return PROXIED_SOURCES.proxied(
+            source, CesiumIonLayerUtils.tile_proxy_url()
+        )
+
+    def _project_read(self):
+        """
+        Called when a project has been read, to check why any of its ion
+        layers failed to load
+        """
+        self._cancel_project_warmup()
+        if not PluginSettings.warm_up_project_layers():
+            return
+
+        warmup = ProjectWarmup(
+            API_CLIENT,
+            list(QgsProject.instance().mapLayers().values()),
+            parent=self
+        )
+        if not warmup.layer_count():
+            warmup.deleteLater()
+            return
+
+        self._project_warmup = warmup
+        warmup.finished.connect(self._project_warmup_finished)
+        warmup.start()
+
+    def _cancel_project_warmup(self):
+        """
+        Cancels any in-progress project warm-up
+        """
+        if self._project_warmup is None:
+            return
+
+        warmup = self._project_warmup
+        self._project_warmup = None
+        warmup.finished.disconnect(self._project_warmup_finished)
+        warmup.cancel()
+        warmup.deleteLater()
+
+    def _project_warmup_finished(self):
+        """
+        Reports the ion layers which failed to load, as a single
+        message
+        """
+        warmup = self._project_warmup
+        if warmup is None or self.sender() is not warmup:
+            return
+
+        self._project_warmup = None
+        warmup.deleteLater()
+
+        failures = warmup.failures()
+        if not failures:
+            return
+
+        details = '\n'.join(
+            '{}: {}'.format(', '.join(layer_names), reason)
+            for layer_names, reason in failures
+        )
+        layer_count = sum(len(layer_names) for layer_names, _ in failures)
+        self.iface.messageBar().pushMessage(
+            self.tr('Cesium ion'),
+            self.tr('{} layers could not be accessed').format(layer_count),
+            details,
+            Qgis.MessageLevel.Warning,
+            0
+        )
+
     @staticmethod
     def tr(message):
         """Get the translation for a string using Qt translation API.
@@ -0,0 +1,185 @@
+# coding=utf-8
+"""API client Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2024 by Nyall Dawson'
+__date__ = '01/03/2024'
+__copyright__ = 'Copyright 2024, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import threading
+import time
+import unittest
+from unittest import mock
+
+from qgis.PyQt.QtNetwork import QNetworkReply
+
+from ..core import CesiumIonApiClient
+from ..core.circuit_breaker import CircuitBreaker
+from ..core.response_cache import ResponseCache
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+class ApiClientTest(unittest.TestCase):
+    """Test API client works."""
+
+    def test_request_headers(self):
+        """
+        Test that per-request headers don't leak into other requests
+        """
+        client = CesiumIonApiClient()
+        request = client._build_request(  # pylint: disable=protected-access
+            client.CREATE_TOKEN_ENDPOINT,
+            {'Content-Type': 'application/json'}
+        )
+        self.assertEqual(request.rawHeader(b'Content-Type').data(),
+                         b'application/json')
+        self.assertEqual(request.rawHeader(b'accept').data(),
+                         b'application/json')
+
+        request = client._build_request(  # pylint: disable=protected-access
+            client.LIST_ASSETS_ENDPOINT
+        )
+        self.assertFalse(request.hasRawHeader(b'Content-Type'))
+        self.assertNotIn('Content-Type', client.headers)
+
+        # the default headers can't be modified through the copy
+        headers = client.headers
+        headers['x-test'] = 'a'
+        self.assertNotIn('x-test', client.headers)
+
+    def test_concurrent_requests(self):
+        """
+        Test building requests concurrently from several threads
+        """
+        client = CesiumIonApiClient()
+        errors = []
+
+        def build(thread_index: int):
+            for _ in range(200):
+                # pylint: disable=protected-access
+                request = client._build_request(
+                    client.LIST_ASSETS_ENDPOINT,
+                    {'x-thread': str(thread_index)}
+                )
+                # pylint: enable=protected-access
+                if request.rawHeader(b'x-thread').data() != \
+                        str(thread_index).encode():
+                    errors.append(thread_index)
+
+        threads = [threading.Thread(target=build, args=(i,))
+                   for i in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertFalse(errors)
+        self.assertNotIn('x-thread', client.headers)
+
+    def test_coalesced_blocking(self):
+        """
+        Test identical blocking calls from several threads are shared
+        """
+        client = CesiumIonApiClient()
+        self.assertEqual(client.in_flight_request_count(), 0)
+
+        started = threading.Event()
+        release = threading.Event()
+        calls = []
+
+        def call():
+            calls.append(threading.get_ident())
+            started.set()
+            release.wait()
+            return ['result']
+
+        results = []
+
+        def run():
+            # pylint: disable=protected-access
+            results.append(client._coalesced_blocking(('key',), call))
+            # pylint: enable=protected-access
+
+        first = threading.Thread(target=run)
+        first.start()
+        started.wait()
+        waiters = [threading.Thread(target=run) for _ in range(3)]
+        for thread in waiters:
+            thread.start()
+
+        # the main thread never waits on other threads
+        # pylint: disable=protected-access
+        self.assertEqual(
+            client._coalesced_blocking(('key',), lambda: ['main']),
+            ['main']
+        )
+        # pylint: enable=protected-access
+
+        # give the waiting threads time to join the in-flight call
+        time.sleep(0.2)
+        release.set()
+        for thread in [first] + waiters:
+            thread.join()
+
+        self.assertEqual(results, [['result']] * 4)
+        self.assertEqual(len(calls), 1)
+
+        # completed calls are not shared with later calls
+        # pylint: disable=protected-access
+        self.assertEqual(
+            client._coalesced_blocking(('key',), lambda: ['later']),
+            ['later']
+        )
+        # pylint: enable=protected-access
+
+    def test_uncached_requests(self):
+        """
+        Test responses of requests which don't use the cache are never
+        stored
+        """
+        client = CesiumIonApiClient()
+        with mock.patch.object(client, '_submit_get') as submit_get:
+            client.get_asset_endpoint(1)
+            get_request = submit_get.call_args[0][0]
+            self.assertIsNone(get_request.cache_key)
+
+            # pylint: disable=protected-access
+            client._get('/v1/test', None, parser=lambda json_data: json_data)
+            # pylint: enable=protected-access
+            get_request = submit_get.call_args[0][0]
+            self.assertIsNotNone(get_request.cache_key)
+
+    def test_uncached_requests_unreachable(self):
+        """
+        Test requests which don't use the cache are never served expired
+        cached responses while ion is unreachable
+        """
+        client = CesiumIonApiClient()
+        client.response_cache().put(
+            ResponseCache.key(client.ASSET_ENDPOINT.format(1), None),
+            {'url': 'stale'}
+        )
+        for _ in range(CircuitBreaker.DEFAULT_FAILURE_THRESHOLD):
+            client.circuit_breaker().record_failure()
+
+        reply = client.get_asset_endpoint(1)
+        self.assertTrue(reply.is_finished())
+        self.assertEqual(reply.error(),
+                         QNetworkReply.TemporaryNetworkFailureError)
+        self.assertIsNone(reply.result())
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ApiClientTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,174 @@
+# coding=utf-8
+"""Area prefetch Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2024 by Nyall Dawson'
+__date__ = '01/03/2024'
+__copyright__ = 'Copyright 2024, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import os
+import tempfile
+import unittest
+
+from ..core.area_prefetch import (
+    AreaPrefetch,
+    PrefetchPlan,
+    PrefetchStore
+)
+from ..core.tile_bounds import TileArea
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+AREA = TileArea((10.0, 20.0, 10.1, 20.1))
+TILE_URL = 'https://assets.ion.cesium.com/1/tiles/{}.b3dm?v=1'
+
+
+class AreaPrefetchTest(unittest.TestCase):
+    """Test area prefetching works."""
+
+    def test_plan(self):
+        """
+        Test prefetch plan progress
+        """
+        plan = PrefetchPlan(asset_id=1,
+                            urls=[TILE_URL.format(i) for i in range(4)],
+                            estimated_bytes=400)
+        self.assertEqual(plan.remaining_count(), 4)
+        self.assertFalse(plan.is_complete())
+        self.assertEqual(plan.estimated_remaining_bytes(), 400)
+
+        plan.completed.add(TILE_URL.format(0))
+        self.assertEqual(plan.remaining_count(), 3)
+        self.assertEqual(plan.estimated_remaining_bytes(), 300)
+
+        plan.completed.update(plan.urls)
+        self.assertTrue(plan.is_complete())
+
+        self.assertIsNone(
+            PrefetchPlan(asset_id=1).estimated_remaining_bytes()
+        )
+        self.assertTrue(PrefetchPlan(asset_id=1).is_complete())
+
+    def test_plan_key(self):
+        """
+        Test plan keys identify the asset, area and geometric error
+        """
+        key = PrefetchStore.plan_key(1, AREA, 10)
+        self.assertEqual(PrefetchStore.plan_key(1, AREA, 10), key)
+        self.assertNotEqual(PrefetchStore.plan_key(2, AREA, 10), key)
+        self.assertNotEqual(PrefetchStore.plan_key(1, AREA, 5), key)
+        self.assertNotEqual(
+            PrefetchStore.plan_key(1, TileArea((0, 0, 1, 1)), 10), key
+        )
+        self.assertNotEqual(PrefetchStore.plan_key(1, AREA, 10, 'a'), key)
+
+    def test_store(self):
+        """
+        Test storing and loading plans
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = PrefetchStore(os.path.join(temp_dir, 'prefetch'))
+            key = PrefetchStore.plan_key(1, AREA, 10)
+            self.assertIsNone(store.load(key))
+
+            plan = PrefetchPlan(asset_id=1,
+                                urls=[TILE_URL.format(i) for i in range(3)],
+                                completed={TILE_URL.format(1)},
+                                estimated_bytes=300)
+            self.assertTrue(store.save(key, plan))
+            self.assertEqual(store.load(key), plan)
+
+            store.remove(key)
+            self.assertIsNone(store.load(key))
+            store.remove(key)
+
+    def test_invalid_plan(self):
+        """
+        Test loading invalid stored plans
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = PrefetchStore(temp_dir)
+            store.save('a', PrefetchPlan(asset_id=1))
+            path = os.path.join(temp_dir, os.listdir(temp_dir)[0])
+
+            with open(path, 'wt', encoding='utf8') as f:
+                f.write('{"version": 1, "urls": [')
+            self.assertIsNone(store.load('a'))
+
+            with open(path, 'wt', encoding='utf8') as f:
+                f.write('{"version": 0, "asset_id": 1, "urls": [], '
+                        '"completed": []}')
+            self.assertIsNone(store.load('a'))
+
+            # completed tiles are stored by index
+            with open(path, 'wt', encoding='utf8') as f:
+                f.write('{"version": 1, "asset_id": 1, "urls": ["a"], '
+                        '"completed": [1]}')
+            self.assertIsNone(store.load('a'))
+
+    def test_failed_write(self):
+        """
+        Test a failed write leaves no partial files behind
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = PrefetchStore(temp_dir)
+            store.save('a', PrefetchPlan(asset_id=1))
+            file_name = os.listdir(temp_dir)[0]
+            os.remove(os.path.join(temp_dir, file_name))
+            # a directory in place of the plan file can't be replaced
+            os.makedirs(os.path.join(temp_dir, file_name, 'x'))
+
+            self.assertFalse(store.save('a', PrefetchPlan(asset_id=1)))
+            self.assertEqual(os.listdir(temp_dir), [file_name])
+
+    def test_resume(self):
+        """
+        Test an incomplete stored plan is resumed without traversal
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = PrefetchStore(temp_dir)
+            prefetch = AreaPrefetch(None, 1, AREA, 10, store=store)
+            self.assertFalse(prefetch.is_resumable())
+
+            plan = PrefetchPlan(asset_id=1,
+                                urls=[TILE_URL.format(i) for i in range(4)],
+                                completed={TILE_URL.format(0)},
+                                estimated_bytes=400)
+            store.save(PrefetchStore.plan_key(1, AREA, 10), plan)
+            self.assertTrue(prefetch.is_resumable())
+            # other areas don't share the plan
+            self.assertFalse(
+                AreaPrefetch(None, 1, AREA, 10, 'other',
+                             store=store).is_resumable()
+            )
+
+            planned = []
+            finished = []
+            prefetch.planned.connect(
+                lambda count, size: planned.append((count, size))
+            )
+            prefetch.finished.connect(lambda: finished.append(True))
+            prefetch.plan()
+            self.assertEqual(planned, [(3, 300)])
+            self.assertEqual(finished, [True])
+            self.assertEqual(prefetch.current_plan(), plan)
+
+            # completed plans are planned again
+            plan.completed.update(plan.urls)
+            store.save(PrefetchStore.plan_key(1, AREA, 10), plan)
+            self.assertFalse(prefetch.is_resumable())
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(AreaPrefetchTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,161 @@
+# coding=utf-8
+"""Asset and token Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2024 by Nyall Dawson'
+__date__ = '01/03/2024'
+__copyright__ = 'Copyright 2024, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import unittest
+
+from qgis.PyQt.QtCore import QDateTime
+
+from ..core import (
+    Asset,
+    AssetType,
+    Status,
+    Token
+)
+from ..core.ion_source import IonDataSource
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+class AssetTest(unittest.TestCase):
+    """Test Asset and Token work."""
+
+    ASSET_JSON = {
+        'id': 123,
+        'name': 'Test asset',
+        'description': 'A test',
+        'type': '3DTILES',
+        'bytes': 1024,
+        'dateAdded': '2023-08-01T10:20:30.000Z',
+        'status': 'COMPLETE',
+        'percentComplete': 100,
+        'archivable': True,
+        'exportable': False
+    }
+
+    TOKEN_JSON = {
+        'id': 'abc',
+        'name': 'Test token',
+        'token': 'secret',
+        'dateAdded': '2023-08-01T10:20:30.000Z',
+        'dateModified': '2023-08-02T10:20:30.000Z',
+        'assetIds': [1, 2],
+        'isDefault': False,
+        'scopes': ['assets:read']
+    }
+
+    def test_asset_from_json(self):
+        """
+        Test creating assets from JSON
+        """
+        asset = Asset.from_json(self.ASSET_JSON)
+        self.assertEqual(asset.id, 123)
+        self.assertEqual(asset.name, 'Test asset')
+        self.assertEqual(asset.description, 'A test')
+        self.assertIsNone(asset.attribution)
+        self.assertEqual(asset.type, AssetType.Tiles3D)
+        self.assertEqual(asset.status, Status.Complete)
+        self.assertEqual(asset.bytes, 1024)
+        self.assertIsInstance(asset.date_added, QDateTime)
+        self.assertEqual(asset.date_added.date().day(), 1)
+        self.assertEqual(asset.percent_complete, 100)
+        self.assertTrue(asset.archivable)
+        self.assertFalse(asset.exportable)
+
+    def test_asset_interning(self):
+        """
+        Test that identical JSON records share an asset instance
+        """
+        asset = Asset.from_json(self.ASSET_JSON)
+        self.assertIs(Asset.from_json(dict(self.ASSET_JSON)), asset)
+
+        renamed = dict(self.ASSET_JSON)
+        renamed['name'] = 'Renamed'
+        renamed_asset = Asset.from_json(renamed)
+        self.assertIsNot(renamed_asset, asset)
+        self.assertNotEqual(renamed_asset, asset)
+
+    def test_asset_to_json(self):
+        """
+        Test converting assets back to JSON
+        """
+        asset = Asset.from_json(self.ASSET_JSON)
+        self.assertEqual(asset.to_json(), self.ASSET_JSON)
+        # decoded values are converted back to their raw form
+        self.assertEqual(asset.type, AssetType.Tiles3D)
+        self.assertEqual(asset.status, Status.Complete)
+        self.assertEqual(Asset.from_json(asset.to_json()), asset)
+        self.assertEqual(asset.to_json()['type'], '3DTILES')
+        self.assertEqual(asset.to_json()['status'], 'COMPLETE')
+
+    def test_asset_equality(self):
+        """
+        Test comparing assets
+        """
+        asset = Asset(id='1', name='a', type=AssetType.Terrain,
+                      status=Status.Complete)
+        self.assertEqual(
+            asset,
+            Asset(id='1', name='a', type='TERRAIN', status='COMPLETE')
+        )
+        self.assertNotEqual(
+            asset,
+            Asset(id='2', name='a', type=AssetType.Terrain,
+                  status=Status.Complete)
+        )
+
+    def test_token_from_json(self):
+        """
+        Test creating tokens from JSON
+        """
+        token = Token.from_json(self.TOKEN_JSON)
+        self.assertEqual(token.id, 'abc')
+        self.assertEqual(token.token, 'secret')
+        self.assertEqual(token.asset_ids, [1, 2])
+        self.assertEqual(token.scopes, ['assets:read'])
+        self.assertEqual(token.date_modified.date().day(), 2)
+        self.assertIsNone(token.date_last_used)
+        self.assertIs(Token.from_json(dict(self.TOKEN_JSON)), token)
+
+    def test_data_source(self):
+        """
+        Test decoding asset data sources
+        """
+        asset = Asset(id='123', name='a', type=AssetType.Tiles3D,
+                      status=Status.Complete)
+        source = IonDataSource.from_source(
+            asset.as_qgis_data_source('abc.def.ghi')
+        )
+        self.assertEqual(source.asset_id, 123)
+        self.assertEqual(source.access_token, 'abc.def.ghi')
+        self.assertIsNone(source.auth_cfg)
+
+        source = IonDataSource.from_source(
+            'ion://?assetId=5&authcfg=cesiion'
+        )
+        self.assertEqual(source.asset_id, 5)
+        self.assertIsNone(source.access_token)
+        self.assertEqual(source.auth_cfg, 'cesiion')
+
+        self.assertIsNone(IonDataSource.from_source('/data/tileset.json'))
+        self.assertIsNone(IonDataSource.from_source('ion://?assetId=x'))
+        self.assertIsNone(IonDataSource.from_source(''))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(AssetTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,130 @@
+# coding=utf-8
+"""Asset table Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2024 by Nyall Dawson'
+__date__ = '01/03/2024'
+__copyright__ = 'Copyright 2024, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import math
+import unittest
+
+from ..core import (
+    Asset,
+    AssetTable,
+    AssetType,
+    Status
+)
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+@unittest.skipIf(not AssetTable.is_available(), 'NumPy is not available')
+class AssetTableTest(unittest.TestCase):
+    """Test AssetTable works."""
+
+    ASSETS_JSON = [
+        {'id': 1, 'name': 'beta', 'type': '3DTILES', 'status': 'COMPLETE',
+         'bytes': 300, 'dateAdded': '2023-01-02T00:00:00.000Z'},
+        {'id': 2, 'name': 'Alpha', 'type': 'TERRAIN', 'status': 'COMPLETE',
+         'bytes': 100, 'dateAdded': '2023-01-03T00:00:00.000Z'},
+        {'id': 3, 'name': 'gamma', 'type': '3DTILES', 'status': 'ERROR',
+         'dateAdded': None},
+        {'id': 4, 'name': 'beta', 'type': 'IMAGERY', 'status': 'COMPLETE',
+         'bytes': 200, 'dateAdded': '2023-01-01T00:00:00.000Z'},
+    ]
+
+    def test_from_json(self):
+        """
+        Test creating tables from JSON
+        """
+        table = AssetTable.from_json(self.ASSETS_JSON)
+        self.assertEqual(len(table), 4)
+        self.assertEqual(list(table.ids), [1, 2, 3, 4])
+        # duplicate names are pooled
+        self.assertEqual(len(table.names), 3)
+        self.assertEqual(table.name(3), 'beta')
+        self.assertEqual(list(table.bytes), [300, 100, -1, 200])
+        self.assertEqual(table.date_added[0], 1672617600)
+        self.assertTrue(math.isnan(table.date_added[2]))
+        self.assertEqual(table.asset(1), Asset.from_json(self.ASSETS_JSON[1]))
+
+    def test_from_assets(self):
+        """
+        Test creating tables from assets
+        """
+        assets = [Asset.from_json(item) for item in self.ASSETS_JSON]
+        table = AssetTable.from_assets(assets)
+        self.assertEqual(list(table.ids), [1, 2, 3, 4])
+        self.assertEqual(table.types[1], AssetType.Terrain.value)
+        self.assertEqual(table.statuses[2], Status.Error.value)
+        self.assertIs(table.asset(0), assets[0])
+
+    def test_sort(self):
+        """
+        Test sorting tables
+        """
+        table = AssetTable.from_json(self.ASSETS_JSON)
+        self.assertEqual(list(table.sort_by('name').ids), [2, 1, 4, 3])
+        self.assertEqual(list(table.sort_by('bytes').ids), [3, 2, 4, 1])
+        self.assertEqual(
+            list(table.sort_by('date_added', descending=True).ids),
+            [2, 1, 4, 3]
+        )
+        self.assertEqual(list(table.sort_by('date_added').ids),
+                         [4, 1, 2, 3])
+        with self.assertRaises(ValueError):
+            table.sort_order('unknown')
+
+    def test_filter(self):
+        """
+        Test filtering tables
+        """
+        table = AssetTable.from_json(self.ASSETS_JSON)
+        self.assertEqual(
+            list(table.filter(types=[AssetType.Tiles3D]).ids), [1, 3]
+        )
+        self.assertEqual(
+            list(table.filter(statuses=[Status.Complete],
+                              min_bytes=150).ids), [1, 4]
+        )
+        self.assertEqual(list(table.filter(max_bytes=150).ids), [2])
+        self.assertEqual(
+            list(table.filter(added_after=1672617600).ids), [1, 2]
+        )
+        self.assertEqual(list(table.filter(name_contains='ET').ids),
+                         [1, 4])
+
+    def test_group_by(self):
+        """
+        Test aggregating tables
+        """
+        table = AssetTable.from_json(self.ASSETS_JSON)
+        self.assertEqual(table.total_bytes(), 600)
+
+        groups = table.group_by('type')
+        self.assertEqual(groups[AssetType.Tiles3D].count, 2)
+        self.assertEqual(groups[AssetType.Tiles3D].total_bytes, 300)
+        self.assertEqual(groups[AssetType.Imagery].total_bytes, 200)
+
+        groups = table.group_by('status')
+        self.assertEqual(groups[Status.Complete].count, 3)
+        self.assertEqual(groups[Status.Error].count, 1)
+
+        with self.assertRaises(ValueError):
+            table.group_by('name')
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(AssetTableTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
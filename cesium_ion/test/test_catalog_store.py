@@ -0,0 +1,269 @@
+# coding=utf-8
+"""Catalog store Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2024 by Nyall Dawson'
+__date__ = '01/03/2024'
+__copyright__ = 'Copyright 2024, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from ..core import asset_catalog
+from ..core.asset import Asset
+from ..core.asset_catalog import AssetCatalog
+from ..core.catalog_store import (
+    CatalogStore,
+    LoadCatalogTask,
+    SaveCatalogTask
+)
+from ..core.pagination import FetchedPage
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+def _asset_json(asset_id: int) -> dict:
+    """
+    Returns the JSON for an asset
+    """
+    return {
+        'id': asset_id,
+        'name': 'Asset {}'.format(asset_id),
+        'type': '3DTILES',
+        'bytes': 1024,
+        'dateAdded': '2023-08-01T10:20:30.000Z',
+        'status': 'COMPLETE',
+        'percentComplete': 100
+    }
+
+
+PAGES = {
+    1: FetchedPage(items=[_asset_json(1), _asset_json(2)], has_more=True,
+                   etag='"a"'),
+    2: FetchedPage(items=[_asset_json(3)],
+                   last_modified='Tue, 01 Aug 2023 10:20:30 GMT')
+}
+
+
+def _asset_pages(pages: dict) -> dict:
+    """
+    Returns pages of raw JSON items as pages of assets
+    """
+    return {
+        page_number: FetchedPage(
+            items=[Asset.from_json(item) for item in page.items],
+            has_more=page.has_more,
+            etag=page.etag,
+            last_modified=page.last_modified
+        )
+        for page_number, page in pages.items()
+    }
+
+
+class CatalogStoreTest(unittest.TestCase):
+    """Test catalog store works."""
+
+    def test_store(self):
+        """
+        Test storing and loading catalogs
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = CatalogStore(os.path.join(temp_dir, 'catalog'))
+            self.assertIsNone(store.load('1'))
+
+            self.assertTrue(store.save('1', PAGES))
+            self.assertEqual(store.load('1'), PAGES)
+            # catalogs are stored per account
+            self.assertIsNone(store.load('2'))
+
+            store.remove('1')
+            self.assertIsNone(store.load('1'))
+            store.remove('1')
+
+    def test_invalid_catalog(self):
+        """
+        Test loading invalid stored catalogs
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = CatalogStore(temp_dir)
+            path = os.path.join(temp_dir, 'assets_1.json')
+
+            with open(path, 'wt', encoding='utf8') as f:
+                f.write('{"version": 1, "pages": [')
+            self.assertIsNone(store.load('1'))
+
+            with open(path, 'wt', encoding='utf8') as f:
+                f.write('{"version": 0, "pages": []}')
+            self.assertIsNone(store.load('1'))
+
+            with open(path, 'wt', encoding='utf8') as f:
+                f.write('{"version": 1, "pages": [{"page": 1}]}')
+            self.assertIsNone(store.load('1'))
+
+    def test_failed_write(self):
+        """
+        Test a failed write leaves no partial files behind
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = CatalogStore(temp_dir)
+            # a directory in place of the catalog file can't be replaced
+            os.makedirs(os.path.join(temp_dir, 'assets_1.json', 'x'))
+
+            self.assertFalse(store.save('1', PAGES))
+            self.assertEqual(os.listdir(temp_dir), ['assets_1.json'])
+
+    def test_load_task(self):
+        """
+        Test loading a stored catalog in a task
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = CatalogStore(temp_dir)
+            store.save('1', PAGES)
+
+            loaded = []
+            task = LoadCatalogTask(store, '1')
+            task.catalog_loaded.connect(
+                lambda *args: loaded.append(args)
+            )
+            self.assertTrue(task.run())
+            task.finished(True)
+            account_id, pages, assets = loaded[0]
+            self.assertEqual(account_id, '1')
+            # the pages hold the parsed assets
+            self.assertEqual(pages, _asset_pages(PAGES))
+            self.assertEqual([asset.id for asset in assets], [1, 2, 3])
+            self.assertIs(pages[2].items[0], assets[2])
+
+            # no stored catalog
+            loaded = []
+            task = LoadCatalogTask(store, '2')
+            task.catalog_loaded.connect(
+                lambda *args: loaded.append(args)
+            )
+            self.assertTrue(task.run())
+            task.finished(True)
+            self.assertEqual(loaded, [('2', None, [])])
+
+    def test_save_task(self):
+        """
+        Test storing a catalog in a task
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = CatalogStore(temp_dir)
+
+            saved = []
+            task = SaveCatalogTask(store, '1', _asset_pages(PAGES))
+            task.catalog_saved.connect(saved.append)
+            self.assertTrue(task.run())
+            task.finished(True)
+            self.assertEqual(saved, [True])
+            self.assertEqual(store.load('1'), PAGES)
+
+    def test_catalog_save(self):
+        """
+        Test the asset catalog stores catalogs in the background, one at
+        a time
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = CatalogStore(temp_dir)
+
+            tasks = []
+            with mock.patch.object(asset_catalog, 'QgsApplication') as app, \
+                    mock.patch.object(asset_catalog.PluginSettings,
+                                      'persistent_catalog_cache',
+                                      return_value=False):
+                app.taskManager.return_value.addTask.side_effect = \
+                    tasks.append
+
+                catalog = AssetCatalog(mock.Mock(), store)
+                newer_pages = {1: PAGES[1]}
+                # pylint: disable=protected-access
+                catalog._save('1', _asset_pages(PAGES))
+                catalog._save('1', {})
+                catalog._save('1', _asset_pages(newer_pages))
+                # pylint: enable=protected-access
+
+                # nothing is written on the main thread
+                self.assertIsNone(store.load('1'))
+                self.assertEqual(len(tasks), 1)
+
+                tasks[0].finished(tasks[0].run())
+                self.assertEqual(store.load('1'), PAGES)
+
+                # only the most recent waiting catalog is written
+                self.assertEqual(len(tasks), 2)
+                tasks[1].finished(tasks[1].run())
+                self.assertEqual(store.load('1'), newer_pages)
+                self.assertEqual(len(tasks), 2)
+
+    def test_catalog_load(self):
+        """
+        Test the asset catalog loads the stored catalog in the background,
+        and revalidates it once loaded
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            store = CatalogStore(temp_dir)
+            store.save('1', PAGES)
+
+            tasks = []
+            client = mock.Mock()
+            with mock.patch.object(asset_catalog, 'QgsApplication') as app, \
+                    mock.patch.object(asset_catalog.PluginSettings,
+                                      'persistent_catalog_cache',
+                                      return_value=True), \
+                    mock.patch.object(asset_catalog.PluginSettings,
+                                      'last_catalog_account',
+                                      return_value='1'):
+                app.taskManager.return_value.addTask.side_effect = \
+                    tasks.append
+
+                catalog = AssetCatalog(client, store)
+                loaded = []
+                catalog.loaded.connect(lambda: loaded.append(True))
+
+                # nothing is available until the stored catalog is loaded
+                self.assertIsNone(catalog.assets())
+                self.assertTrue(catalog.is_loading())
+                self.assertEqual(len(tasks), 1)
+
+                # revalidation waits for the stored pages
+                catalog.revalidate()
+                self.assertTrue(catalog.is_revalidating())
+                client.get_account.assert_not_called()
+
+                finished = []
+                catalog.finished.connect(lambda: finished.append(True))
+                catalog.cancel()
+                self.assertEqual(finished, [True])
+                self.assertFalse(catalog.is_revalidating())
+
+                tasks[0].run()
+                tasks[0].finished(True)
+                self.assertEqual(loaded, [True])
+                self.assertFalse(catalog.is_loading())
+                self.assertEqual(
+                    [asset.id for asset in catalog.assets()], [1, 2, 3]
+                )
+                # the canceled revalidation is not started
+                client.get_account.assert_not_called()
+
+                # the catalog is only loaded once
+                catalog.load()
+                self.assertEqual(len(tasks), 1)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(CatalogStoreTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,112 @@
+# coding=utf-8
+"""Circuit breaker Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2024 by Nyall Dawson'
+__date__ = '01/03/2024'
+__copyright__ = 'Copyright 2024, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import unittest
+
+from qgis.PyQt.QtNetwork import QNetworkReply
+from qgis.core import QgsNetworkAccessManager
+
+from ..core.circuit_breaker import (
+    CircuitBreaker,
+    is_connectivity_failure
+)
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+class CircuitBreakerTest(unittest.TestCase):
+    """Test circuit breaker works."""
+
+    def test_connectivity_failure(self):
+        """
+        Test classifying failed requests
+        """
+        self.assertTrue(
+            is_connectivity_failure(QNetworkReply.HostNotFoundError, None)
+        )
+        self.assertTrue(is_connectivity_failure(
+            QNetworkReply.ConnectionRefusedError, None
+        ))
+        self.assertTrue(is_connectivity_failure(
+            QNetworkReply.ServiceUnavailableError, 503
+        ))
+        self.assertFalse(is_connectivity_failure(QNetworkReply.NoError, 200))
+        self.assertFalse(is_connectivity_failure(
+            QNetworkReply.ContentNotFoundError, 404
+        ))
+        self.assertFalse(is_connectivity_failure(
+            QNetworkReply.AuthenticationRequiredError, 401
+        ))
+
+        # aborted requests only count if they timed out
+        timeout = QgsNetworkAccessManager.timeout() / 1000
+        self.assertFalse(is_connectivity_failure(
+            QNetworkReply.OperationCanceledError, None, 0.1
+        ))
+        self.assertTrue(is_connectivity_failure(
+            QNetworkReply.OperationCanceledError, None, timeout
+        ))
+
+    def test_trip_and_close(self):
+        """
+        Test opening and closing the circuit
+        """
+        changes = []
+        breaker = CircuitBreaker(failure_threshold=3,
+                                 state_changed=changes.append)
+        self.assertTrue(breaker.allow_request())
+
+        breaker.record(QNetworkReply.HostNotFoundError, None)
+        breaker.record(QNetworkReply.HostNotFoundError, None)
+        # a response resets the failure count
+        breaker.record(QNetworkReply.NoError, 200)
+        breaker.record(QNetworkReply.HostNotFoundError, None)
+        breaker.record(QNetworkReply.HostNotFoundError, None)
+        self.assertFalse(breaker.is_open())
+        self.assertEqual(breaker.statistics().consecutive_failures, 2)
+
+        # canceled requests are ignored
+        breaker.record(QNetworkReply.OperationCanceledError, None)
+        self.assertFalse(breaker.is_open())
+
+        breaker.record(QNetworkReply.HostNotFoundError, None)
+        self.assertTrue(breaker.is_open())
+        self.assertEqual(changes, [True])
+        self.assertFalse(breaker.allow_request())
+        self.assertFalse(breaker.allow_request())
+
+        # further failures don't trip the circuit again
+        breaker.record_failure()
+        self.assertEqual(changes, [True])
+
+        # error responses show that ion is reachable again
+        breaker.record(QNetworkReply.ContentNotFoundError, 404)
+        self.assertFalse(breaker.is_open())
+        self.assertEqual(changes, [True, False])
+        self.assertTrue(breaker.allow_request())
+
+        statistics = breaker.statistics()
+        self.assertFalse(statistics.is_open)
+        self.assertEqual(statistics.trips, 1)
+        self.assertEqual(statistics.rejected, 2)
+        self.assertEqual(statistics.consecutive_failures, 0)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(CircuitBreakerTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,362 @@
+# coding=utf-8
+"""Browser data items Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2024 by Nyall Dawson'
+__date__ = '01/03/2024'
+__copyright__ = 'Copyright 2024, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import unittest
+from typing import (
+    List,
+    Optional
+)
+from unittest import mock
+
+from qgis.PyQt.QtCore import (
+    QObject,
+    pyqtSignal
+)
+from qgis.core import (
+    QgsMimeDataUtils,
+    QgsVectorLayer
+)
+
+from ..core import (
+    Asset,
+    AssetType,
+    Status,
+    Token,
+    TokenIndex
+)
+from ..gui import (
+    add_asset_dialog,
+    data_items
+)
+from ..gui.data_items import (
+    CesiumIonDropHandler,
+    CesiumIonLayerUtils,
+    IonAssetItem,
+    IonRootItem
+)
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+def _asset(asset_id: int, name: Optional[str] = None) -> Asset:
+    """
+    Returns an asset
+    """
+    return Asset(id=asset_id, name=name or 'Asset {}'.format(asset_id),
+                 type=AssetType.Tiles3D, status=Status.Complete)
+
+
+class _Catalog(QObject):
+    """
+    An asset catalog whose revalidation is finished manually
+    """
+
+    page_fetched = pyqtSignal(int, list)
+    updated = pyqtSignal(list)
+    unchanged = pyqtSignal()
+    finished = pyqtSignal()
+
+    def __init__(self):
+        super().__init__()
+        self.revalidation_count = 0
+        self.is_revalidating = False
+
+    def revalidate(self):
+        """
+        Starts a revalidation
+        """
+        self.revalidation_count += 1
+        self.is_revalidating = True
+
+    def cancel(self):
+        """
+        Cancels any revalidation
+        """
+        if self.is_revalidating:
+            self.is_revalidating = False
+            self.finished.emit()
+
+    def finish(self):
+        """
+        Finishes the revalidation
+        """
+        self.is_revalidating = False
+        self.finished.emit()
+
+    @staticmethod
+    def table():
+        """
+        Returns no table, so that children are sorted from their assets
+        """
+        return None
+
+
+class IonRootItemTest(unittest.TestCase):
+    """Test the browser root item works."""
+
+    def setUp(self):
+        self.catalog = _Catalog()
+        self.cached_assets = None
+
+        patcher = mock.patch.object(data_items, 'API_CLIENT')
+        client = patcher.start()
+        self.addCleanup(patcher.stop)
+        client.asset_catalog.return_value = self.catalog
+        client.cached_assets.side_effect = lambda: self.cached_assets
+
+        for setting in ('async_browser_population',
+                        'stale_while_revalidate_browser'):
+            patcher = mock.patch.object(data_items.PluginSettings, setting,
+                                        return_value=True)
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _child_assets(item: IonRootItem) -> List:
+        """
+        Returns the IDs and names of the assets shown by an item
+        """
+        return sorted((child.asset.id, child.name())
+                      for child in item.children()
+                      if isinstance(child, IonAssetItem))
+
+    def test_streaming_population(self):
+        """
+        Test children are appended as each page of the catalog arrives
+        """
+        item = IonRootItem()
+        item.populate()
+        self.assertTrue(item.is_populating())
+        self.assertEqual(self.catalog.revalidation_count, 1)
+        self.assertEqual(item.children(), [])
+
+        self.catalog.page_fetched.emit(1, [_asset(1), _asset(2)])
+        self.assertEqual(self._child_assets(item),
+                         [(1, 'Asset 1'), (2, 'Asset 2')])
+        self.catalog.page_fetched.emit(2, [_asset(3)])
+        self.assertEqual(len(item.children()), 3)
+
+        # a streaming population ignores the complete catalog
+        self.catalog.updated.emit([_asset(1)])
+        self.assertEqual(len(item.children()), 3)
+
+        self.catalog.finish()
+        self.assertFalse(item.is_populating())
+        self.assertEqual(len(item.children()), 3)
+
+    def test_cancel_on_collapse(self):
+        """
+        Test collapsing the item cancels the population
+        """
+        item = IonRootItem()
+        item.populate()
+        self.catalog.page_fetched.emit(1, [_asset(1), _asset(2)])
+
+        item.depopulate()
+        self.assertFalse(item.is_populating())
+        self.assertFalse(self.catalog.is_revalidating)
+        self.assertEqual(item.children(), [])
+
+        # pages arriving later are ignored
+        self.catalog.page_fetched.emit(2, [_asset(3)])
+        self.assertEqual(item.children(), [])
+
+        # canceling without a population in progress does nothing
+        item.cancel_population()
+        self.assertEqual(self.catalog.revalidation_count, 1)
+
+    def test_cached_population(self):
+        """
+        Test a cached catalog is shown immediately while it is
+        revalidated
+        """
+        self.cached_assets = [_asset(1), _asset(2)]
+        item = IonRootItem()
+        item.populate()
+        self.assertEqual(self._child_assets(item),
+                         [(1, 'Asset 1'), (2, 'Asset 2')])
+        self.assertTrue(item.is_populating())
+        self.assertEqual(self.catalog.revalidation_count, 1)
+
+        # pages are not appended to the cached children
+        self.catalog.page_fetched.emit(1, [_asset(1), _asset(2)])
+        self.assertEqual(len(item.children()), 2)
+
+        self.catalog.unchanged.emit()
+        self.catalog.finish()
+        self.assertFalse(item.is_populating())
+        self.assertEqual(self._child_assets(item),
+                         [(1, 'Asset 1'), (2, 'Asset 2')])
+
+    def test_refresh_while_revalidating(self):
+        """
+        Test refreshing keeps the existing children while the catalog is
+        revalidated, and then applies only the changed assets
+        """
+        self.cached_assets = [_asset(1), _asset(2), _asset(3)]
+        item = IonRootItem()
+        item.populate()
+        self.catalog.unchanged.emit()
+        self.catalog.finish()
+        kept_item = [child for child in item.children()
+                     if child.asset.id == 1][0]
+        renamed_item = [child for child in item.children()
+                        if child.asset.id == 2][0]
+
+        item.refresh()
+        self.assertTrue(item.is_populating())
+        self.assertEqual(self.catalog.revalidation_count, 2)
+        # stale children remain visible while revalidating
+        self.assertEqual(len(item.children()), 3)
+
+        self.catalog.updated.emit(
+            [_asset(1), _asset(2, 'Renamed'), _asset(4)]
+        )
+        self.catalog.finish()
+        self.assertFalse(item.is_populating())
+        self.assertEqual(self._child_assets(item),
+                         [(1, 'Asset 1'), (2, 'Renamed'), (4, 'Asset 4')])
+        # unchanged and renamed assets keep their items
+        self.assertIn(kept_item, item.children())
+        self.assertIn(renamed_item, item.children())
+        self.assertEqual(renamed_item.name(), 'Renamed')
+
+    def test_apply_unchanged_catalog(self):
+        """
+        Test an unchanged catalog still restores children which differ
+        from it
+        """
+        self.cached_assets = [_asset(1), _asset(2)]
+        item = IonRootItem()
+        item.populate()
+        self.catalog.finish()
+
+        # e.g. an earlier population was canceled part way through
+        item.deleteChildItem(item.children()[0])
+        self.assertEqual(len(item.children()), 1)
+
+        item.refresh()
+        self.catalog.unchanged.emit()
+        self.catalog.finish()
+        self.assertEqual(self._child_assets(item),
+                         [(1, 'Asset 1'), (2, 'Asset 2')])
+
+
+class CesiumIonLayerUtilsTest(unittest.TestCase):
+    """Test adding assets to projects works."""
+
+    def test_drop_assets(self):
+        """
+        Test dropping several assets selects a token once, and creates
+        at most one token covering all the assets
+        """
+        assets = [_asset(1), _asset(2), _asset(3)]
+        uris = []
+        for asset in assets:
+            uri = QgsMimeDataUtils.Uri()
+            uri.layerType = 'custom'
+            uri.providerKey = 'cesium_ion'
+            uri.name = asset.name
+            uri.uri = asset.as_qgis_drop_uri()
+            uris.append(uri)
+        created = Token(id='1', name='new', token='t1',
+                        scopes=CesiumIonLayerUtils.NEW_TOKEN_SCOPES,
+                        asset_ids=[1, 2, 3])
+
+        with mock.patch.object(add_asset_dialog, 'AddAssetDialog') \
+                as dialog_class, \
+                mock.patch.object(data_items, 'API_CLIENT') as client, \
+                mock.patch.object(data_items.PluginSettings,
+                                  'reuse_existing_tokens',
+                                  return_value=True), \
+                mock.patch.object(CesiumIonLayerUtils,
+                                  'prefetch_assets'), \
+                mock.patch.object(CesiumIonLayerUtils,
+                                  'add_assets_with_token') as add_assets:
+            dialog = dialog_class.return_value
+            dialog.exec_.return_value = True
+            dialog.existing_token.return_value = None
+            dialog.new_token_name.return_value = 'new'
+            client.token_index.return_value = TokenIndex()
+            client.create_token.return_value = created
+
+            self.assertTrue(CesiumIonDropHandler().handleMimeDataV2(
+                QgsMimeDataUtils.encodeUriList(uris)
+            ))
+            dialog_class.assert_called_once_with(asset_count=3)
+
+            # the layers for all the assets are created together, with
+            # the token found or created by the layer creation task
+            add_assets.assert_called_once()
+            dropped, token = add_assets.call_args[0]
+            self.assertEqual([asset.id for asset in dropped],
+                             ['1', '2', '3'])
+            self.assertIsNone(token)
+            token_provider = add_assets.call_args[1]['token_provider']
+            client.create_token.assert_not_called()
+
+            self.assertIs(token_provider(), created)
+            client.create_token.assert_called_once_with(
+                'new',
+                scopes=CesiumIonLayerUtils.NEW_TOKEN_SCOPES,
+                asset_ids=[1, 2, 3]
+            )
+
+            # the created token is reused for later drops of the assets
+            client.create_token.reset_mock()
+            client.token_index.return_value = TokenIndex([created])
+            self.assertIs(token_provider(), created)
+            client.create_token.assert_not_called()
+
+    def test_add_layers_to_project(self):
+        """
+        Test several layers are added to the project in a single
+        operation, under a new group
+        """
+        layers = [
+            QgsVectorLayer('Point', 'layer {}'.format(i), 'memory')
+            for i in range(3)
+        ]
+        with mock.patch.object(data_items, 'QgsProject') as project_class, \
+                mock.patch.object(data_items, 'iface') as iface:
+            project = project_class.instance.return_value
+            CesiumIonLayerUtils.add_layers_to_project(layers, 'Assets')
+
+        project.addMapLayers.assert_called_once_with(layers, False)
+        project.addMapLayer.assert_not_called()
+
+        root = project.layerTreeRoot.return_value
+        root.insertChildNode.assert_called_once()
+        position, group = root.insertChildNode.call_args[0]
+        self.assertEqual(position, 0)
+        self.assertEqual(group.name(), 'Assets')
+        self.assertEqual(group.findLayerIds(),
+                         [layer.id() for layer in layers])
+
+        # the canvas is only refreshed once all the layers are added
+        canvas = iface.mapCanvas.return_value
+        self.assertEqual(canvas.freeze.call_args_list,
+                         [mock.call(True), mock.call(False)])
+
+
+if __name__ == "__main__":
+    suite = unittest.TestSuite([
+        unittest.makeSuite(IonRootItemTest),
+        unittest.makeSuite(CesiumIonLayerUtilsTest)
+    ])
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,113 @@
+# coding=utf-8
+"""Endpoint cache Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2024 by Nyall Dawson'
+__date__ = '01/03/2024'
+__copyright__ = 'Copyright 2024, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import base64
+import json
+import unittest
+
+from ..core.endpoint_cache import (
+    AssetEndpoint,
+    EndpointCache,
+    token_expiry
+)
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+def make_jwt(payload) -> str:
+    """
+    Creates an unsigned JWT with the specified payload
+    """
+    encoded = base64.urlsafe_b64encode(
+        json.dumps(payload).encode()
+    ).decode().rstrip('=')
+    return 'header.{}.signature'.format(encoded)
+
+
+class EndpointCacheTest(unittest.TestCase):
+    """Test EndpointCache works."""
+
+    def test_token_expiry(self):
+        """
+        Test reading the expiry of access tokens
+        """
+        self.assertEqual(token_expiry(make_jwt({'exp': 1700000000})),
+                         1700000000)
+        self.assertIsNone(token_expiry(make_jwt({'sub': 'x'})))
+        self.assertIsNone(token_expiry(make_jwt({'exp': 'soon'})))
+        self.assertIsNone(token_expiry('not a jwt'))
+        self.assertIsNone(token_expiry('a.!!!.c'))
+        self.assertIsNone(token_expiry(None))
+
+    def test_endpoint_from_json(self):
+        """
+        Test creating endpoints from JSON
+        """
+        endpoint = AssetEndpoint.from_json(
+            1,
+            {'type': '3DTILES',
+             'url': 'https://assets.ion.cesium.com/1/tileset.json',
+             'accessToken': make_jwt({'exp': 5000}),
+             'attributions': [{'html': 'x'}]},
+            default_expiry=100
+        )
+        self.assertEqual(endpoint.type, '3DTILES')
+        self.assertEqual(endpoint.expires, 5000)
+        self.assertEqual(endpoint.attributions, [{'html': 'x'}])
+
+        endpoint = AssetEndpoint.from_json(
+            1, {'url': 'https://example.com'}, default_expiry=100
+        )
+        self.assertEqual(endpoint.expires, 100)
+
+    def test_expiry(self):
+        """
+        Test that endpoints expire before their access token
+        """
+        now = [1000.0]
+        cache = EndpointCache(None, clock=lambda: now[0])
+        endpoint = AssetEndpoint(asset_id=1, type='3DTILES', url='u',
+                                 access_token='t', expires=2000)
+        cache.put(endpoint, 'token')
+        self.assertIs(cache.get(1, 'token'), endpoint)
+        self.assertIs(cache.get('1', 'token'), endpoint)
+        self.assertIsNone(cache.get(1))
+        self.assertIsNone(cache.get(1, 'other'))
+
+        now[0] = 2000 - EndpointCache.REFRESH_MARGIN
+        self.assertIsNone(cache.get(1, 'token'))
+        self.assertEqual(len(cache), 0)
+
+    def test_invalidate(self):
+        """
+        Test invalidating endpoints
+        """
+        cache = EndpointCache(None, clock=lambda: 0)
+        for asset_id in (1, 2):
+            cache.put(AssetEndpoint(asset_id=asset_id, type=None, url='u',
+                                    access_token=None, expires=10000))
+        cache.invalidate(1)
+        self.assertIsNone(cache.get(1))
+        self.assertIsNotNone(cache.get(2))
+        cache.invalidate()
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(EndpointCacheTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
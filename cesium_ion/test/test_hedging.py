@@ -0,0 +1,187 @@
+# coding=utf-8
+"""Hedged request Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2024 by Nyall Dawson'
+__date__ = '01/03/2024'
+__copyright__ = 'Copyright 2024, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import unittest
+
+from qgis.PyQt.QtNetwork import QNetworkReply
+
+from ..core.hedging import (
+    HedgedReply,
+    HedgingPolicy,
+    LatencyTracker
+)
+from .utilities import (
+    FakeReply,
+    get_qgis_app
+)
+
+QGIS_APP = get_qgis_app()
+
+
+def _policy() -> HedgingPolicy:
+    """
+    Returns an enabled hedging policy with enough latency samples
+    """
+    policy = HedgingPolicy(enabled=True)
+    for _ in range(HedgingPolicy.MIN_SAMPLES):
+        policy.record_latency(0.1)
+    return policy
+
+
+class HedgingTest(unittest.TestCase):
+    """Test hedged requests work."""
+
+    def test_latency_tracker(self):
+        """
+        Test latency percentiles
+        """
+        tracker = LatencyTracker(window=100)
+        self.assertIsNone(tracker.percentile(95))
+        for i in range(1, 101):
+            tracker.add(i / 100)
+        self.assertEqual(tracker.count(), 100)
+        self.assertEqual(tracker.percentile(50), 0.5)
+        self.assertEqual(tracker.percentile(95), 0.95)
+        self.assertEqual(tracker.percentile(100), 1.0)
+        self.assertEqual(tracker.percentile(0), 0.01)
+
+        # only the most recent samples are retained
+        for _ in range(100):
+            tracker.add(2)
+        self.assertEqual(tracker.count(), 100)
+        self.assertEqual(tracker.percentile(0), 2)
+
+    def test_hedge_delay(self):
+        """
+        Test the delay after which requests are hedged
+        """
+        policy = HedgingPolicy()
+        for _ in range(HedgingPolicy.MIN_SAMPLES - 1):
+            policy.record_latency(0.2)
+        policy.set_enabled(True)
+        # too few samples
+        self.assertIsNone(policy.hedge_delay())
+
+        policy.record_latency(1.0)
+        policy.set_percentile(90)
+        self.assertEqual(policy.hedge_delay(), 0.2)
+        policy.set_percentile(100)
+        self.assertEqual(policy.hedge_delay(), 1.0)
+        self.assertEqual(policy.statistics().delay, 1.0)
+
+        policy.set_enabled(False)
+        self.assertIsNone(policy.hedge_delay())
+        self.assertIsNone(policy.statistics().delay)
+
+        policy = HedgingPolicy(enabled=True)
+        for _ in range(HedgingPolicy.MIN_SAMPLES):
+            policy.record_latency(0)
+        self.assertEqual(policy.hedge_delay(), HedgingPolicy.MIN_DELAY)
+
+    def test_hedge_wins(self):
+        """
+        Test a hedge request which completes first
+        """
+        policy = _policy()
+        replies = []
+
+        def send():
+            replies.append(FakeReply())
+            return replies[-1]
+
+        hedged_reply = HedgedReply(send, policy,
+                                   reader_factory=lambda reply: 'reader')
+        finished = []
+        hedged_reply.finished.connect(lambda: finished.append(True))
+        hedged_reply.start()
+        self.assertEqual(len(replies), 1)
+        self.assertFalse(hedged_reply.is_hedged())
+
+        # pylint: disable=protected-access
+        hedged_reply._send_hedge()
+        # pylint: enable=protected-access
+        self.assertEqual(len(replies), 2)
+        self.assertTrue(hedged_reply.is_hedged())
+
+        replies[1].metaDataChanged.emit()
+        replies[1].finish()
+        self.assertEqual(finished, [True])
+        self.assertIs(hedged_reply.reply(), replies[1])
+        self.assertEqual(hedged_reply.reader(), 'reader')
+        # the loser is aborted
+        self.assertTrue(replies[0].aborted)
+
+        statistics = policy.statistics()
+        self.assertEqual(statistics.requests, 1)
+        self.assertEqual(statistics.hedged, 1)
+        self.assertEqual(statistics.hedge_wins, 1)
+
+    def test_failed_reply(self):
+        """
+        Test a failed reply doesn't win while another reply is pending
+        """
+        policy = _policy()
+        replies = []
+
+        def send():
+            replies.append(FakeReply())
+            return replies[-1]
+
+        hedged_reply = HedgedReply(send, policy)
+        hedged_reply.start()
+        # pylint: disable=protected-access
+        hedged_reply._send_hedge()
+        # pylint: enable=protected-access
+
+        replies[1].finish(QNetworkReply.ContentNotFoundError)
+        self.assertIsNone(hedged_reply.reply())
+        replies[0].metaDataChanged.emit()
+        replies[0].finish()
+        self.assertIs(hedged_reply.reply(), replies[0])
+        self.assertEqual(policy.statistics().hedge_wins, 0)
+
+    def test_no_hedge_after_response_started(self):
+        """
+        Test requests aren't hedged once their response has started
+        """
+        policy = _policy()
+        replies = []
+
+        def send():
+            replies.append(FakeReply())
+            return replies[-1]
+
+        hedged_reply = HedgedReply(send, policy)
+        hedged_reply.start()
+        replies[0].metaDataChanged.emit()
+        # pylint: disable=protected-access
+        hedged_reply._send_hedge()
+        # pylint: enable=protected-access
+        self.assertEqual(len(replies), 1)
+
+        # aborted requests never finish
+        finished = []
+        hedged_reply.finished.connect(lambda: finished.append(True))
+        hedged_reply.abort()
+        self.assertTrue(replies[0].aborted)
+        self.assertFalse(finished)
+        self.assertEqual(policy.statistics().hedged, 0)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(HedgingTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,137 @@
+# coding=utf-8
+"""JSON stream decoding Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2024 by Nyall Dawson'
+__date__ = '01/03/2024'
+__copyright__ = 'Copyright 2024, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import json
+import unittest
+from unittest import mock
+
+from ..core.json_stream import (
+    JsonListDecoder,
+    ReplyItemsReader
+)
+
+
+class JsonListDecoderTest(unittest.TestCase):
+    """Test JsonListDecoder works."""
+
+    RESPONSE = {
+        'next': 'https://api.cesium.com/v1/assets?page=2',
+        'items': [
+            {'id': 1, 'name': 'a "quoted" name, with ]} brackets'},
+            {'id': 2, 'name': 'café', 'bytes': 12345678901},
+            {'id': 3, 'nested': [1, {'a': '['}], 'percentComplete': 99.5}
+        ],
+        'total': 1.5e3
+    }
+
+    def decode(self, data: bytes, chunk_size: int):
+        """
+        Decodes data fed in chunks of the specified size
+        """
+        decoder = JsonListDecoder()
+        items = []
+        for i in range(0, len(data), chunk_size):
+            items.extend(decoder.feed(data[i:i + chunk_size]))
+        items.extend(decoder.close())
+        return items, decoder.envelope()
+
+    def test_chunked(self):
+        """
+        Test decoding with every possible chunk boundary
+        """
+        data = json.dumps(self.RESPONSE, ensure_ascii=False).encode()
+        for chunk_size in range(1, len(data) + 1):
+            items, envelope = self.decode(data, chunk_size)
+            self.assertEqual(items, self.RESPONSE['items'])
+            self.assertEqual(envelope, {
+                'next': self.RESPONSE['next'],
+                'items': [],
+                'total': 1.5e3
+            })
+
+    def test_items_yielded_incrementally(self):
+        """
+        Test that items are yielded as soon as they are complete
+        """
+        decoder = JsonListDecoder()
+        self.assertEqual(
+            list(decoder.feed(b'{"items": [{"id": 1}, {"id"')),
+            [{'id': 1}]
+        )
+        self.assertEqual(list(decoder.feed(b': 2}]}')), [{'id': 2}])
+        self.assertEqual(list(decoder.close()), [])
+        self.assertEqual(decoder.item_count(), 2)
+
+    def test_empty(self):
+        """
+        Test decoding an empty list response
+        """
+        items, envelope = self.decode(b'{"items": []}', 4)
+        self.assertEqual(items, [])
+        self.assertEqual(envelope, {'items': []})
+
+    def test_invalid(self):
+        """
+        Test decoding invalid or incomplete responses
+        """
+        with self.assertRaises(ValueError):
+            self.decode(b'{"items": [{"id": 1}', 4)
+        with self.assertRaises(ValueError):
+            self.decode(b'["not", "an", "object"]', 4)
+        with self.assertRaises(ValueError):
+            self.decode(b'<html></html>', 4)
+
+
+class ReplyItemsReaderTest(unittest.TestCase):
+    """Test ReplyItemsReader works."""
+
+    @staticmethod
+    def reader(data: bytes) -> ReplyItemsReader:
+        """
+        Returns a reader for a reply with the specified data, parsing
+        item IDs
+        """
+        reply = mock.Mock()
+        reply.readAll.return_value.data.return_value = data
+        return ReplyItemsReader(reply, lambda item: item['id'])
+
+    def test_items(self):
+        """
+        Test parsing the items of a reply
+        """
+        items, envelope = self.reader(
+            b'{"items": [{"id": 1}, {"id": 2}], "next": ""}'
+        ).finish()
+        self.assertEqual(items, [1, 2])
+        self.assertEqual(envelope, {'items': [], 'next': ''})
+
+    def test_invalid_items(self):
+        """
+        Test items missing required fields fail the reply
+        """
+        with self.assertRaises(ValueError):
+            self.reader(b'{"items": [{"id": 1}, {"name": "a"}]}').finish()
+        with self.assertRaises(ValueError):
+            self.reader(b'{"items": [{"id": 1}').finish()
+
+
+if __name__ == "__main__":
+    suite = unittest.TestSuite([
+        unittest.makeSuite(JsonListDecoderTest),
+        unittest.makeSuite(ReplyItemsReaderTest)
+    ])
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,150 @@
+# coding=utf-8
+"""Layer creation task Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2024 by Nyall Dawson'
+__date__ = '01/03/2024'
+__copyright__ = 'Copyright 2024, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import threading
+import unittest
+from unittest import mock
+
+from qgis.PyQt.QtCore import QCoreApplication
+from qgis.core import QgsVectorLayer
+
+from ..core import (
+    Asset,
+    AssetType,
+    Status,
+    Token
+)
+from ..core.layer_task import CreateLayersTask
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+def _asset(asset_id: int) -> Asset:
+    """
+    Returns an asset
+    """
+    return Asset(id=asset_id, name='Asset {}'.format(asset_id),
+                 type=AssetType.Tiles3D, status=Status.Complete)
+
+
+def _create_layer(asset: Asset, *_) -> QgsVectorLayer:
+    """
+    Creates a layer for an asset, which is invalid for even asset IDs
+    """
+    if asset.id % 2:
+        return QgsVectorLayer('Point', asset.name, 'memory')
+    return QgsVectorLayer('/not/a/layer.shp', asset.name, 'ogr')
+
+
+class CreateLayersTaskTest(unittest.TestCase):
+    """Test CreateLayersTask works."""
+
+    @staticmethod
+    def _created(task: CreateLayersTask) -> list:
+        """
+        Returns a list which is populated with the created layers and
+        invalid asset names
+        """
+        created = []
+        task.layers_created.connect(
+            lambda layers, invalid_names: created.append(
+                (layers, invalid_names)
+            )
+        )
+        return created
+
+    def test_create_layers(self):
+        """
+        Test layers are created in a background thread, and moved to the
+        main thread
+        """
+        task = CreateLayersTask([_asset(1), _asset(2), _asset(3)], 'token')
+        created = self._created(task)
+        with mock.patch.object(CreateLayersTask, 'create_layer',
+                               side_effect=_create_layer) as create_layer:
+            results = []
+            thread = threading.Thread(
+                target=lambda: results.append(task.run())
+            )
+            thread.start()
+            thread.join()
+        self.assertEqual(results, [True])
+        self.assertEqual(create_layer.call_args_list[0],
+                         mock.call(_asset(1), 'token', None))
+
+        # layers are only emitted once the task has finished
+        self.assertEqual(created, [])
+        task.finished(True)
+        layers, invalid_names = created[0]
+        self.assertEqual([layer.name() for layer in layers],
+                         ['Asset 1', 'Asset 3'])
+        self.assertEqual(invalid_names, ['Asset 2'])
+        main_thread = QCoreApplication.instance().thread()
+        for layer in layers:
+            self.assertIs(layer.thread(), main_thread)
+
+    def test_cancel(self):
+        """
+        Test canceling the task stops creating layers
+        """
+        task = CreateLayersTask([_asset(1), _asset(3), _asset(5)], 'token')
+        created = self._created(task)
+
+        def create_and_cancel(asset: Asset, *args):
+            task.cancel()
+            return _create_layer(asset, *args)
+
+        with mock.patch.object(CreateLayersTask, 'create_layer',
+                               side_effect=create_and_cancel) \
+                as create_layer:
+            self.assertFalse(task.run())
+        self.assertEqual(create_layer.call_count, 1)
+
+        # no layers are emitted by a canceled task
+        task.finished(False)
+        self.assertEqual(created, [])
+
+    def test_token_provider(self):
+        """
+        Test the token is obtained from the provider in the background
+        thread
+        """
+        token = Token(id='1', name='new', token='secret',
+                      scopes=['assets:read'], asset_ids=[1])
+        task = CreateLayersTask([_asset(1)], None,
+                                token_provider=lambda: token)
+        with mock.patch.object(CreateLayersTask, 'create_layer',
+                               side_effect=_create_layer) as create_layer:
+            self.assertTrue(task.run())
+        create_layer.assert_called_once_with(_asset(1), 'secret', None)
+
+        # the task fails if no token can be found or created
+        task = CreateLayersTask([_asset(1)], None,
+                                token_provider=lambda: None)
+        created = self._created(task)
+        with mock.patch.object(CreateLayersTask, 'create_layer') \
+                as create_layer:
+            self.assertFalse(task.run())
+        create_layer.assert_not_called()
+        task.finished(False)
+        self.assertEqual(created, [])
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(CreateLayersTaskTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
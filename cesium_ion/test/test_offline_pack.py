@@ -0,0 +1,130 @@
+# coding=utf-8
+"""Offline pack Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2024 by Nyall Dawson'
+__date__ = '01/03/2024'
+__copyright__ = 'Copyright 2024, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import unittest
+
+from ..core.offline_pack import (
+    pack_path,
+    rewrite_terrain_layer,
+    rewrite_tileset
+)
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+ROOT_URL = 'https://assets.ion.cesium.com/1/tileset.json?v=2'
+
+
+class OfflinePackTest(unittest.TestCase):
+    """Test offline pack utilities work."""
+
+    def test_pack_path(self):
+        """
+        Test mapping URLs to paths within a pack
+        """
+        self.assertEqual(pack_path(ROOT_URL, ROOT_URL), 'tileset.json')
+        self.assertEqual(
+            pack_path(ROOT_URL,
+                      'https://assets.ion.cesium.com/1/tiles/0.b3dm?v=2'),
+            'tiles/0.b3dm'
+        )
+        self.assertEqual(
+            pack_path(ROOT_URL,
+                      'https://assets.ion.cesium.com/2/tiles/0.b3dm'),
+            'external/assets.ion.cesium.com/2/tiles/0.b3dm'
+        )
+        self.assertEqual(
+            pack_path(ROOT_URL, 'https://example.com/a/../../b.glb'),
+            'external/example.com/a/b.glb'
+        )
+
+    def test_rewrite_tileset(self):
+        """
+        Test rewriting tilesets for a pack
+        """
+        tileset = {
+            'root': {
+                'content': {'uri': 'root.b3dm'},
+                'children': [
+                    {'content': {'uri': 'tiles/a.b3dm'},
+                     'children': [{'content': {'uri': 'tiles/deep.b3dm'}}]},
+                    {'contents': [{'uri': 'tiles/b.glb'},
+                                  {'uri': 'tiles/c.glb'}]},
+                    {'content': {'uri': 'https://example.com/ext.json'}},
+                    {'children': [{'content': {'uri': 'tiles/d.b3dm'}}]}
+                ]
+            }
+        }
+        packed = {
+            'https://assets.ion.cesium.com/1/root.b3dm?v=2',
+            'https://assets.ion.cesium.com/1/tiles/a.b3dm?v=2',
+            'https://assets.ion.cesium.com/1/tiles/c.glb?v=2',
+            'https://example.com/ext.json'
+        }
+        rewrite_tileset(tileset, ROOT_URL, ROOT_URL, packed)
+        self.assertEqual(tileset, {
+            'root': {
+                'content': {'uri': 'root.b3dm'},
+                'children': [
+                    {'content': {'uri': 'tiles/a.b3dm'}},
+                    {'contents': [{'uri': 'tiles/c.glb'}]},
+                    {'content': {
+                        'uri': 'external/example.com/ext.json'}}
+                ]
+            }
+        })
+
+        # external tileset in a subdirectory
+        external = {'root': {'content': {'uri': 'x.b3dm'}}}
+        rewrite_tileset(
+            external,
+            'https://example.com/ext.json',
+            ROOT_URL,
+            {'https://example.com/x.b3dm'}
+        )
+        self.assertEqual(external['root']['content']['uri'], 'x.b3dm')
+
+        external = {'root': {'content': {'uri': 'x.b3dm'}}}
+        rewrite_tileset(
+            external,
+            'https://assets.ion.cesium.com/1/sub/ext.json?v=2',
+            ROOT_URL,
+            {'https://assets.ion.cesium.com/1/sub/x.b3dm?v=2'}
+        )
+        self.assertEqual(external['root']['content']['uri'], 'x.b3dm')
+
+    def test_rewrite_terrain_layer(self):
+        """
+        Test rewriting terrain layer.json for a pack
+        """
+        layer = {
+            'tiles': ['{z}/{x}/{y}.terrain?v={version}'],
+            'maxzoom': 15,
+            'available': [[{'startX': 0}], [{'startX': 1}],
+                          [{'startX': 2}]]
+        }
+        rewrite_terrain_layer(layer, 2)
+        self.assertEqual(layer, {
+            'tiles': ['{z}/{x}/{y}.terrain'],
+            'maxzoom': 1,
+            'available': [[{'startX': 0}], [{'startX': 1}]]
+        })
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(OfflinePackTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,356 @@
+# coding=utf-8
+"""Paged fetcher Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2024 by Nyall Dawson'
+__date__ = '01/03/2024'
+__copyright__ = 'Copyright 2024, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import json
+import unittest
+from typing import (
+    Dict,
+    List,
+    Optional
+)
+from unittest import mock
+
+from qgis.PyQt.QtCore import QUrl
+from qgis.PyQt.QtNetwork import QNetworkRequest
+
+from ..core import pagination
+from ..core.pagination import (
+    FetchedPage,
+    PagedFetcher
+)
+from ..core.request_scheduler import (
+    AimdConcurrencyLimit,
+    RequestScheduler
+)
+from .utilities import (
+    FakeReply,
+    get_qgis_app
+)
+
+QGIS_APP = get_qgis_app()
+
+
+class _PageReply(FakeReply):
+    """
+    A reply for a page of a list endpoint, which is finished manually
+    """
+
+    def finish_page(self, items: List, next_url: Optional[str] = None,
+                    headers: Optional[Dict[bytes, bytes]] = None):
+        """
+        Finishes the reply with a page of items, and optionally a next
+        link and response headers
+        """
+        response = {'items': items}
+        if next_url is not None:
+            response['next'] = next_url
+        self.respond(json.dumps(response).encode(), headers=headers)
+
+    def finish_not_modified(self):
+        """
+        Finishes the reply with a "not modified" response
+        """
+        self.respond(b'', status=304)
+
+
+class _NetworkAccessManager:
+    """
+    Network access manager which returns manually finished replies for
+    paged requests, by page number
+    """
+
+    def __init__(self):
+        self.requests: Dict[int, QNetworkRequest] = {}
+        self.replies: Dict[int, _PageReply] = {}
+
+    def get(self, request: QNetworkRequest) -> _PageReply:
+        """
+        Returns a reply for a page request
+        """
+        page = int(request.url().query().split('=')[1])
+        self.requests[page] = request
+        self.replies[page] = _PageReply()
+        return self.replies[page]
+
+
+class PagedFetcherTest(unittest.TestCase):
+    """Test paged fetcher works."""
+
+    def setUp(self):
+        self.manager = _NetworkAccessManager()
+        patcher = mock.patch.object(pagination, 'QgsNetworkAccessManager')
+        patcher.start().instance.return_value = self.manager
+        self.addCleanup(patcher.stop)
+
+    @staticmethod
+    def _fetcher(page_size: int = 2,
+                 max_concurrent_requests: int = 3,
+                 cached_pages: Optional[Dict[int, FetchedPage]] = None) \
+            -> PagedFetcher:
+        """
+        Returns a fetcher for a paged endpoint
+        """
+        return PagedFetcher(
+            lambda page: QNetworkRequest(
+                QUrl('http://127.0.0.1:1/items?page={}'.format(page))
+            ),
+            lambda item: item,
+            page_size=page_size,
+            max_concurrent_requests=max_concurrent_requests,
+            cached_pages=cached_pages
+        )
+
+    @staticmethod
+    def _fetched_pages(fetcher: PagedFetcher) -> List:
+        """
+        Returns a list which is populated with the pages fetched
+        """
+        pages = []
+        fetcher.page_fetched.connect(
+            lambda page, items: pages.append((page, items))
+        )
+        return pages
+
+    def test_out_of_order(self):
+        """
+        Test pages are emitted in order when replies arrive out of order
+        """
+        fetcher = self._fetcher()
+        pages = self._fetched_pages(fetcher)
+        fetcher.start()
+        self.assertEqual(list(self.manager.replies), [1])
+
+        self.manager.replies[1].finish_page([1, 2])
+        self.assertEqual(list(self.manager.replies), [1, 2, 3, 4])
+
+        self.manager.replies[3].finish_page([5, 6])
+        self.assertEqual(pages, [(1, [1, 2])])
+
+        self.manager.replies[2].finish_page([3, 4])
+        self.assertEqual(pages, [(1, [1, 2]), (2, [3, 4]), (3, [5, 6])])
+        self.assertEqual(list(self.manager.replies), [1, 2, 3, 4, 5, 6])
+
+        # a short page ends the listing
+        self.manager.replies[4].finish_page([7])
+        self.assertTrue(fetcher.is_finished())
+        self.assertFalse(fetcher.is_canceled())
+        self.assertEqual(pages[-1], (4, [7]))
+        self.assertTrue(self.manager.replies[5].aborted)
+        self.assertTrue(self.manager.replies[6].aborted)
+        self.assertEqual(list(fetcher.pages()), [1, 2, 3, 4])
+
+    def test_last_page_arrives_early(self):
+        """
+        Test the last page arriving before earlier pages
+        """
+        fetcher = self._fetcher()
+        pages = self._fetched_pages(fetcher)
+        finished = []
+        fetcher.finished.connect(lambda: finished.append(True))
+        fetcher.start()
+        self.manager.replies[1].finish_page([1, 2])
+
+        self.manager.replies[3].finish_page([5])
+        # later pages are no longer required
+        self.assertTrue(self.manager.replies[4].aborted)
+        self.assertFalse(fetcher.is_finished())
+
+        self.manager.replies[2].finish_page([3, 4])
+        self.assertEqual(pages, [(1, [1, 2]), (2, [3, 4]), (3, [5])])
+        self.assertEqual(finished, [True])
+        self.assertEqual(list(self.manager.replies), [1, 2, 3, 4])
+
+    def test_capped_page_size(self):
+        """
+        Test a server returning fewer items per page than requested
+        """
+        fetcher = self._fetcher(page_size=10)
+        pages = self._fetched_pages(fetcher)
+        fetcher.start()
+
+        # a short first page may be capped by the server, so the second
+        # page is probed alone
+        self.manager.replies[1].finish_page([1, 2])
+        self.assertFalse(fetcher.is_finished())
+        self.assertEqual(list(self.manager.replies), [1, 2])
+
+        self.manager.replies[2].finish_page([3, 4])
+        self.assertEqual(list(self.manager.replies), [1, 2, 3, 4, 5])
+
+        # pages shorter than the first page end the listing
+        self.manager.replies[3].finish_page([5])
+        self.assertEqual(len(pages), 3)
+        self.assertTrue(fetcher.is_finished())
+
+        # an empty second page ends a short listing
+        fetcher = self._fetcher(page_size=10)
+        pages = self._fetched_pages(fetcher)
+        fetcher.start()
+        self.manager.replies[1].finish_page([1, 2])
+        self.manager.replies[2].finish_page([])
+        self.assertTrue(fetcher.is_finished())
+        self.assertEqual(pages, [(1, [1, 2]), (2, [])])
+
+    def test_next_link(self):
+        """
+        Test next links take precedence over page sizes
+        """
+        fetcher = self._fetcher(page_size=10)
+        pages = self._fetched_pages(fetcher)
+        fetcher.start()
+        self.manager.replies[1].finish_page([1, 2],
+                                            'http://127.0.0.1:1/?page=2')
+        self.manager.replies[2].finish_page([3, 4], '')
+        self.assertTrue(fetcher.is_finished())
+        self.assertEqual(pages, [(1, [1, 2]), (2, [3, 4])])
+
+    def test_conditional_requests(self):
+        """
+        Test cached pages are requested conditionally, and reused when
+        they are not modified
+        """
+        cached_pages = {
+            1: FetchedPage(items=[1, 2], has_more=True, etag='"a"'),
+            2: FetchedPage(items=[3], last_modified='yesterday')
+        }
+        fetcher = self._fetcher(cached_pages=cached_pages)
+        pages = self._fetched_pages(fetcher)
+        fetcher.start()
+
+        request = self.manager.requests[1]
+        self.assertEqual(request.rawHeader(b'If-None-Match').data(), b'"a"')
+        # the QGIS network cache must not answer conditional requests
+        self.assertEqual(
+            request.attribute(QNetworkRequest.CacheLoadControlAttribute),
+            QNetworkRequest.AlwaysNetwork
+        )
+        self.manager.replies[1].finish_not_modified()
+
+        request = self.manager.requests[2]
+        self.assertEqual(
+            request.rawHeader(b'If-Modified-Since').data(), b'yesterday'
+        )
+        self.manager.replies[2].finish_not_modified()
+
+        # the cached pages still end the listing
+        self.assertTrue(fetcher.is_finished())
+        self.assertTrue(self.manager.replies[3].aborted)
+        self.assertEqual(pages, [(1, [1, 2]), (2, [3])])
+        self.assertIs(fetcher.pages()[1], cached_pages[1])
+        self.assertFalse(fetcher.is_modified())
+
+    def test_modified_pages(self):
+        """
+        Test modified pages replace cached pages
+        """
+        cached_pages = {
+            1: FetchedPage(items=[1, 2], has_more=True, etag='"a"'),
+            2: FetchedPage(items=[3], etag='"b"')
+        }
+        fetcher = self._fetcher(cached_pages=cached_pages)
+        pages = self._fetched_pages(fetcher)
+        fetcher.start()
+        self.manager.replies[1].finish_not_modified()
+        self.manager.replies[2].finish_page([3, 4], headers={b'ETag': b'"c"'})
+        self.manager.replies[3].finish_page([5])
+
+        self.assertTrue(fetcher.is_finished())
+        self.assertEqual(pages, [(1, [1, 2]), (2, [3, 4]), (3, [5])])
+        self.assertTrue(fetcher.is_modified())
+        self.assertEqual(fetcher.pages()[2].etag, '"c"')
+        self.assertIsNone(fetcher.pages()[3].etag)
+
+    def test_cancel(self):
+        """
+        Test canceling a fetch aborts its in-flight requests
+        """
+        fetcher = self._fetcher()
+        pages = self._fetched_pages(fetcher)
+        finished = []
+        fetcher.finished.connect(lambda: finished.append(True))
+        fetcher.start()
+        self.manager.replies[1].finish_page([1, 2])
+        self.manager.replies[3].finish_page([5, 6])
+        self.assertEqual(list(self.manager.replies), [1, 2, 3, 4, 5])
+
+        fetcher.cancel()
+        self.assertTrue(fetcher.is_canceled())
+        self.assertEqual(finished, [True])
+        for page in (2, 4, 5):
+            self.assertTrue(self.manager.replies[page].aborted)
+        # no further pages are emitted or requested
+        self.assertEqual(pages, [(1, [1, 2])])
+        self.assertEqual(list(self.manager.replies), [1, 2, 3, 4, 5])
+        self.assertEqual(list(fetcher.pages()), [1])
+
+        fetcher.cancel()
+        self.assertEqual(finished, [True])
+
+    def test_invalid_items(self):
+        """
+        Test items missing required fields fail the fetch
+        """
+        fetcher = self._fetcher()
+        pages = self._fetched_pages(fetcher)
+        errors = []
+        fetcher.error_occurred.connect(errors.append)
+        fetcher.start()
+        with mock.patch.object(pagination.ReplyItemsReader, 'finish',
+                               side_effect=KeyError('id')):
+            self.manager.replies[1].finish_page([{'name': 'item'}])
+
+        self.assertTrue(fetcher.is_finished())
+        self.assertEqual(pages, [])
+        self.assertEqual(errors, ["'id'"])
+
+    def test_cancel_queued(self):
+        """
+        Test canceling a fetch withdraws its queued page requests
+        """
+        scheduler = RequestScheduler(
+            rate=1000, burst=1000,
+            concurrency_limit=AimdConcurrencyLimit(initial=1, maximum=1)
+        )
+        # occupy the only request slot
+        slots = []
+        scheduler.submit(slots.append)
+
+        requested = []
+
+        def request_factory(page: int) -> QNetworkRequest:
+            requested.append(page)
+            return QNetworkRequest(QUrl('http://127.0.0.1:1/'))
+
+        fetcher = PagedFetcher(request_factory, dict, page_size=10,
+                               scheduler=scheduler)
+        fetcher.start()
+        self.assertEqual(scheduler.statistics().queued, 1)
+
+        fetcher.cancel()
+        self.assertTrue(fetcher.is_finished())
+        self.assertTrue(fetcher.is_canceled())
+        self.assertEqual(scheduler.statistics().queued, 0)
+
+        # the page request is never started, and no slot is leaked
+        scheduler.finish(slots[0], 200)
+        self.assertEqual(scheduler.statistics().active, 0)
+        self.assertFalse(requested)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(PagedFetcherTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
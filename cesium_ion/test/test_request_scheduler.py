@@ -0,0 +1,267 @@
+# coding=utf-8
+"""Request scheduler Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2024 by Nyall Dawson'
+__date__ = '01/03/2024'
+__copyright__ = 'Copyright 2024, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import random
+import unittest
+
+from ..core.request_scheduler import (
+    AimdConcurrencyLimit,
+    RequestPriority,
+    RequestScheduler,
+    TokenBucket,
+    parse_retry_after
+)
+from .utilities import (
+    FakeClock,
+    get_qgis_app
+)
+
+QGIS_APP = get_qgis_app()
+
+
+class RequestSchedulerTest(unittest.TestCase):
+    """Test request scheduler works."""
+
+    def test_token_bucket(self):
+        """
+        Test the token bucket rate limiter
+        """
+        clock = FakeClock(100.0)
+        bucket = TokenBucket(rate=2, capacity=3, clock=clock)
+        for _ in range(3):
+            self.assertEqual(bucket.try_consume(), 0)
+        self.assertAlmostEqual(bucket.try_consume(), 0.5)
+
+        clock.now += 0.5
+        self.assertEqual(bucket.try_consume(), 0)
+        self.assertAlmostEqual(bucket.try_consume(), 0.5)
+
+        # tokens don't accumulate beyond the capacity
+        clock.now += 100
+        for _ in range(3):
+            self.assertEqual(bucket.try_consume(), 0)
+        self.assertGreater(bucket.try_consume(), 0)
+
+    def test_concurrency_limit(self):
+        """
+        Test the adaptive concurrency limit
+        """
+        limit = AimdConcurrencyLimit(initial=4, minimum=1, maximum=6)
+        self.assertEqual(limit.limit(), 4)
+
+        for _ in range(5):
+            limit.on_success(0.1)
+        self.assertEqual(limit.limit(), 5)
+
+        limit.on_overload()
+        self.assertEqual(limit.limit(), 2)
+
+        # high latency reduces the limit
+        for _ in range(3):
+            limit.on_success(1.0)
+        self.assertEqual(limit.limit(), 1)
+
+        for _ in range(3):
+            limit.on_overload()
+        self.assertEqual(limit.limit(), 1)
+
+        for _ in range(100):
+            limit.on_success(0.1)
+        self.assertEqual(limit.limit(), 6)
+
+    def test_parse_retry_after(self):
+        """
+        Test parsing Retry-After headers
+        """
+        self.assertIsNone(parse_retry_after(None))
+        self.assertIsNone(parse_retry_after(''))
+        self.assertIsNone(parse_retry_after('soon'))
+        self.assertEqual(parse_retry_after('5'), 5)
+        self.assertEqual(parse_retry_after(' 2.5 '), 2.5)
+        self.assertEqual(parse_retry_after('-1'), 0)
+        self.assertAlmostEqual(
+            parse_retry_after('Wed, 21 Oct 2015 07:28:30 GMT',
+                              now=1445412480),
+            30
+        )
+
+    def test_scheduling(self):
+        """
+        Test requests are started within the concurrency limit
+        """
+        clock = FakeClock(100.0)
+        scheduler = RequestScheduler(
+            rate=1000, burst=1000,
+            concurrency_limit=AimdConcurrencyLimit(initial=2, maximum=2),
+            clock=clock
+        )
+        started = []
+        for i in range(4):
+            scheduler.submit(
+                lambda slot, i=i: started.append((i, slot))
+            )
+        self.assertEqual([i for i, _ in started], [0, 1])
+        statistics = scheduler.statistics()
+        self.assertEqual(statistics.active, 2)
+        self.assertEqual(statistics.queued, 2)
+
+        scheduler.finish(started[0][1], 200)
+        self.assertEqual([i for i, _ in started], [0, 1, 2])
+
+        # a Retry-After response pauses all requests
+        clock.now += 1
+        scheduler.finish(started[1][1], 429, retry_after=30)
+        self.assertEqual(len(started), 3)
+        statistics = scheduler.statistics()
+        self.assertEqual(statistics.throttled, 1)
+        self.assertEqual(statistics.concurrency_limit, 1)
+
+        scheduler.finish(started[2][1], 200)
+        self.assertEqual(len(started), 3)
+        clock.now += 30
+        # pylint: disable=protected-access
+        scheduler._dispatch()
+        # pylint: enable=protected-access
+        self.assertEqual([i for i, _ in started], [0, 1, 2, 3])
+        self.assertEqual(scheduler.statistics().started, 4)
+
+    def test_priorities(self):
+        """
+        Test interactive requests start before background requests
+        """
+        clock = FakeClock(100.0)
+        scheduler = RequestScheduler(
+            rate=1000, burst=1000,
+            concurrency_limit=AimdConcurrencyLimit(initial=4, maximum=4),
+            clock=clock
+        )
+        started = []
+
+        def submit(name, priority, **kwargs):
+            return scheduler.submit(
+                lambda slot: started.append((name, slot)),
+                priority=priority, **kwargs
+            )
+
+        # background requests may only use half the connections
+        for i in range(4):
+            submit('b{}'.format(i), RequestPriority.Background)
+        self.assertEqual([name for name, _ in started], ['b0', 'b1'])
+        self.assertEqual(scheduler.statistics().active_background, 2)
+
+        submit('n0', RequestPriority.Normal)
+        submit('i0', RequestPriority.Interactive)
+        submit('i1', RequestPriority.Interactive)
+        self.assertEqual([name for name, _ in started],
+                         ['b0', 'b1', 'n0', 'i0'])
+
+        # interactive requests jump the queue
+        scheduler.finish(started[0][1], 200)
+        self.assertEqual(started[-1][0], 'i1')
+        scheduler.finish(started[1][1], 200)
+        self.assertEqual(started[-1][0], 'b2')
+
+        # a promoted background request is started next
+        queued = submit('b4', RequestPriority.Background)
+        scheduler.promote(queued, RequestPriority.Interactive)
+        scheduler.finish(started[2][1], 200)
+        self.assertEqual(started[-1][0], 'b4')
+
+    def test_drop_stale(self):
+        """
+        Test stale queued requests are dropped
+        """
+        clock = FakeClock(100.0)
+        scheduler = RequestScheduler(
+            rate=1000, burst=1000,
+            concurrency_limit=AimdConcurrencyLimit(initial=1, maximum=1),
+            clock=clock
+        )
+        started = []
+        dropped = []
+        scheduler.submit(started.append)
+        scheduler.submit(started.append,
+                         priority=RequestPriority.Background,
+                         max_queue_time=10,
+                         dropped=lambda: dropped.append('stale'))
+        scheduler.submit(started.append,
+                         priority=RequestPriority.Background,
+                         max_queue_time=60,
+                         dropped=lambda: dropped.append('fresh'))
+        self.assertEqual(len(started), 1)
+
+        clock.now += 20
+        scheduler.finish(started[0], 200)
+        self.assertEqual(dropped, ['stale'])
+        self.assertEqual(len(started), 2)
+        self.assertEqual(scheduler.statistics().dropped, 1)
+
+    def test_cancel(self):
+        """
+        Test withdrawing queued requests
+        """
+        clock = FakeClock(100.0)
+        scheduler = RequestScheduler(
+            rate=1000, burst=1000,
+            concurrency_limit=AimdConcurrencyLimit(initial=1, maximum=1),
+            clock=clock
+        )
+        started = []
+        first = scheduler.submit(started.append)
+        second = scheduler.submit(started.append)
+        self.assertEqual(scheduler.statistics().queued, 1)
+
+        # started requests can't be canceled
+        self.assertFalse(scheduler.cancel(first))
+        self.assertTrue(scheduler.cancel(second))
+        self.assertFalse(scheduler.cancel(second))
+        self.assertEqual(scheduler.statistics().queued, 0)
+
+        scheduler.finish(started[0], 200)
+        self.assertEqual(len(started), 1)
+        self.assertEqual(scheduler.statistics().active, 0)
+
+    def test_retry_delay(self):
+        """
+        Test retry delays
+        """
+        scheduler = RequestScheduler(max_retries=3, rng=random.Random(1))
+        self.assertIsNone(scheduler.retry_delay(0, 404))
+        self.assertIsNone(scheduler.retry_delay(0, None))
+        self.assertIsNone(scheduler.retry_delay(3, 503))
+
+        for attempt in range(3):
+            delay = scheduler.retry_delay(attempt, 503)
+            self.assertGreaterEqual(delay, 0)
+            self.assertLessEqual(
+                delay, RequestScheduler.BACKOFF_BASE * 2 ** attempt
+            )
+
+        # the server's requested delay is honoured
+        self.assertGreaterEqual(scheduler.retry_delay(0, 429, 10), 10)
+
+        # non-idempotent requests are only retried when rate limited
+        self.assertIsNone(scheduler.retry_delay(0, 503, idempotent=False))
+        self.assertIsNotNone(
+            scheduler.retry_delay(0, 429, idempotent=False)
+        )
+        self.assertEqual(scheduler.statistics().retries, 5)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(RequestSchedulerTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,132 @@
+# coding=utf-8
+"""Response cache Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2024 by Nyall Dawson'
+__date__ = '01/03/2024'
+__copyright__ = 'Copyright 2024, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import unittest
+
+from ..core.response_cache import ResponseCache
+from .utilities import FakeClock
+
+
+class ResponseCacheTest(unittest.TestCase):
+    """Test ResponseCache works."""
+
+    def test_key(self):
+        """
+        Test cache keys
+        """
+        self.assertEqual(
+            ResponseCache.key('/v1/assets', {'page': 1, 'type': ['A', 'B']}),
+            ResponseCache.key('/v1/assets', {'type': ['A', 'B'], 'page': 1})
+        )
+        self.assertNotEqual(
+            ResponseCache.key('/v1/assets', {'page': 1}),
+            ResponseCache.key('/v1/assets', {'page': 2})
+        )
+        self.assertNotEqual(
+            ResponseCache.key('/v1/assets', {'page': 1}),
+            ResponseCache.key('/v2/tokens', {'page': 1})
+        )
+
+    def test_hit_miss(self):
+        """
+        Test cache hits and misses
+        """
+        cache = ResponseCache()
+        key = ResponseCache.key('/v2/tokens')
+        self.assertIsNone(cache.get(key))
+        cache.put(key, [1, 2])
+        self.assertEqual(cache.get(key), [1, 2])
+
+        statistics = cache.statistics()
+        self.assertEqual(statistics.hits, 1)
+        self.assertEqual(statistics.misses, 1)
+        self.assertEqual(statistics.hit_ratio(), 0.5)
+
+    def test_ttl(self):
+        """
+        Test that entries expire
+        """
+        clock = FakeClock()
+        cache = ResponseCache(ttl=10, clock=clock)
+        cache.put('a', 1)
+        clock.now = 9
+        self.assertEqual(cache.get('a'), 1)
+        clock.now = 10
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.statistics().expirations, 1)
+        self.assertEqual(len(cache), 0)
+
+    def test_stale(self):
+        """
+        Test retrieving expired entries
+        """
+        clock = FakeClock()
+        cache = ResponseCache(max_entries=2, ttl=10, clock=clock)
+        key = ResponseCache.key('/v2/tokens')
+        self.assertIsNone(cache.get_stale(key))
+        cache.put(key, 1)
+        self.assertEqual(cache.get_stale(key), 1)
+
+        clock.now = 10
+        self.assertIsNone(cache.get(key))
+        self.assertEqual(cache.get_stale(key), 1)
+        self.assertEqual(cache.statistics().misses, 1)
+
+        cache.put(key, 2)
+        self.assertEqual(cache.get(key), 2)
+
+        clock.now = 20
+        self.assertIsNone(cache.get(key))
+        cache.invalidate('/v2/tokens')
+        self.assertIsNone(cache.get_stale(key))
+
+    def test_lru_eviction(self):
+        """
+        Test that the least recently used entry is evicted
+        """
+        cache = ResponseCache(max_entries=2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        # make 'a' the most recently used entry
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(cache.statistics().evictions, 1)
+
+    def test_invalidate(self):
+        """
+        Test invalidating entries by endpoint
+        """
+        cache = ResponseCache()
+        tokens_key = ResponseCache.key('/v2/tokens', {'page': 1})
+        assets_key = ResponseCache.key('/v1/assets', {'page': 1})
+        cache.put(tokens_key, [])
+        cache.put(assets_key, [])
+
+        cache.invalidate('/v2/tokens')
+        self.assertIsNone(cache.get(tokens_key))
+        self.assertEqual(cache.get(assets_key), [])
+
+        cache.invalidate()
+        self.assertEqual(len(cache), 0)
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(ResponseCacheTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,185 @@
+# coding=utf-8
+"""Tile bounds Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2024 by Nyall Dawson'
+__date__ = '01/03/2024'
+__copyright__ = 'Copyright 2024, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import math
+import unittest
+
+from ..core.tile_bounds import (
+    IDENTITY_TRANSFORM,
+    TileArea,
+    bounding_volume_extent,
+    ecef_to_geodetic,
+    multiply_transforms,
+    terrain_level_for_geometric_error,
+    terrain_tile_extent,
+    terrain_tile_range,
+    TERRAIN_LEVEL_ZERO_GEOMETRIC_ERROR
+)
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+class TileBoundsTest(unittest.TestCase):
+    """Test tile bounds utilities work."""
+
+    def test_ecef_to_geodetic(self):
+        """
+        Test converting ECEF coordinates to geodetic coordinates
+        """
+        longitude, latitude, height = ecef_to_geodetic(6378137.0, 0, 0)
+        self.assertAlmostEqual(longitude, 0)
+        self.assertAlmostEqual(latitude, 0)
+        self.assertAlmostEqual(height, 0, 3)
+
+        longitude, latitude, height = ecef_to_geodetic(0, 6378237.0, 0)
+        self.assertAlmostEqual(longitude, 90)
+        self.assertAlmostEqual(latitude, 0)
+        self.assertAlmostEqual(height, 100, 3)
+
+        longitude, latitude, height = ecef_to_geodetic(0, 0, -6356752.3)
+        self.assertAlmostEqual(latitude, -90)
+        self.assertAlmostEqual(height, 0, 0)
+
+        # round trip a point near Canberra
+        a = 6378137.0
+        e2 = (1 / 298.257223563) * (2 - 1 / 298.257223563)
+        phi = math.radians(-35.2809)
+        lam = math.radians(149.13)
+        n = a / math.sqrt(1 - e2 * math.sin(phi) ** 2)
+        longitude, latitude, height = ecef_to_geodetic(
+            (n + 580) * math.cos(phi) * math.cos(lam),
+            (n + 580) * math.cos(phi) * math.sin(lam),
+            (n * (1 - e2) + 580) * math.sin(phi)
+        )
+        self.assertAlmostEqual(longitude, 149.13, 6)
+        self.assertAlmostEqual(latitude, -35.2809, 6)
+        self.assertAlmostEqual(height, 580, 2)
+
+    def test_multiply_transforms(self):
+        """
+        Test multiplying transforms
+        """
+        translate = (1, 0, 0, 0,
+                     0, 1, 0, 0,
+                     0, 0, 1, 0,
+                     10, 20, 30, 1)
+        scale = (2, 0, 0, 0,
+                 0, 2, 0, 0,
+                 0, 0, 2, 0,
+                 0, 0, 0, 1)
+        self.assertEqual(
+            multiply_transforms(IDENTITY_TRANSFORM, translate),
+            list(translate)
+        )
+        self.assertEqual(
+            multiply_transforms(translate, IDENTITY_TRANSFORM),
+            list(translate)
+        )
+        # scale is applied first, then the translation
+        self.assertEqual(
+            multiply_transforms(translate, scale),
+            [2, 0, 0, 0, 0, 2, 0, 0, 0, 0, 2, 0, 10, 20, 30, 1]
+        )
+        self.assertEqual(
+            multiply_transforms(scale, translate),
+            [2, 0, 0, 0, 0, 2, 0, 0, 0, 0, 2, 0, 20, 40, 60, 1]
+        )
+
+    def test_bounding_volume_extent(self):
+        """
+        Test calculating bounding volume extents
+        """
+        self.assertIsNone(bounding_volume_extent({}))
+
+        extent = bounding_volume_extent(
+            {'region': [-math.pi / 2, -math.pi / 4, 0, math.pi / 4, 0, 10]}
+        )
+        for value, expected in zip(extent, (-90, -45, 0, 45)):
+            self.assertAlmostEqual(value, expected)
+
+        # sphere at the origin is not georeferenced
+        self.assertIsNone(
+            bounding_volume_extent({'sphere': [0, 0, 0, 100]})
+        )
+
+        west, south, east, north = bounding_volume_extent(
+            {'sphere': [6378137.0, 0, 0, 1000]}
+        )
+        self.assertLess(west, 0)
+        self.assertGreater(east, 0)
+        self.assertLess(south, 0)
+        self.assertGreater(north, 0)
+        self.assertLess(east - west, 0.1)
+
+        # box, placed on the equator by the transform
+        transform = list(IDENTITY_TRANSFORM)
+        transform[12] = 6378137.0
+        west, south, east, north = bounding_volume_extent(
+            {'box': [0, 0, 0, 100, 0, 0, 0, 100, 0, 0, 0, 100]},
+            transform
+        )
+        self.assertLess(west, 0)
+        self.assertGreater(east, 0)
+        self.assertLess(south, 0)
+        self.assertGreater(north, 0)
+        self.assertLess(east - west, 0.01)
+
+    def test_terrain_tiles(self):
+        """
+        Test quantized mesh tile extents and ranges
+        """
+        self.assertEqual(terrain_tile_extent(0, 0, 0), (-180, -90, 0, 90))
+        self.assertEqual(terrain_tile_extent(0, 1, 0), (0, -90, 180, 90))
+        self.assertEqual(terrain_tile_extent(1, 3, 1), (90, 0, 180, 90))
+
+        self.assertEqual(terrain_tile_range(0, (-180, -90, 180, 90)),
+                         (0, 0, 1, 0))
+        self.assertEqual(terrain_tile_range(1, (10, 10, 20, 20)),
+                         (2, 1, 2, 1))
+        self.assertEqual(terrain_tile_range(2, (-200, -100, 200, 100)),
+                         (0, 0, 7, 3))
+
+        self.assertEqual(
+            terrain_level_for_geometric_error(
+                TERRAIN_LEVEL_ZERO_GEOMETRIC_ERROR), 0
+        )
+        self.assertEqual(
+            terrain_level_for_geometric_error(
+                TERRAIN_LEVEL_ZERO_GEOMETRIC_ERROR / 3), 2
+        )
+        self.assertEqual(terrain_level_for_geometric_error(0), 30)
+        self.assertEqual(terrain_level_for_geometric_error(0, 5), 5)
+
+    def test_tile_area(self):
+        """
+        Test tile area intersection
+        """
+        area = TileArea((0, 0, 10, 10))
+        self.assertTrue(area.intersects(None))
+        self.assertTrue(area.intersects((5, 5, 20, 20)))
+        self.assertFalse(area.intersects((11, 0, 20, 10)))
+
+        area = TileArea((0, 0, 10, 10), lambda extent: extent[0] < 5)
+        self.assertTrue(area.intersects((1, 1, 2, 2)))
+        self.assertFalse(area.intersects((6, 1, 7, 2)))
+        self.assertFalse(area.intersects((11, 0, 20, 10)))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TileBoundsTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,135 @@
+# coding=utf-8
+"""Tile cache Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2024 by Nyall Dawson'
+__date__ = '01/03/2024'
+__copyright__ = 'Copyright 2024, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import os
+import tempfile
+import unittest
+from unittest import mock
+
+from ..core import tile_cache
+from ..core.tile_cache import TileCache
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+TILE_URL = 'https://assets.ion.cesium.com/1/tiles/{}.b3dm?v=1'
+
+
+class TileCacheTest(unittest.TestCase):
+    """Test tile cache works."""
+
+    def test_cacheable_url(self):
+        """
+        Test determining which URLs are cached
+        """
+        self.assertTrue(TileCache.is_cacheable_url(TILE_URL.format(0)))
+        self.assertTrue(
+            TileCache.is_cacheable_url('https://assets.cesium.com/1/a.glb')
+        )
+        self.assertFalse(
+            TileCache.is_cacheable_url('https://example.com/tileset.json')
+        )
+        self.assertFalse(
+            TileCache.is_cacheable_url('https://notcesium.com/a.glb')
+        )
+
+    def test_get_put(self):
+        """
+        Test storing and retrieving tiles
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = TileCache(temp_dir)
+            self.assertIsNone(cache.get(TILE_URL.format(0)))
+            self.assertTrue(cache.put(TILE_URL.format(0), b'abc',
+                                      'application/octet-stream'))
+            tile = cache.get(TILE_URL.format(0))
+            self.assertEqual(tile.content, b'abc')
+            self.assertEqual(tile.content_type, 'application/octet-stream')
+            self.assertTrue(cache.contains(TILE_URL.format(0)))
+            self.assertFalse(cache.contains(TILE_URL.format(1)))
+
+            statistics = cache.statistics()
+            self.assertEqual(statistics.hits, 1)
+            self.assertEqual(statistics.misses, 1)
+            self.assertEqual(statistics.insertions, 1)
+            self.assertEqual(statistics.entry_count, 1)
+            self.assertAlmostEqual(statistics.hit_ratio(), 0.5)
+
+            # entries persist
+            cache = TileCache(temp_dir)
+            self.assertEqual(cache.get(TILE_URL.format(0)).content, b'abc')
+
+            cache.remove(TILE_URL.format(0))
+            self.assertIsNone(cache.get(TILE_URL.format(0)))
+            self.assertEqual(cache.statistics().size_bytes, 0)
+
+    def test_failed_write(self):
+        """
+        Test a failed write leaves no partial files behind
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = TileCache(temp_dir)
+            with mock.patch.object(tile_cache.os, 'replace',
+                                   side_effect=OSError):
+                self.assertFalse(cache.put(TILE_URL.format(0), b'abc'))
+
+            self.assertEqual(os.listdir(str(cache.directory())), [])
+            self.assertIsNone(cache.get(TILE_URL.format(0)))
+
+    def test_eviction(self):
+        """
+        Test least recently used entries are evicted
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = TileCache(temp_dir)
+            cache.put(TILE_URL.format(0), b'x' * 1000)
+            entry_size = cache.statistics().size_bytes
+            cache.set_max_size(entry_size * 3)
+
+            cache.put(TILE_URL.format(1), b'x' * 1000)
+            cache.put(TILE_URL.format(2), b'x' * 1000)
+            # use tile 0, so that tile 1 is the least recently used
+            self.assertIsNotNone(cache.get(TILE_URL.format(0)))
+            cache.put(TILE_URL.format(3), b'x' * 1000)
+
+            self.assertTrue(cache.contains(TILE_URL.format(0)))
+            self.assertFalse(cache.contains(TILE_URL.format(1)))
+            self.assertTrue(cache.contains(TILE_URL.format(2)))
+            self.assertTrue(cache.contains(TILE_URL.format(3)))
+
+            statistics = cache.statistics()
+            self.assertEqual(statistics.evictions, 1)
+            self.assertEqual(statistics.entry_count, 3)
+            self.assertLessEqual(statistics.size_bytes, entry_size * 3)
+
+            # content larger than the cache is not stored
+            self.assertFalse(cache.put(TILE_URL.format(4),
+                                       b'x' * entry_size * 4))
+
+            cache.set_max_size(entry_size)
+            self.assertEqual(cache.statistics().entry_count, 1)
+
+            cache.clear()
+            self.assertEqual(cache.statistics().entry_count, 0)
+            self.assertFalse(
+                [f for f in os.listdir(temp_dir) if f.endswith('.tile')]
+            )
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TileCacheTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
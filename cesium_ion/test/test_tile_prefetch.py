@@ -0,0 +1,111 @@
+# coding=utf-8
+"""Tile prefetch Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2024 by Nyall Dawson'
+__date__ = '01/03/2024'
+__copyright__ = 'Copyright 2024, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import unittest
+
+from ..core.tile_bounds import (
+    TileArea,
+    terrain_level_for_geometric_error
+)
+from ..core.tile_prefetch import (
+    TilePrefetcher,
+    resolve_tile_url,
+    tile_content_uris
+)
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+class TilePrefetchTest(unittest.TestCase):
+    """Test tile prefetch utilities work."""
+
+    def test_resolve_tile_url(self):
+        """
+        Test resolving tile URLs
+        """
+        base = 'https://assets.ion.cesium.com/1/tileset.json?v=3'
+        self.assertEqual(
+            resolve_tile_url(base, 'tiles/0.b3dm'),
+            'https://assets.ion.cesium.com/1/tiles/0.b3dm?v=3'
+        )
+        self.assertEqual(
+            resolve_tile_url(base, 'tiles/0.b3dm?v=4'),
+            'https://assets.ion.cesium.com/1/tiles/0.b3dm?v=4'
+        )
+        self.assertEqual(
+            resolve_tile_url(base, 'https://example.com/a.glb'),
+            'https://example.com/a.glb'
+        )
+        self.assertEqual(
+            resolve_tile_url('https://assets.ion.cesium.com/1/',
+                             'layer.json'),
+            'https://assets.ion.cesium.com/1/layer.json'
+        )
+
+    def test_tile_content_uris(self):
+        """
+        Test retrieving tile content URIs
+        """
+        self.assertEqual(tile_content_uris({}), [])
+        self.assertEqual(
+            tile_content_uris({'content': {'uri': 'a.b3dm'}}), ['a.b3dm']
+        )
+        self.assertEqual(
+            tile_content_uris({'content': {'url': 'legacy.b3dm'}}),
+            ['legacy.b3dm']
+        )
+        self.assertEqual(
+            tile_content_uris({'contents': [{'uri': 'a.glb'},
+                                            {'uri': 'b.glb'}]}),
+            ['a.glb', 'b.glb']
+        )
+
+    def test_terrain_geometric_error(self):
+        """
+        Test terrain traversal stops at the level matching the maximum
+        geometric error
+        """
+        layer_url = 'https://assets.ion.cesium.com/1/layer.json'
+        layer = {'tiles': ['{z}/{x}/{y}.terrain?v={version}'],
+                 'maxzoom': 20}
+        area = TileArea((10.0, 20.0, 10.01, 20.01))
+
+        def levels(**kwargs):
+            prefetcher = TilePrefetcher(None, 1, area=area, plan_only=True,
+                                        **kwargs)
+            # pylint: disable=protected-access
+            urls = prefetcher._terrain_tile_urls(layer_url, layer)
+            # pylint: enable=protected-access
+            return sorted({int(url.split('/')[4]) for url in urls})
+
+        self.assertEqual(levels(max_depth=None), list(range(21)))
+        self.assertEqual(levels(max_depth=3), [0, 1, 2])
+        level = terrain_level_for_geometric_error(1000)
+        self.assertLess(level, 20)
+        self.assertEqual(
+            levels(max_depth=None, max_geometric_error=1000),
+            list(range(level + 1))
+        )
+        self.assertEqual(
+            levels(max_depth=3, max_geometric_error=1000), [0, 1, 2]
+        )
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TilePrefetchTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
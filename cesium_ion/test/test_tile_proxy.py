@@ -0,0 +1,310 @@
+# coding=utf-8
+"""Tile proxy Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2024 by Nyall Dawson'
+__date__ = '01/03/2024'
+__copyright__ = 'Copyright 2024, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import re
+import tempfile
+import unittest
+import urllib.error
+import urllib.request
+
+from qgis.PyQt.QtNetwork import QNetworkReply
+
+from ..core.endpoint_cache import AssetEndpoint
+from ..core.tile_cache import TileCache
+from ..core.tile_proxy import (
+    ProxiedSources,
+    TileProxyServer,
+    proxied_tile_url
+)
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+ENDPOINT_URL = 'https://assets.ion.cesium.com/1/tileset.json?v=2'
+
+
+class _EndpointCache:
+    """
+    Endpoint cache resolving a single asset
+    """
+
+    def __init__(self):
+        self.tokens = []
+
+    def resolve_blocking(self, asset_id, token=None):
+        """
+        Resolves the endpoint for an asset, which is only accessible
+        with the plugin's login or the token "abc"
+        """
+        self.tokens.append(token)
+        if asset_id != 1:
+            return None, QNetworkReply.ContentNotFoundError
+        if token not in (None, 'abc'):
+            return None, QNetworkReply.ContentAccessDenied
+        return AssetEndpoint(asset_id=1, type='3DTILES', url=ENDPOINT_URL,
+                             access_token='xyz', expires=0), \
+            QNetworkReply.NoError
+
+    def invalidate(self, asset_id=None, token=None):
+        """
+        Invalidates endpoints
+        """
+
+
+class _Client:
+    """
+    API client with a fake endpoint cache
+    """
+
+    OAUTH_ID = 'cesiion'
+
+    def __init__(self):
+        self._endpoint_cache = _EndpointCache()
+
+    def endpoint_cache(self):
+        """
+        Returns the endpoint cache
+        """
+        return self._endpoint_cache
+
+
+class TileProxyTest(unittest.TestCase):
+    """Test tile proxy works."""
+
+    @staticmethod
+    def _status(url) -> int:
+        """
+        Returns the HTTP status for a URL or request
+        """
+        try:
+            with urllib.request.urlopen(url) as response:
+                return response.status
+        except urllib.error.HTTPError as e:
+            return e.code
+
+    @staticmethod
+    def _key(proxied: str) -> str:
+        """
+        Returns the source key from a proxied source
+        """
+        return re.search(r'/ion/\d+-(\w+)/', proxied).group(1)
+
+    def test_proxied_tile_url(self):
+        """
+        Test mapping proxy paths to ion URLs
+        """
+        self.assertEqual(proxied_tile_url(ENDPOINT_URL, 'tileset.json'),
+                         ENDPOINT_URL)
+        self.assertEqual(
+            proxied_tile_url(ENDPOINT_URL, 'tiles/0.b3dm'),
+            'https://assets.ion.cesium.com/1/tiles/0.b3dm?v=2'
+        )
+        self.assertEqual(
+            proxied_tile_url(ENDPOINT_URL, 'tiles/0.b3dm', 'v=3'),
+            'https://assets.ion.cesium.com/1/tiles/0.b3dm?v=3'
+        )
+        # an empty path is the asset's root
+        self.assertEqual(proxied_tile_url(ENDPOINT_URL, ''), ENDPOINT_URL)
+
+    def test_proxied_sources(self):
+        """
+        Test rewriting ion:// sources to load through a proxy
+        """
+        sources = ProxiedSources()
+        source = 'ion://?assetId=1&accessToken=abc'
+        self.assertEqual(sources.proxied(source, None), source)
+        self.assertEqual(
+            sources.proxied('/data/tileset.json', 'http://proxy/s'),
+            '/data/tileset.json'
+        )
+
+        proxied = sources.proxied(source, 'http://proxy:8765/secret/')
+        self.assertTrue(
+            proxied.startswith('url=http://proxy:8765/secret/ion/1-')
+        )
+        # the access token is sent to the proxy in a header
+        self.assertTrue(
+            proxied.endswith('/&http-header:X-Cesium-Ion-Token=abc')
+        )
+        self.assertEqual(sources.original(proxied), source)
+        self.assertEqual(sources.original('other'), 'other')
+        self.assertEqual(sources.proxied(source, 'http://proxy:8765/secret'),
+                         proxied)
+        self.assertEqual(sources.source(1, self._key(proxied)).access_token,
+                         'abc')
+        self.assertIsNone(sources.source(2, self._key(proxied)))
+
+        # sources for the same asset with different credentials are
+        # restored separately
+        other_source = 'ion://?assetId=1&authcfg=cesiion'
+        other_proxied = sources.proxied(other_source, 'http://proxy:8765/s')
+        self.assertTrue(other_proxied.endswith('/'))
+        self.assertNotEqual(self._key(other_proxied), self._key(proxied))
+        self.assertEqual(sources.original(other_proxied), other_source)
+        self.assertEqual(sources.original(proxied), source)
+        self.assertEqual(
+            sources.source(1, self._key(other_proxied)).auth_cfg, 'cesiion'
+        )
+
+    def test_serve_cached(self):
+        """
+        Test serving cached tiles
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            cache = TileCache(temp_dir)
+            cache.put('https://assets.ion.cesium.com/1/tiles/0.b3dm?v=2',
+                      b'tile', 'application/octet-stream')
+            cache.put(ENDPOINT_URL, b'{}', 'application/json')
+            # content fetched with a token is only served to that token
+            cache.put(TileCache.cache_url(ENDPOINT_URL, 'abc'), b'[]',
+                      'application/json')
+
+            client = _Client()
+            sources = ProxiedSources()
+            proxy = TileProxyServer(client, cache, sources)
+            self.assertTrue(proxy.start(port=0))
+            try:
+                base_url = proxy.base_url()
+                self.assertTrue(base_url.startswith('http://127.0.0.1:'))
+                self.assertTrue(base_url.endswith('/' + proxy.secret()))
+                login_key = self._key(sources.proxied(
+                    'ion://?assetId=1&authcfg=cesiion', base_url
+                ))
+                token_key = self._key(sources.proxied(
+                    'ion://?assetId=1&accessToken=abc', base_url
+                ))
+
+                with urllib.request.urlopen(
+                        base_url + '/ion/1-{}/tiles/0.b3dm'.format(
+                            login_key)) as response:
+                    self.assertEqual(response.status, 200)
+                    self.assertEqual(response.read(), b'tile')
+                    self.assertEqual(response.headers['Content-Type'],
+                                     'application/octet-stream')
+                    self.assertIsNone(
+                        response.headers['Access-Control-Allow-Origin']
+                    )
+
+                # an empty path is the asset's root
+                with urllib.request.urlopen(
+                        base_url + '/ion/1-{}/'.format(
+                            token_key)) as response:
+                    self.assertEqual(response.read(), b'[]')
+                self.assertEqual(client.endpoint_cache().tokens,
+                                 [None, 'abc'])
+
+                # a token sent in the header is used for unknown keys
+                request = urllib.request.Request(
+                    base_url + '/ion/1/',
+                    headers={TileProxyServer.TOKEN_HEADER: 'abc'}
+                )
+                with urllib.request.urlopen(request) as response:
+                    self.assertEqual(response.read(), b'[]')
+
+                # requests without credentials are never served with the
+                # plugin's login
+                self.assertEqual(
+                    self._status(base_url + '/ion/1/tiles/0.b3dm'), 403
+                )
+                self.assertEqual(
+                    self._status(base_url + '/ion/1-abc/tiles/0.b3dm'), 403
+                )
+                request = urllib.request.Request(
+                    base_url + '/ion/1/',
+                    headers={TileProxyServer.TOKEN_HEADER: 'def'}
+                )
+                self.assertEqual(self._status(request), 403)
+                request = urllib.request.Request(
+                    base_url + '/ion/2/',
+                    headers={TileProxyServer.TOKEN_HEADER: 'abc'}
+                )
+                self.assertEqual(self._status(request), 404)
+                self.assertEqual(self._status(base_url + '/other'), 404)
+
+                # requests without the secret are rejected
+                server_url = base_url[:-len(proxy.secret()) - 1]
+                self.assertEqual(
+                    self._status(server_url + '/ion/1/tiles/0.b3dm'), 404
+                )
+                self.assertEqual(
+                    self._status(server_url + '/wrong/ion/1/tiles/0.b3dm'),
+                    404
+                )
+            finally:
+                proxy.stop()
+
+            self.assertFalse(proxy.is_running())
+            self.assertEqual(cache.statistics().hits, 3)
+
+    def test_credentials(self):
+        """
+        Test choosing the credentials for proxy requests
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            sources = ProxiedSources()
+            proxy = TileProxyServer(_Client(), TileCache(temp_dir), sources)
+            login_key = self._key(sources.proxied(
+                'ion://?assetId=1&authcfg=cesiion', 'http://proxy/s'
+            ))
+            other_key = self._key(sources.proxied(
+                'ion://?assetId=1&authcfg=other', 'http://proxy/s'
+            ))
+
+            source = proxy.credentials(1, login_key, None, True)
+            self.assertEqual(source.auth_cfg, 'cesiion')
+            self.assertIsNone(source.access_token)
+            self.assertIsNone(proxy.credentials(1, other_key, None, True))
+            self.assertIsNone(proxy.credentials(2, login_key, None, True))
+
+            # other workstations can't use this workstation's credentials
+            self.assertIsNone(proxy.credentials(1, login_key, None, False))
+            source = proxy.credentials(1, login_key, 'abc', False)
+            self.assertEqual(source.access_token, 'abc')
+            self.assertIsNone(source.auth_cfg)
+
+    def test_cache_url(self):
+        """
+        Test cache URLs for content fetched with access tokens
+        """
+        self.assertEqual(TileCache.cache_url(ENDPOINT_URL), ENDPOINT_URL)
+        self.assertEqual(TileCache.cache_url(ENDPOINT_URL, None),
+                         ENDPOINT_URL)
+        url = TileCache.cache_url(ENDPOINT_URL, 'abc')
+        self.assertTrue(url.startswith(ENDPOINT_URL + '#credential='))
+        self.assertNotIn('abc', url[len(ENDPOINT_URL):])
+        self.assertNotEqual(TileCache.cache_url(ENDPOINT_URL, 'def'), url)
+        self.assertTrue(TileCache.is_cacheable_url(url))
+
+    def test_configured_secret(self):
+        """
+        Test starting the proxy with a configured secret
+        """
+        with tempfile.TemporaryDirectory() as temp_dir:
+            proxy = TileProxyServer(_Client(), TileCache(temp_dir))
+            self.assertTrue(proxy.start(port=0, secret='office'))
+            try:
+                self.assertTrue(proxy.base_url().endswith('/office'))
+                self.assertTrue(proxy.is_valid_secret('office'))
+                self.assertFalse(proxy.is_valid_secret('other'))
+            finally:
+                proxy.stop()
+            self.assertFalse(proxy.is_valid_secret(''))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TileProxyTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -0,0 +1,139 @@
+# coding=utf-8
+"""Token index Test.
+
+.. note:: This program is free software; you can redistribute it and/or modify
+     it under the terms of the GNU General Public License as published by
+     the Free Software Foundation; either version 2 of the License, or
+     (at your option) any later version.
+
+"""
+
+__author__ = '(C) 2024 by Nyall Dawson'
+__date__ = '01/03/2024'
+__copyright__ = 'Copyright 2024, North Road'
+# This will get replaced with a git SHA1 when you do a git archive
+__revision__ = '$Format:%H$'
+
+import unittest
+from unittest import mock
+
+from ..core import (
+    Asset,
+    AssetType,
+    Status,
+    Token,
+    TokenIndex
+)
+from ..gui import data_items
+from ..gui.data_items import CesiumIonLayerUtils
+from .utilities import get_qgis_app
+
+QGIS_APP = get_qgis_app()
+
+
+class TokenIndexTest(unittest.TestCase):
+    """Test TokenIndex works."""
+
+    def test_find(self):
+        """
+        Test finding tokens covering assets
+        """
+        single = Token(id='1', name='single', token='t1',
+                       scopes=['assets:read'], asset_ids=[1])
+        pair = Token(id='2', name='pair', token='t2',
+                     scopes=['assets:list', 'assets:read'],
+                     asset_ids=[1, 2])
+        list_only = Token(id='3', name='list only', token='t3',
+                          scopes=['assets:list'], asset_ids=[3])
+        index = TokenIndex([single, pair, list_only])
+        self.assertEqual(len(index), 3)
+
+        # the most restricted covering token is preferred
+        self.assertIs(index.find([1], ['assets:read']), single)
+        self.assertIs(index.find([1, 2], ['assets:read']), pair)
+        self.assertIs(index.find([2], ['assets:read', 'assets:list']), pair)
+        self.assertIsNone(index.find([1, 3], ['assets:read']))
+        self.assertIsNone(index.find([3], ['assets:read']))
+        self.assertIsNone(index.find([4], ['assets:read']))
+        self.assertIsNone(index.find([], ['assets:read']))
+
+    def test_unrestricted_tokens(self):
+        """
+        Test tokens which grant access to all assets are never returned
+        """
+        default = Token(id='1', name='default', token='t1',
+                        scopes=['assets:read'], is_default=True)
+        index = TokenIndex([default])
+        self.assertEqual(len(index), 1)
+        self.assertIsNone(index.find([5, 6], ['assets:read']))
+
+        all_assets = Token(id='2', name='all', token='t2',
+                           scopes=['assets:read'])
+        index.add(all_assets)
+        self.assertIsNone(index.find([5, 6], ['assets:read']))
+
+        # a default token restricted to assets is still not reused
+        restricted_default = Token(id='3', name='default', token='t3',
+                                   scopes=['assets:read'], asset_ids=[5],
+                                   is_default=True)
+        index.add(restricted_default)
+        self.assertIsNone(index.find([5], ['assets:read']))
+
+        single = Token(id='4', name='single', token='t4',
+                       scopes=['assets:read'], asset_ids=[5])
+        index.add(single)
+        self.assertIs(index.find([5], ['assets:read']), single)
+        self.assertIsNone(index.find([5, 6], ['assets:read']))
+
+    def test_token_for_assets(self):
+        """
+        Test a new token is created when only the default token exists
+        """
+        default = Token(id='1', name='default', token='t1',
+                        scopes=['assets:list', 'assets:read'],
+                        is_default=True)
+        created = Token(id='2', name='new', token='t2',
+                        scopes=['assets:list', 'assets:read'],
+                        asset_ids=[5])
+        asset = Asset(id=5, name='asset', type=AssetType.Tiles3D,
+                      status=Status.Complete)
+
+        with mock.patch.object(data_items, 'API_CLIENT') as client, \
+                mock.patch.object(data_items.PluginSettings,
+                                  'reuse_existing_tokens',
+                                  return_value=True):
+            client.token_index.return_value = TokenIndex([default])
+            client.create_token.return_value = created
+            self.assertIs(
+                CesiumIonLayerUtils.token_for_assets('new', [asset]),
+                created
+            )
+            client.create_token.assert_called_once_with(
+                'new',
+                scopes=CesiumIonLayerUtils.NEW_TOKEN_SCOPES,
+                asset_ids=[5]
+            )
+
+            # an existing restricted token is reused, whatever its name
+            client.create_token.reset_mock()
+            client.token_index.return_value = TokenIndex([default, created])
+            self.assertIs(
+                CesiumIonLayerUtils.token_for_assets('other', [asset]),
+                created
+            )
+            client.create_token.assert_not_called()
+
+    def test_tokens_without_secret(self):
+        """
+        Test that tokens without a token string are ignored
+        """
+        index = TokenIndex([Token(id='1', name='a', token=None,
+                                  scopes=['assets:read'], asset_ids=[1])])
+        self.assertEqual(len(index), 0)
+        self.assertIsNone(index.find([1], ['assets:read']))
+
+
+if __name__ == "__main__":
+    suite = unittest.makeSuite(TokenIndexTest)
+    runner = unittest.TextTestRunner(verbosity=2)
+    runner.run(suite)
@@ -5,11 +5,24 @@ import sys
 import logging
 import os
 import atexit
+from typing import (
+    Dict,
+    Optional
+)
 
 from qgis.core import QgsApplication
 from qgis.utils import iface
 from qgis.gui import QgsMapCanvas
-from qgis.PyQt.QtCore import QSize
+from qgis.PyQt.QtCore import (
+    QByteArray,
+    QObject,
+    QSize,
+    pyqtSignal
+)
+from qgis.PyQt.QtNetwork import (
+    QNetworkReply,
+    QNetworkRequest
+)
 from qgis.PyQt.QtWidgets import QWidget
 
 from .qgis_interface import QgisInterface
@@ -106,3 +119,102 @@ def get_qgis_app(cleanup=True):
         IFACE = QgisInterface(CANVAS)
 
     return QGISAPP, CANVAS, IFACE, PARENT
+
+
+class FakeClock:
+    """
+    A manually advanced clock, for classes which accept a clock callable
+    """
+
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeReply(QObject):
+    """
+    A network reply which is finished manually
+    """
+
+    readyRead = pyqtSignal()
+    metaDataChanged = pyqtSignal()
+    finished = pyqtSignal()
+
+    def __init__(self):
+        super().__init__()
+        self._error = QNetworkReply.NoError
+        self._data = b''
+        self._status: Optional[int] = 200
+        self._headers: Dict[bytes, bytes] = {}
+        self._is_finished = False
+        self.aborted = False
+
+    def error(self):
+        """
+        Returns the reply's error
+        """
+        return self._error
+
+    def errorString(self) -> str:  # pylint: disable=invalid-name
+        """
+        Returns the reply's error message
+        """
+        return 'error {}'.format(self._error)
+
+    def isFinished(self) -> bool:  # pylint: disable=invalid-name
+        """
+        Returns True if the reply is finished
+        """
+        return self._is_finished
+
+    def attribute(self, attribute):
+        """
+        Returns a reply attribute
+        """
+        if attribute == QNetworkRequest.HttpStatusCodeAttribute:
+            return self._status
+        return None
+
+    def rawHeader(self, name) -> QByteArray:  # pylint: disable=invalid-name
+        """
+        Returns a raw header
+        """
+        return QByteArray(self._headers.get(name, b''))
+
+    def readAll(self) -> QByteArray:  # pylint: disable=invalid-name
+        """
+        Returns all available data
+        """
+        data = self._data
+        self._data = b''
+        return QByteArray(data)
+
+    def finish(self, error=QNetworkReply.NoError):
+        """
+        Finishes the reply, without a response
+        """
+        self._error = error
+        self._is_finished = True
+        self.finished.emit()
+
+    def respond(self, data: bytes, status: int = 200,
+                headers: Optional[Dict[bytes, bytes]] = None):
+        """
+        Finishes the reply with a response
+        """
+        self._status = status
+        self._headers = headers or {}
+        self.metaDataChanged.emit()
+        if data:
+            self._data = data
+            self.readyRead.emit()
+        self.finish()
+
+    def abort(self):
+        """
+        Aborts the reply
+        """
+        self.aborted = True
+        self.finish(QNetworkReply.OperationCanceledError)